@@ -15,6 +15,16 @@ ETHERPY_DATA_DIR = os.environ.get(
     "ETHERPY_DATA_DIR",
     os.getcwd()
 )
+ETHERPY_CACHE_DIR = os.environ.get(
+    "ETHERPY_CACHE_DIR",
+    os.path.join(
+        os.environ.get(
+            "XDG_CACHE_HOME",
+            os.path.join(os.path.expanduser('~'), '.cache')
+        ),
+        'ether-py'
+    )
+)
 
 
 def copyright():
@@ -50,19 +60,31 @@ __summary__ = 'The ether-py Ethereum command line interface.'
 __title__ = 'ether-py'
 __url__ = 'https://github.com/davedittrich/ether-py'
 
-# Get development version from repository tags?
-try:
-    from setuptools_scm import get_version
-    __version__ = get_version(root='..', relative_to=__file__)
-except (LookupError, ModuleNotFoundError):
-    pass
+# Get development version from repository tags? Only bother importing
+# ``setuptools_scm`` (which is slow to import) when running from a
+# source checkout.
+if os.path.exists(
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), '.git')
+):
+    try:
+        from setuptools_scm import get_version
+        __version__ = get_version(root='..', relative_to=__file__)
+    except (LookupError, ModuleNotFoundError):
+        pass
 
 if __version__ is None:
-    from pkg_resources import get_distribution, DistributionNotFound
     try:
-        __version__ = get_distribution("ether_py").version
-    except (DistributionNotFound, ModuleNotFoundError):
-        pass
+        from importlib.metadata import version, PackageNotFoundError
+        try:
+            __version__ = version("ether_py")
+        except PackageNotFoundError:
+            pass
+    except ModuleNotFoundError:
+        from pkg_resources import get_distribution, DistributionNotFound
+        try:
+            __version__ = get_distribution("ether_py").version
+        except DistributionNotFound:
+            pass
 
 if __version__ is None:
     __version__ = __release__
@@ -7,31 +7,63 @@
 
 # Standard library modules.
 import argparse
-import coloredlogs
 import logging
 import os
 import sys
 import textwrap
+import threading
+import time
 
 from . import (
     __version__,
     ETHERPY_DATA_DIR,
 )
 from ether_py.utils import (
+    endpoint_type,
     ganache_url,
     infura_url,
+    is_endpoint_uri,
     Timer,
 )
+from ether_py.utils.commandmanager import CachedCommandManager
+from ether_py.utils.endpoint import (
+    ENDPOINT_CACHE_TTL,
+    Endpoint,
+    EndpointConnectionError,
+)
+from ether_py.utils.metrics import (
+    metrics_middleware,
+    start_metrics,
+    stop_metrics,
+)
+from ether_py.utils.profiling import (
+    PROFILE,
+    PROFILE_SAMPLE,
+    CommandProfiler,
+    should_profile,
+)
+from ether_py.utils.secretsnapshot import SecretsSnapshot
+from ether_py.utils.trace import (
+    get_tracer,
+    span,
+    start_tracing,
+    stop_tracing,
+    traced,
+    tracing_middleware,
+)
+from ether_py.utils.rpcbatch import (
+    RPC_BATCH_SIZE,
+    RPCBatch,
+    SerialEngine,
+)
 # External dependencies.
 
 from cliff.app import App
-from cliff.commandmanager import CommandManager
-from psec.secrets_environment import SecretsEnvironment
-from web3 import Web3
 
 # List command groups that require an established connection
 # to an ethereum endpoint.
 REQUIRES_ETH_ENDPOINT = [
+    'account',
     'block',
     'demo',
     'eth',
@@ -41,6 +73,12 @@ REQUIRES_ETH_ENDPOINT = [
     'tx',
 ]
 
+# Middleware (and names) installed in every endpoint's ``Web3`` object.
+ENDPOINT_MIDDLEWARES = [
+    (metrics_middleware, 'metrics'),
+    (tracing_middleware, 'tracing'),
+]
+
 if sys.version_info < (3, 6, 0):
     print(f"The { os.path.basename(sys.argv[0]) } program "
           "prequires Python 3.6.0 or newer\n"
@@ -56,18 +94,32 @@ def default_environment(default='ether-py'):
 class Ether_pyApp(App):
     """The ether-py Ethereum command line interface."""
 
-    def __init__(self):
+    def __init__(self, stdin=None, stdout=None, stderr=None, warm=None):
         super().__init__(
             description=__doc__.strip(),
             version=__version__,
-            command_manager=CommandManager(
+            command_manager=CachedCommandManager(
                 namespace='ether_py'
             ),
+            stdin=stdin,
+            stdout=stdout,
+            stderr=stderr,
             deferred_help=True,
         )
         self.environment = None
-        self.se = None
+        self.endpoint = None
+        self._se = None
+        self._block_store = None
+        self._endpoint_lock = threading.RLock()
         self.timer = Timer()
+        self.metrics = None
+        # State kept warm across invocations by the ``ether-py`` daemon,
+        # keyed by environment.
+        self.warm = warm if warm is not None else {}
+
+    def get_warm_state(self):
+        """Return the warm state dictionary for the current environment."""
+        return self.warm.setdefault(self.environment, {'endpoints': {}})
 
     def build_option_parser(self, description, version):
         parser = super().build_option_parser(
@@ -93,6 +145,256 @@ class Ether_pyApp(App):
             help=('Include elapsed time (and ASCII bell) '
                   'on exit (default: False)')
         )
+        parser.add_argument(
+            '--trace',
+            action='store_true',
+            dest='trace',
+            default=False,
+            help=('Write a JSON lines trace of command phases and '
+                  'JSON-RPC calls to the ``traces`` directory in the data '
+                  'directory (see ``ether-py trace chrome --help``) '
+                  '(default: False)')
+        )
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            dest='profile',
+            default=PROFILE,
+            help=('Profile the command and write a ``pstats`` file and '
+                  'collapsed stacks (for flame graph tools) to the '
+                  '``profiles`` directory in the data directory '
+                  '(Env: ``ETHERPY_PROFILE``; default: False)')
+        )
+        parser.add_argument(
+            '--profile-sample',
+            metavar='<percent>',
+            dest='profile_sample',
+            type=float,
+            default=PROFILE_SAMPLE,
+            help=('Only profile this percentage of commands run with '
+                  '``--profile`` '
+                  '(Env: ``ETHERPY_PROFILE_SAMPLE``; default: 100)')
+        )
+        parser.add_argument(
+            '--metrics',
+            action='store_true',
+            dest='metrics',
+            default=False,
+            help=('Print a summary of JSON-RPC calls (counts, latency, '
+                  'errors, and sizes) by method on exit to stderr '
+                  '(default: False)')
+        )
+        parser.add_argument(
+            '--metrics-textfile',
+            metavar='<path>',
+            dest='metrics_textfile',
+            default=os.getenv('ETHERPY_METRICS_TEXTFILE', None),
+            help=('Write JSON-RPC metrics on exit to this file for the '
+                  "Prometheus node_exporter textfile collector "
+                  "(Env: ``ETHERPY_METRICS_TEXTFILE``; default: None)")
+        )
+        parser.add_argument(
+            '--endpoint-uri',
+            metavar='<uri>',
+            dest='endpoint_uri',
+            default=os.getenv('ETHERPY_ENDPOINT_URI', None),
+            help=('Use the node at this URI instead of the Infura '
+                  'endpoint: http(s)://, ws(s)://, or the path of an '
+                  'IPC socket '
+                  "(Secret: ``ethereum_uri``; "
+                  "Env: ``ETHERPY_ENDPOINT_URI``; default: None)")
+        )
+        parser.add_argument(
+            '--endpoints',
+            metavar='<endpoint>[,<endpoint>...]',
+            dest='endpoints',
+            default=os.getenv('ETHERPY_ENDPOINTS', None),
+            help=('Comma separated list of endpoints (URIs, ``ganache``, '
+                  'or Infura network names) to spread reads across '
+                  "(Secret: ``ethereum_endpoints``; "
+                  "Env: ``ETHERPY_ENDPOINTS``; default: None)")
+        )
+        parser.add_argument(
+            '--primary-endpoint',
+            metavar='<endpoint>',
+            dest='primary_endpoint',
+            default=None,
+            help=('Endpoint in the ``--endpoints`` list that writes '
+                  '(e.g., ``eth send``) are sent to '
+                  "(Secret: ``ethereum_primary_endpoint``; "
+                  "Env: ``ETHERPY_PRIMARY_ENDPOINT``; "
+                  "default: the first endpoint)")
+        )
+        parser.add_argument(
+            '--endpoint-routing',
+            metavar='<strategy>',
+            dest='endpoint_routing',
+            choices=['fastest', 'sticky'],
+            default=None,
+            help=('Send reads to the ``fastest`` healthy endpoint, or '
+                  'keep using the same one while it stays healthy '
+                  '(``sticky``) '
+                  "(Secret: ``endpoint_routing``; "
+                  "Env: ``ETHERPY_ENDPOINT_ROUTING``; default: fastest)")
+        )
+        parser.add_argument(
+            '--max-block-lag',
+            metavar='<blocks>',
+            dest='max_block_lag',
+            type=int,
+            default=None,
+            help=('Skip endpoints more than this many blocks behind '
+                  'the others '
+                  "(Secret: ``endpoint_max_block_lag``; "
+                  "Env: ``ETHERPY_ENDPOINT_MAX_BLOCK_LAG``; default: 3)")
+        )
+        parser.add_argument(
+            '--endpoint-cache-ttl',
+            metavar='<seconds>',
+            dest='endpoint_cache_ttl',
+            type=int,
+            default=ENDPOINT_CACHE_TTL,
+            help=('Seconds to cache static endpoint facts like '
+                  'clientVersion and chain_id, or 0 to disable '
+                  "(Env: ``ETHERPY_ENDPOINT_CACHE_TTL``; "
+                  f"default: { ENDPOINT_CACHE_TTL })")
+        )
+        parser.add_argument(
+            '--http-pool-size',
+            metavar='<connections>',
+            dest='http_pool_size',
+            type=int,
+            default=None,
+            help=('Maximum HTTP connections kept open to the endpoint '
+                  "(Secret: ``http_pool_size``; "
+                  "Env: ``ETHERPY_HTTP_POOL_SIZE``; default: 10)")
+        )
+        parser.add_argument(
+            '--http-timeout',
+            metavar='<seconds>',
+            dest='http_timeout',
+            type=float,
+            default=None,
+            help=('HTTP request timeout '
+                  "(Secret: ``http_timeout``; "
+                  "Env: ``ETHERPY_HTTP_TIMEOUT``; default: 30)")
+        )
+        parser.add_argument(
+            '--http-retries',
+            metavar='<retries>',
+            dest='http_retries',
+            type=int,
+            default=None,
+            help=('Retries for HTTP 429 and 5xx responses '
+                  "(Secret: ``http_retries``; "
+                  "Env: ``ETHERPY_HTTP_RETRIES``; default: 3)")
+        )
+        parser.add_argument(
+            '--http-backoff',
+            metavar='<seconds>',
+            dest='http_backoff',
+            type=float,
+            default=None,
+            help=('Exponential backoff factor between HTTP retries '
+                  "(Secret: ``http_backoff``; "
+                  "Env: ``ETHERPY_HTTP_BACKOFF``; default: 0.5)")
+        )
+        parser.add_argument(
+            '--http-no-keep-alive',
+            action='store_const',
+            const=False,
+            dest='http_keep_alive',
+            default=None,
+            help=('Close HTTP connections after each request '
+                  "(Secret: ``http_keep_alive``; "
+                  "Env: ``ETHERPY_HTTP_KEEP_ALIVE``; default: keep alive)")
+        )
+        parser.add_argument(
+            '--http-no-gzip',
+            action='store_const',
+            const=False,
+            dest='http_gzip',
+            default=None,
+            help=('Do not accept gzip compressed HTTP responses '
+                  "(Secret: ``http_gzip``; "
+                  "Env: ``ETHERPY_HTTP_GZIP``; default: accept gzip)")
+        )
+        parser.add_argument(
+            '--concurrency',
+            metavar='<requests>',
+            dest='concurrency',
+            type=int,
+            default=None,
+            help=('Maximum concurrent requests made by commands that '
+                  'fetch many items (e.g., ``block show``) '
+                  "(Env: ``ETHERPY_CONCURRENCY``; default: 16)")
+        )
+        parser.add_argument(
+            '--rate-limit',
+            metavar='<requests/sec>',
+            dest='rate_limit',
+            type=float,
+            default=None,
+            help=('Maximum average requests per second sent to each '
+                  'endpoint, or 0 for no limit '
+                  "(Secret: ``rate_limit``; "
+                  "Env: ``ETHERPY_RATE_LIMIT``; default: 0)")
+        )
+        parser.add_argument(
+            '--daily-limit',
+            metavar='<requests>',
+            dest='daily_limit',
+            type=int,
+            default=None,
+            help=('Maximum requests per (UTC) day for each project, '
+                  'or 0 for no limit '
+                  "(Secret: ``daily_request_limit``; "
+                  "Env: ``ETHERPY_DAILY_LIMIT``; default: 0)")
+        )
+        parser.add_argument(
+            '--no-block-cache',
+            action='store_const',
+            const=False,
+            dest='block_cache',
+            default=None,
+            help=('Do not read blocks from (or add them to) the local '
+                  'block cache '
+                  "(Secret: ``block_cache``; "
+                  "Env: ``ETHERPY_BLOCK_CACHE``; default: use the cache)")
+        )
+        parser.add_argument(
+            '--block-cache-size',
+            metavar='<MiB>',
+            dest='block_cache_size',
+            type=float,
+            default=None,
+            help=('Size of the local block cache above which the least '
+                  'recently used blocks are removed '
+                  "(Secret: ``block_cache_size``; "
+                  "Env: ``ETHERPY_BLOCK_CACHE_SIZE``; default: 1024)")
+        )
+        parser.add_argument(
+            '--finality-depth',
+            metavar='<blocks>',
+            dest='finality_depth',
+            type=int,
+            default=None,
+            help=('Number of blocks behind the chain head at which blocks '
+                  'are treated as final and added to the block cache '
+                  "(Secret: ``finality_depth``; "
+                  "Env: ``ETHERPY_FINALITY_DEPTH``; default: 64)")
+        )
+        parser.add_argument(
+            '--rpc-batch-size',
+            metavar='<calls>',
+            dest='rpc_batch_size',
+            type=int,
+            default=RPC_BATCH_SIZE,
+            help=('Maximum JSON-RPC calls sent in one batch request, '
+                  'or 1 to disable batching '
+                  "(Env: ``ETHERPY_RPC_BATCH_SIZE``; "
+                  f"default: { RPC_BATCH_SIZE })")
+        )
         parser.add_argument(
             '-E', '--environment',
             metavar='<environment>',
@@ -123,6 +425,7 @@ class Ether_pyApp(App):
 
         # Use colored logging output for console with the coloredlogs package
         # https://pypi.org/project/coloredlogs/
+        import coloredlogs
         coloredlogs.install(level=log_level, fmt=fmt, logger=self.LOG)
 
         # Disable logging of JSON-RPC requests and replies
@@ -136,44 +439,327 @@ class Ether_pyApp(App):
         logging.getLogger("urllib3").setLevel(logging.WARNING)
 
     def setup_endpoint(self):
-        """Establish connection with Ethereum network endpoint."""
-        self.infura_project_id = self.se.get_secret('infura_project_id')
-        self.infura_endpoint = self.se.get_secret('infura_endpoint')
-        self.infura_api_version = self.se.get_secret('infura_api_version')
-        self.ethereum_address = self.se.get_secret('ethereum_address')
-        if self.infura_endpoint == 'ganache':
+        """
+        Select the Ethereum network endpoint.
+
+        No connection is made here. The endpoint connects the first time
+        a command accesses ``self.app.w3``.
+        """
+        endpoint_list = (
+            self.options.endpoints
+            or self.se.get_secret('ethereum_endpoints', allow_none=True)
+        )
+        if endpoint_list:
+            self.setup_endpoint_pool(
+                [e.strip() for e in endpoint_list.split(',') if e.strip()])
+            return
+        endpoint_uri = (
+            self.options.endpoint_uri
+            or self.se.get_secret('ethereum_uri', allow_none=True)
+        )
+        self.infura_endpoint = self.se.get_secret(
+            'infura_endpoint', allow_none=endpoint_uri is not None)
+        if endpoint_uri is None and is_endpoint_uri(self.infura_endpoint):
+            endpoint_uri = self.infura_endpoint
+        if endpoint_uri is None:
+            self.ethereum_address = self.se.get_secret('ethereum_address')
+        endpoint_name, self.ethereum_url = self.resolve_endpoint(
+            endpoint_uri or self.infura_endpoint)
+        self.endpoint = self.warm_endpoint(self.ethereum_url,
+                                           endpoint_name, self.ethereum_url)
+
+    def setup_endpoint_pool(self, endpoint_list):
+        """
+        Select a pool of endpoints that reads are spread across.
+
+        The primary endpoint (which writes go to) is added to the pool if
+        it is not in ``endpoint_list``.
+        """
+        from ether_py.utils.pool import get_routing_settings
+        try:
+            routing = get_routing_settings(
+                options=self.options,
+                get_secret=lambda s: self.se.get_secret(s, allow_none=True))
+        except ValueError as err:
+            sys.exit(str(err))
+        members = [self.resolve_endpoint(entry) for entry in endpoint_list]
+        primary = members[0]
+        if routing['primary'] is not None:
+            primary = self.resolve_endpoint(routing['primary'])
+            if primary not in members:
+                members.insert(0, primary)
+        routing['primary'] = primary[1]
+        self.ethereum_url = primary[1]
+        # Static facts are cached under the primary endpoint's URI,
+        # since every endpoint in the pool serves the same chain.
+        self.endpoint = self.warm_endpoint(
+            ','.join(uri for _, uri in members),
+            'pool' if len(members) > 1 else primary[0],
+            self.ethereum_url,
+            members=members,
+            routing=routing)
+
+    def warm_endpoint(self, key, name, url, **settings):
+        """
+        Return the ``Endpoint`` for ``key`` with the settings given by
+        options and secrets, reusing one kept warm by the daemon only if
+        it was made with the same settings.
+        """
+        import json
+        settings.update(
+            ttl=self.options.endpoint_cache_ttl,
+            transport=self.get_transport_settings(),
+            limits=self.get_rate_limit_settings())
+        key = (key, json.dumps(settings, sort_keys=True))
+        endpoints = self.get_warm_state()['endpoints']
+        if key not in endpoints:
+            endpoints[key] = Endpoint(name, url,
+                                      middlewares=ENDPOINT_MIDDLEWARES,
+                                      **settings)
+        return endpoints[key]
+
+    def resolve_endpoint(self, endpoint):
+        """
+        Return (name, URI) for an endpoint.
+
+        ``endpoint`` is the URI of our own node (HTTP, WebSocket, or IPC
+        depending on the URI scheme), ``ganache``, or an Infura network
+        name like ``mainnet``.
+        """
+        if is_endpoint_uri(endpoint):
+            try:
+                return (endpoint_type(endpoint), endpoint)
+            except ValueError as err:
+                sys.exit(str(err))
+        if endpoint == 'ganache':
             # Ganache test server is treated like Infura endpoint.
             self.ethereum_host = self.se.get_secret('ganache_host')
             self.ethereum_port = self.se.get_secret('ganache_port')
-            self.ethereum_url = ganache_url(host=self.ethereum_host,
-                                            port=self.ethereum_port)
-        else:
-            self.ethereum_url = infura_url(
-                endpoint=self.infura_endpoint,
-                project_id=self.infura_project_id,
-                api_version=self.infura_api_version)
-        self.w3 = Web3(Web3.HTTPProvider(self.ethereum_url))
-        if not self.w3.isConnected():
-            sys.exit(f'[+] connection to {self.infura_endpoint} '
-                     f'endpoint {self.ethereum_url} failed')
-        if self.options.verbose_level > 1 or self.options.debug:
-            print('[+] established connection to '
-                  f'{self.infura_endpoint} endpoint '
-                  f'at {self.ethereum_url}')
-        self.LOG.debug(f'[+] api {self.w3.api}, '
-                       f'clientVersion {self.w3.clientVersion}')
+            return (endpoint, ganache_url(host=self.ethereum_host,
+                                          port=self.ethereum_port))
+        self.infura_project_id = self.se.get_secret('infura_project_id')
+        self.infura_api_version = self.se.get_secret('infura_api_version')
+        return (endpoint, infura_url(endpoint=endpoint,
+                                     project_id=self.infura_project_id,
+                                     api_version=self.infura_api_version))
+
+    def get_transport_settings(self):
+        """Return HTTP transport settings from options and secrets."""
+        from ether_py.utils.transport import get_transport_settings
+        return get_transport_settings(
+            options=self.options,
+            get_secret=lambda s: self.se.get_secret(s, allow_none=True))
+
+    def get_rate_limit_settings(self):
+        """Return request scheduling settings from options and secrets."""
+        from ether_py.utils.ratelimit import get_rate_limit_settings
+        return get_rate_limit_settings(
+            options=self.options,
+            get_secret=lambda s: self.se.get_secret(s, allow_none=True))
+
+    @property
+    def w3(self):
+        """Return the ``Web3`` object for the endpoint, connecting lazily."""
+        if self.endpoint is None:
+            raise RuntimeError('[-] no Ethereum endpoint has been set up')
+        if self.endpoint.connected:
+            return self.endpoint.w3
+        with self._endpoint_lock:
+            if self.endpoint.connected:
+                return self.endpoint.w3
+            try:
+                with span('connect', endpoint=self.endpoint.name):
+                    w3 = self.endpoint.w3
+            except EndpointConnectionError as err:
+                sys.exit(str(err))
+            if self.options.verbose_level > 1 or self.options.debug:
+                print('[+] established connection to '
+                      f'{self.endpoint.name} endpoint '
+                      f'at {self.ethereum_url}')
+            if self.LOG.isEnabledFor(logging.DEBUG):
+                facts = self.endpoint.facts
+                self.LOG.debug(f"[+] api {facts['api']}, "
+                               f"clientVersion {facts['clientVersion']}")
+        return w3
+
+    def async_engine(self):
+        """
+        Return an engine for making many independent requests.
+
+        HTTP endpoints get an ``AsyncEngine`` that makes concurrent
+        requests. WebSocket and IPC endpoints get a ``SerialEngine``.
+        A pool of endpoints gets an ``AsyncEngine`` for its fastest
+        healthy HTTP endpoint, if it has one.
+        """
+        from ether_py.utils.aio import (
+            AIO_CONCURRENCY,
+            AsyncEngine,
+        )
+        if self.endpoint is None:
+            raise RuntimeError('[-] no Ethereum endpoint has been set up')
+        url = self.endpoint.url
+        if self.endpoint.type == 'pool':
+            # Concurrent requests go to the best HTTP endpoint in the pool.
+            url = next(
+                (
+                    member.uri
+                    for member in self.w3.provider.candidates()
+                    if endpoint_type(member.uri) == 'http'
+                ),
+                None,
+            )
+        elif self.endpoint.type != 'http':
+            url = None
+        if url is None:
+            return SerialEngine(self.w3)
+        concurrency = self.options.concurrency
+        return AsyncEngine(
+            url,
+            concurrency=AIO_CONCURRENCY if concurrency is None else concurrency,
+            settings=self.endpoint.transport,
+            limits=self.endpoint.limits)
+
+    def get_block_cache_settings(self):
+        """Return block cache settings from options and secrets."""
+        from ether_py.utils.blockstore import get_block_cache_settings
+        return get_block_cache_settings(
+            options=self.options,
+            get_secret=lambda s: self.se.get_secret(s, allow_none=True))
+
+    def block_store(self):
+        """
+        Return the local block store for the endpoint's chain, or
+        ``None`` if the block cache is turned off.
+
+        The store is opened on first use and closed after the command,
+        and can be used by several threads.
+        """
+        from ether_py.utils.blockstore import (
+            BlockStore,
+            block_store_path,
+        )
+        with self._endpoint_lock:
+            if self._block_store is None:
+                settings = self.get_block_cache_settings()
+                if not settings['enabled']:
+                    return None
+                path = block_store_path(self.options.data_dir,
+                                        self.endpoint.facts['chain_id'])
+                self._block_store = BlockStore(
+                    path, max_size=settings['max_size'])
+        return self._block_store
+
+    def block_fetcher(self):
+        """
+        Return a ``BlockFetcher`` that gets blocks from the local block
+        store when it has them and from the endpoint when it doesn't.
+        """
+        from ether_py.utils.blockstore import BlockFetcher
+        return BlockFetcher(
+            self.async_engine(),
+            self.block_store(),
+            finality_depth=self.get_block_cache_settings()['finality_depth'],
+            batch_size=self.options.rpc_batch_size,
+        )
+
+    def transaction_fetcher(self):
+        """
+        Return a ``TransactionFetcher`` that gets blocks with full
+        transaction objects (and their receipts) from the endpoint.
+        """
+        from ether_py.utils.transactions import TransactionFetcher
+        return TransactionFetcher(self.async_engine(),
+                                  batch_size=self.options.rpc_batch_size)
+
+    def rpc_batch(self):
+        """Return an ``RPCBatch`` for the endpoint."""
+        return RPCBatch(self.w3, batch_size=self.options.rpc_batch_size)
+
+    def ensure_endpoint(self, cmd_name):
+        """Set up the endpoint if the command's group requires one."""
+        cmd_group = cmd_name.split(' ')[0]
+        if cmd_group not in REQUIRES_ETH_ENDPOINT:
+            return
+        with self._endpoint_lock:
+            if self.endpoint is None:
+                with span('setup endpoint'):
+                    self.setup_endpoint()
 
     def initialize_app(self, argv):
         self.LOG.debug('initialize_app')
         self.setup_logging(
             log_level=logging.DEBUG if self.options.debug else logging.INFO)
         self.set_environment(self.options.environment)
-        # Load configuration from default python-secrets environment
-        # and export them environment variables for programs running
-        # in child processes (e.g., Vagrant) to access.
-        self.se = SecretsEnvironment(environment=self.environment,
-                                     export_env_vars=True)
-        self.se.read_secrets_and_descriptions()
+        if self.options.trace:
+            start_tracing(self.timer)
+
+    def run_subcommand(self, argv):
+        if not (self.options.profile
+                and should_profile(self.options.profile_sample)):
+            return self.run_traced_subcommand(argv)
+        profiler = CommandProfiler()
+        try:
+            with profiler:
+                return self.run_traced_subcommand(argv)
+        finally:
+            self.write_profile(profiler)
+
+    def run_traced_subcommand(self, argv):
+        if get_tracer() is None:
+            return super().run_subcommand(argv)
+        try:
+            with span('command', argv=' '.join(argv)):
+                return super().run_subcommand(argv)
+        finally:
+            stop_tracing()
+            self.write_trace()
+
+    def write_trace(self):
+        """Write the spans recorded by ``self.timer`` to a trace file."""
+        trace_dir = os.path.join(self.options.data_dir, 'traces')
+        path = os.path.join(
+            trace_dir,
+            f"ether-py-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.jsonl"
+        )
+        try:
+            os.makedirs(trace_dir, exist_ok=True)
+            self.timer.write_trace(path)
+        except OSError as err:
+            self.LOG.error(f'[-] could not write trace: {err}')
+            return
+        self.stderr.write(f'[+] wrote trace to {path}\n')
+
+    def write_profile(self, profiler):
+        """Write the results of ``profiler`` to the profiles directory."""
+        try:
+            paths = profiler.write(
+                os.path.join(self.options.data_dir, 'profiles'))
+        except OSError as err:
+            self.LOG.error(f'[-] could not write profile: {err}')
+            return
+        self.stderr.write(f"[+] wrote profile to {' and '.join(paths)}\n")
+
+    @property
+    def se(self):
+        """
+        Return the python-secrets environment, loading it on first use.
+
+        Commands that never read secrets (e.g., ``about`` and ``contract
+        list``) do not pay for importing ``psec`` and parsing the secrets
+        and descriptions files. The others read the names of the secrets
+        from a snapshot that is only rebuilt (using ``psec``) when those
+        files change, and their values from the secrets file. Secrets
+        are not exported to the environment.
+        """
+        if self._se is None:
+            warm_state = self.get_warm_state()
+            if 'se' not in warm_state:
+                warm_state['se'] = SecretsSnapshot(self.environment)
+            else:
+                # Pick up changes made since the daemon loaded them.
+                warm_state['se'].refresh()
+            self._se = warm_state['se']
+        return self._se
 
     def prepare_to_run_command(self, cmd):
         if cmd.app_args.verbose_level > 1:
@@ -184,9 +770,13 @@ class Ether_pyApp(App):
         self.LOG.debug(f"prepare_to_run_command('{cmd.cmd_name}')")
         if self.options.elapsed:
             self.timer.start()
-        cmd_group = cmd.cmd_name.split(' ')[0]
-        if cmd_group in REQUIRES_ETH_ENDPOINT:
-            self.setup_endpoint()
+        if self.options.metrics or self.options.metrics_textfile:
+            self.metrics = start_metrics()
+        if get_tracer() is not None:
+            cmd.take_action = traced('take_action', cmd.take_action)
+            if hasattr(cmd, 'produce_output'):
+                cmd.produce_output = traced('output', cmd.produce_output)
+        self.ensure_endpoint(cmd.cmd_name)
 
     def clean_up(self, cmd, result, err):
         self.LOG.debug('[!] clean_up %s', cmd.__class__.__name__)
@@ -203,6 +793,28 @@ class Ether_pyApp(App):
                 if sys.stdout.isatty():
                     sys.stdout.write('\a')
                     sys.stdout.flush()
+        if self._block_store is not None:
+            self._block_store.close()
+            self._block_store = None
+        if self.metrics is not None:
+            self.report_metrics(cmd)
+            stop_metrics()
+            self.metrics = None
+
+    def report_metrics(self, cmd):
+        """Print and/or write the metrics recorded while running ``cmd``."""
+        if self.options.metrics:
+            self.stderr.write(self.metrics.summary() + '\n')
+        if self.options.metrics_textfile:
+            labels = {
+                'command': cmd.cmd_name,
+                'environment': self.environment,
+            }
+            try:
+                self.metrics.write_textfile(self.options.metrics_textfile,
+                                            labels=labels)
+            except OSError as err:
+                self.LOG.error(f'[-] could not write metrics: {err}')
 
     def set_environment(self, environment=default_environment()):
         """Set variable for current environment"""
@@ -218,8 +830,13 @@ def main(argv=sys.argv[1:]):
     Command line interface for the ``ether-py`` project.
     """
 
+    # Let a running ``ether-py daemon`` handle the command, if possible.
+    from ether_py.daemon import forward
+    myapp = Ether_pyApp()
+    result = forward(argv, parser=myapp.parser)
+    if result is not None:
+        return result
     try:
-        myapp = Ether_pyApp()
         result = myapp.run(argv)
     except KeyboardInterrupt:
         sys.stderr.write("\nReceived keyboard interrupt: exiting\n")
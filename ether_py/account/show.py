@@ -2,10 +2,12 @@
 
 import argparse
 import logging
+import sys
 import textwrap
 
 from cliff.lister import Lister
-from web3 import Web3
+from ether_py.utils import to_int
+from ether_py.utils.endpoint import EndpointConnectionError
 
 
 class AccountShow(Lister):
@@ -19,9 +21,9 @@ class AccountShow(Lister):
         parser.add_argument(
             'address',
             metavar="ADDRESS",
-            nargs='?',
+            nargs='*',
             default=[],
-            help="Ethereum account address",
+            help="Ethereum account address(es)",
         )
         parser.epilog = textwrap.dedent("""\
             Shows Ethereum accounts.
@@ -51,24 +53,46 @@ class AccountShow(Lister):
                 | 0xC587C57EFEe451e033D853F129f7B5e61a5937C5 | 100.00      |
                 +--------------------------------------------+-------------+
 
+            Addresses given on the command line are looked up directly, so they
+            do not need to be accounts managed by the endpoint. Balances are
+            fetched with JSON-RPC batch requests of up to ``--rpc-batch-size``
+            addresses each, and up to ``--concurrency`` of those requests are
+            made at the same time.
             """)  # noqa
         return parser
 
-    def eth_balance(self, address):
+    @staticmethod
+    def eth_balance(balance_in_wei):
         """Return the balance in ether to two decimal places."""
-        balance_in_wei = self.app.w3.eth.get_balance(address)
+        from web3 import Web3
         return f"{Web3.fromWei(balance_in_wei, 'ether'):.2f}"
 
     def take_action(self, parsed_args):
         self.log.debug('[+] showing Ethereum accounts')
-        addresses = [a for a in self.app.w3.eth.accounts]
+        from web3 import Web3
+        if len(parsed_args.address):
+            invalid = [a for a in parsed_args.address if not Web3.isAddress(a)]
+            if invalid:
+                sys.exit(f"[-] invalid address(es): {', '.join(invalid)}")
+            addresses = [Web3.toChecksumAddress(a) for a in parsed_args.address]
+        else:
+            addresses = self.app.w3.eth.accounts
         columns = ['address', 'eth_balance']
-        data = [
-            (a, self.eth_balance(a))
-            for a in addresses
-            if not len(parsed_args.address) or a in parsed_args.address
-        ]
-        return (columns, data)
+        return (columns, self.balances(addresses))
+
+    def balances(self, addresses):
+        """Yield (address, balance) for each address, in order."""
+        engine = self.app.async_engine()
+        balances = engine.imap(
+            [('eth_getBalance', [a, 'latest']) for a in addresses],
+            formatter=to_int,
+            batch_size=self.app.options.rpc_batch_size,
+        )
+        try:
+            for a, balance in zip(addresses, balances):
+                yield (a, self.eth_balance(balance.result()))
+        except EndpointConnectionError as err:
+            sys.exit(str(err))
 
         # big_acct = '0x23735750a6ed0119e778d9bb969137df8cc8c3d1'
         # balance = contract.functions.balanceOf(
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import io
+import logging
+import shlex
+import sys
+import textwrap
+import threading
+
+from contextlib import redirect_stdout
+from cliff.display import DisplayCommandBase
+from cliff.lister import Lister
+from ether_py.utils import (
+    env_number,
+    ordered_map,
+    to_str,
+)
+
+BATCH_JOBS = env_number('ETHERPY_BATCH_JOBS', 4)
+
+
+class RowCollector(object):
+    """
+    Formatter that keeps what a command emits as (item, field, value)
+    rows instead of writing it.
+
+    Each row emitted by a list-style command, and each record emitted by
+    a show-style command, is a new item.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.items = 0
+
+    def emit_list(self, column_names, data, stdout, parsed_args):
+        for values in data:
+            self.emit_one(column_names, values, stdout, parsed_args)
+
+    def emit_one(self, column_names, data, stdout, parsed_args):
+        self.rows.extend(
+            (self.items, column, value)
+            for column, value in zip(column_names, data)
+        )
+        self.items += 1
+
+
+class RowApp(object):
+    """
+    The application as seen by one row's command, with its own
+    ``stdout``. Everything else is the application's.
+    """
+
+    def __init__(self, app, stdout):
+        self.__dict__['_app'] = app
+        self.__dict__['stdout'] = stdout
+
+    def __getattr__(self, name):
+        return getattr(self._app, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._app, name, value)
+
+
+class Batch(Lister):
+    """Run many commands in one process"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            '-j', '--jobs',
+            metavar='<jobs>',
+            dest='jobs',
+            type=int,
+            default=BATCH_JOBS,
+            help=('Maximum number of commands to run concurrently '
+                  "(Env: ``ETHERPY_BATCH_JOBS``; "
+                  f"default: {BATCH_JOBS})")
+        )
+        parser.add_argument(
+            'file',
+            metavar='FILE',
+            nargs='?',
+            default='-',
+            help="File with one command per line (default: stdin)",
+        )
+        parser.epilog = textwrap.dedent("""\
+            Run many ``ether-py`` commands in a single process.
+
+            Each line of input holds one command line, without the leading
+            ``ether-py`` (blank lines and lines starting with ``#`` are
+            ignored). All commands share one secrets environment and one
+            endpoint connection, and up to ``--jobs`` of them run at the
+            same time. Results are produced in input order as one row per
+            field, so they can be written with any of the output formatters.
+
+            ::
+
+                $ cat commands.txt
+                block show 12282370 -c number -c gasUsed
+                account show 0xBe50e2b648e9A0e7E1e2B1b517C53cDAB6424355
+                $ ether-py batch commands.txt
+                +-----+--------------+------+-------------+--------------------------------------------+
+                | row | command      | item | field       | value                                      |
+                +-----+--------------+------+-------------+--------------------------------------------+
+                |   1 | block show   |    0 | number      | 12282370                                   |
+                |   1 | block show   |    0 | gasUsed     | 12458279                                   |
+                |   2 | account show |    0 | address     | 0xBe50e2b648e9A0e7E1e2B1b517C53cDAB6424355 |
+                |   2 | account show |    0 | eth_balance | 100.00                                     |
+                +-----+--------------+------+-------------+--------------------------------------------+
+
+            ``item`` numbers the rows returned by list-style commands
+            like ``account show``, and the records shown by commands
+            like ``block show`` that take more than one identifier.
+            Column selection (``-c``) and sorting (``--sort-column``)
+            options given inside a row are honored, but other output
+            formatting options given inside a row are ignored since the
+            batch's own formatter options apply to all output. A row
+            that fails produces a single ``error`` field with the
+            reason, and the remaining rows still run.
+
+            Commands that are not display commands (e.g., ``block get``
+            or ``eth send``) run one at a time. What they write is kept
+            and produced at their place in the input as ``output``
+            fields, one for each line, followed by their exit status in
+            a ``result`` field.
+
+            ::
+
+                $ ether-py batch -f csv
+                block get 100..101 number
+                ^D
+                "row","command","item","field","value"
+                1,"block get",0,"output","{""number"":100}"
+                1,"block get",1,"output","{""number"":101}"
+                1,"block get",0,"result","0"
+            """)  # noqa
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] running batch of commands')
+        # Held by commands whose output is captured, since standard
+        # output can only be redirected for the whole process.
+        self.capturing = threading.Lock()
+        if parsed_args.jobs < 1:
+            sys.exit('[-] --jobs must be at least 1')
+        columns = ('row', 'command', 'item', 'field', 'value')
+        data = (
+            row
+            for rows in ordered_map(
+                self.run_row,
+                self.read_rows(parsed_args.file),
+                workers=parsed_args.jobs
+            )
+            for row in rows
+        )
+        return (columns, data)
+
+    def read_rows(self, file_name):
+        """Yield (row number, command line) tuples from input."""
+        f_in = sys.stdin if file_name == '-' else open(file_name, 'r')
+        try:
+            for number, line in enumerate(f_in, start=1):
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield (number, line)
+        finally:
+            if f_in is not sys.stdin:
+                f_in.close()
+
+    def run_row(self, row):
+        """Run one command and return its output as a list of rows."""
+        number, line = row
+        cmd_name = line
+        collector = RowCollector()
+        try:
+            argv = shlex.split(line)
+            cmd_factory, cmd_name, sub_argv = \
+                self.app.command_manager.find_command(argv)
+            if cmd_name == self.cmd_name:
+                raise RuntimeError('batches can not be nested')
+            self.app.ensure_endpoint(cmd_name)
+            if not issubclass(cmd_factory, DisplayCommandBase):
+                return self.run_captured(number, cmd_name, cmd_factory,
+                                         sub_argv)
+            cmd = cmd_factory(self.app, self.app_args, cmd_name=cmd_name)
+            cmd_parser = cmd.get_parser(f'ether-py {cmd_name}')
+            parsed_args = cmd_parser.parse_args(sub_argv)
+            # The command's own ``produce_output()`` selects (and sorts)
+            # columns as the row's options ask, and emits the result to
+            # the collector instead of a formatter that writes it.
+            cmd.formatter = collector
+            column_names, data = cmd.take_action(parsed_args)
+            cmd.produce_output(parsed_args, column_names, data)
+            return self.rows(number, cmd_name, collector)
+        except (SystemExit, Exception) as err:  # noqa
+            rows = self.rows(number, cmd_name, collector)
+            return rows + [(number, cmd_name, 0, 'error', self.reason(err))]
+
+    def run_captured(self, number, cmd_name, cmd_factory, argv):
+        """
+        Run a command that writes its own output, and return that
+        output (one ``output`` field per line) and its exit status.
+        """
+        stdout = io.StringIO()
+        try:
+            with self.capturing, redirect_stdout(stdout):
+                cmd = cmd_factory(RowApp(self.app, stdout), self.app_args,
+                                  cmd_name=cmd_name)
+                cmd_parser = cmd.get_parser(f'ether-py {cmd_name}')
+                result = cmd.run(cmd_parser.parse_args(argv))
+            status = (number, cmd_name, 0, 'result', str(result or 0))
+        except (SystemExit, Exception) as err:  # noqa
+            # What was written before the failure is still produced.
+            status = (number, cmd_name, 0, 'error', self.reason(err))
+        return [
+            (number, cmd_name, item, 'output', line)
+            for item, line in enumerate(stdout.getvalue().splitlines())
+        ] + [status]
+
+    @classmethod
+    def rows(cls, number, cmd_name, collector):
+        """Return the output rows for what a row's command emitted."""
+        return [
+            (number, cmd_name, item, column, cls.to_value(value))
+            for item, column, value in collector.rows
+        ]
+
+    @staticmethod
+    def reason(err):
+        """Return why a row's command failed."""
+        if isinstance(err, SystemExit):
+            return (err.code if isinstance(err.code, str)
+                    else f'exit status {err.code}')
+        return str(err)
+
+    @staticmethod
+    def to_value(value):
+        return value if isinstance(value, str) else to_str(value)
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import textwrap
+import sys
+
+from cliff.lister import Lister
+from ether_py.utils import parse_timestamp
+from ether_py.utils.endpoint import EndpointConnectionError
+
+
+class BlockAtTime(Lister):
+    """Find the Ethereum block that was current at given time(s)"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            'timestamp',
+            metavar='TIMESTAMP',
+            nargs='+',
+            help=('Time(s) as seconds since the Unix epoch or ISO 8601 '
+                  '("-" to read them from stdin, one per line)'),
+        )
+        parser.epilog = textwrap.dedent("""\
+            Find the block that was the head of the chain at each of one
+            or more times: the last block with a timestamp at or before
+            the time. Times are seconds since the Unix epoch or ISO 8601
+            dates and times (UTC unless they say otherwise).
+
+            Lookups use a sparse index of block timestamps kept in the
+            ``blocks`` directory of the data directory, one for each
+            chain. The block number for a time is guessed by
+            interpolating between the samples on either side of it, and
+            each block asked for along the way is added to the index, so
+            a lookup usually takes a handful of requests at first and
+            fewer (often none) once the index has samples nearby. When
+            there are many times (e.g., thousands read from stdin with
+            "-"), they are resolved together in sorted order, with the
+            guesses for all of them requested at once in each round.
+            Blocks are fetched the same way as by ``block get`` (and read
+            from the local block cache when they are there).
+
+            Times before the first block have no block, and times after
+            the chain head get the head.
+
+            ::
+
+                $ ether-py block at-time 2021-08-05T12:00:00Z 1628208000
+                +------------+---------------------------+----------+-----------------+
+                |  timestamp | time                      |    block | block_timestamp |
+                +------------+---------------------------+----------+-----------------+
+                | 1628164800 | 2021-08-05T12:00:00+00:00 | 12968002 |      1628164796 |
+                | 1628208000 | 2021-08-06T00:00:00+00:00 | 12971265 |      1628207988 |
+                +------------+---------------------------+----------+-----------------+
+
+            ..""")  # noqa
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] finding Ethereum blocks by time')
+        try:
+            timestamps = [
+                parse_timestamp(value)
+                for value in self.read_timestamps(parsed_args.timestamp)
+            ]
+            index = self.get_index()
+            blocks = index.resolve(timestamps, self.fetch)
+        except (EndpointConnectionError, ValueError) as err:
+            sys.exit(str(err))
+        index.save(self.final)
+        self.log.info(f'[+] {len(index) - index.loaded} samples added to '
+                      f'the time index for {len(timestamps)} times')
+        columns = ['timestamp', 'time', 'block', 'block_timestamp']
+        return (columns, self.rows(timestamps, blocks, index))
+
+    @staticmethod
+    def read_timestamps(values):
+        """Return the times given, reading any "-" from stdin."""
+        for value in values:
+            if value == '-':
+                yield from (line.strip() for line in sys.stdin
+                            if line.strip())
+            else:
+                yield value
+
+    def get_index(self):
+        """
+        Return the time index for the endpoint's chain, with samples
+        for the first block and the head.
+        """
+        from ether_py.utils.timeindex import (
+            TimeIndex,
+            time_index_path,
+        )
+        index = TimeIndex(time_index_path(self.app.options.data_dir,
+                                          self.app.endpoint.facts['chain_id']))
+        self.fetcher = self.app.block_fetcher()
+        block_ids = ['latest'] if index.has(0) else ['latest', '0']
+        for block_id, block in zip(block_ids, self.get_blocks(block_ids)):
+            index.add(int(block['number'], 16), int(block['timestamp'], 16))
+            if block_id == 'latest':
+                self.final = (int(block['number'], 16)
+                              - self.fetcher.finality_depth)
+        return index
+
+    def fetch(self, numbers):
+        """Return (number, timestamp) pairs for blocks."""
+        return [
+            (number, int(block['timestamp'], 16))
+            for number, block in zip(numbers, self.get_blocks(numbers))
+        ]
+
+    def get_blocks(self, block_ids):
+        # Read them all before returning, so no other request is made
+        # while the fetcher is part way through.
+        blocks = list(self.fetcher.imap(block_ids))
+        for block_id, block in zip(block_ids, blocks):
+            if block is None:
+                raise ValueError(f"[-] block with id '{block_id}' not found")
+        return blocks
+
+    @staticmethod
+    def rows(timestamps, blocks, index):
+        from datetime import (
+            datetime,
+            timezone,
+        )
+        for timestamp in timestamps:
+            number = blocks[timestamp]
+            yield (
+                timestamp,
+                datetime.fromtimestamp(timestamp, timezone.utc).isoformat(),
+                number,
+                None if number is None else index.bracket(timestamp)[0][1],
+            )
+
+
+# vim: set ts=4 sw=4 tw=0 et :
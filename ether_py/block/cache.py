@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import textwrap
+import sys
+
+from cliff.command import Command
+from cliff.lister import Lister
+from cliff.show import ShowOne
+
+
+def get_block_store(app):
+    """Return the application's block store, or exit if it is off."""
+    store = app.block_store()
+    if store is None:
+        sys.exit('[-] the block cache is turned off '
+                 '(see ``--no-block-cache``)')
+    return store
+
+
+class BlockCacheStats(ShowOne):
+    """Show local block cache statistics"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.epilog = textwrap.dedent("""\
+            Show statistics about the local block cache for the
+            endpoint's chain.
+
+            Blocks that are at least ``--finality-depth`` blocks older
+            than the chain head are kept in an SQLite database in the
+            ``blocks`` directory of the data directory, one for each
+            chain, and are read from there by ``block show`` and
+            ``block get`` instead of being requested again. Blocks are
+            stored compressed, and when they take more than
+            ``--block-cache-size`` MiB the least recently used ones are
+            removed (except for those synced by ``block sync``).
+
+            ::
+
+                $ ether-py block cache stats
+                +----------------------+---------------------------------------+
+                | Field                | Value                                 |
+                +----------------------+---------------------------------------+
+                | path                 | /home/dittrich/blocks/chain-1.sqlite3 |
+                | blocks               | 3001                                  |
+                | first_block          | 0                                     |
+                | last_block           | 3000                                  |
+                | missing_blocks       | 0                                     |
+                | blocks_with_receipts | 0                                     |
+                | tx_receipts          | 0                                     |
+                | synced_blocks        | 0                                     |
+                | stored_bytes         | 1704212                               |
+                | raw_bytes            | 4006335                               |
+                | compression_ratio    | 2.35                                  |
+                | file_bytes           | 2269184                               |
+                | max_bytes            | 1073741824                            |
+                | oldest_access        | 1792323011                            |
+                +----------------------+---------------------------------------+
+            """)  # noqa
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] showing block cache statistics')
+        stats = get_block_store(self.app).stats()
+        columns = list(stats.keys())
+        return (columns, [stats[k] for k in columns])
+
+
+class BlockCachePrune(Command):
+    """Remove blocks from the local block cache"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        what = parser.add_mutually_exclusive_group()
+        what.add_argument(
+            '--max-size',
+            metavar='<MiB>',
+            dest='max_size',
+            type=float,
+            default=None,
+            help=('Remove the least recently used blocks until the rest '
+                  'take no more than this (default: ``--block-cache-size``)')
+        )
+        what.add_argument(
+            '--below',
+            metavar='<block>',
+            dest='below',
+            type=int,
+            default=None,
+            help='Remove blocks numbered below this one'
+        )
+        what.add_argument(
+            '--all',
+            action='store_true',
+            dest='all',
+            default=False,
+            help='Remove all blocks'
+        )
+        parser.epilog = textwrap.dedent("""\
+            Remove blocks (and transaction receipts stored by ``tx
+            receipt``) from the local block cache for the endpoint's
+            chain and return the space they took to the file system.
+
+            By default, they are removed (least recently used first)
+            only if the cache is larger than ``--block-cache-size``, just
+            as happens automatically after a command adds blocks to it.
+            Blocks synced by ``block sync`` are only removed by
+            ``--below`` and ``--all``.
+
+            ::
+
+                $ ether-py block cache prune --below 1000
+                [+] removed 1000 blocks and receipts
+            """)
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] pruning block cache')
+        store = get_block_store(self.app)
+        if parsed_args.all:
+            removed = store.delete_range(0, sys.maxsize)
+        elif parsed_args.below is not None:
+            removed = store.delete_range(0, parsed_args.below - 1)
+        else:
+            removed = store.evict(max_size=parsed_args.max_size)
+        store.vacuum()
+        if self.app_args.verbose_level >= 1:
+            print(f'[+] removed {removed} blocks and receipts')
+
+
+class BlockCacheVerify(Lister):
+    """Check blocks in the local block cache"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            '--check-hashes',
+            action='store_true',
+            dest='check_hashes',
+            default=False,
+            help=("Recompute each block's header hash (default: False)")
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            dest='delete',
+            default=False,
+            help='Remove blocks that fail the checks (default: False)'
+        )
+        parser.epilog = textwrap.dedent("""\
+            Check that blocks in the local block cache are intact.
+
+            Every block must decode, match the number and hash it is
+            stored under, and have the hash of the block before it (if
+            that is stored too) as its parent hash. With
+            ``--check-hashes``, the hash of each block's header is
+            recomputed and compared with its hash as well. A row is
+            listed for each block that fails, and the command exits with
+            status 1 if any do.
+
+            ::
+
+                $ ether-py block cache verify --check-hashes
+                +--------+--------------------------------------------------------------------+----------------------------+
+                | number | hash                                                               | problem                    |
+                +--------+--------------------------------------------------------------------+----------------------------+
+                | 1207   | 0x9b1e1c7a01f5ba4a0d3cc0a0e5f43b0d2e9d0e0c8e8a2c1f8e1c4b1a8f2e4c11 | header hash does not match |
+                +--------+--------------------------------------------------------------------+----------------------------+
+            """)  # noqa
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] verifying block cache')
+        store = get_block_store(self.app)
+        problems = list(store.verify(check_hashes=parsed_args.check_hashes))
+        if problems and parsed_args.delete:
+            store.delete([number for number, _, _ in problems])
+        self.failed = bool(problems)
+        return (('number', 'hash', 'problem'), problems)
+
+    def run(self, parsed_args):
+        result = super().run(parsed_args)
+        return 1 if result == 0 and self.failed else result
+
+
+# vim: set ts=4 sw=4 tw=0 et :
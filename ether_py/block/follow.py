@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import itertools
+import logging
+import textwrap
+import sys
+
+from cliff.command import Command
+from ether_py.block.get import BlockGet
+from ether_py.utils.display import (
+    STREAM_FORMATS,
+    RecordWriter,
+    discard_output,
+)
+from ether_py.utils.endpoint import EndpointConnectionError
+from ether_py.utils.follow import POLL_INTERVAL
+
+
+class BlockFollow(Command):
+    """Follow new Ethereum blocks as they arrive"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            '--format',
+            dest='format',
+            choices=STREAM_FORMATS,
+            default='ndjson',
+            help='Output format (default: ndjson)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            metavar='<seconds>',
+            dest='poll_interval',
+            type=float,
+            default=POLL_INTERVAL,
+            help=('Seconds between polls for new blocks when the '
+                  f'endpoint is not a WebSocket (default: {POLL_INTERVAL})'),
+        )
+        parser.add_argument(
+            '--count',
+            metavar='<blocks>',
+            dest='count',
+            type=int,
+            default=None,
+            help='Stop after this many blocks are applied (default: never)',
+        )
+        parser.add_argument(
+            'field',
+            metavar='FIELD',
+            nargs='*',
+            default=[],
+            help='Block metadata field(s) to include (default: all)',
+        )
+        parser.epilog = textwrap.dedent("""\
+            Follow the head of the chain, writing a record for each new
+            block as soon as the endpoint has it.
+
+            On a WebSocket endpoint, new blocks come from a ``newHeads``
+            subscription. Otherwise, a block filter is polled every
+            ``--poll-interval`` seconds (or, if the endpoint has no
+            filters, the latest block is).
+
+            Each record has an ``event`` field. The current head and
+            each block added after it are written as ``apply`` records
+            with the block's fields. When a reorganization replaces
+            blocks already written, a ``revert`` record (with just the
+            ``number`` and ``hash``) is written for each of them, newest
+            first, and then ``apply`` records for the blocks that took
+            their place. Only the hashes of the last ``--finality-depth``
+            blocks are kept to detect this, so memory use doesn't grow
+            however long the command runs. Blocks missed while the
+            connection was down are caught up on when it comes back.
+
+            ::
+
+                $ ether-py block follow number hash
+                {"event":"apply","number":13100000,"hash":"0x62f0..."}
+                {"event":"apply","number":13100001,"hash":"0x0d1b..."}
+                {"event":"revert","number":13100001,"hash":"0x0d1b..."}
+                {"event":"apply","number":13100001,"hash":"0x7a4c..."}
+                {"event":"apply","number":13100002,"hash":"0x4e95..."}
+                ^C
+
+            ..""")  # noqa
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] following Ethereum blocks')
+        fields = [f.lower() for f in parsed_args.field]
+        writer = RecordWriter(self.app.stdout, fmt=parsed_args.format)
+        try:
+            for event, eth_block in self.events(parsed_args.poll_interval,
+                                                parsed_args.count):
+                if event == 'apply':
+                    eth_block = BlockGet.select(eth_block, fields)
+                writer.write(dict(event=event, **eth_block))
+                self.app.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+        except BrokenPipeError:
+            # The reader went away (e.g., ``| head``): stop quietly.
+            discard_output(self.app.stdout)
+        except EndpointConnectionError as err:
+            sys.exit(str(err))
+
+    def heads(self, poll_interval):
+        """Return a generator of the ids of new chain heads."""
+        from ether_py.utils.follow import (
+            poll_heads,
+            subscribe_heads,
+        )
+        w3 = self.app.w3
+        if self.app.endpoint.type == 'websocket':
+            heads = subscribe_heads(self.app.endpoint.url)
+            try:
+                # Make sure the subscription is accepted.
+                return itertools.chain([next(heads)], heads)
+            except ValueError as err:
+                self.log.debug(f'[-] cannot subscribe to new heads ({err})')
+        return poll_heads(w3, interval=poll_interval)
+
+    def events(self, poll_interval, count=None):
+        """Yield (event, block) for changes to the chain, in order."""
+        from ether_py.utils.follow import HeadTracker
+        from web3.exceptions import BlockNotFound
+        w3 = self.app.w3
+        tracker = HeadTracker(
+            w3.eth.get_block,
+            depth=self.app.get_block_cache_settings()['finality_depth'])
+        applied = 0
+        for block_id in self.heads(poll_interval):
+            try:
+                for event, eth_block in tracker.update(
+                        w3.eth.get_block(block_id)):
+                    yield (event, eth_block)
+                    if event == 'apply':
+                        applied += 1
+                        if count is not None and applied >= count:
+                            return
+            except BlockNotFound as err:
+                # Replaced before we got to it; the next head covers it.
+                self.log.debug(f'[-] {err}')
+
+
+# vim: set ts=4 sw=4 tw=0 et :
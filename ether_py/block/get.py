@@ -6,10 +6,23 @@ import textwrap
 import sys
 
 from cliff.command import Command
+from ether_py.block.show import (
+    add_transaction_options,
+    block_records,
+    field_columns,
+)
+from ether_py.utils import parse_block_range
+from ether_py.utils.display import (
+    STREAM_FORMATS,
+    RecordWriter,
+    discard_output,
+)
+from ether_py.utils.endpoint import EndpointConnectionError
+from ether_py.utils.transactions import record_columns
 
 
 class BlockGet(Command):
-    """Get Ethereum block"""
+    """Get a range of Ethereum blocks"""
 
     log = logging.getLogger(__name__)
 
@@ -17,32 +30,145 @@ class BlockGet(Command):
         parser = super().get_parser(prog_name)
         parser.formatter_class = argparse.RawDescriptionHelpFormatter
         parser.add_argument(
-            'block',
-            metavar="BLOCK",
-            nargs=1,
+            '--format',
+            dest='format',
+            choices=STREAM_FORMATS,
+            default='ndjson',
+            help='Output format (default: ndjson)',
+        )
+        parser.add_argument(
+            '--window',
+            metavar='<blocks>',
+            dest='window',
+            type=int,
             default=None,
-            help="Ethereum block number",
+            help=('Maximum blocks requested ahead of the one being '
+                  'written (default: twice the concurrency)'),
+        )
+        add_transaction_options(parser)
+        parser.add_argument(
+            'range',
+            metavar='RANGE',
+            help=('Range of blocks (e.g., "1000000..1010000" or '
+                  '"1000000..latest")'),
+        )
+        parser.add_argument(
+            'field',
+            metavar='FIELD',
+            nargs='*',
+            default=[],
+            help='Block metadata field(s) to include (default: all)',
         )
         parser.epilog = textwrap.dedent("""\
-            Get an Ethereum block.
+            Get a range of Ethereum blocks.
 
-            The block number should be the block's number, its hash,
-            or the word "latest" to get the most recent block.
+            Both ends of the range are included. The end can be "latest"
+            (or left off, as in "1000000..") for the most recent block.
+            Blocks are fetched concurrently (see ``--concurrency`` and
+            ``--rpc-batch-size``) but written in block order, one record
+            at a time as they arrive, either as JSON lines (``ndjson``)
+            or as ``csv``. CSV output has the fields named or, by
+            default, a fixed set of block (or transaction) fields, empty
+            where a record doesn't have one. Only ``--window`` blocks
+            are requested ahead of the one being written, so memory use
+            stays flat for long ranges and fetching slows down to match
+            a slow reader.
+            Blocks in the local block cache are read from there (see
+            ``block cache stats``).
 
             ::
 
-                $ ether-py block get latest
-                ether-py                  ERROR    [!] NOT IMPLEMENTED
+                $ ether-py block get 13..15 number gasUsed
+                {"number":13,"gasUsed":0}
+                {"number":14,"gasUsed":0}
+                {"number":15,"gasUsed":313249}
+                $ ether-py block get 13..15 number gasUsed --format csv
+                number,gasUsed
+                13,0
+                14,0
+                15,313249
+
+            With ``--full-transactions`` (or ``--receipts``), a record
+            is written for each transaction instead, as described for
+            ``block show``, with the transactions (and receipts) fetched
+            a block at a time rather than one by one.
 
-            ..""")
+            ::
+
+                $ ether-py block get --receipts 13..15 hash blockNumber gasUsed status --format csv
+                hash,blockNumber,gasUsed,status
+                0x07a137a05974311c877874d5fd699d90adfeb4fca10c95d989285a504af39b2d,15,313249,1
+
+            ..""")  # noqa
         return parser
 
     def take_action(self, parsed_args):
-        self.log.debug('[+] getting Ethereum block')
-        block = parsed_args.block[0]
-        if not (type(block) is int or block == 'latest'):
-            sys.exit(f"[-] '{block}' is not a valid block")
-        eth_block = self.app.w3.eth.get_block(block)  # noqa
-        raise RuntimeError('[!] NOT IMPLEMENTED')
+        self.log.debug('[+] getting Ethereum blocks')
+        try:
+            start, end = parse_block_range(parsed_args.range)
+        except ValueError as err:
+            sys.exit(str(err))
+        if end == 'latest':
+            end = self.app.w3.eth.block_number
+            if end < start:
+                sys.exit(f'[-] block {start} is after the latest '
+                         f'block ({end})')
+        full_transactions = (parsed_args.full_transactions
+                             or parsed_args.receipts)
+        columns = field_columns(
+            parsed_args.field,
+            record_columns(full_transactions, parsed_args.receipts))
+        writer = RecordWriter(self.app.stdout, fmt=parsed_args.format,
+                              columns=columns)
+        try:
+            for record in self.records(
+                    start, end, window=parsed_args.window,
+                    full_transactions=full_transactions,
+                    receipts=parsed_args.receipts):
+                writer.write(self.select(record, parsed_args.field))
+            self.app.stdout.flush()
+        except BrokenPipeError:
+            # The reader went away (e.g., ``| head``): stop quietly.
+            discard_output(self.app.stdout)
+        except EndpointConnectionError as err:
+            sys.exit(str(err))
+
+    @staticmethod
+    def select(eth_block, fields):
+        """
+        Return the block's ``fields`` (any case; all if none), in that
+        order, named as in the block.
+        """
+        if not len(fields):
+            return eth_block
+        keys = {k.lower(): k for k in eth_block.keys()}
+        return {
+            keys[field.lower()]: eth_block[keys[field.lower()]]
+            for field in fields
+            if field.lower() in keys
+        }
+
+    def records(self, start, end, window=None, full_transactions=False,
+                receipts=False):
+        """
+        Yield blocks ``start`` through ``end`` (or, with
+        ``full_transactions``, their transactions), in order.
+        """
+        numbers = range(start, end + 1)
+        if full_transactions:
+            fetched = self.app.transaction_fetcher().imap(
+                numbers, receipts=receipts, window=window)
+        else:
+            fetched = (
+                (raw_block, None)
+                for raw_block in self.app.block_fetcher().imap(
+                    numbers, window=window)
+            )
+        for number, (raw_block, raw_receipts) in zip(numbers, fetched):
+            if raw_block is None:
+                sys.exit(f"[-] block with id '{number}' not found")
+            yield from block_records(raw_block, raw_receipts,
+                                     full_transactions)
+
 
 # vim: set ts=4 sw=4 tw=0 et :
@@ -5,12 +5,71 @@ import logging
 import textwrap
 import sys
 
-from ether_py.utils import to_str
-from cliff.show import ShowOne
+from cliff.lister import Lister
+from ether_py.utils import (
+    is_block_id,
+    split_ids_and_fields,
+    to_str,
+)
+from ether_py.utils.endpoint import EndpointConnectionError
+from ether_py.utils.transactions import record_columns
 
 
-class BlockShow(ShowOne):
-    """Show Ethereum block"""
+def add_transaction_options(parser):
+    """Add the options for getting blocks' transactions and receipts."""
+    parser.add_argument(
+        '--full-transactions',
+        action='store_true',
+        dest='full_transactions',
+        default=False,
+        help=('Fetch transaction objects with each block and show one '
+              'record for each transaction (default: False)'),
+    )
+    parser.add_argument(
+        '--receipts',
+        action='store_true',
+        dest='receipts',
+        default=False,
+        help=('Add the fields of transactions\' receipts '
+              '(implies ``--full-transactions``; default: False)'),
+    )
+
+
+def field_columns(fields, columns):
+    """
+    Return the ``fields`` named (in any case, as they are named in
+    ``columns``), or all of ``columns`` if none are.
+    """
+    if not len(fields):
+        return list(columns)
+    names = {column.lower(): column for column in columns}
+    return list(dict.fromkeys(names.get(field.lower(), field)
+                              for field in fields))
+
+
+def block_records(raw_block, raw_receipts=None, full_transactions=False):
+    """
+    Return the formatted block (in a list) or, with
+    ``full_transactions``, a record for each of its transactions.
+    """
+    from web3._utils.method_formatters import (
+        block_formatter,
+        receipt_formatter,
+    )
+    from ether_py.utils.transactions import denormalize
+    eth_block = block_formatter(raw_block)
+    if not full_transactions:
+        return [eth_block]
+    if raw_receipts is not None:
+        raw_receipts = [
+            None if receipt is None else receipt_formatter(receipt)
+            for receipt in raw_receipts
+        ]
+    return denormalize(eth_block, raw_receipts)
+
+
+class BlockShow(Lister):
+    """Show Ethereum block(s)"""
 
     log = logging.getLogger(__name__)
 
@@ -20,73 +79,145 @@ class BlockShow(ShowOne):
         parser.add_argument(
             'block',
             metavar='BLOCK',
-            nargs=1,
-            default=None,
-            help="Ethereum block number",
-        )
-        parser.add_argument(
-            'field',
-            metavar='FIELD',
-            nargs='?',
-            default=[],
-            help="Block metadata field",
+            nargs='+',
+            help=("Ethereum block number(s) or hash(es), "
+                  "optionally followed by block metadata field(s)"),
         )
+        add_transaction_options(parser)
         parser.epilog = textwrap.dedent("""\
             Get an Ethereum block.
 
             The block number should be the block's number, its hash,
             or the word "latest" to get the most recent block.
+            Arguments that are numbers or start with ``0x`` are always
+            taken to be blocks, and any other arguments that are not
+            block identifiers are taken to be the names of fields to
+            show. If some of the blocks are not valid identifiers (e.g.,
+            a truncated hash), the others are still shown and then those
+            are reported as an error.
+
+            ::
+
+                $ ether-py block show latest number hash gasUsed timestamp
+                +--------+--------------------------------------------------------------------+---------+------------+
+                | number | hash                                                               | gasUsed | timestamp  |
+                +--------+--------------------------------------------------------------------+---------+------------+
+                | 15     | 0x008547e530fe0965d3711d25fbb1d20264c16d525f02aa280633c1a721ff5720 | 313249  | 1618011641 |
+                +--------+--------------------------------------------------------------------+---------+------------+
+
+            Each block is a row with the same columns: the fields named
+            or, by default, all of a block's fields, with empty values
+            for those a block doesn't have (e.g., ``baseFeePerGas``
+            before the London fork). Use ``-f yaml`` to see a single
+            block one field per line, and ``-f json`` or ``-f csv`` to
+            get all of the rows as one document.
 
             ::
 
-                $ ether-py block show latest --fit-width
-                +------------------+-------------------------------------------------------------------------------------------------------------------------+
-                | Field            | Value                                                                                                                   |
-                +------------------+-------------------------------------------------------------------------------------------------------------------------+
-                | number           | 15                                                                                                                      |
-                | hash             | 0x008547e530fe0965d3711d25fbb1d20264c16d525f02aa280633c1a721ff5720                                                      |
-                | parentHash       | 0xc95783fb95338588b8bffe4c88eb979086e0c6b6fdd1a78bc591319c3270906d                                                      |
-                | mixHash          | 0x0000000000000000000000000000000000000000000000000000000000000000                                                      |
-                | nonce            | 0x0000000000000000                                                                                                      |
-                | sha3Uncles       | 0x1dcc4de8dec75d7aab85b567b6ccd41ad312451b948a7413f0a142fd40d49347                                                      |
-                | logsBloom        | 0x000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000 |
-                |                  | 00000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000 |
-                |                  | 00000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000 |
-                |                  | 00000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000 |
-                |                  | 00000000000000000000000000000000000000                                                                                  |
-                | transactionsRoot | 0x9f619679ac0f15e5725d63c06bf352f88a2eb002d7bbb983188a929c10f38de1                                                      |
-                | stateRoot        | 0xeb0ae3b8c7beb461793f9780d4e180515843f60227768c3b19b0472216673ed6                                                      |
-                | receiptsRoot     | 0xd5420f0d6143865fa94e3464abb47a054c4f83dd5b9159603616fe39b97dd2b2                                                      |
-                | miner            | 0x0000000000000000000000000000000000000000                                                                              |
-                | difficulty       | 0                                                                                                                       |
-                | totalDifficulty  | 0                                                                                                                       |
-                | extraData        | 0x                                                                                                                      |
-                | size             | 1000                                                                                                                    |
-                | gasLimit         | 6721975                                                                                                                 |
-                | gasUsed          | 313249                                                                                                                  |
-                | timestamp        | 1618011641                                                                                                              |
-                | transactions     | [HexBytes('0x07a137a05974311c877874d5fd699d90adfeb4fca10c95d989285a504af39b2d')]                                        |
-                | uncles           | []                                                                                                                      |
-                +------------------+-------------------------------------------------------------------------------------------------------------------------+
+                $ ether-py block show latest number gasUsed -f yaml
+                - gasUsed: '313249'
+                  number: '15'
+
+            When more than one block is given, the blocks are fetched
+            concurrently (see ``--concurrency``) and shown in the order
+            given, one row for each block. Blocks older than the
+            finality depth are read from the local block cache when it
+            has them (see ``--finality-depth`` and ``block cache``).
+
+            ::
+
+                $ ether-py block show 13 14 15 number gasUsed -f value
+                13 0
+                14 0
+                15 313249
+
+            With ``--full-transactions``, each block is fetched with its
+            transaction objects in the same request, and one row is
+            shown for each transaction instead of one for each block.
+            The row has the transaction's fields, then (with
+            ``--receipts``) those of its receipt, then the block's fields
+            with a ``block`` prefix (e.g., ``blockTimestamp``), so no
+            ``tx show`` is needed for each transaction hash. Receipts
+            are fetched for a whole block at once with
+            ``eth_getBlockReceipts`` where the endpoint has it, and one
+            at a time (in batches) where it doesn't. Blocks without
+            transactions have no rows.
+
+            ::
+
+                $ ether-py block show --receipts 15 hash gasUsed status blockTimestamp -f value
+                0x07a137a05974311c877874d5fd699d90adfeb4fca10c95d989285a504af39b2d 313249 1 1618011641
 
             ..""")  # noqa
         return parser
 
     def take_action(self, parsed_args):
-        self.log.debug('[+] showing Ethereum block')
-        block = parsed_args.block[0]
+        self.log.debug('[+] showing Ethereum block(s)')
+        blocks, fields = split_ids_and_fields(parsed_args.block, is_block_id)
+        if not len(blocks):
+            sys.exit('[-] no block number, hash, or tag was given')
+        full_transactions = (parsed_args.full_transactions
+                             or parsed_args.receipts)
+        columns = field_columns(
+            fields, record_columns(full_transactions, parsed_args.receipts))
+        # Why blocks given weren't shown, reported once the others are.
+        self.errors = []
+        return (columns, self.rows(
+            blocks, columns,
+            full_transactions=full_transactions,
+            receipts=parsed_args.receipts))
+
+    def produce_output(self, parsed_args, column_names, data):
+        result = super().produce_output(parsed_args, column_names, data)
+        if len(self.errors):
+            sys.exit('\n'.join(self.errors))
+        return result
+
+    def rows(self, blocks, columns, full_transactions=False,
+             receipts=False):
+        """
+        Yield a row of ``columns`` for each block (or, with
+        ``full_transactions``, each transaction), in order, with empty
+        values for the fields a record doesn't have.
+        """
+        for record in self.records(blocks, full_transactions, receipts):
+            yield tuple(record.get(column, '') for column in columns)
+
+    def records(self, blocks, full_transactions=False, receipts=False):
+        """
+        Yield a dictionary of fields (as strings) for each block (or
+        each transaction), in order, and keep why any of ``blocks``
+        weren't found in ``errors``.
+        """
+        invalid = [block for block in blocks if not is_block_id(block)]
+        blocks = [block for block in blocks if is_block_id(block)]
+        missing = []
         try:
-            eth_block = self.app.w3.eth.get_block(block)
-        except KeyError:
-            sys.exit(f"[-] block with id '{block}' not found")
-        columns = []
-        data = []
-        fields = [f.lower() for f in parsed_args.field]
-        for k, v in eth_block.items():
-            if not len(fields) or k.lower() in fields:
-                columns.append(k)
-                data.append((to_str(v)))
-        return (columns, data)
+            if full_transactions:
+                fetched = self.app.transaction_fetcher().imap(
+                    blocks, receipts=receipts)
+            else:
+                fetched = (
+                    (raw_block, None)
+                    for raw_block in self.app.block_fetcher().imap(blocks)
+                )
+            for block, (raw_block, raw_receipts) in zip(blocks, fetched):
+                if raw_block is None:
+                    missing.append(block)
+                    continue
+                for record in block_records(raw_block, raw_receipts,
+                                            full_transactions):
+                    yield {k: to_str(v) for k, v in record.items()}
+        except EndpointConnectionError as err:
+            sys.exit(str(err))
+        if len(invalid):
+            ids = ', '.join([f"'{block}'" for block in invalid])
+            self.errors.append(f'[-] not a block number, hash, or tag: {ids}')
+        if len(missing) == 1:
+            self.errors.append(f"[-] block with id '{missing[0]}' not found")
+        elif len(missing):
+            ids = ', '.join([f"'{block}'" for block in missing])
+            self.errors.append(f"[-] blocks with ids {ids} not found")
 
 
 # vim: set ts=4 sw=4 tw=0 et :
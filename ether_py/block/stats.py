@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import textwrap
+import sys
+
+from cliff.lister import Lister
+from ether_py.block.export import fetch_columns
+from ether_py.utils import parse_block_range
+from ether_py.utils.blockstats import (
+    DEFAULT_PERCENTILES,
+    METRICS,
+    STATS_COLUMNS,
+)
+from ether_py.utils.endpoint import EndpointConnectionError
+
+
+def percentile_list(value):
+    """Parse a comma separated list of percentiles (e.g., "50,90,99")."""
+    try:
+        percentiles = [float(p) for p in value.split(',') if p.strip()]
+    except ValueError:
+        percentiles = []
+    if not percentiles or any(not 0 <= p <= 100 for p in percentiles):
+        raise argparse.ArgumentTypeError(
+            f"'{value}' is not a list of percentiles (e.g., '50,90,99')")
+    return percentiles
+
+
+class BlockStats(Lister):
+    """Summarize block header values over a range of blocks"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            '--input',
+            metavar='<path>',
+            dest='input',
+            default=None,
+            help=('Read the blocks from columns written by '
+                  '``block export`` instead of fetching them'),
+        )
+        parser.add_argument(
+            '--percentiles',
+            metavar='<list>',
+            dest='percentiles',
+            type=percentile_list,
+            default=DEFAULT_PERCENTILES,
+            help=('Comma separated percentiles to show (default: '
+                  f'{",".join(str(p) for p in DEFAULT_PERCENTILES)})'),
+        )
+        view = parser.add_mutually_exclusive_group()
+        view.add_argument(
+            '--histogram',
+            metavar='<metric>',
+            dest='histogram',
+            choices=METRICS,
+            default=None,
+            help='Show a histogram of one metric instead of a summary',
+        )
+        view.add_argument(
+            '--rolling',
+            metavar='<blocks>',
+            dest='rolling',
+            type=int,
+            default=None,
+            help='Show metric means over windows of this many blocks',
+        )
+        parser.add_argument(
+            '--bins',
+            metavar='<bins>',
+            dest='bins',
+            type=int,
+            default=10,
+            help='Number of histogram bins (default: 10)',
+        )
+        parser.add_argument(
+            '--step',
+            metavar='<blocks>',
+            dest='step',
+            type=int,
+            default=None,
+            help=('Blocks between the starts of rolling windows '
+                  '(default: the window size)'),
+        )
+        parser.add_argument(
+            '--window',
+            metavar='<blocks>',
+            dest='window',
+            type=int,
+            default=None,
+            help=('Maximum blocks requested ahead of the one being '
+                  'added (default: twice the concurrency)'),
+        )
+        parser.add_argument(
+            'range',
+            metavar='RANGE',
+            nargs='?',
+            default=None,
+            help=('Range of blocks (e.g., "1000000..1010000" or '
+                  '"1000000..latest"; default with ``--input``: all)'),
+        )
+        parser.epilog = textwrap.dedent(f"""\
+            Summarize block header values over a range of blocks.
+
+            The headers are fetched the same way as by ``block export``
+            (and read from the local block cache when they are there)
+            into NumPy arrays, or, with ``--input``, read from columns
+            already written by ``block export`` (which must include
+            {", ".join(STATS_COLUMNS)}). All of the statistics are
+            computed over whole arrays, so once the blocks are local
+            even millions of them take well under a second.
+
+            Metrics: {", ".join(METRICS)}. ``gas_utilization`` is gas
+            used over the gas limit, ``block_time`` is the seconds since
+            the block before (so it has one value fewer than there are
+            blocks), and ``base_fee_gwei`` only counts blocks that have
+            a base fee.
+
+            By default the count, mean, standard deviation, minimum,
+            ``--percentiles`` and maximum of each metric are shown.
+            ``--histogram`` shows a histogram of one metric with
+            ``--bins`` bins instead, and ``--rolling`` shows the means
+            over windows of that many blocks, starting every ``--step``
+            blocks.
+
+            ::
+
+                $ ether-py block stats 12965000..13160000 --input july
+                +-----------------+--------+--------------+-------------+----------+------------+------------+------------+------------+
+                | metric          |  count |         mean |         std |      min |        p50 |        p90 |        p99 |        max |
+                +-----------------+--------+--------------+-------------+----------+------------+------------+------------+------------+
+                | gas_used        | 195001 | 14935772.684 | 9116433.139 |      0.0 | 14848419.0 | 29958014.0 | 29996796.0 | 30029295.0 |
+                | gas_utilization | 195001 |     0.497859 |    0.303881 |      0.0 |   0.494947 |     0.9986 |   0.999893 |        1.0 |
+                | block_time      | 195000 |       13.247 |      12.137 |      1.0 |       10.0 |       29.0 |       58.0 |      181.0 |
+                | tx_count        | 195001 |      190.529 |     109.624 |      0.0 |      183.0 |      338.0 |      484.0 |     1431.0 |
+                | base_fee_gwei   | 195001 |       49.331 |      24.672 | 0.856213 |     43.948 |     81.772 |    131.907 |    419.372 |
+                | size            | 195001 |    68826.172 |   43913.471 |    514.0 |    62329.0 |   117622.0 |   206934.0 |   830281.0 |
+                +-----------------+--------+--------------+-------------+----------+------------+------------+------------+------------+
+                $ ether-py block stats --input july --rolling 50000 -c first_block -c gas_utilization
+                +-------------+-----------------+
+                | first_block | gas_utilization |
+                +-------------+-----------------+
+                |    12965000 |        0.493127 |
+                |    13015000 |        0.498754 |
+                |    13065000 |        0.500412 |
+                +-------------+-----------------+
+
+            ..""")  # noqa
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] summarizing Ethereum blocks')
+        from ether_py.utils import blockstats
+        if parsed_args.range is None and parsed_args.input is None:
+            sys.exit('[-] specify a block range (or ``--input``)')
+        try:
+            arrays = self.get_arrays(parsed_args)
+        except (EndpointConnectionError, ValueError) as err:
+            sys.exit(str(err))
+        if len(arrays['number']) == 0:
+            sys.exit('[-] no blocks in the range')
+        if parsed_args.histogram is not None:
+            metrics = blockstats.derive_metrics(arrays)
+            columns, rows = blockstats.histogram(
+                metrics[parsed_args.histogram], bins=parsed_args.bins)
+        elif parsed_args.rolling is not None:
+            columns, rows = blockstats.rolling(
+                arrays, parsed_args.rolling, step=parsed_args.step)
+        else:
+            metrics = blockstats.derive_metrics(arrays)
+            columns, rows = blockstats.summarize(
+                metrics, percentiles=parsed_args.percentiles)
+        return (columns, ([self.rounded(value) for value in row]
+                          for row in rows))
+
+    def get_arrays(self, parsed_args):
+        """Return the columns of the blocks to summarize."""
+        from ether_py.utils.blockstats import select_range
+        if parsed_args.input is None:
+            _, _, builder = fetch_columns(self.app, STATS_COLUMNS,
+                                          parsed_args.range,
+                                          window=parsed_args.window)
+            return builder.arrays()
+        from ether_py.utils.columnar import read_columns
+        try:
+            arrays = read_columns(parsed_args.input)
+        except (OSError, KeyError) as err:
+            raise ValueError(f'[-] cannot read {parsed_args.input}: {err}')
+        missing = [c for c in STATS_COLUMNS if c not in arrays]
+        if missing:
+            raise ValueError(f'[-] {parsed_args.input} is missing column(s) '
+                             f'{", ".join(missing)}')
+        if parsed_args.range is None:
+            return arrays
+        start, end = parse_block_range(parsed_args.range)
+        return select_range(arrays, start,
+                            None if end == 'latest' else end)
+
+    @staticmethod
+    def rounded(value):
+        """
+        Return a NumPy number as a plain one, rounding floats (to six
+        significant digits, for fractions).
+        """
+        if value is None or isinstance(value, str):
+            return value
+        if not isinstance(value, float):
+            return int(value)
+        if abs(value) < 1:
+            return float(f'{value:.6g}')
+        return round(float(value), 3)
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import textwrap
+import sys
+
+from cliff.command import Command
+from ether_py.block.cache import get_block_store
+from ether_py.utils.endpoint import EndpointConnectionError
+
+
+class BlockSync(Command):
+    """Sync a range of blocks into the local block cache"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            '--receipts',
+            action='store_true',
+            dest='receipts',
+            default=False,
+            help="Store each block's transaction receipts too "
+                 '(default: False)',
+        )
+        parser.add_argument(
+            '--window',
+            metavar='<blocks>',
+            dest='window',
+            type=int,
+            default=None,
+            help=('Maximum blocks requested ahead of the one being '
+                  'stored (default: twice the concurrency)'),
+        )
+        parser.add_argument(
+            '--progress-interval',
+            metavar='<seconds>',
+            dest='progress_interval',
+            type=float,
+            default=5.0,
+            help='Seconds between progress reports (default: 5.0)',
+        )
+        parser.add_argument(
+            'start',
+            metavar='FROM',
+            type=int,
+            help='First block to sync',
+        )
+        parser.add_argument(
+            'end',
+            metavar='TO',
+            nargs='?',
+            default='latest',
+            help=('Last block to sync (default: the latest block at least '
+                  '``--finality-depth`` blocks old)'),
+        )
+        parser.epilog = textwrap.dedent("""\
+            Sync a range of blocks (and, with ``--receipts``, their
+            transaction receipts) into the local block cache, so that
+            ``block show``, ``block get`` and ``block export`` can read
+            them from there.
+
+            Only blocks the cache doesn't have are requested, several at
+            once (see ``--concurrency`` and ``--rpc-batch-size``), in
+            order. After every chunk of blocks a checkpoint is saved
+            along with them, so if the sync is interrupted (e.g., by a
+            network failure or CTRL-C) running the same command again
+            picks up where it stopped. Running it again later adds the
+            blocks that have become final since.
+
+            Only blocks at least ``--finality-depth`` blocks older than
+            the chain head are synced. Each one is checked against the
+            block before it, and if the chain has been reorganized under
+            blocks that were synced (which is only likely with a small
+            ``--finality-depth``), they are removed back to the last one
+            still on the chain and synced again.
+
+            Synced blocks are never removed when the cache grows larger
+            than ``--block-cache-size`` (only other blocks are), so keep
+            it large enough to hold the range: if it isn't, a warning
+            says so. ``block cache prune --below`` or ``--all`` remove
+            synced blocks too.
+
+            ::
+
+                $ ether-py block sync 12965000 13000000 --receipts
+                [+] synced 8192/35001 blocks (1631.2 blocks/sec)
+                [+] synced 16384/35001 blocks (1645.8 blocks/sec)
+                ^C
+                $ ether-py block sync 12965000 13000000 --receipts
+                [+] synced 9216/18617 blocks (1702.5 blocks/sec)
+                [+] synced 18617/18617 blocks (1698.0 blocks/sec)
+                [+] blocks 12965000 through 13000000 are synced
+
+            ..""")  # noqa
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] syncing Ethereum blocks')
+        from ether_py.utils.sync import (
+            BlockSync,
+            Throughput,
+        )
+        get_block_store(self.app)
+        depth = self.app.get_block_cache_settings()['finality_depth']
+        try:
+            final = self.app.w3.eth.block_number - depth
+            end = self.get_end(parsed_args.end, parsed_args.start, final)
+            sync = BlockSync(self.app.block_fetcher(), parsed_args.start,
+                             receipts=parsed_args.receipts,
+                             window=parsed_args.window)
+            progress = Throughput(self.report,
+                                  every=parsed_args.progress_interval)
+            synced = sync.run(end, progress=progress)
+        except KeyboardInterrupt:
+            sys.exit('[-] interrupted: run the same command again to resume')
+        except EndpointConnectionError as err:
+            sys.exit(f'{err}: run the same command again to resume')
+        except ValueError as err:
+            sys.exit(str(err))
+        if synced:
+            progress(synced, synced, final=True)
+        if self.app_args.verbose_level >= 1:
+            print(f'[+] blocks {parsed_args.start} through {end} '
+                  'are synced')
+
+    def get_end(self, end, start, final):
+        """Return the last block to sync."""
+        if end == 'latest':
+            end = final
+        else:
+            try:
+                end = int(end)
+            except ValueError:
+                raise ValueError(f"[-] '{end}' is not a block number")
+            if end < start:
+                raise ValueError(f"[-] block range '{start}..{end}' ends "
+                                 'before it starts')
+            if end > final:
+                self.log.info(f'[-] stopping at block {final}, the last one '
+                              'at least --finality-depth blocks old')
+                end = final
+        if end < start:
+            raise ValueError(f'[-] block {start} is not final yet '
+                             f'(the last final block is {final})')
+        return end
+
+    def report(self, synced, total, elapsed, rate):
+        if self.app_args.verbose_level >= 1:
+            print(f'[+] synced {synced}/{total} blocks '
+                  f'({rate:.1f} blocks/sec)', flush=True)
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import arrow
 import logging
 import os
 import sys
@@ -18,6 +17,7 @@ def details_about(contract_name=None, file_type=None):
     """Return a tuple for details about contract files."""
     if contract_name is None:
         return ('File', 'Last_Modified')
+    import arrow
     file_name = os.path.join(ETHERPY_CONTRACTS_DIR,
                              f"{contract_name}.{file_type}")
     mtime = None
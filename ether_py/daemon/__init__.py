@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent ``ether-py`` daemon and its Unix socket client.
+
+The daemon keeps secrets environments and endpoint connections warm
+between invocations. The normal ``ether-py`` entry point forwards its
+arguments over a Unix socket when a daemon is listening and streams
+back the output, falling back to running the command locally whenever
+the daemon cannot run it exactly as a local process would (e.g., from
+a different working directory).
+
+The protocol is one JSON object per line. The client sends a single
+request object and the server replies with either one ``fallback``
+frame, or a ``started`` frame, a stream of ``stdout`` and ``stderr``
+frames, and one ``exit`` frame.
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from ether_py import ETHERPY_CACHE_DIR
+from ether_py.utils import env_number
+
+
+DAEMON_SOCKET = os.environ.get(
+    'ETHERPY_DAEMON_SOCKET',
+    os.path.join(ETHERPY_CACHE_DIR, 'daemon.sock')
+)
+DAEMON_IDLE_TIMEOUT = env_number('ETHERPY_DAEMON_IDLE_TIMEOUT', 3600)
+# Seconds to wait for the daemon to take a command before running it
+# locally instead.
+DAEMON_CONNECT_TIMEOUT = env_number(
+    'ETHERPY_DAEMON_CONNECT_TIMEOUT', 5.0, float)
+# Environment variables that change how commands behave. A request is
+# only served by the daemon when these match the daemon's environment.
+DAEMON_ENV_PREFIXES = ('BROWSER', 'D2_', 'ETHERPY', 'SOLCX_')
+# Commands (and command groups) that are never forwarded to the daemon.
+# (``batch`` reads its commands from stdin, and ``block follow`` and
+# ``block sync`` run for as long as they are left to.)
+NOT_FORWARDED = ['batch', 'block follow', 'block sync', 'daemon']
+
+
+logger = logging.getLogger(__name__)
+
+
+def relevant_env(environ=os.environ):
+    """Return the environment variables that affect command behavior."""
+    return {
+        k: v for k, v in environ.items()
+        if k.startswith(DAEMON_ENV_PREFIXES)
+        and k != 'ETHERPY_NO_DAEMON'
+    }
+
+
+def send_message(sock_file, message):
+    """Write one JSON protocol message."""
+    sock_file.write((json.dumps(message) + '\n').encode('utf-8'))
+    sock_file.flush()
+
+
+def receive_message(sock_file):
+    """Read one JSON protocol message, or ``None`` at end of stream."""
+    line = sock_file.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
+def connect(socket_path=DAEMON_SOCKET, timeout=None):
+    """Return a socket connected to the daemon, or ``None``."""
+    if not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def control(command, socket_path=DAEMON_SOCKET, timeout=5.0):
+    """Send a control command to the daemon and return its reply."""
+    sock = connect(socket_path=socket_path, timeout=timeout)
+    if sock is None:
+        return None
+    with sock, sock.makefile('rwb') as sock_file:
+        send_message(sock_file, {'control': command})
+        return receive_message(sock_file)
+
+
+def command_words(argv, parser=None):
+    """
+    Return the command name and arguments in ``argv``, after any global
+    options (as ``cliff`` finds them with the application's ``parser``).
+    """
+    if parser is None:
+        return list(argv)
+    _, remainder = parser.parse_known_args(argv)
+    return remainder
+
+
+def forwardable(words):
+    """
+    Return ``True`` if the command in ``words`` (from ``command_words()``)
+    can be run by the daemon.
+
+    Commands that are never forwarded, and commands that read stdin
+    (which the daemon doesn't have), are run locally.
+    """
+    if not words:
+        return False
+    for command in NOT_FORWARDED:
+        names = command.split()
+        if words[:len(names)] == names:
+            return False
+    return not any(word in ['-', '--from-file=-'] for word in words)
+
+
+def forward(argv, socket_path=DAEMON_SOCKET, parser=None,
+            timeout=DAEMON_CONNECT_TIMEOUT):
+    """
+    Run a command in the daemon, if one is listening.
+
+    Returns the command's exit status, or ``None`` if the command was not
+    run by the daemon and should be run locally instead (including when
+    the daemon doesn't take the command within ``timeout`` seconds).
+    ``parser`` is the application's option parser, used to find the
+    command after any global options.
+    """
+    if (
+        os.getenv('ETHERPY_NO_DAEMON')
+        or not forwardable(command_words(argv, parser))
+    ):
+        return None
+    sock = connect(socket_path=socket_path, timeout=timeout)
+    if sock is None:
+        return None
+    request = {
+        'argv': argv,
+        'cwd': os.getcwd(),
+        'env': relevant_env(),
+        'isatty': sys.stdout.isatty(),
+    }
+    streams = {'stdout': sys.stdout, 'stderr': sys.stderr}
+    with sock, sock.makefile('rwb') as sock_file:
+        try:
+            send_message(sock_file, request)
+            message = receive_message(sock_file)
+        except OSError as err:
+            logger.debug(f'[-] daemon did not take the command: {err}')
+            return None
+        if message is None or 'fallback' in message:
+            reason = 'no reply' if message is None else message['fallback']
+            logger.debug(f'[-] daemon fallback: {reason}')
+            return None
+        # The command is running: wait for its output as long as it takes.
+        sock.settimeout(None)
+        return _stream_output(sock_file, message, streams)
+
+
+def _stream_output(sock_file, message, streams):
+    """Write output frames until the ``exit`` frame; return exit status."""
+    while True:
+        if 'exit' in message:
+            for stream in streams.values():
+                stream.flush()
+            return message['exit']
+        for name, data in message.items():
+            if name in streams:
+                streams[name].write(data)
+        message = receive_message(sock_file)
+        if message is None:
+            # Daemon went away before finishing; output may have been
+            # partially written, so don't run the command again.
+            sys.stderr.write('[-] lost connection to ether-py daemon\n')
+            return 1
+
+
+class FrameWriter(io.TextIOBase):
+    """
+    Text stream that sends writes to the client as frames.
+
+    It has no file descriptor (``fileno()`` raises
+    ``io.UnsupportedOperation``). Writing after the client has gone away
+    raises ``BrokenPipeError``, which stops the command.
+    """
+
+    def __init__(self, sock_file, name, isatty=False):
+        super().__init__()
+        self.sock_file = sock_file
+        self.name = name
+        self._isatty = isatty
+
+    @property
+    def encoding(self):
+        return 'utf-8'
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        if data:
+            send_message(self.sock_file, {self.name: data})
+        return len(data)
+
+    def flush(self):
+        super().flush()
+        self.sock_file.flush()
+
+    def isatty(self):
+        return self._isatty
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """Serve one client request."""
+
+    def handle(self):
+        try:
+            request = receive_message(self.rfile)
+        except ValueError:
+            return
+        if request is None:
+            return
+        if 'control' in request:
+            send_message(self.wfile, self.server.control(request['control']))
+            return
+        reason = self.server.check_request(request)
+        if reason is None and not self.server.busy.acquire(blocking=False):
+            reason = 'daemon is running another command'
+        if reason is not None:
+            send_message(self.wfile, {'fallback': reason})
+            return
+        try:
+            send_message(self.wfile, {'started': True})
+            result = self.server.run_command(request, self.wfile)
+            send_message(self.wfile, {'exit': result})
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug('[-] client went away')
+        finally:
+            self.server.busy.release()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server that runs ``ether-py`` commands in-process.
+
+    Each request is handled in its own thread, so status and stop
+    requests are answered while a command runs, but only one command
+    runs at a time, which allows ``sys.stdout`` and ``sys.stderr`` to be
+    redirected to the client for the duration of the command. Commands
+    asked for while one is running are sent back to run locally. A fresh
+    ``Ether_pyApp`` is created for each request, but each environment's
+    secrets and endpoint connections are kept in ``self.warm`` and reused
+    by later requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path=DAEMON_SOCKET,
+                 idle_timeout=DAEMON_IDLE_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = idle_timeout if idle_timeout > 0 else None
+        self.started = time.time()
+        self.requests = 0
+        self.stopping = False
+        self.busy = threading.Lock()
+        self.warm = {}
+        self.cwd = os.getcwd()
+        self.env = relevant_env()
+        os.makedirs(os.path.dirname(socket_path), mode=0o700, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
+        old_umask = os.umask(0o077)
+        try:
+            super().__init__(socket_path, DaemonRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def serve(self):
+        """Serve requests until stopped or idle for too long."""
+        try:
+            while not self.stopping:
+                self.handle_request()
+        finally:
+            self.server_close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.socket_path)
+
+    def handle_timeout(self):
+        if self.busy.locked():
+            return
+        logger.info('[+] daemon idle timeout reached')
+        self.stopping = True
+
+    def status(self):
+        """Return dictionary with daemon status."""
+        return {
+            'pid': os.getpid(),
+            'socket': self.socket_path,
+            'cwd': self.cwd,
+            'started': self.started,
+            'uptime': time.time() - self.started,
+            'requests': self.requests,
+            'busy': self.busy.locked(),
+            'environments': sorted(self.warm.keys()),
+        }
+
+    def control(self, command):
+        """Handle a control command and return the reply."""
+        if command == 'stop':
+            self.stopping = True
+            return {'stopping': os.getpid()}
+        if command == 'status':
+            return {'status': self.status()}
+        return {'error': f"unknown control command '{command}'"}
+
+    def check_request(self, request):
+        """Return reason the daemon can't serve request, or ``None``."""
+        if request.get('cwd') != self.cwd:
+            return f"daemon working directory is {self.cwd}"
+        if request.get('env') != self.env:
+            return 'environment variables differ from daemon'
+        return None
+
+    def run_command(self, request, wfile):
+        """Run the requested command, streaming output to the client."""
+        from ether_py.__main__ import Ether_pyApp
+        self.requests += 1
+        isatty = request.get('isatty', False)
+        stdout = FrameWriter(wfile, 'stdout', isatty=isatty)
+        stderr = FrameWriter(wfile, 'stderr')
+        loggers = [logging.getLogger(''), logging.getLogger('ether_py')]
+        saved_handlers = [list(lgr.handlers) for lgr in loggers]
+        try:
+            with contextlib.redirect_stdout(stdout), \
+                    contextlib.redirect_stderr(stderr):
+                app = Ether_pyApp(stdout=stdout, stderr=stderr,
+                                  warm=self.warm)
+                try:
+                    return app.run(request['argv'])
+                except SystemExit as err:
+                    if err.code is None or isinstance(err.code, int):
+                        return err.code or 0
+                    print(err.code, file=stderr)
+                    return 1
+                except Exception as err:  # noqa
+                    print(f'[-] {err}', file=stderr)
+                    return 1
+        finally:
+            for lgr, handlers in zip(loggers, saved_handlers):
+                lgr.handlers = handlers
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import os
+import subprocess  # nosec
+import sys
+import textwrap
+import time
+
+from cliff.command import Command
+from ether_py.daemon import (
+    DAEMON_IDLE_TIMEOUT,
+    DAEMON_SOCKET,
+    DaemonServer,
+    control,
+)
+
+
+class DaemonStart(Command):
+    """Start the ``ether-py`` daemon"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            '--foreground',
+            action='store_true',
+            dest='foreground',
+            default=False,
+            help='Run the daemon in the foreground (default: False)'
+        )
+        parser.add_argument(
+            '--idle-timeout',
+            metavar='<seconds>',
+            dest='idle_timeout',
+            type=int,
+            default=DAEMON_IDLE_TIMEOUT,
+            help=('Exit after this many seconds without a request, '
+                  'or 0 to never exit '
+                  "(Env: ``ETHERPY_DAEMON_IDLE_TIMEOUT``; "
+                  f"default: {DAEMON_IDLE_TIMEOUT})")
+        )
+        parser.add_argument(
+            '--socket',
+            metavar='<path>',
+            dest='socket',
+            default=DAEMON_SOCKET,
+            help=('Unix socket to listen on '
+                  "(Env: ``ETHERPY_DAEMON_SOCKET``; "
+                  f"default: {DAEMON_SOCKET})")
+        )
+        parser.epilog = textwrap.dedent("""\
+            Start a daemon that keeps secrets and endpoint connections warm.
+
+            Every ``ether-py`` invocation normally loads the secrets
+            environment, creates a ``Web3`` object, and opens a new HTTP
+            connection to the endpoint before throwing them all away. Once
+            the daemon is running, ``ether-py`` forwards its command line
+            over a Unix socket to the daemon, which runs the command with
+            the warm state and streams the output back. Scripts that run
+            commands like ``tx show`` or ``account show`` in a loop go
+            from paying full startup costs on every call to milliseconds.
+
+            ::
+
+                $ ether-py daemon start
+                [+] started ether-py daemon (pid 41803)
+                $ ether-py block show latest -c number
+                +--------+----------+
+                | Field  | Value    |
+                +--------+----------+
+                | number | 12282370 |
+                +--------+----------+
+                $ ether-py daemon stop
+                [+] stopped ether-py daemon (pid 41803)
+
+            The daemon only handles commands when the client's working
+            directory and ``ETHERPY*``, ``D2_*``, ``SOLCX_*``, and
+            ``BROWSER`` environment variables match those the daemon was
+            started with; otherwise the command runs locally as usual.
+            The daemon runs one command at a time, so a command given
+            while it is busy also runs locally, as do commands that read
+            stdin (``-``) and ``batch``, ``block follow``, and ``block
+            sync``. Set ``ETHERPY_NO_DAEMON=1`` to always run commands
+            locally.
+
+            The daemon exits after ``--idle-timeout`` seconds without
+            a request.
+            """)
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] starting ether-py daemon')
+        reply = control('status', socket_path=parsed_args.socket)
+        if reply is not None:
+            sys.exit("[-] ether-py daemon already running "
+                     f"(pid {reply['status']['pid']})")
+        if parsed_args.foreground:
+            server = DaemonServer(socket_path=parsed_args.socket,
+                                  idle_timeout=parsed_args.idle_timeout)
+            self.log.info(f'[+] ether-py daemon listening on '
+                          f'{parsed_args.socket}')
+            server.serve()
+            return
+        log_path = os.path.join(os.path.dirname(parsed_args.socket),
+                                'daemon.log')
+        os.makedirs(os.path.dirname(log_path), mode=0o700, exist_ok=True)
+        with open(log_path, 'a') as log_file:
+            subprocess.Popen(  # nosec
+                [
+                    sys.executable, '-m', 'ether_py',
+                    '-E', self.app.options.environment,
+                    'daemon', 'start', '--foreground',
+                    '--idle-timeout', str(parsed_args.idle_timeout),
+                    '--socket', parsed_args.socket,
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=log_file,
+                start_new_session=True,
+            )
+        for _ in range(50):
+            reply = control('status', socket_path=parsed_args.socket)
+            if reply is not None:
+                if self.app_args.verbose_level >= 1:
+                    print('[+] started ether-py daemon '
+                          f"(pid {reply['status']['pid']})")
+                return
+            time.sleep(0.1)
+        sys.exit(f'[-] ether-py daemon did not start: see {log_path}')
+
+
+# vim: set ts=4 sw=4 tw=0 et :
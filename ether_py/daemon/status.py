@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import datetime
+import logging
+import sys
+import textwrap
+
+from cliff.show import ShowOne
+from ether_py.daemon import (
+    DAEMON_SOCKET,
+    control,
+)
+from ether_py.utils import elapsed
+
+
+class DaemonStatus(ShowOne):
+    """Show ``ether-py`` daemon status"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            '--socket',
+            metavar='<path>',
+            dest='socket',
+            default=DAEMON_SOCKET,
+            help=('Unix socket the daemon listens on '
+                  "(Env: ``ETHERPY_DAEMON_SOCKET``; "
+                  f"default: {DAEMON_SOCKET})")
+        )
+        parser.epilog = textwrap.dedent("""\
+            Show the status of a running ``ether-py`` daemon.
+
+            ::
+
+                $ ether-py daemon status
+                +--------------+---------------------------------------------+
+                | Field        | Value                                       |
+                +--------------+---------------------------------------------+
+                | pid          | 41803                                       |
+                | socket       | /Users/dittrich/.cache/ether-py/daemon.sock |
+                | cwd          | /Users/dittrich/git/ether-py                |
+                | started      | 2021-04-20T18:31:55                         |
+                | uptime       | 00:04:12.37                                 |
+                | requests     | 418                                         |
+                | busy         | False                                       |
+                | environments | ether-py                                    |
+                +--------------+---------------------------------------------+
+
+            The command exits with status 1 if no daemon is running.
+            """)
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] showing ether-py daemon status')
+        reply = control('status', socket_path=parsed_args.socket)
+        if reply is None:
+            if self.app_args.verbose_level > 1:
+                sys.exit('[-] ether-py daemon is not running')
+            sys.exit(1)
+        status = reply['status']
+        status['started'] = datetime.datetime.fromtimestamp(
+            int(status['started'])).isoformat()
+        status['uptime'] = elapsed(0.0, float(status['uptime']))
+        status['environments'] = ','.join(status['environments'])
+        columns = list(status.keys())
+        data = [str(status[k]) for k in columns]
+        return (columns, data)
+
+
+# vim: set ts=4 sw=4 tw=0 et :
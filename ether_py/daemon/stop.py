@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import sys
+import textwrap
+
+from cliff.command import Command
+from ether_py.daemon import (
+    DAEMON_SOCKET,
+    control,
+)
+
+
+class DaemonStop(Command):
+    """Stop the ``ether-py`` daemon"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            '--socket',
+            metavar='<path>',
+            dest='socket',
+            default=DAEMON_SOCKET,
+            help=('Unix socket the daemon listens on '
+                  "(Env: ``ETHERPY_DAEMON_SOCKET``; "
+                  f"default: {DAEMON_SOCKET})")
+        )
+        parser.epilog = textwrap.dedent("""\
+            Stop a running ``ether-py`` daemon.
+
+            ::
+
+                $ ether-py daemon stop
+                [+] stopped ether-py daemon (pid 41803)
+
+            See also ``ether-py daemon start --help``.
+            """)
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] stopping ether-py daemon')
+        reply = control('stop', socket_path=parsed_args.socket)
+        if reply is None:
+            sys.exit('[-] ether-py daemon is not running')
+        if self.app_args.verbose_level >= 1:
+            print(f"[+] stopped ether-py daemon (pid {reply['stopping']})")
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -7,7 +7,6 @@ import json  # noqa
 import logging
 import os
 import secrets  # noqa
-import solcx
 import sys
 import textwrap
 
@@ -18,7 +17,6 @@ from ether_py.utils import (
     get_contract_data,
     save_contract_data,
 )
-from solcx.exceptions import SolcNotInstalled
 
 
 class GreeterCompile(Command):
@@ -70,6 +68,8 @@ class GreeterCompile(Command):
 
     def take_action(self, parsed_args):
         self.log.debug('[+] demo compile Greeter contract')
+        import solcx
+        from solcx.exceptions import SolcNotInstalled
         contract_name = 'Greeter'
         source_path = contract_filename(contract_name, 'sol')
         source_sol = get_contract_data(contract_name, 'sol')
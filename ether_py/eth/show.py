@@ -2,11 +2,13 @@
 
 import argparse
 import logging
+import sys
 import textwrap
 
 from ether_py.utils import (
     to_str,
     ETH_ATTRIBUTES,
+    ETH_RPC_METHODS,
 )
 from cliff.show import ShowOne
 
@@ -22,10 +24,9 @@ class EthShow(ShowOne):
         parser.add_argument(
             'field',
             metavar='FIELD',
-            choices=ETH_ATTRIBUTES,
-            nargs='?',
+            nargs='*',
             default=[],
-            help="Blockchain metadata field",
+            help="Blockchain metadata field(s)",
         )
         parser.epilog = textwrap.dedent("""\
             Shows attributes about Ethereum blockchain.
@@ -48,18 +49,35 @@ class EthShow(ShowOne):
                 | protocol_version | 63                                         |
                 | syncing          | False                                      |
                 +------------------+--------------------------------------------+
+
+            The attributes that come from the endpoint are fetched with a
+            single JSON-RPC batch request (see ``--rpc-batch-size``).
             """)  # noqa
         return parser
 
     def take_action(self, parsed_args):
         self.log.debug('[+] showing Ethereum blockchain info')
-        columns = []
-        data = []
         fields = [f.lower() for f in parsed_args.field]
-        for k in ETH_ATTRIBUTES:
-            if not len(fields) or k.lower() in fields:
-                columns.append(k)
-                data.append((to_str(getattr(self.app.w3.eth, k))))
+        unknown = set(fields) - set(ETH_ATTRIBUTES)
+        if unknown:
+            sys.exit(f"[-] unknown field(s): {', '.join(sorted(unknown))}")
+        columns = [
+            k for k in ETH_ATTRIBUTES
+            if not len(fields) or k.lower() in fields
+        ]
+        calls = {}
+        with self.app.rpc_batch() as batch:
+            for k in columns:
+                if k in ETH_RPC_METHODS:
+                    method, formatter = ETH_RPC_METHODS[k]
+                    calls[k] = batch.add(method, formatter=formatter)
+        data = [
+            to_str(
+                calls[k].result() if k in calls
+                else getattr(self.app.w3.eth, k)
+            )
+            for k in columns
+        ]
         return (columns, data)
 
 
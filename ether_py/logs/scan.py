@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import textwrap
+import sys
+
+from cliff.command import Command
+from ether_py.block.export import fetch_columns
+from ether_py.utils import parse_block_range
+from ether_py.utils.display import (
+    STREAM_FORMATS,
+    RecordWriter,
+    discard_output,
+)
+from ether_py.utils.endpoint import EndpointConnectionError
+
+
+# Blocks whose blooms are tested together.
+SCAN_CHUNK = 8192
+
+
+class LogsScan(Command):
+    """Scan a range of blocks for logs of addresses or topics"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            '--address',
+            metavar='<address>',
+            dest='address',
+            action='append',
+            default=[],
+            help='Contract address to match (can be repeated)',
+        )
+        parser.add_argument(
+            '--topic',
+            metavar='<topic>',
+            dest='topic',
+            action='append',
+            default=[],
+            help='Log topic to match (can be repeated)',
+        )
+        parser.add_argument(
+            '--format',
+            dest='format',
+            choices=STREAM_FORMATS,
+            default='ndjson',
+            help='Output format (default: ndjson)',
+        )
+        parser.add_argument(
+            '--window',
+            metavar='<blocks>',
+            dest='window',
+            type=int,
+            default=None,
+            help=('Maximum blocks requested ahead of the one being '
+                  'checked (default: twice the concurrency)'),
+        )
+        parser.add_argument(
+            'range',
+            metavar='RANGE',
+            help=('Range of blocks (e.g., "1000000..1010000" or '
+                  '"1000000..latest")'),
+        )
+        parser.epilog = textwrap.dedent("""\
+            Scan a range of blocks for logs from any of the
+            ``--address`` contracts with any of the ``--topic`` topics
+            (either can be left out to match any), without
+            ``eth_getLogs``.
+
+            The ``logsBloom`` bloom filter in each block header is
+            tested first, for thousands of blocks at once, and receipts
+            are only fetched for the blocks whose bloom may have a
+            matching log (all of a block's receipts at once where the
+            endpoint has ``eth_getBlockReceipts``). Headers are read
+            from the local block cache when they are there, as are
+            receipts stored by ``block sync --receipts``. Matching logs
+            are written in block order as they are found, either as
+            JSON lines (``ndjson``) or as ``csv``. Receipts that the
+            endpoint doesn't have (yet) for a block near the chain head
+            are asked for once more, and any still missing are skipped
+            and reported with a warning.
+
+            At the end, the number of blocks scanned, the number whose
+            receipts were checked (and so, how many receipt fetches the
+            blooms saved), and the false positive rate (the share of the
+            blocks checked that had no matching log after all) are
+            reported on stderr.
+
+            ::
+
+                $ ether-py logs scan 12965000..12966000 --address 0x1f9840a85d5aF5bf1D1762F925BDADdC4201F984 | head -1
+                {"address":"0x1f9840a85d5aF5bf1D1762F925BDADdC4201F984","blockHash":"0x...","blockNumber":12965003,...}
+                ...
+                [+] scanned 1001 blocks: receipts checked for 213 (788 skipped), 198 with matching logs (7.0% false positives)
+
+            ..""")  # noqa
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] scanning Ethereum logs')
+        from ether_py.utils.bloom import (
+            BloomQuery,
+            LogScan,
+        )
+        if not parsed_args.address and not parsed_args.topic:
+            sys.exit('[-] give at least one --address or --topic')
+        try:
+            query = BloomQuery(parsed_args.address, parsed_args.topic)
+            start, end = parse_block_range(parsed_args.range)
+        except ValueError as err:
+            sys.exit(str(err))
+        scan = LogScan(query)
+        writer = RecordWriter(self.app.stdout, fmt=parsed_args.format)
+        try:
+            if end == 'latest':
+                end = self.app.w3.eth.block_number
+            for log in self.scan(scan, start, end, parsed_args.window):
+                writer.write(log)
+            self.app.stdout.flush()
+        except BrokenPipeError:
+            # The reader went away (e.g., ``| head``): stop quietly.
+            discard_output(self.app.stdout)
+        except (EndpointConnectionError, ValueError) as err:
+            sys.exit(str(err))
+        self.report(scan)
+
+    def report(self, scan):
+        """Report what the scan checked (and couldn't) on stderr."""
+        if scan.unavailable:
+            self.log.warning(f'[-] {scan.unavailable} receipt(s) were not '
+                             'available, so their logs were not checked')
+        if self.app_args.verbose_level >= 1:
+            print(f'[+] scanned {scan.scanned} blocks: receipts checked '
+                  f'for {scan.candidates} ({scan.saved} skipped), '
+                  f'{scan.matched} with matching logs '
+                  f'({100 * scan.false_positive_rate:.1f}% false positives)',
+                  file=sys.stderr)
+
+    def scan(self, scan, start, end, window=None):
+        """Yield the (formatted) matching logs in blocks ``start``-``end``."""
+        from web3._utils.method_formatters import log_entry_formatter
+        for first in range(start, end + 1, SCAN_CHUNK):
+            last = min(first + SCAN_CHUNK - 1, end)
+            _, _, builder = fetch_columns(self.app, ['number', 'logsBloom'],
+                                          f'{first}..{last}', window=window)
+            arrays = builder.arrays()
+            numbers = [
+                int(number)
+                for number in scan.select(arrays['number'],
+                                          arrays['logsBloom'])
+            ]
+            for receipts in self.receipts(numbers, window):
+                for log in scan.logs(receipts):
+                    yield log_entry_formatter(log)
+
+    def receipts(self, numbers, window=None):
+        """Yield the raw receipts of each block, in order."""
+        store = self.app.block_store()
+        if store is None or not numbers:
+            stored = set()
+        else:
+            stored = set(numbers).difference(
+                number
+                for first, last in store.missing(numbers[0], numbers[-1],
+                                                 receipts=True)
+                for number in range(first, last + 1)
+            )
+        fetcher = self.app.transaction_fetcher()
+        fetched = fetcher.imap(
+            (number for number in numbers if number not in stored),
+            receipts=True, window=window, full_transactions=False)
+        for number in numbers:
+            if number in stored:
+                yield store.get_receipts(number)
+                continue
+            raw_block, receipts = next(fetched)
+            if raw_block is None:
+                raise ValueError(f"[-] block with id '{number}' not found")
+            if any(receipt is None for receipt in receipts):
+                # The endpoint didn't have some of them yet: try again.
+                receipts = fetcher.receipts([raw_block], window=window)[0]
+            yield receipts
+
+
+# vim: set ts=4 sw=4 tw=0 et :
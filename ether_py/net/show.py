@@ -2,9 +2,14 @@
 
 import argparse
 import logging
+import sys
 import textwrap
 
-from ether_py.utils import to_str
+from ether_py.utils import (
+    to_str,
+    NET_ATTRIBUTES,
+    NET_RPC_METHODS,
+)
 from cliff.show import ShowOne
 
 
@@ -19,9 +24,9 @@ class NetShow(ShowOne):
         parser.add_argument(
             'field',
             metavar='FIELD',
-            nargs='?',
+            nargs='*',
             default=[],
-            help="Ethereum network metadata field",
+            help="Ethereum network metadata field(s)",
         )
         parser.epilog = textwrap.dedent("""\
             Shows attributes about Ethereum net.
@@ -42,14 +47,27 @@ class NetShow(ShowOne):
 
     def take_action(self, parsed_args):
         self.log.debug('[+] showing Ethereum net')
-        columns = []
-        data = []
         fields = [f.lower() for f in parsed_args.field]
-        net_attributes = ['is_async', 'listening', 'peer_count', 'version']
-        for k in net_attributes:
-            if not len(fields) or k.lower() in fields:
-                columns.append(k)
-                data.append((to_str(getattr(self.app.w3.net, k))))
+        unknown = set(fields) - set(NET_ATTRIBUTES)
+        if unknown:
+            sys.exit(f"[-] unknown field(s): {', '.join(sorted(unknown))}")
+        columns = [
+            k for k in NET_ATTRIBUTES
+            if not len(fields) or k.lower() in fields
+        ]
+        calls = {}
+        with self.app.rpc_batch() as batch:
+            for k in columns:
+                if k in NET_RPC_METHODS:
+                    method, formatter = NET_RPC_METHODS[k]
+                    calls[k] = batch.add(method, formatter=formatter)
+        data = [
+            to_str(
+                calls[k].result() if k in calls
+                else getattr(self.app.w3.net, k)
+            )
+            for k in columns
+        ]
         return (columns, data)
 
 
@@ -2,17 +2,23 @@
 
 # https://solcx.readthedocs.io/en/latest/toctree.html
 
+import functools
 import os
-import solcx
 
 
-SOLCX_BINARY_PATH = solcx.get_solcx_install_folder(
-    solcx_binary_path=os.getenv('SOLCX_BINARY_PATH', None)
-)
+@functools.lru_cache(maxsize=None)
+def get_solcx_binary_path():
+    """Return the ``solcx`` install folder (imports ``solcx`` on demand)."""
+    import solcx
+    return solcx.get_solcx_install_folder(
+        solcx_binary_path=os.getenv('SOLCX_BINARY_PATH', None)
+    )
 
 
-def get_solc_versions(solcx_binary_path=SOLCX_BINARY_PATH):
+def get_solc_versions(solcx_binary_path=None):
     """Return solc version numbers from solcx directory."""
+    if solcx_binary_path is None:
+        solcx_binary_path = get_solcx_binary_path()
     return [
         fname[6:]
         for fname in os.listdir(solcx_binary_path)
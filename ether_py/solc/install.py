@@ -2,11 +2,10 @@
 
 import argparse
 import logging
-import solcx
 import sys
 import textwrap
 
-from ether_py.solc import SOLCX_BINARY_PATH
+from ether_py.solc import get_solcx_binary_path
 from cliff.command import Command
 
 
@@ -66,6 +65,7 @@ class SolcInstall(Command):
 
     def take_action(self, parsed_args):
         self.log.debug('[+] installing solc compiler version(s)')
+        import solcx
         installed_versions = [
             str(version)
             for version in solcx.get_installed_solc_versions()
@@ -93,7 +93,7 @@ class SolcInstall(Command):
                 )
                 solcx.install_solc(version=version,
                                    show_progress=show_progress,
-                                   solcx_binary_path=SOLCX_BINARY_PATH)
+                                   solcx_binary_path=get_solcx_binary_path())
                 if self.app_args.verbose_level == 1:
                     print(f"[+] installed solc version '{version}'")
 
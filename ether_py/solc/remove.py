@@ -3,11 +3,10 @@
 import argparse
 import logging
 import os
-import solcx
 import sys
 import textwrap
 
-from ether_py.solc import SOLCX_BINARY_PATH
+from ether_py.solc import get_solcx_binary_path
 from cliff.command import Command
 
 
@@ -58,6 +57,7 @@ class SolcRemove(Command):
 
     def take_action(self, parsed_args):
         self.log.debug('[+] removing solc compiler version(s)')
+        import solcx
         installed_versions = [
             str(version)
             for version in solcx.get_installed_solc_versions()
@@ -76,7 +76,7 @@ class SolcRemove(Command):
                       file=sys.stderr)
             else:
                 compiler_path = os.path.join(
-                    SOLCX_BINARY_PATH,
+                    get_solcx_binary_path(),
                     f"solc-v{version}"
                 )
                 if self.app_args.verbose_level > 1:
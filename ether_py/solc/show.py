@@ -3,7 +3,6 @@
 import argparse
 import logging
 import textwrap
-import solcx
 import sys
 
 from cliff.show import ShowOne
@@ -45,6 +44,7 @@ class SolcShow(ShowOne):
 
     def take_action(self, parsed_args):
         self.log.debug('[+] showing solc compiler information')
+        import solcx
         try:
             solc_version = str(solcx.get_solc_version(with_commit_hash=False))
             solc_version_with_hash = str(solcx.get_solc_version(with_commit_hash=True))  # noqa
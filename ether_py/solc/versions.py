@@ -2,7 +2,6 @@
 
 import argparse
 import logging
-import solcx
 import textwrap
 
 from cliff.lister import Lister
@@ -91,6 +90,7 @@ class SolcVersions(Lister):
 
     def take_action(self, parsed_args):
         self.log.debug('[+] showing solc versions')
+        import solcx
         columns = ['version']
         solc_versions = (
             solcx.get_installable_solc_versions()
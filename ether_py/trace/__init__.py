@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+
+# vim: set ts=4 sw=4 tw=0 et :
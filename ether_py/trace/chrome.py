@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import textwrap
+
+from cliff.command import Command
+from ether_py.utils.trace import (
+    read_trace,
+    to_chrome,
+)
+
+
+class TraceChrome(Command):
+    """Convert a trace to Chrome trace event format"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        parser.add_argument(
+            '-o', '--output',
+            metavar='<file>',
+            dest='output',
+            default=None,
+            help=('File to write (default: the trace file name '
+                  'with a ``.json`` extension)')
+        )
+        parser.add_argument(
+            'trace',
+            metavar='TRACE',
+            nargs='?',
+            default=None,
+            help=('JSON lines trace file written by ``--trace`` '
+                  '(default: the newest one in the data directory)'),
+        )
+        parser.epilog = textwrap.dedent("""\
+            Convert a trace written by the ``--trace`` option to the Chrome trace
+            event format, for viewing in ``chrome://tracing`` or at
+            https://ui.perfetto.dev.
+
+            ::
+
+                $ ether-py --trace block show 12282370 12282371 number
+                [+] wrote trace to /Users/dittrich/git/ether-py/traces/ether-py-20210420T183155-41803.jsonl
+                ...
+                $ ether-py trace chrome
+                [+] wrote /Users/dittrich/git/ether-py/traces/ether-py-20210420T183155-41803.json
+
+            Command phases (loading secrets, connecting to the endpoint, the
+            command's action, and output formatting) and JSON-RPC calls made
+            through ``web3`` are drawn nested in the thread that made them.
+            Calls made concurrently (e.g., by ``block show`` with several
+            blocks) are drawn on tracks of their own.
+            """)  # noqa
+        return parser
+
+    def take_action(self, parsed_args):
+        self.log.debug('[+] converting trace to Chrome format')
+        trace = parsed_args.trace
+        if trace is None:
+            traces = glob.glob(os.path.join(self.app_args.data_dir,
+                                            'traces', '*.jsonl'))
+            if not traces:
+                sys.exit('[-] no traces found in '
+                         f"{os.path.join(self.app_args.data_dir, 'traces')}")
+            trace = max(traces, key=os.path.getmtime)
+        try:
+            spans = read_trace(trace)
+        except OSError as err:
+            sys.exit(f'[-] could not read trace: {err}')
+        except ValueError as err:
+            sys.exit(f"[-] '{trace}' is not a trace file: {err}")
+        output = parsed_args.output or f'{os.path.splitext(trace)[0]}.json'
+        with open(output, 'w') as f_out:
+            json.dump(to_chrome(spans), f_out)
+        if self.app_args.verbose_level >= 1:
+            print(f'[+] wrote {output}')
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import textwrap
+
+from ether_py.tx.show import TxShow
+from ether_py.utils import (
+    TX_ATTRIBUTES,
+    chunked,
+    is_tx_hash,
+    to_str,
+)
+from ether_py.utils.transactions import RECEIPT_COLUMNS
+
+
+# Hashes looked up in the cache (and then requested) together.
+RECEIPT_CHUNK = 1024
+
+
+class TxReceipt(TxShow):
+    """Show Ethereum transaction receipt(s)"""
+
+    log = logging.getLogger(__name__)
+    key = 'transactionHash'
+    columns = RECEIPT_COLUMNS
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.epilog = textwrap.dedent("""\
+            Show the receipt of an Ethereum transaction (tx).
+
+            Transactions are given just as for ``tx show`` (on the
+            command line, with ``--from-file``, or on stdin with
+            ``-``), and any arguments that are not numbers and don't
+            start with ``0x`` are taken to be the names of fields to
+            show. Receipts are requested in batches (see
+            ``--rpc-batch-size``) several at once, and shown in the order
+            given, one row for each transaction. Every row has the
+            ``transactionHash``, then the fields named (or, by default,
+            all the usual receipt fields), then an ``error``, which is
+            empty unless the receipt can't be shown.
+
+            ::
+
+                $ ether-py tx receipt 0xf357f2c33c3793ffaa2f4c98c22790d7b587aa30c3df4fdd65143a8a2a50d523 gasUsed status
+                +--------------------------------------------------------------------+---------+--------+-------+
+                | transactionHash                                                    | gasUsed | status | error |
+                +--------------------------------------------------------------------+---------+--------+-------+
+                | 0xf357f2c33c3793ffaa2f4c98c22790d7b587aa30c3df4fdd65143a8a2a50d523 | 21000   | 1      |       |
+                +--------------------------------------------------------------------+---------+--------+-------+
+
+            The receipt of a transaction in a block at least
+            ``--finality-depth`` blocks older than the chain head will
+            never change, so it is kept in the local block cache (see
+            ``block cache stats``) and read from there the next time.
+            Once all of them are there, showing the same receipts
+            again (e.g., by a daily reconciliation job) makes no
+            requests at all.
+
+            ::
+
+                $ ether-py tx receipt --from-file hashes.txt gasUsed status -f csv
+                "transactionHash","gasUsed","status","error"
+                "0xf357f2c33c3793ffaa2f4c98c22790d7b587aa30c3df4fdd65143a8a2a50d523","21000","1",""
+                ...
+
+            ..""")  # noqa
+        return parser
+
+    def lookup(self, txs):
+        """
+        Yield (tx, raw receipt or error message) for each transaction,
+        in order, reading receipts from the block cache when they are
+        there and storing those of finalized blocks that aren't.
+        """
+        store = self.app.block_store()
+        engine = None
+        head = None
+        cached = requested = 0
+        for chunk in chunked(txs, RECEIPT_CHUNK):
+            valid = [tx for tx in chunk if is_tx_hash(tx)]
+            found = {} if store is None else store.get_tx_receipts(valid)
+            cached += len(found)
+            wanted = list(dict.fromkeys(
+                tx for tx in valid if tx not in found))
+            if wanted:
+                if engine is None:
+                    engine = self.app.async_engine()
+                head, receipts = self.fetch(engine, wanted, store, head)
+                requested += len(wanted)
+                found.update(receipts)
+            for tx in chunk:
+                if not is_tx_hash(tx):
+                    yield (tx, 'not a transaction hash')
+                else:
+                    yield (tx, found[tx])
+        self.log.debug(f'[+] {cached} receipt(s) from the block cache, '
+                       f'{requested} requested')
+
+    def fetch(self, engine, txs, store=None, head=None):
+        """
+        Return the chain head and a dictionary mapping each of ``txs``
+        to its raw receipt (or an error message), requested in batches.
+
+        With a ``store``, the chain head is also requested (if ``head``
+        isn't known yet) and the receipts of finalized blocks are
+        stored.
+        """
+        requests = [('eth_getTransactionReceipt', [tx]) for tx in txs]
+        if store is not None and head is None:
+            requests.insert(0, ('eth_blockNumber', []))
+        calls = list(engine.imap(requests,
+                                 batch_size=self.app.options.rpc_batch_size))
+        if len(calls) > len(txs):
+            head = int(calls.pop(0).result(), 16)
+        final = (
+            None if head is None
+            else head - self.app.get_block_cache_settings()['finality_depth']
+        )
+        receipts = {}
+        for tx, call in zip(txs, calls):
+            try:
+                receipt = call.result()
+            except ValueError as err:
+                receipts[tx] = str(err)
+                continue
+            if receipt is None:
+                receipts[tx] = 'not found'
+                continue
+            receipts[tx] = receipt
+            number = receipt.get('blockNumber')
+            if final is not None and number and int(number, 16) <= final:
+                store.put_tx_receipt(receipt)
+        return head, receipts
+
+    @staticmethod
+    def select(receipt):
+        """
+        Return a dictionary of a raw receipt's fields, converted as
+        given by ``TX_ATTRIBUTES``, as strings.
+        """
+        from web3._utils.method_formatters import receipt_formatter
+        fields = {}
+        for k, v in receipt_formatter(receipt).items():
+            convert = TX_ATTRIBUTES.get(k)
+            fields[k] = to_str(v if convert is None else convert(v))
+        return fields
+
+
+# vim: set ts=4 sw=4 tw=0 et :
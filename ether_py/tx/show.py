@@ -5,79 +5,194 @@ import logging
 import textwrap
 import sys
 
-from ether_py.utils import to_str
-from cliff.show import ShowOne
+from cliff.lister import Lister
+from collections import deque
+from ether_py.utils import (
+    is_tx_hash,
+    split_ids_and_fields,
+    to_str,
+)
+from ether_py.utils.endpoint import EndpointConnectionError
+from ether_py.utils.transactions import TX_COLUMNS
 
 
-class TxShow(ShowOne):
-    """Show Ethereum transaction"""
+class TxShow(Lister):
+    """Show Ethereum transaction(s)"""
 
     log = logging.getLogger(__name__)
+    # The column that identifies each row, and the others shown by
+    # default.
+    key = 'hash'
+    columns = TX_COLUMNS
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
         parser.formatter_class = argparse.RawDescriptionHelpFormatter
         parser.add_argument(
-            'tx',
-            metavar='TRANSACTION',
-            nargs=1,
+            '--from-file',
+            metavar='<path>',
+            dest='from_file',
             default=None,
-            help="Transaction ID",
+            help=('File with one transaction hash per line '
+                  '("-" for stdin)'),
         )
         parser.add_argument(
-            'field',
-            metavar='FIELD',
-            nargs='?',
+            'tx',
+            metavar='TRANSACTION',
+            nargs='*',
             default=[],
-            help="Transaction metadata field",
+            help=("Transaction ID(s) (\"-\" to read them from stdin), "
+                  "optionally followed by transaction metadata field(s)"),
         )
         parser.epilog = textwrap.dedent("""\
             Show an Ethereum transaction (tx).
 
-            The transaction is identified by hash.
+            The transaction is identified by hash. Arguments that are
+            numbers or start with ``0x`` are taken to be transactions
+            (and get an ``error`` if they are not valid hashes), and any
+            others are taken to be the names of fields to show. When
+            more than one transaction is given, they are fetched
+            concurrently (see ``--concurrency``) and shown in the order
+            given, one row for each transaction.
+
+            Every row has the same columns: the ``hash``, then the
+            fields named (or, by default, all the usual transaction
+            fields, empty where a transaction doesn't have one), then an
+            ``error``, which is empty unless the transaction can't be
+            shown. So the output of any number of transactions is one
+            table, CSV file, or JSON list. A single transaction is a
+            table with one row, too; use ``-f yaml`` to see it one field
+            per line.
+
+            ::
+
+                $ ether-py tx show 0xf357f2c33c3793ffaa2f4c98c22790d7b587aa30c3df4fdd65143a8a2a50d523 blockNumber from value
+                +--------------------------------------------------------------------+-------------+--------------------------------------------+--------------------+-------+
+                | hash                                                               | blockNumber | from                                       | value              | error |
+                +--------------------------------------------------------------------+-------------+--------------------------------------------+--------------------+-------+
+                | 0xf357f2c33c3793ffaa2f4c98c22790d7b587aa30c3df4fdd65143a8a2a50d523 | 2           | 0xBe50e2b648e9A0e7E1e2B1b517C53cDAB6424355 | 500000000000000000 |       |
+                +--------------------------------------------------------------------+-------------+--------------------------------------------+--------------------+-------+
+
+            Long lists of hashes (e.g., from an incident report) can be
+            read one per line from a file with ``--from-file``, or from
+            stdin with ``-``. They are requested in batches (see
+            ``--rpc-batch-size``) several at once. With ``-f csv`` or
+            ``-f value``, each row is written as soon as it and the ones
+            before it have arrived, so memory use stays flat however
+            many there are. A hash that isn't found (or a line that
+            isn't a hash) gets a row with just the ``hash`` and an
+            ``error`` instead, and the rest are still shown.
 
             ::
 
-                $ ether-py tx show 0xf357f2c33c3793ffaa2f4c98c22790d7b587aa30c3df4fdd65143a8a2a50d523
-                +------------------+--------------------------------------------------------------------+
-                | Field            | Value                                                              |
-                +------------------+--------------------------------------------------------------------+
-                | hash             | 0xf357f2c33c3793ffaa2f4c98c22790d7b587aa30c3df4fdd65143a8a2a50d523 |
-                | nonce            | 1                                                                  |
-                | blockHash        | 0x07df29f220a31c43cd2792a2effa3a1187eb6c66d71a6f2cbbff29c60c3270f6 |
-                | blockNumber      | 2                                                                  |
-                | transactionIndex | 0                                                                  |
-                | from             | 0xBe50e2b648e9A0e7E1e2B1b517C53cDAB6424355                         |
-                | to               | 0x3b4720e34496A6b2357045Bf129a40bCaC87B6e1                         |
-                | value            | 500000000000000000                                                 |
-                | gas              | 2000000                                                            |
-                | gasPrice         | 50000000000                                                        |
-                | input            | 0x                                                                 |
-                | v                | 27                                                                 |
-                | r                | 0x4b5a13f54f054ab12cd3f2b38c3d8b8de9cfc3cb7b431e7270135f00f7402510 |
-                | s                | 0x5dd02463f52bced1b990d1fc213e06930597a3fc5ef0e6b29156efe634a33748 |
-                +------------------+--------------------------------------------------------------------+
-
-            """)  # noqa
+                $ ether-py tx show --from-file hashes.txt blockNumber -f csv
+                "hash","blockNumber","error"
+                "0xf357f2c33c3793ffaa2f4c98c22790d7b587aa30c3df4fdd65143a8a2a50d523","2",""
+                "0x0000000000000000000000000000000000000000000000000000000000000000","","not found"
+
+            ..""")  # noqa
         return parser
 
     def take_action(self, parsed_args):
-        self.log.debug('[+] showing Ethereum transaction')
-        tx = parsed_args.tx[0]
+        self.log.debug('[+] showing Ethereum transaction(s)')
+        args = [arg for arg in parsed_args.tx if arg != '-']
+        txs, fields = split_ids_and_fields(args, is_tx_hash)
+        from_stdin = len(args) < len(parsed_args.tx)
+        if parsed_args.from_file is not None or from_stdin:
+            txs = self.read_txs(txs, parsed_args.from_file, from_stdin)
+        elif not len(txs):
+            sys.exit('[-] no transaction hash was given')
+        columns = self.get_columns(fields)
+        return (columns, self.rows(txs, columns))
+
+    def get_columns(self, fields):
+        """
+        Return the columns for ``fields`` (or the default ones): the
+        ``key`` column first and an ``error`` column last, so that every
+        row has the same columns whether it could be shown or not.
+        """
+        fields = [field for field in fields or self.columns
+                  if field not in [self.key, 'error']]
+        return [self.key] + list(dict.fromkeys(fields)) + ['error']
+
+    @staticmethod
+    def read_txs(txs, file_name=None, from_stdin=False):
+        """Yield transaction hashes given and read from a file or stdin."""
+        yield from txs
+        sources = []
+        if file_name is not None:
+            sources.append(file_name)
+        if from_stdin and file_name != '-':
+            sources.append('-')
+        for source in sources:
+            try:
+                f_in = sys.stdin if source == '-' else open(source, 'r')
+            except OSError as err:
+                sys.exit(f'[-] cannot read {source}: {err}')
+            try:
+                for line in f_in:
+                    if line.strip():
+                        yield line.strip()
+            finally:
+                if f_in is not sys.stdin:
+                    f_in.close()
+
+    def rows(self, txs, columns):
+        """
+        Yield a row of ``columns`` for each transaction, in order, with
+        just the ``key`` and an ``error`` for each one that can't be
+        shown. Columns a row has no value for are empty.
+        """
+        errors = 0
         try:
-            eth_tx = self.app.w3.eth.get_transaction(tx)
-        except KeyError:
-            sys.exit(f"[-] transaction (tx) with id '{tx}' not found")
-        columns = []
-        data = []
-        for k, v in eth_tx.items():
-            if (
-                not len(parsed_args.field)
-                or k in parsed_args.field
-            ):
-                columns.append(k)
-                data.append((to_str(v)))
-        return (columns, data)
+            for tx, eth_tx in self.lookup(txs):
+                if isinstance(eth_tx, str):
+                    errors += 1
+                    record = {self.key: tx, 'error': eth_tx}
+                else:
+                    record = self.select(eth_tx)
+                yield tuple(record.get(column, '') for column in columns)
+        except EndpointConnectionError as err:
+            sys.exit(str(err))
+        if errors:
+            self.log.warning(f'[-] {errors} transaction(s) not shown')
+
+    def lookup(self, txs):
+        """
+        Yield (tx, transaction or error message) for each transaction,
+        in order.
+        """
+        from web3._utils.method_formatters import (
+            transaction_result_formatter,
+        )
+        # Transactions requested but not yet yielded, in order.
+        pending = deque()
+
+        def requests():
+            for tx in txs:
+                pending.append(tx)
+                if is_tx_hash(tx):
+                    yield ('eth_getTransactionByHash', [tx])
+
+        calls = self.app.async_engine().imap(
+            requests(),
+            formatter=transaction_result_formatter,
+            batch_size=self.app.options.rpc_batch_size)
+        for call in calls:
+            while not is_tx_hash(pending[0]):
+                yield (pending.popleft(), 'not a transaction hash')
+            tx = pending.popleft()
+            try:
+                eth_tx = call.result()
+            except ValueError as err:
+                eth_tx = str(err)
+            yield (tx, 'not found' if eth_tx is None else eth_tx)
+        while pending:
+            yield (pending.popleft(), 'not a transaction hash')
 
+    @staticmethod
+    def select(eth_tx):
+        """Return a dictionary of the transaction's fields, as strings."""
+        return {k: to_str(v) for k, v in eth_tx.items()}
 
 # vim: set ts=4 sw=4 tw=0 et :
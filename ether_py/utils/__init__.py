@@ -1,19 +1,32 @@
 # -*- coding: utf-8 -*-
 
+import contextlib
+import itertools
 import logging
 import os
+import re
 import sys
+import threading
 import time
 import webbrowser
 
-from collections import OrderedDict
+from collections import (
+    OrderedDict,
+    deque,
+)
 from ether_py import ETHERPY_CONTRACTS_DIR
-from web3 import Web3
-from web3.types import HexBytes
-from web3._utils.empty import Empty
 
 
+BLOCK_TAGS = ['earliest', 'finalized', 'latest', 'pending', 'safe']
 BROWSER = os.getenv('BROWSER', None)
+HASH_RE = re.compile(r'^0x[0-9a-fA-F]{64}$')
+# ISO 8601 date and (optional) time with an (optional) UTC offset.
+ISO_TIME_RE = re.compile(
+    r'^(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})'
+    r'(?:[T ](?P<hour>\d{2}):(?P<minute>\d{2})'
+    r'(?::(?P<second>\d{2})(?:\.(?P<fraction>\d+))?)?)?'
+    r'(?P<offset>[zZ]|[+-]\d{2}:?\d{2})?$'
+)
 INFURA_TLD = 'infura.io'
 # Use syslog for logging?
 # TODO(dittrich): Make this configurable, since it can fail on Mac OS X
@@ -31,18 +44,67 @@ ETH_ATTRIBUTES = [
     'protocol_version',
     'syncing'
 ]
+
+
+def to_hex(value):
+    """Return hex string for value (defers importing ``web3``)."""
+    from web3 import Web3
+    return Web3.toHex(value)
+
+
+def to_int(value):
+    """Return integer for a JSON-RPC hex quantity (or an integer)."""
+    return value if isinstance(value, int) else int(value, 16)
+
+
+def to_checksum_address(value):
+    """Return checksum address (defers importing ``web3``)."""
+    from web3 import Web3
+    return Web3.toChecksumAddress(value)
+
+
+def _identity(value):
+    return value
+
+
+# JSON-RPC method and result formatter for each of the ``ETH_ATTRIBUTES``
+# that requires a call to the endpoint, so they can be fetched together
+# in one ``RPCBatch``. (The others are local ``w3.eth`` settings.)
+ETH_RPC_METHODS = {
+    'block_number': ('eth_blockNumber', to_int),
+    'chain_id': ('eth_chainId', to_int),
+    'coinbase': ('eth_coinbase', to_checksum_address),
+    'gas_price': ('eth_gasPrice', to_int),
+    'hashrate': ('eth_hashrate', to_int),
+    'mining': ('eth_mining', _identity),
+    'protocol_version': ('eth_protocolVersion', _identity),
+    'syncing': ('eth_syncing', _identity),
+}
+NET_ATTRIBUTES = [
+    'is_async',
+    'listening',
+    'peer_count',
+    'version',
+]
+NET_RPC_METHODS = {
+    'listening': ('net_listening', _identity),
+    'peer_count': ('net_peerCount', to_int),
+    'version': ('net_version', _identity),
+}
+
+
 TX_ATTRIBUTES = {
-    'blockHash': Web3.toHex,
+    'blockHash': to_hex,
     'blockNumber': int,
     'contractAddress': str,
     'cumulativeGasUsed': int,
     'from': str,
     'gasUsed': int,
     'logs': str,
-    'logsBloom': Web3.toHex,
+    'logsBloom': to_hex,
     'status': int,
     'to': str,
-    'transactionHash': Web3.toHex,
+    'transactionHash': to_hex,
     'transactionIndex': int,
 }
 VALID_CONTRACT_TYPES = [
@@ -57,6 +119,23 @@ VALID_CONTRACT_TYPES = [
 logger = logging.getLogger(__name__)
 
 
+def env_number(name, default, cast=int):
+    """
+    Return the number in environment variable ``name`` (converted with
+    ``cast``), or ``default`` if it is not set. A value that isn't a
+    number is ignored with a warning, rather than failing every command
+    when the module that reads it is imported.
+    """
+    value = os.getenv(name, '').strip()
+    if value:
+        try:
+            return cast(value)
+        except ValueError:
+            logger.warning(f"[-] ignoring {name}='{value}', which is "
+                           f"not a number: using {default}")
+    return cast(default)
+
+
 def _get_abs_path(
     file_name,
     file_ext,
@@ -108,9 +187,45 @@ def infura_url(
     return f"https://{endpoint}.{INFURA_TLD}/{api_version}/{project_id}"
 
 
+def endpoint_type(uri):
+    """
+    Return the type of endpoint ('http', 'websocket', or 'ipc') for a URI.
+
+    IPC endpoints are given either as a file system path to the node's
+    Unix socket, or as a URI with the ``ipc://`` scheme.
+    """
+    from urllib.parse import urlparse
+    scheme = urlparse(uri).scheme.lower()
+    if scheme in ['http', 'https']:
+        return 'http'
+    if scheme in ['ws', 'wss']:
+        return 'websocket'
+    if scheme in ['', 'ipc', 'file']:
+        return 'ipc'
+    raise ValueError(f"[-] endpoint URI '{uri}' has unsupported scheme")
+
+
+def is_endpoint_uri(value):
+    """Return ``True`` if value is an endpoint URI rather than a name."""
+    return value is not None and (
+        '://' in value
+        or value.startswith(('/', '~', '.'))
+    )
+
+
+def ipc_path(uri):
+    """Return the file system path for an IPC endpoint URI."""
+    for prefix in ['ipc://', 'file://']:
+        if uri.startswith(prefix):
+            uri = uri[len(prefix):]
+    return os.path.expanduser(uri)
+
+
 def to_str(item):
+    from hexbytes import HexBytes
+    from web3._utils.empty import Empty
     if type(item) is HexBytes:
-        return Web3.toHex(item)
+        return to_hex(item)
     elif type(item) is Empty:
         return 'None'
     # elif type(item) is list:
@@ -119,6 +234,208 @@ def to_str(item):
         return str(item)
 
 
+def to_jsonable(item):
+    """
+    Return ``item`` with byte strings as hex strings and mappings as
+    dictionaries, so that ``json`` can encode it.
+    """
+    if isinstance(item, (bytes, bytearray)):
+        return '0x' + bytes(item).hex()
+    if hasattr(item, 'items'):
+        return {k: to_jsonable(v) for k, v in item.items()}
+    if isinstance(item, (list, tuple)):
+        return [to_jsonable(v) for v in item]
+    return item
+
+
+def atomic_write(path, text, mode=None):
+    """
+    Write ``text`` to ``path`` through a temporary file in the same
+    directory that replaces it at the end, so readers never see a partly
+    written file. The temporary file is removed if writing fails. With
+    ``mode``, the file gets those permissions (``mkstemp`` makes it
+    ``0o600``).
+    """
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f_out:
+            f_out.write(text)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, obj, **kwargs):
+    """
+    Write ``obj`` as JSON to ``path`` with ``atomic_write()``. Keyword
+    arguments are passed to ``json.dumps()``.
+    """
+    import json
+    atomic_write(path, json.dumps(obj, **kwargs))
+
+
+def ordered_map(func, iterable, workers=4, window=None):
+    """
+    Yield ``func(item)`` for each item in ``iterable``, in input order.
+
+    Up to ``workers`` calls run concurrently in threads. No more than
+    ``window`` (default ``2 * workers``) results are outstanding at any
+    time, so memory use stays flat for long inputs and a slow consumer
+    throttles how quickly new items are started.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    window = max(window or 2 * workers, workers)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in iterable:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def chunked(iterable, size):
+    """Yield lists of up to ``size`` items from ``iterable``."""
+    from itertools import islice
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, max(size, 1)))
+        if not chunk:
+            return
+        yield chunk
+
+
+def is_block_id(value):
+    """Return ``True`` if value is a block number, hash, or tag."""
+    return (
+        value in BLOCK_TAGS
+        or str(value).isdigit()
+        or HASH_RE.match(str(value)) is not None
+    )
+
+
+def is_tx_hash(value):
+    """Return ``True`` if value looks like a transaction hash."""
+    return HASH_RE.match(str(value)) is not None
+
+
+def block_request(block_id, full_transactions=False):
+    """
+    Return the JSON-RPC (method, params) to get a block by identifier.
+
+    ``block_id`` is a block number, a block hash, or one of the
+    ``BLOCK_TAGS`` (e.g., "latest"). With ``full_transactions``, the
+    block has transaction objects rather than transaction hashes.
+    """
+    block_id = str(block_id)
+    if HASH_RE.match(block_id):
+        return ('eth_getBlockByHash', [block_id, full_transactions])
+    if block_id.isdigit():
+        return ('eth_getBlockByNumber',
+                [hex(int(block_id)), full_transactions])
+    if block_id in BLOCK_TAGS:
+        return ('eth_getBlockByNumber', [block_id, full_transactions])
+    raise ValueError(f"[-] '{block_id}' is not a block number, hash, or tag")
+
+
+def parse_block_range(value):
+    """
+    Return the first and last block numbers of a range of blocks.
+
+    ``value`` is a block number ("1000000") or two separated by ``..``
+    ("1000000..1010000"), both ends included. The end can also be
+    "latest" or left off ("1000000..") to mean the most recent block,
+    in which case it is returned as "latest" for the caller to resolve.
+    """
+    start, sep, end = str(value).partition('..')
+    if not sep:
+        end = start
+    elif end in ['', 'latest']:
+        end = 'latest'
+    if not start.isdigit() or not (end.isdigit() or end == 'latest'):
+        raise ValueError(f"[-] '{value}' is not a block range "
+                         "(e.g., '1000000..1010000' or '1000000..latest')")
+    start = int(start)
+    if end != 'latest':
+        end = int(end)
+        if end < start:
+            raise ValueError(f"[-] block range '{value}' ends before "
+                             "it starts")
+    return (start, end)
+
+
+def parse_timestamp(value):
+    """
+    Return a time as seconds since the Unix epoch.
+
+    ``value`` is a number of seconds ("1628121600") or an ISO 8601 date
+    and time ("2021-08-05T00:00:00Z"), taken to be UTC if it has no time
+    zone.
+    """
+    from datetime import (
+        datetime,
+        timedelta,
+        timezone,
+    )
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    match = ISO_TIME_RE.match(value)
+    try:
+        if match is None:
+            raise ValueError(value)
+        fields = match.groupdict()
+        offset = timedelta(0)
+        if fields['offset'] not in [None, 'Z', 'z']:
+            digits = fields['offset'][1:].replace(':', '')
+            offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+            if fields['offset'][0] == '-':
+                offset = -offset
+        when = datetime(
+            int(fields['year']), int(fields['month']), int(fields['day']),
+            int(fields['hour'] or 0), int(fields['minute'] or 0),
+            int(fields['second'] or 0),
+            int((fields['fraction'] or '0').ljust(6, '0')[:6]),
+            tzinfo=timezone(offset))
+    except ValueError:
+        raise ValueError(f"[-] '{value}' is not a time (e.g., "
+                         "'1628121600' or '2021-08-05T00:00:00Z')")
+    return int(when.timestamp())
+
+
+def split_ids_and_fields(args, is_id):
+    """
+    Split positional arguments into identifiers and field names.
+
+    Commands like ``block show`` take one or more identifiers followed
+    by optional field names. Field names are never numbers or hashes,
+    so any argument that starts with ``0x`` or is all digits is taken to
+    be an identifier, even if it isn't a valid one (e.g., a truncated
+    hash), for the command to report, as is anything ``is_id()``
+    accepts (e.g., "latest"). Only the rest are field names.
+    """
+    def looks_like_id(arg):
+        arg = str(arg)
+        return is_id(arg) or arg.isdigit() or arg.lower().startswith('0x')
+
+    ids = [arg for arg in args if looks_like_id(arg)]
+    fields = [arg for arg in args if not looks_like_id(arg)]
+    return (ids, fields)
+
+
 def elapsed(start, end):
     assert isinstance(start, float)
     assert isinstance(end, float)
@@ -146,7 +463,17 @@ class Timer(object):
         with Timer() as t:
             r = requests.get(url)
 
-        print 'fetched %r in %.2f msec' % (url, t.elapsed*1000)
+        print('fetched %r in %.2f msec' % (url, t.elapsed_raw()*1000))
+
+    A timer also records nested spans (named, timed phases of work) for
+    tracing. Spans opened by a thread while another of its spans is open
+    are recorded as children of that span::
+
+        timer = Timer()
+        with timer.span('fetch', url=url):
+            with timer.span('parse'):
+                ...
+        timer.write_trace('trace.jsonl')
 
     """
 
@@ -154,6 +481,10 @@ class Timer(object):
         self.verbose = verbose
         self.task_description = task_description
         self.laps = OrderedDict()
+        self.spans = []
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._lock = threading.Lock()
 
     def __enter__(self):
         """Record initial time."""
@@ -180,9 +511,7 @@ class Timer(object):
     def start(self, lap=None):
         """Record starting time."""
         t = time.time()
-        first = None if len(self.laps) == 0 \
-            else self.laps.iteritems().next()[0]
-        if first is None:
+        if len(self.laps) == 0:
             self.laps["__enter__"] = t
         if lap is not None:
             self.laps[lap] = t
@@ -204,7 +533,7 @@ class Timer(object):
 
     def get_lap(self, lap="__exit__"):
         """Get the timer for label specified by 'lap'"""
-        return self.lap[lap]
+        return self.laps[lap]
 
     def elapsed_raw(self, start="__enter__", end="__exit__"):
         """Return the elapsed time as a raw value."""
@@ -220,6 +549,68 @@ class Timer(object):
         return "{:0>2}:{:0>2}:{:05.2f}".format(
             int(hours), int(minutes), seconds)
 
+    @contextlib.contextmanager
+    def span(self, name, category='ether-py', **args):
+        """
+        Time the body of a ``with`` statement as a span named ``name``.
+
+        Keyword arguments are recorded with the span, and the dictionary
+        holding them is the ``with`` statement's target, so attributes
+        only known later can be added to it. A span whose body raises
+        an exception records the exception as its ``error``.
+        """
+        stack = self._local.__dict__.setdefault('stack', [])
+        span_id = next(self._ids)
+        parent = stack[-1] if stack else None
+        stack.append(span_id)
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield args
+        except BaseException as err:
+            args['error'] = str(err) or type(err).__name__
+            raise
+        finally:
+            stack.pop()
+            self.record(name, start, time.perf_counter() - started,
+                        category=category, span_id=span_id, parent=parent,
+                        args=args)
+
+    def record(self, name, start, duration, category='ether-py',
+               span_id=None, parent=None, args=None, concurrent=False):
+        """
+        Record a span that started at ``start`` (from ``time.time()``).
+
+        Spans of work that overlaps other work in the same thread (e.g.,
+        requests made by an ``asyncio`` event loop) should be recorded
+        with ``concurrent=True``, since they do not nest.
+        """
+        span = {
+            'name': name,
+            'cat': category,
+            'ts': start,
+            'dur': duration,
+            'id': span_id or next(self._ids),
+            'parent': parent,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args or {},
+        }
+        if concurrent:
+            span['concurrent'] = True
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def write_trace(self, path):
+        """Write the recorded spans to ``path`` as JSON lines."""
+        import json
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span['ts'])
+        with open(path, 'w') as f_out:
+            for span in spans:
+                f_out.write(json.dumps(span, default=str) + '\n')
+
 
 def add_browser_options(parser):
     """Add web browser options."""
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""Concurrent JSON-RPC requests using ``web3``'s ``AsyncHTTPProvider``."""
+
+import asyncio
+import logging
+import time
+
+from collections import deque
+from ether_py.utils import (
+    chunked,
+    env_number,
+)
+from ether_py.utils.endpoint import EndpointConnectionError
+from ether_py.utils.metrics import get_metrics
+from ether_py.utils.trace import (
+    get_tracer,
+    record_calls,
+)
+from ether_py.utils.rpcbatch import (
+    BatchNotSupported,
+    RPCCall,
+    decode_batch,
+    encode_batch,
+)
+
+
+AIO_CONCURRENCY = env_number('ETHERPY_CONCURRENCY', 16)
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEngine(object):
+    """
+    Make many independent JSON-RPC calls concurrently.
+
+    The synchronous commands drive an ``asyncio`` event loop of their own
+    through ``imap()``, so nothing outside this class needs to be
+    ``async``. No more than ``concurrency`` requests are in flight at
+    once (bounded by a semaphore and by the size of the ``aiohttp``
+    connection pool), so throughput scales with the concurrency limit
+    until the endpoint starts rate limiting, at which point requests
+    that get HTTP 429 (or 5xx) are retried with backoff. With ``limits``
+    (see ``get_rate_limit_settings()``), requests are also paced by the
+    endpoint's shared ``RequestScheduler``, which lowers the number in
+    flight when the endpoint pushes back.
+    """
+
+    def __init__(self, url, concurrency=AIO_CONCURRENCY, settings=None,
+                 limits=None):
+        from ether_py.utils.transport import get_transport_settings
+        self.url = url
+        self.concurrency = max(concurrency, 1)
+        self.settings = settings or get_transport_settings()
+        self.scheduler = None
+        if limits is not None:
+            from ether_py.utils.ratelimit import get_scheduler
+            self.scheduler = get_scheduler(url, limits)
+
+    def imap(self, requests, formatter=None, batch_size=1, window=None):
+        """
+        Yield an ``RPCCall`` for each (method, params) in ``requests``.
+
+        Calls are sent ``batch_size`` at a time (as JSON-RPC batch arrays
+        when ``batch_size`` is greater than 1). Up to ``window`` calls
+        (by default, ``2 * concurrency`` requests' worth, and never fewer
+        than ``concurrency`` requests' worth) are started ahead of the
+        one being consumed, so a slow consumer throttles how quickly new
+        requests are made, and ``requests`` can be a generator of any
+        length without using more memory. Calls are
+        yielded in the same order as ``requests``. Errors returned by the
+        endpoint for a call are raised by that call's ``result()``;
+        failing to reach the endpoint at all raises
+        ``EndpointConnectionError``.
+        """
+        loop = asyncio.new_event_loop()
+        batch_size = max(batch_size, 1)
+        ahead = (
+            2 * self.concurrency if window is None
+            else max(-(-window // batch_size), self.concurrency)
+        )
+        agen = self._imap(requests, formatter, batch_size, ahead)
+        try:
+            while True:
+                try:
+                    calls = loop.run_until_complete(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+                yield from calls
+        finally:
+            try:
+                loop.run_until_complete(agen.aclose())
+            except RuntimeError:
+                # Interrupted (e.g., by CTRL-C) in the middle of a step,
+                # so it can't be closed; let the original error through.
+                pass
+            loop.close()
+
+    async def _imap(self, requests, formatter, batch_size, ahead):
+        import aiohttp
+        from web3 import AsyncHTTPProvider
+        timeout = aiohttp.ClientTimeout(total=self.settings['timeout'])
+        provider = AsyncHTTPProvider(self.url,
+                                     request_kwargs={'timeout': timeout})
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.concurrency,
+                force_close=not self.settings['keep_alive'],
+            ),
+            headers=(
+                {} if self.settings['gzip']
+                else {'Accept-Encoding': 'identity'}
+            ),
+            raise_for_status=True,
+        )
+        await provider.cache_async_session(session)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending = deque()
+        try:
+            for chunk in chunked(requests, batch_size):
+                calls = [
+                    RPCCall(method, params=params, formatter=formatter)
+                    for method, params in chunk
+                ]
+                pending.append(asyncio.ensure_future(
+                    self._send(provider, semaphore, calls)))
+                if len(pending) >= ahead:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await session.close()
+
+    async def _send(self, provider, semaphore, calls):
+        async with semaphore:
+            if self.scheduler is None:
+                responses = await self._send_calls(provider, calls)
+            else:
+                started = await self.scheduler.acquire_async(len(calls))
+                try:
+                    responses = await self._send_calls(provider, calls)
+                finally:
+                    self.scheduler.release(started)
+        for call, response in zip(calls, responses):
+            call.set_response(response)
+        return calls
+
+    async def _send_calls(self, provider, calls):
+        """Return the responses to calls, sent as one batch if possible."""
+        metrics = get_metrics()
+        if metrics is None and get_tracer() is None:
+            return await self._post_calls(provider, calls)
+        requests = [(call.method, call.params) for call in calls]
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            responses = await self._post_calls(provider, calls)
+        except Exception as err:  # noqa
+            duration = time.perf_counter() - started
+            if metrics is not None:
+                metrics.observe_calls(requests, None, duration)
+            record_calls(requests, start, duration, error=str(err))
+            raise
+        duration = time.perf_counter() - started
+        if metrics is not None:
+            metrics.observe_calls(requests, responses, duration)
+        record_calls(requests, start, duration)
+        return responses
+
+    async def _post_calls(self, provider, calls):
+        if len(calls) == 1:
+            return [
+                await self._retry(provider.make_request,
+                                  calls[0].method, calls[0].params)
+            ]
+        try:
+            return await self._retry(self._make_batch_request,
+                                     provider, calls)
+        except BatchNotSupported as err:
+            logger.debug(f'[-] {err}: making calls one at a time')
+            return [
+                await self._retry(provider.make_request,
+                                  call.method, call.params)
+                for call in calls
+            ]
+
+    async def _make_batch_request(self, provider, calls):
+        from web3._utils.request import async_make_post_request
+        ids, payload = encode_batch(
+            [(call.method, call.params) for call in calls],
+            provider.request_counter)
+        raw_response = await async_make_post_request(
+            provider.endpoint_uri, payload, **provider.get_request_kwargs())
+        return decode_batch(provider.decode_rpc_response(raw_response), ids)
+
+    async def _retry(self, func, *args):
+        """Await ``func(*args)``, retrying with backoff as configured."""
+        import aiohttp
+        from ether_py.utils.transport import RETRY_STATUSES
+        attempt = 0
+        while True:
+            try:
+                return await func(*args)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                status = getattr(err, 'status', None)
+                if status == 429 and self.scheduler is not None:
+                    self.scheduler.record_throttle()
+                retryable = status is None or status in RETRY_STATUSES
+                if not retryable or attempt >= self.settings['retries']:
+                    raise EndpointConnectionError(
+                        f'[-] request to {self.url} failed: '
+                        f'{err or type(err).__name__}') from err
+                delay = self.settings['backoff'] * (2 ** attempt)
+                headers = getattr(err, 'headers', None) or {}
+                if 'Retry-After' in headers:
+                    try:
+                        delay = max(delay, float(headers['Retry-After']))
+                    except ValueError:
+                        pass
+                logger.debug(f'[-] {err}: retrying in {delay:.2f}s')
+                await asyncio.sleep(delay)
+                attempt += 1
+
+
+# vim: set ts=4 sw=4 tw=0 et :
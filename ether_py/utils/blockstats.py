@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+Statistics over columns of block header values.
+
+Everything here works on whole NumPy arrays (as made by
+``ColumnBuilder`` or read back by ``read_columns()``) rather than block
+by block, so summarizing millions of blocks takes a fraction of a
+second.
+"""
+
+
+# Columns the metrics are derived from.
+STATS_COLUMNS = [
+    'number',
+    'timestamp',
+    'gasUsed',
+    'gasLimit',
+    'size',
+    'baseFeePerGas',
+    'txCount',
+]
+METRICS = [
+    'gas_used',
+    'gas_utilization',
+    'block_time',
+    'tx_count',
+    'base_fee_gwei',
+    'size',
+]
+DEFAULT_PERCENTILES = [50, 90, 99]
+
+
+def select_range(arrays, start=None, end=None):
+    """Return the rows of ``arrays`` for blocks ``start`` to ``end``."""
+    import numpy as np
+
+    numbers = arrays['number']
+    mask = np.ones(len(numbers), dtype=bool)
+    if start is not None:
+        mask &= numbers >= start
+    if end is not None:
+        mask &= numbers <= end
+    if mask.all():
+        return arrays
+    return {column: array[mask] for column, array in arrays.items()}
+
+
+def derive_metrics(arrays):
+    """
+    Return a dictionary of metric arrays derived from block columns.
+
+    ``block_time`` has one value fewer than there are blocks (the time
+    since the block before, for every block but the first), and
+    ``base_fee_gwei`` only has values for blocks with a base fee.
+    """
+    import numpy as np
+
+    gas_used = arrays['gasUsed'].astype(np.float64)
+    gas_limit = arrays['gasLimit'].astype(np.float64)
+    base_fee = arrays['baseFeePerGas']
+    return {
+        'gas_used': gas_used,
+        'gas_utilization': np.divide(
+            gas_used, gas_limit,
+            out=np.zeros_like(gas_used), where=gas_limit > 0),
+        'block_time': np.diff(arrays['timestamp'].astype(np.int64)),
+        'tx_count': arrays['txCount'],
+        'base_fee_gwei': base_fee[base_fee > 0] / 1e9,
+        'size': arrays['size'],
+    }
+
+
+def summarize(metrics, percentiles=DEFAULT_PERCENTILES):
+    """
+    Return (columns, rows) with count, mean, standard deviation,
+    minimum, percentiles and maximum for each metric.
+    """
+    import numpy as np
+
+    columns = (
+        ['metric', 'count', 'mean', 'std', 'min']
+        + [f'p{p:g}' for p in percentiles]
+        + ['max']
+    )
+    rows = []
+    for metric, values in metrics.items():
+        if len(values) == 0:
+            rows.append([metric, 0] + [None] * (len(columns) - 2))
+            continue
+        values = values.astype(np.float64, copy=False)
+        # One call, so the values are only partitioned once.
+        ranks = list(np.percentile(values, [0] + list(percentiles) + [100]))
+        rows.append(
+            [metric, len(values), values.mean(), values.std()] + ranks
+        )
+    return (columns, rows)
+
+
+def histogram(values, bins=10):
+    """Return (columns, rows) of a histogram of ``values``."""
+    import numpy as np
+
+    if len(values) == 0:
+        return (['low', 'high', 'count', 'percent'], [])
+    counts, edges = np.histogram(values, bins=bins)
+    percents = 100.0 * counts / counts.sum()
+    return (
+        ['low', 'high', 'count', 'percent'],
+        [
+            [edges[i], edges[i + 1], int(counts[i]), percents[i]]
+            for i in range(len(counts))
+        ],
+    )
+
+
+def rolling(arrays, window, step=None):
+    """
+    Return (columns, rows) of the mean of each metric over windows of
+    ``window`` blocks, starting every ``step`` blocks (by default, the
+    windows don't overlap).
+
+    Means come from differences of cumulative sums, so the cost doesn't
+    depend on the size of the window.
+    """
+    import numpy as np
+
+    step = step or window
+    count = len(arrays['number'])
+    columns = ['first_block', 'last_block', 'gas_utilization',
+               'block_time', 'tx_count', 'base_fee_gwei']
+    if window < 1 or count < window:
+        return (columns, [])
+    starts = np.arange(0, count - window + 1, step)
+    ends = starts + window
+
+    def window_sums(values):
+        sums = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+        return sums[ends] - sums[starts]
+
+    metrics = derive_metrics(arrays)
+    base_fee = arrays['baseFeePerGas']
+    has_fee = window_sums(base_fee > 0)
+    fee_means = np.divide(window_sums(base_fee) / 1e9, has_fee,
+                          out=np.full(len(starts), np.nan),
+                          where=has_fee > 0)
+    timestamps = arrays['timestamp'].astype(np.float64)
+    block_times = (
+        (timestamps[ends - 1] - timestamps[starts]) / max(window - 1, 1)
+    )
+    numbers = arrays['number']
+    table = np.column_stack([
+        numbers[starts],
+        numbers[ends - 1],
+        window_sums(metrics['gas_utilization']) / window,
+        block_times,
+        window_sums(metrics['tx_count']) / window,
+        fee_means,
+    ])
+    rows = [
+        [int(row[0]), int(row[1])]
+        + [None if np.isnan(value) else value for value in row[2:]]
+        for row in table.tolist()
+    ]
+    return (columns, rows)
+
+
+# vim: set ts=4 sw=4 tw=0 et :
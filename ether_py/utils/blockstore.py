@@ -0,0 +1,848 @@
+# -*- coding: utf-8 -*-
+
+"""
+Local archive of finalized blocks.
+
+Blocks that are at least ``finality_depth`` blocks older than the chain
+head will not change, so ``BlockFetcher`` keeps them in a ``BlockStore``
+(an SQLite database per chain in the data directory) and reads them from
+there instead of asking the endpoint again. Blocks are stored as the raw
+JSON-RPC result (i.e., before ``web3``'s formatters), compressed with
+``zlib``, and looked up by number or by hash. Receipts of transactions in
+finalized blocks are kept the same way, looked up by transaction hash.
+When the stored blocks and receipts take more than ``max_size`` MiB, the
+least recently used ones are evicted, except for the ranges of blocks
+pinned by ``block sync``.
+"""
+
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from collections import deque
+from ether_py.utils import (
+    HASH_RE,
+    block_request,
+    chunked,
+    env_number,
+)
+
+
+BLOCK_CACHE = (
+    os.getenv('ETHERPY_BLOCK_CACHE', 'true').lower() == 'true'
+)
+# Size of the stored blocks (in MiB) above which blocks are evicted.
+BLOCK_CACHE_SIZE = env_number('ETHERPY_BLOCK_CACHE_SIZE', 1024, float)
+# Blocks this far behind the chain head are treated as final.
+FINALITY_DEPTH = env_number('ETHERPY_FINALITY_DEPTH', 64)
+# Seconds before the chain head is asked for again.
+HEAD_REFRESH = 12
+# Eviction removes blocks until they take no more than this fraction of
+# the maximum size, so it doesn't happen again on the next run.
+EVICT_TO = 0.9
+# Rows written (or access times updated) per transaction.
+COMMIT_EVERY = 256
+SCHEMA_VERSION = 4
+# Settings that can come from CLI options, psec secrets, or defaults.
+# Maps setting name to (option name, secret name, type, default).
+BLOCK_CACHE_SETTINGS = {
+    'enabled': ('block_cache', 'block_cache', bool, BLOCK_CACHE),
+    'finality_depth': (
+        'finality_depth', 'finality_depth', int, FINALITY_DEPTH),
+    'max_size': (
+        'block_cache_size', 'block_cache_size', float, BLOCK_CACHE_SIZE),
+}
+# Condition on ``number`` for blocks in a pinned range.
+PINNED = (
+    'EXISTS (SELECT 1 FROM pinned '
+    'WHERE number BETWEEN first_block AND last_block)'
+)
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS blocks (
+        number INTEGER PRIMARY KEY,
+        hash BLOB NOT NULL UNIQUE,
+        parent_hash BLOB NOT NULL,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        raw_size INTEGER NOT NULL,
+        accessed INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS blocks_accessed ON blocks (accessed, number);
+    CREATE TABLE IF NOT EXISTS totals (
+        blocks INTEGER NOT NULL,
+        bytes INTEGER NOT NULL,
+        raw_bytes INTEGER NOT NULL
+    );
+    INSERT INTO totals
+        SELECT 0, 0, 0 WHERE NOT EXISTS (SELECT * FROM totals);
+    CREATE TRIGGER IF NOT EXISTS blocks_insert AFTER INSERT ON blocks
+    BEGIN
+        UPDATE totals SET blocks = blocks + 1,
+            bytes = bytes + NEW.size,
+            raw_bytes = raw_bytes + NEW.raw_size;
+    END;
+    CREATE TRIGGER IF NOT EXISTS blocks_delete AFTER DELETE ON blocks
+    BEGIN
+        UPDATE totals SET blocks = blocks - 1,
+            bytes = bytes - OLD.size,
+            raw_bytes = raw_bytes - OLD.raw_size;
+    END;
+    CREATE TRIGGER IF NOT EXISTS blocks_update
+    AFTER UPDATE OF size, raw_size ON blocks
+    BEGIN
+        UPDATE totals SET bytes = bytes + NEW.size - OLD.size,
+            raw_bytes = raw_bytes + NEW.raw_size - OLD.raw_size;
+    END;
+    CREATE TABLE IF NOT EXISTS receipts (
+        number INTEGER PRIMARY KEY,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        raw_size INTEGER NOT NULL
+    );
+    CREATE TRIGGER IF NOT EXISTS receipts_insert AFTER INSERT ON receipts
+    BEGIN
+        UPDATE totals SET bytes = bytes + NEW.size,
+            raw_bytes = raw_bytes + NEW.raw_size;
+    END;
+    CREATE TRIGGER IF NOT EXISTS receipts_delete AFTER DELETE ON receipts
+    BEGIN
+        UPDATE totals SET bytes = bytes - OLD.size,
+            raw_bytes = raw_bytes - OLD.raw_size;
+    END;
+    CREATE TRIGGER IF NOT EXISTS receipts_update
+    AFTER UPDATE OF size, raw_size ON receipts
+    BEGIN
+        UPDATE totals SET bytes = bytes + NEW.size - OLD.size,
+            raw_bytes = raw_bytes + NEW.raw_size - OLD.raw_size;
+    END;
+    CREATE TRIGGER IF NOT EXISTS blocks_delete_receipts
+    AFTER DELETE ON blocks
+    BEGIN
+        DELETE FROM receipts WHERE number = OLD.number;
+    END;
+    CREATE TRIGGER IF NOT EXISTS blocks_replace_receipts
+    AFTER UPDATE OF hash ON blocks WHEN NEW.hash != OLD.hash
+    BEGIN
+        DELETE FROM receipts WHERE number = OLD.number;
+    END;
+    CREATE TABLE IF NOT EXISTS tx_receipts (
+        hash BLOB PRIMARY KEY,
+        number INTEGER NOT NULL,
+        block_hash BLOB NOT NULL,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        raw_size INTEGER NOT NULL,
+        accessed INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS tx_receipts_number ON tx_receipts (number);
+    CREATE INDEX IF NOT EXISTS tx_receipts_accessed
+        ON tx_receipts (accessed);
+    CREATE TRIGGER IF NOT EXISTS tx_receipts_insert
+    AFTER INSERT ON tx_receipts
+    BEGIN
+        UPDATE totals SET bytes = bytes + NEW.size,
+            raw_bytes = raw_bytes + NEW.raw_size;
+    END;
+    CREATE TRIGGER IF NOT EXISTS tx_receipts_delete
+    AFTER DELETE ON tx_receipts
+    BEGIN
+        UPDATE totals SET bytes = bytes - OLD.size,
+            raw_bytes = raw_bytes - OLD.raw_size;
+    END;
+    CREATE TRIGGER IF NOT EXISTS tx_receipts_update
+    AFTER UPDATE OF size, raw_size ON tx_receipts
+    BEGIN
+        UPDATE totals SET bytes = bytes + NEW.size - OLD.size,
+            raw_bytes = raw_bytes + NEW.raw_size - OLD.raw_size;
+    END;
+    CREATE TRIGGER IF NOT EXISTS blocks_replace_tx_receipts
+    AFTER UPDATE OF hash ON blocks WHEN NEW.hash != OLD.hash
+    BEGIN
+        DELETE FROM tx_receipts WHERE number = OLD.number;
+    END;
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        name TEXT PRIMARY KEY,
+        next_block INTEGER NOT NULL,
+        last_hash BLOB,
+        updated INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS pinned (
+        name TEXT PRIMARY KEY,
+        first_block INTEGER NOT NULL,
+        last_block INTEGER NOT NULL
+    );
+"""
+
+
+logger = logging.getLogger(__name__)
+
+
+class BlockStoreError(RuntimeError):
+    """Raised when stored blocks can't be read."""
+
+
+def get_block_cache_settings(options=None, get_secret=None):
+    """
+    Return a dictionary of block cache settings.
+
+    Settings come from command line options, psec secrets, or defaults,
+    in that order (see ``get_transport_settings()``).
+    """
+    from ether_py.utils.transport import _to_bool
+    settings = {}
+    for setting, (option, secret, cast, default) in (
+        BLOCK_CACHE_SETTINGS.items()
+    ):
+        value = getattr(options, option, None) if option else None
+        if value is None and secret and get_secret is not None:
+            value = get_secret(secret)
+        if value is None or value == '':
+            value = default
+        settings[setting] = _to_bool(value) if cast is bool else cast(value)
+    return settings
+
+
+def block_store_path(data_dir, chain_id):
+    """Return the path of the block store for a chain."""
+    return os.path.join(data_dir, 'blocks', f'chain-{chain_id}.sqlite3')
+
+
+def decode_block(data):
+    """Return the raw JSON-RPC block from its stored form."""
+    return json.loads(zlib.decompress(data))
+
+
+def _to_bytes(value):
+    return bytes.fromhex(value[2:] if value.startswith('0x') else value)
+
+
+# Header fields in the order they are RLP encoded. Fields added by later
+# forks are only present in blocks from those forks.
+HEADER_FIELDS = [
+    'parentHash', 'sha3Uncles', 'miner', 'stateRoot', 'transactionsRoot',
+    'receiptsRoot', 'logsBloom', 'difficulty', 'number', 'gasLimit',
+    'gasUsed', 'timestamp', 'extraData', 'mixHash', 'nonce',
+]
+OPTIONAL_HEADER_FIELDS = [
+    'baseFeePerGas', 'withdrawalsRoot', 'blobGasUsed', 'excessBlobGas',
+    'parentBeaconBlockRoot', 'requestsHash',
+]
+QUANTITY_FIELDS = [
+    'difficulty', 'number', 'gasLimit', 'gasUsed', 'timestamp',
+    'baseFeePerGas', 'blobGasUsed', 'excessBlobGas',
+]
+
+
+def header_hash(block):
+    """
+    Return the hash of a raw JSON-RPC block's header (as a hex string).
+
+    Used to check that a stored block has not been corrupted or altered.
+    """
+    import rlp
+    from eth_utils import keccak
+    fields = HEADER_FIELDS + [
+        field for field in OPTIONAL_HEADER_FIELDS if field in block
+    ]
+    header = []
+    for field in fields:
+        if field in QUANTITY_FIELDS:
+            value = int(block[field], 16)
+            header.append(
+                value.to_bytes((value.bit_length() + 7) // 8, 'big'))
+        else:
+            header.append(_to_bytes(block[field]))
+    return '0x' + keccak(rlp.encode(header)).hex()
+
+
+def _locked(method):
+    """Run a ``BlockStore`` method holding the store's lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class BlockStore(object):
+    """
+    SQLite database of raw JSON-RPC blocks, keyed by number and hash,
+    along with the receipts of some blocks, receipts of transactions
+    keyed by hash, and named checkpoints.
+
+    Several processes can use the same store at once, as can several
+    threads of one process (e.g., the workers of ``batch``), which share
+    one connection, taking turns with ``lock``. Writes and access time
+    updates are batched and committed every ``COMMIT_EVERY`` rows and by
+    ``close()``, which also evicts blocks if the store is larger than
+    ``max_size`` MiB.
+    """
+
+    def __init__(self, path, max_size=BLOCK_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version < SCHEMA_VERSION:
+            # Every statement in the schema can be run again, so this
+            # also adds what is new to stores made by older versions.
+            with self.db:
+                self.db.executescript(SCHEMA)
+                self.db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self._writes = 0
+        self._touched = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @_locked
+    def close(self):
+        """Commit pending changes, evict if too large, and close."""
+        if self.db is None:
+            return
+        self._flush_touched()
+        self.db.commit()
+        if self._writes:
+            self.evict()
+        self.db.close()
+        self.db = None
+
+    @_locked
+    def get(self, block_id):
+        """Return the raw block with a number or hash, or ``None``."""
+        if isinstance(block_id, int) or str(block_id).isdigit():
+            row = self.db.execute(
+                'SELECT number, data FROM blocks WHERE number = ?',
+                (int(block_id),)).fetchone()
+        elif HASH_RE.match(str(block_id)):
+            row = self.db.execute(
+                'SELECT number, data FROM blocks WHERE hash = ?',
+                (_to_bytes(block_id),)).fetchone()
+        else:
+            return None
+        if row is None:
+            return None
+        self._touch(row[0])
+        return decode_block(row[1])
+
+    @_locked
+    def contains(self, block_id):
+        """
+        Return ``True`` if the block with a number or hash is stored.
+
+        Found blocks count as used, so they are the last to be evicted
+        (by this or another process) before they are read.
+        """
+        if isinstance(block_id, int) or str(block_id).isdigit():
+            query = ('SELECT number FROM blocks WHERE number = ?',
+                     int(block_id))
+        elif HASH_RE.match(str(block_id)):
+            query = ('SELECT number FROM blocks WHERE hash = ?',
+                     _to_bytes(block_id))
+        else:
+            return False
+        row = self.db.execute(query[0], (query[1],)).fetchone()
+        if row is None:
+            return False
+        self._touch(row[0])
+        return True
+
+    def _rows(self, query, params=()):
+        """
+        Yield the rows a query returns, holding the lock only while
+        fetching them, so other threads can use the store in between.
+        """
+        with self.lock:
+            cursor = self.db.execute(query, params)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(COMMIT_EVERY)
+            if not rows:
+                return
+            yield from rows
+
+    def iter_range(self, start, end):
+        """Yield (number, raw block) for stored blocks in a range."""
+        for number, data in self._rows(
+            'SELECT number, data FROM blocks '
+            'WHERE number BETWEEN ? AND ? ORDER BY number',
+            (start, end),
+        ):
+            self._touch(number)
+            yield (number, decode_block(data))
+
+    @_locked
+    def put(self, block):
+        """Store a raw JSON-RPC block."""
+        raw = json.dumps(block, separators=(',', ':')).encode('utf-8')
+        data = zlib.compress(raw)
+        self.db.execute(
+            'INSERT INTO blocks '
+            '(number, hash, parent_hash, data, size, raw_size, accessed) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (number) DO UPDATE SET hash = excluded.hash, '
+            'parent_hash = excluded.parent_hash, data = excluded.data, '
+            'size = excluded.size, raw_size = excluded.raw_size, '
+            'accessed = excluded.accessed',
+            (
+                int(block['number'], 16),
+                _to_bytes(block['hash']),
+                _to_bytes(block['parentHash']),
+                data,
+                len(data),
+                len(raw),
+                int(time.time()),
+            ))
+        self._writes += 1
+        if self._writes % COMMIT_EVERY == 0:
+            self.db.commit()
+
+    @_locked
+    def delete(self, numbers):
+        """Delete the blocks with these numbers."""
+        for chunk in chunked(numbers, 500):
+            self.db.executemany('DELETE FROM blocks WHERE number = ?',
+                                [(number,) for number in chunk])
+        self.db.commit()
+
+    @_locked
+    def delete_range(self, start, end):
+        """
+        Delete the blocks numbered ``start`` through ``end``, and the
+        receipts of transactions in them. Returns the number of blocks
+        and transaction receipts deleted.
+        """
+        deleted = sum(
+            self.db.execute(
+                f'DELETE FROM {table} WHERE number BETWEEN ? AND ?',
+                (start, end)).rowcount
+            for table in ['blocks', 'tx_receipts']
+        )
+        self.db.commit()
+        return deleted
+
+    @_locked
+    def hash_at(self, number):
+        """Return the hash of stored block ``number``, or ``None``."""
+        row = self.db.execute('SELECT hash FROM blocks WHERE number = ?',
+                              (number,)).fetchone()
+        return None if row is None else '0x' + row[0].hex()
+
+    @_locked
+    def missing(self, start, end, receipts=False):
+        """
+        Return a list of (first, last) ranges of the block numbers from
+        ``start`` through ``end`` that are not stored (or, with
+        ``receipts``, whose receipts are not stored).
+        """
+        table = 'receipts' if receipts else 'blocks'
+        cursor = self.db.execute(
+            f'SELECT number FROM {table} '
+            'WHERE number BETWEEN ? AND ? ORDER BY number',
+            (start, end))
+        ranges = []
+        expected = start
+        for (number,) in cursor:
+            if number > expected:
+                ranges.append((expected, number - 1))
+            expected = number + 1
+        if expected <= end:
+            ranges.append((expected, end))
+        return ranges
+
+    @_locked
+    def put_receipts(self, number, receipts):
+        """Store the raw JSON-RPC receipts of stored block ``number``."""
+        raw = json.dumps(receipts, separators=(',', ':')).encode('utf-8')
+        data = zlib.compress(raw)
+        self.db.execute(
+            'INSERT INTO receipts (number, data, size, raw_size) '
+            'VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (number) DO UPDATE SET data = excluded.data, '
+            'size = excluded.size, raw_size = excluded.raw_size',
+            (number, data, len(data), len(raw)))
+        self._writes += 1
+        if self._writes % COMMIT_EVERY == 0:
+            self.db.commit()
+
+    @_locked
+    def get_receipts(self, number):
+        """Return the stored receipts of block ``number``, or ``None``."""
+        row = self.db.execute('SELECT data FROM receipts WHERE number = ?',
+                              (number,)).fetchone()
+        if row is None:
+            return None
+        self._touch(number)
+        return json.loads(zlib.decompress(row[0]))
+
+    @_locked
+    def put_tx_receipt(self, receipt):
+        """Store a raw JSON-RPC transaction receipt."""
+        raw = json.dumps(receipt, separators=(',', ':')).encode('utf-8')
+        data = zlib.compress(raw)
+        self.db.execute(
+            'INSERT INTO tx_receipts '
+            '(hash, number, block_hash, data, size, raw_size, accessed) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (hash) DO UPDATE SET number = excluded.number, '
+            'block_hash = excluded.block_hash, data = excluded.data, '
+            'size = excluded.size, raw_size = excluded.raw_size, '
+            'accessed = excluded.accessed',
+            (
+                _to_bytes(receipt['transactionHash']),
+                int(receipt['blockNumber'], 16),
+                _to_bytes(receipt['blockHash']),
+                data,
+                len(data),
+                len(raw),
+                int(time.time()),
+            ))
+        self._writes += 1
+        if self._writes % COMMIT_EVERY == 0:
+            self.db.commit()
+
+    @_locked
+    def get_tx_receipts(self, tx_hashes):
+        """
+        Return a dictionary mapping each of ``tx_hashes`` whose receipt
+        is stored to the raw receipt.
+
+        A receipt from a block other than the stored block with its
+        number (i.e., one that was replaced by a reorganization) is
+        left out.
+        """
+        found = {}
+        for chunk in chunked(tx_hashes, 500):
+            keys = {_to_bytes(tx_hash): tx_hash for tx_hash in chunk}
+            cursor = self.db.execute(
+                'SELECT tx_receipts.hash, tx_receipts.data '
+                'FROM tx_receipts LEFT JOIN blocks USING (number) '
+                f'WHERE tx_receipts.hash IN ({",".join("?" * len(keys))}) '
+                'AND (blocks.hash IS NULL '
+                'OR blocks.hash = tx_receipts.block_hash)',
+                list(keys))
+            rows = cursor.fetchall()
+            for key, data in rows:
+                found[keys[key]] = json.loads(zlib.decompress(data))
+            if rows:
+                now = int(time.time())
+                self.db.executemany(
+                    'UPDATE tx_receipts SET accessed = ? WHERE hash = ?',
+                    [(now, key) for key, _ in rows])
+        return found
+
+    @_locked
+    def get_checkpoint(self, name):
+        """Return (next block, last block hash) for a checkpoint."""
+        row = self.db.execute(
+            'SELECT next_block, last_hash FROM checkpoints WHERE name = ?',
+            (name,)).fetchone()
+        if row is None:
+            return None
+        return (row[0], None if row[1] is None else '0x' + row[1].hex())
+
+    @_locked
+    def set_checkpoint(self, name, next_block, last_hash=None):
+        """
+        Record a checkpoint, committing it along with every block and
+        receipt stored before it.
+        """
+        self.db.execute(
+            'INSERT INTO checkpoints (name, next_block, last_hash, updated) '
+            'VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET '
+            'next_block = excluded.next_block, '
+            'last_hash = excluded.last_hash, updated = excluded.updated',
+            (name, next_block,
+             None if last_hash is None else _to_bytes(last_hash),
+             int(time.time())))
+        self.db.commit()
+
+    @_locked
+    def pin(self, name, first, last):
+        """
+        Keep blocks ``first`` through ``last`` (and their receipts) from
+        being evicted, adding them to the range pinned as ``name``.
+        """
+        self.db.execute(
+            'INSERT INTO pinned (name, first_block, last_block) '
+            'VALUES (?, ?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET '
+            'first_block = MIN(first_block, excluded.first_block), '
+            'last_block = MAX(last_block, excluded.last_block)',
+            (name, first, last))
+        self.db.commit()
+
+    @_locked
+    def _touch(self, number):
+        self._touched.add(number)
+        if len(self._touched) >= COMMIT_EVERY:
+            self._flush_touched()
+
+    @_locked
+    def _flush_touched(self):
+        if not self._touched:
+            return
+        now = int(time.time())
+        self.db.executemany('UPDATE blocks SET accessed = ? WHERE number = ?',
+                            [(now, number) for number in self._touched])
+        self.db.commit()
+        self._touched.clear()
+
+    @_locked
+    def stats(self):
+        """Return a dictionary describing the store."""
+        blocks, size, raw_size = self.db.execute(
+            'SELECT blocks, bytes, raw_bytes FROM totals').fetchone()
+        first, last, oldest = self.db.execute(
+            'SELECT MIN(number), MAX(number), MIN(accessed) FROM blocks'
+        ).fetchone()
+        receipts = self.db.execute(
+            'SELECT COUNT(*) FROM receipts').fetchone()[0]
+        tx_receipts = self.db.execute(
+            'SELECT COUNT(*) FROM tx_receipts').fetchone()[0]
+        synced = self.db.execute(
+            f'SELECT COUNT(*) FROM blocks WHERE {PINNED}').fetchone()[0]
+        file_size = sum(
+            os.path.getsize(path)
+            for path in [self.path, f'{self.path}-wal']
+            if os.path.exists(path)
+        )
+        return {
+            'path': self.path,
+            'blocks': blocks,
+            'first_block': first,
+            'last_block': last,
+            'missing_blocks': (
+                0 if first is None else last - first + 1 - blocks),
+            'blocks_with_receipts': receipts,
+            'tx_receipts': tx_receipts,
+            'synced_blocks': synced,
+            'stored_bytes': size,
+            'raw_bytes': raw_size,
+            'compression_ratio': (
+                round(raw_size / size, 2) if size else None),
+            'file_bytes': file_size,
+            'max_bytes': int(self.max_size * 2**20),
+            'oldest_access': oldest,
+        }
+
+    @_locked
+    def evict(self, max_size=None):
+        """
+        Delete the least recently used blocks and transaction receipts
+        until they take no more than ``EVICT_TO`` of ``max_size`` MiB (if
+        they take more than ``max_size``). Blocks in pinned ranges are
+        kept, even if that leaves more than ``max_size``. Returns the
+        number of blocks and receipts deleted.
+        """
+        max_bytes = int((self.max_size if max_size is None else max_size)
+                        * 2**20)
+        self._flush_touched()
+        total = self.db.execute('SELECT bytes FROM totals').fetchone()[0]
+        if total <= max_bytes:
+            return 0
+        target = int(max_bytes * EVICT_TO)
+        deleted = 0
+        while total > target:
+            # A block's receipts are deleted with it.
+            rows = self.db.execute(
+                'SELECT accessed, number, NULL, '
+                'blocks.size + IFNULL(receipts.size, 0) '
+                'FROM blocks LEFT JOIN receipts USING (number) '
+                f'WHERE NOT {PINNED} '
+                'UNION ALL SELECT accessed, number, hash, size '
+                'FROM tx_receipts '
+                'ORDER BY 1, 2 LIMIT 1000').fetchall()
+            if not rows:
+                break
+            victims = []
+            tx_victims = []
+            for _, number, tx_hash, size in rows:
+                if total <= target:
+                    break
+                if tx_hash is None:
+                    victims.append(number)
+                else:
+                    tx_victims.append((tx_hash,))
+                total -= size
+            self.delete(victims)
+            self.db.executemany('DELETE FROM tx_receipts WHERE hash = ?',
+                                tx_victims)
+            self.db.commit()
+            deleted += len(victims) + len(tx_victims)
+        self.db.execute('PRAGMA incremental_vacuum')
+        if total > max_bytes:
+            logger.warning(f'[-] synced blocks in {self.path} take more '
+                           f'than {max_bytes / 2**20:g} MiB: raise '
+                           '--block-cache-size to hold them')
+        logger.debug(f'[+] evicted {deleted} blocks and receipts '
+                     f'from {self.path}')
+        return deleted
+
+    @_locked
+    def vacuum(self):
+        """Return space freed by deleted blocks to the file system."""
+        self.db.commit()
+        self.db.execute('VACUUM')
+        self.db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def verify(self, check_hashes=False):
+        """
+        Yield (number, hash, problem) for each block that fails checks.
+
+        Every stored block must decode, match the number and hash it is
+        stored under, and (when the previous block is also stored) have
+        that block's hash as its parent hash. With ``check_hashes``,
+        the hash of each block's header is also recomputed.
+        """
+        previous = None
+        for number, hash_, parent_hash, data in self._rows(
+            'SELECT number, hash, parent_hash, data FROM blocks '
+            'ORDER BY number'
+        ):
+            hex_hash = '0x' + hash_.hex()
+            try:
+                block = decode_block(data)
+            except (zlib.error, ValueError) as err:
+                yield (number, hex_hash, f'cannot decode: {err}')
+                previous = None
+                continue
+            if int(block.get('number', '0x-1'), 16) != number:
+                yield (number, hex_hash, 'number does not match')
+            elif block.get('hash', '').lower() != hex_hash:
+                yield (number, hex_hash, 'hash does not match')
+            elif check_hashes and header_hash(block) != hex_hash:
+                yield (number, hex_hash, 'header hash does not match')
+            elif (
+                previous is not None
+                and previous[0] == number - 1
+                and previous[1] != parent_hash
+            ):
+                yield (number, hex_hash, 'parent hash does not match '
+                       f'block {number - 1}')
+            previous = (number, hash_)
+
+
+class BlockFetcher(object):
+    """
+    Get blocks from a ``BlockStore`` or, failing that, the endpoint.
+
+    Blocks fetched from the endpoint are added to the store if they are
+    at least ``finality_depth`` blocks older than the chain head. The
+    head is asked for (at most every ``HEAD_REFRESH`` seconds) in the
+    same stream of requests as the blocks, so it costs nothing extra
+    when every block is already stored. ``imap()`` has the same
+    streaming behavior as ``AsyncEngine.imap()``. With no ``store``,
+    every block comes from the endpoint.
+    """
+
+    def __init__(self, engine, store,
+                 finality_depth=FINALITY_DEPTH, batch_size=1):
+        self.engine = engine
+        self.store = store
+        self.finality_depth = finality_depth
+        self.batch_size = batch_size
+        self.head = None
+
+    def imap(self, block_ids, window=None):
+        """
+        Yield the raw block (or ``None``) for each block id, in order.
+
+        Block ids are numbers, hashes, or tags like "latest" (which are
+        never read from the store). Stored blocks are read back in runs
+        of consecutive numbers, so reading a long stored range costs one
+        query per run rather than one per block.
+        """
+        # Entries are ['run', first, last] for stored consecutive
+        # numbers, ['stored', block_id] for a block stored by hash,
+        # ['fetch', block_id] for blocks requested from the endpoint, and
+        # ['head'] for requests for the chain head.
+        slots = deque()
+
+        def requests():
+            head_requested = None
+            for block_id in block_ids:
+                block_id = str(block_id)
+                if not self._add_slot(slots, block_id):
+                    continue
+                if self.store is not None and (
+                    head_requested is None
+                    or time.monotonic() - head_requested > HEAD_REFRESH
+                ):
+                    head_requested = time.monotonic()
+                    slots.insert(len(slots) - 1, ['head'])
+                    yield ('eth_blockNumber', [])
+                yield block_request(block_id)
+
+        calls = self.engine.imap(requests(), batch_size=self.batch_size,
+                                 window=window)
+        for call in calls:
+            while slots[0][0] not in ['fetch', 'head']:
+                yield from self._read_slot(slots.popleft())
+            if slots.popleft()[0] == 'head':
+                self.head = int(call.result(), 16)
+                continue
+            block = call.result()
+            if (
+                self.store is not None
+                and block is not None
+                and int(block['number'], 16) <= (
+                    self.head - self.finality_depth)
+            ):
+                self.store.put(block)
+            yield block
+        while slots:
+            yield from self._read_slot(slots.popleft())
+
+    def _add_slot(self, slots, block_id):
+        """Add a slot for a block, returning ``True`` if it is a fetch."""
+        stored = self.store is not None and self.store.contains(block_id)
+        if stored and block_id.isdigit():
+            number = int(block_id)
+            if slots and slots[-1][0] == 'run' and slots[-1][2] == number - 1:
+                slots[-1][2] = number
+            else:
+                slots.append(['run', number, number])
+        elif stored:
+            slots.append(['stored', block_id])
+        else:
+            slots.append(['fetch', block_id])
+        return not stored
+
+    def _read_slot(self, slot):
+        # The requests for the blocks around a stored block have already
+        # been sent, so if it has been removed (e.g., evicted by another
+        # process) since it was found, it's too late to request it.
+        missing = slot[1]
+        if slot[0] == 'stored':
+            block = self.store.get(slot[1])
+            if block is not None:
+                yield block
+                return
+        else:
+            for number, block in self.store.iter_range(slot[1], slot[2]):
+                if number != missing:
+                    break
+                yield block
+                missing += 1
+            if missing > slot[2]:
+                return
+        raise BlockStoreError(f"[-] block '{missing}' was removed from the "
+                              "block store while being read: try again")
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test block header ``logsBloom`` filters for addresses and topics.
+
+Every block header has a 2048 bit bloom filter of the addresses and
+topics of the logs in the block. Each value sets three bits, taken from
+its Keccak-256 hash, so a block whose bloom is missing any of a value's
+bits certainly has no log with it, and only blocks that pass need their
+receipts fetched (a few will still turn out to have no matching log).
+``BloomQuery`` tests a whole array of blooms (e.g., the ``logsBloom``
+column made by ``ColumnBuilder``) at once with NumPy.
+"""
+
+
+BLOOM_BYTES = 256
+
+
+def bloom_bits(value):
+    """
+    Return the (byte index, bit mask) pairs a value sets in a bloom.
+
+    ``value`` is the raw bytes of an address or topic. Each of the first
+    three pairs of bytes of its hash gives a bit number (0 to 2047),
+    counted from the low end of the big-endian bloom.
+    """
+    from eth_utils import keccak
+    digest = keccak(value)
+    bits = []
+    for i in range(0, 6, 2):
+        bit = ((digest[i] << 8) | digest[i + 1]) & 2047
+        bits.append((BLOOM_BYTES - 1 - bit // 8, 1 << (bit % 8)))
+    return bits
+
+
+def _to_bytes(value, size, kind):
+    value = value.lower()
+    if (
+        not value.startswith('0x')
+        or len(value) != 2 + 2 * size
+        or not all(c in '0123456789abcdef' for c in value[2:])
+    ):
+        raise ValueError(f"[-] '{value}' is not {kind}")
+    return bytes.fromhex(value[2:])
+
+
+class BloomQuery(object):
+    """
+    Match logs (and blooms that may have them) from any of
+    ``addresses`` with any of ``topics``.
+
+    Addresses and topics are hex strings. Leaving either out matches
+    any address (or topic).
+    """
+
+    def __init__(self, addresses=None, topics=None):
+        self.addresses = [a.lower() for a in addresses or []]
+        self.topics = [t.lower() for t in topics or []]
+        self.groups = [
+            [
+                bloom_bits(_to_bytes(address, 20, 'an address'))
+                for address in self.addresses
+            ],
+            [
+                bloom_bits(_to_bytes(topic, 32, 'a topic'))
+                for topic in self.topics
+            ],
+        ]
+
+    def matches(self, blooms):
+        """
+        Return a boolean array of which blooms may have a matching log.
+
+        ``blooms`` is a NumPy array of 256 byte blooms, either as an
+        ``S256`` array or as rows of ``uint8``.
+        """
+        import numpy as np
+
+        if blooms.dtype.kind == 'S':
+            blooms = np.frombuffer(blooms.tobytes(), dtype=np.uint8)
+        blooms = blooms.reshape(-1, BLOOM_BYTES)
+        result = np.ones(len(blooms), dtype=bool)
+        for group in self.groups:
+            if not group:
+                continue
+            found = np.zeros(len(blooms), dtype=bool)
+            for bits in group:
+                columns, masks = zip(*bits)
+                found |= (
+                    blooms[:, list(columns)] & np.array(masks, dtype=np.uint8)
+                ).all(axis=1)
+            result &= found
+        return result
+
+    def match_log(self, log):
+        """Return ``True`` if a (raw JSON-RPC) log matches."""
+        if self.addresses and log['address'].lower() not in self.addresses:
+            return False
+        if self.topics and not any(
+            topic.lower() in self.topics for topic in log['topics']
+        ):
+            return False
+        return True
+
+
+class LogScan(object):
+    """
+    Find the logs matching a ``BloomQuery`` in blocks, counting how many
+    blocks' receipts the blooms saved fetching, how many of those
+    fetched had no matching log after all (false positives), and how
+    many receipts weren't available to check.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.scanned = 0
+        self.candidates = 0
+        self.matched = 0
+        self.unavailable = 0
+
+    def select(self, numbers, blooms):
+        """Return the block ``numbers`` whose ``blooms`` may match."""
+        found = numbers[self.query.matches(blooms)]
+        self.scanned += len(numbers)
+        self.candidates += len(found)
+        return found
+
+    def logs(self, receipts):
+        """
+        Return the matching logs in a block's (raw) receipts, skipping
+        (and counting) those that are ``None`` because the endpoint
+        didn't have them (e.g., just after the block was mined).
+        """
+        self.unavailable += sum(1 for receipt in receipts if receipt is None)
+        logs = [
+            log
+            for receipt in receipts
+            if receipt is not None
+            for log in receipt['logs']
+            if self.query.match_log(log)
+        ]
+        if logs:
+            self.matched += 1
+        return logs
+
+    @property
+    def saved(self):
+        """Blocks whose receipts didn't need to be fetched."""
+        return self.scanned - self.candidates
+
+    @property
+    def false_positives(self):
+        """Blocks whose bloom matched but that had no matching log."""
+        return self.candidates - self.matched
+
+    @property
+    def false_positive_rate(self):
+        """Fraction of the blocks fetched that had no matching log."""
+        return (
+            self.false_positives / self.candidates if self.candidates
+            else 0.0
+        )
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+"""
+Typed columnar export of block headers.
+
+Values are parsed straight from the JSON-RPC block objects into
+preallocated NumPy arrays, one per column, instead of being built up as
+a dictionary (or ``web3`` ``AttributeDict``) per block. The arrays are
+then written as a bundle of ``.npy`` files, a ``.npz`` archive, or (if
+``pyarrow`` is installed) an Arrow IPC or Parquet file.
+"""
+
+import json
+import os
+
+from ether_py.utils import atomic_write_json
+
+
+EXPORT_FORMATS = ['npy', 'npz', 'arrow', 'parquet']
+# File name suffix for each format (``npy`` bundles are directories).
+EXPORT_SUFFIXES = {
+    'npy': '',
+    'npz': '.npz',
+    'arrow': '.arrow',
+    'parquet': '.parquet',
+}
+# Column name -> (block field, NumPy dtype). Fields a block doesn't
+# have (e.g., ``baseFeePerGas`` before London) are exported as zero.
+HEADER_COLUMNS = {
+    'number': ('number', 'uint64'),
+    'timestamp': ('timestamp', 'uint64'),
+    'gasUsed': ('gasUsed', 'uint64'),
+    'gasLimit': ('gasLimit', 'uint64'),
+    'size': ('size', 'uint64'),
+    'baseFeePerGas': ('baseFeePerGas', 'uint64'),
+    'txCount': ('transactions', 'uint32'),
+    'blobGasUsed': ('blobGasUsed', 'uint64'),
+    'excessBlobGas': ('excessBlobGas', 'uint64'),
+    'hash': ('hash', 'S32'),
+    'parentHash': ('parentHash', 'S32'),
+    'miner': ('miner', 'S20'),
+    'logsBloom': ('logsBloom', 'S256'),
+}
+DEFAULT_COLUMNS = [
+    'number',
+    'timestamp',
+    'gasUsed',
+    'gasLimit',
+    'size',
+    'baseFeePerGas',
+    'txCount',
+]
+
+
+class ColumnBuilder(object):
+    """
+    Fill preallocated arrays with columns of block header values.
+
+    ``length`` is the most blocks that will be added; ``arrays()``
+    returns only the rows that were.
+    """
+
+    def __init__(self, columns=None, length=0):
+        import numpy as np
+
+        columns = list(columns or DEFAULT_COLUMNS)
+        unknown = [c for c in columns if c not in HEADER_COLUMNS]
+        if unknown:
+            raise ValueError(f'[-] unknown column(s): {", ".join(unknown)} '
+                             f'(choose from {", ".join(HEADER_COLUMNS)})')
+        self.columns = columns
+        self.count = 0
+        self._arrays = {
+            column: np.zeros(length, dtype=HEADER_COLUMNS[column][1])
+            for column in columns
+        }
+        # (array, field, parser) for each column, looked up once rather
+        # than for every block.
+        self._fillers = [
+            (self._arrays[column], HEADER_COLUMNS[column][0],
+             self._parser(column))
+            for column in columns
+        ]
+
+    @staticmethod
+    def _parser(column):
+        field, dtype = HEADER_COLUMNS[column]
+        if field == 'transactions':
+            return len
+        if dtype.startswith('S'):
+            return lambda value: bytes.fromhex(value[2:])
+        return lambda value: int(value, 16)
+
+    def add(self, raw_block):
+        """Add a JSON-RPC block object as the next row."""
+        row = self.count
+        for array, field, parse in self._fillers:
+            value = raw_block.get(field)
+            if value is not None:
+                try:
+                    array[row] = parse(value)
+                except OverflowError:
+                    raise ValueError(
+                        f"[-] block {raw_block.get('number')} {field} "
+                        f"({value}) does not fit in {array.dtype}")
+        self.count += 1
+
+    def arrays(self):
+        """Return a dictionary of the filled part of each column."""
+        return {
+            column: array[:self.count]
+            for column, array in self._arrays.items()
+        }
+
+
+def _pyarrow_array(array):
+    import pyarrow as pa
+
+    if array.dtype.kind == 'S':
+        # Converting NumPy bytes drops trailing zero bytes, so hand the
+        # raw buffer to Arrow as fixed size values instead.
+        return pa.FixedSizeBinaryArray.from_buffers(
+            pa.binary(array.dtype.itemsize), len(array),
+            [None, pa.py_buffer(array.tobytes())])
+    return pa.array(array)
+
+
+def _pyarrow_table(arrays, metadata):
+    import pyarrow as pa
+
+    return pa.table(
+        {column: _pyarrow_array(array) for column, array in arrays.items()},
+        metadata={'ether_py': json.dumps(metadata)},
+    )
+
+
+def _numpy_array(column):
+    import numpy as np
+    import pyarrow as pa
+
+    if pa.types.is_fixed_size_binary(column.type):
+        return np.array(column.to_pylist(),
+                        dtype=f'S{column.type.byte_width}')
+    return column.to_numpy()
+
+
+def write_columns(arrays, path, fmt='npy', metadata=None):
+    """
+    Write a dictionary of column arrays to ``path`` in format ``fmt``.
+
+    An ``npy`` bundle is a directory holding one ``<column>.npy`` file
+    for each column and a ``manifest.json`` file with ``metadata`` and
+    the column types. Other formats carry the same metadata in the file
+    itself. Raises ``ModuleNotFoundError`` for the ``arrow`` and
+    ``parquet`` formats if ``pyarrow`` is not installed.
+    """
+    import numpy as np
+
+    metadata = dict(metadata or {})
+    metadata['columns'] = {
+        column: str(array.dtype) for column, array in arrays.items()
+    }
+    if fmt == 'npy':
+        os.makedirs(path, exist_ok=True)
+        for column, array in arrays.items():
+            np.save(os.path.join(path, f'{column}.npy'), array)
+        atomic_write_json(os.path.join(path, 'manifest.json'), metadata,
+                          indent=2)
+    elif fmt == 'npz':
+        np.savez(path, __manifest__=np.array(json.dumps(metadata)), **arrays)
+    elif fmt == 'arrow':
+        import pyarrow as pa
+
+        table = _pyarrow_table(arrays, metadata)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        pq.write_table(_pyarrow_table(arrays, metadata), path)
+    else:
+        raise ValueError(f"[-] unknown export format '{fmt}'")
+    return path
+
+
+def read_columns(path):
+    """Read arrays written by ``write_columns()`` in any format."""
+    import numpy as np
+
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'manifest.json')) as f_in:
+            manifest = json.load(f_in)
+        return {
+            column: np.load(os.path.join(path, f'{column}.npy'))
+            for column in manifest['columns']
+        }
+    if path.endswith('.npz'):
+        with np.load(path) as bundle:
+            return {
+                column: bundle[column]
+                for column in bundle.files
+                if column != '__manifest__'
+            }
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+    else:
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    return {
+        column: _numpy_array(table.column(column))
+        for column in table.column_names
+    }
+
+
+# vim: set ts=4 sw=4 tw=0 et :
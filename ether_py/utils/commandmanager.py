@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""Command manager that caches the ``ether_py`` entry point table."""
+
+import json
+import logging
+import os
+
+from cliff.commandmanager import CommandManager
+from ether_py import ETHERPY_CACHE_DIR
+from ether_py.utils import atomic_write_json
+
+
+COMMAND_CACHE = os.path.join(ETHERPY_CACHE_DIR, 'entry-points.json')
+DISTRIBUTION = 'ether_py'
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_install_signature(distribution=DISTRIBUTION):
+    """
+    Return a value that changes whenever the installed package changes.
+
+    The signature is built from the location of the distribution's
+    metadata directory, its version, and the size and modification time
+    of its ``entry_points.txt`` file. Returns ``None`` if the
+    distribution's metadata cannot be found.
+    """
+    try:
+        from importlib.metadata import (
+            distribution as get_distribution,
+            PackageNotFoundError,
+        )
+    except ModuleNotFoundError:
+        return None
+    try:
+        dist = get_distribution(distribution)
+    except PackageNotFoundError:
+        return None
+    metadata_path = getattr(dist, '_path', None)
+    if metadata_path is None:
+        return None
+    try:
+        stat = os.stat(os.path.join(str(metadata_path), 'entry_points.txt'))
+    except OSError:
+        return None
+    return [str(metadata_path), dist.version, stat.st_mtime_ns, stat.st_size]
+
+
+def read_entry_points(namespace, distribution=DISTRIBUTION):
+    """Return dictionary mapping entry point names to their values."""
+    from importlib.metadata import distribution as get_distribution
+    return {
+        ep.name: ep.value
+        for ep in get_distribution(distribution).entry_points
+        if ep.group == namespace
+    }
+
+
+class CachedCommandManager(CommandManager):
+    """
+    Discovers commands using a cached entry point table.
+
+    cliff's ``CommandManager`` uses ``stevedore`` to scan every installed
+    distribution for entry points and import every command module on
+    each run. This subclass keeps the table of ``name -> module:class``
+    strings for ``namespace`` in a JSON file keyed by the signature of
+    the installed package, and only imports a command module when that
+    command is actually run (or ``help`` needs its description).
+    Anything unexpected falls back to the normal ``CommandManager``
+    behavior.
+    """
+
+    def __init__(self, namespace, cache_file=COMMAND_CACHE, **kwargs):
+        self.cache_file = cache_file
+        super().__init__(namespace=namespace, **kwargs)
+
+    def load_commands(self, namespace):
+        table = self._get_entry_point_table(namespace)
+        if table is None:
+            return super().load_commands(namespace)
+        from importlib.metadata import EntryPoint
+        self.group_list.append(namespace)
+        for name, value in table.items():
+            if self._is_module_ignored(value, self.ignored_modules):
+                continue
+            cmd_name = (
+                name.replace('_', ' ')
+                if self.convert_underscores
+                else name
+            )
+            self.commands[cmd_name] = EntryPoint(
+                name=name, value=value, group=namespace)
+
+    def _get_entry_point_table(self, namespace):
+        """Return cached entry points, refreshing the cache if stale."""
+        signature = get_install_signature()
+        if signature is None:
+            return None
+        try:
+            with open(self.cache_file, 'r') as f_in:
+                cache = json.load(f_in)
+            if (
+                cache.get('signature') == signature
+                and namespace in cache.get('namespaces', {})
+            ):
+                return cache['namespaces'][namespace]
+        except (OSError, ValueError):
+            cache = {}
+        try:
+            table = read_entry_points(namespace)
+        except Exception as err:  # noqa
+            logger.debug(f'[-] could not read entry points: {err}')
+            return None
+        namespaces = (
+            cache.get('namespaces', {})
+            if cache.get('signature') == signature
+            else {}
+        )
+        namespaces[namespace] = table
+        self._save_cache({'signature': signature, 'namespaces': namespaces})
+        return table
+
+    def _save_cache(self, cache):
+        cache_dir = os.path.dirname(self.cache_file)
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            atomic_write_json(self.cache_file, cache)
+        except OSError as err:
+            logger.debug(f'[-] could not cache entry points: {err}')
+
+
+# vim: set ts=4 sw=4 tw=0 et :
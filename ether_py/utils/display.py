@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""Helpers for writing what display commands produce."""
+
+import csv
+import io
+import json
+import os
+
+from ether_py.utils import to_jsonable
+
+
+# Formats that ``RecordWriter`` writes one record at a time.
+STREAM_FORMATS = ['ndjson', 'csv']
+
+
+def discard_output(stream):
+    """
+    Send anything more written to ``stream`` to the null device, once its
+    reader has gone away (e.g., ``| head``), so nothing complains about
+    the broken pipe when it is flushed at exit. Streams without a file
+    descriptor (e.g., output forwarded by the daemon) are left alone.
+    """
+    try:
+        fd = stream.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, fd)
+    os.close(devnull)
+
+
+class RecordWriter(object):
+    """
+    Write records (dictionaries) to a stream one at a time.
+
+    Unlike ``cliff``'s ``Lister`` formatters, which collect every row
+    before writing any, each record is written as soon as it is given,
+    so memory use does not grow with the number of records and a slow
+    reader (e.g., a full pipe) holds up the producer. ``ndjson`` writes
+    one JSON object per line. ``csv`` writes a header of ``columns``
+    and then one row per record, with lists and mappings encoded as
+    JSON. Without ``columns``, the header is the keys of the first
+    record, and a later record with other keys raises ``ValueError``
+    rather than losing them.
+    """
+
+    def __init__(self, stream, fmt='ndjson', columns=None):
+        if fmt not in STREAM_FORMATS:
+            raise ValueError(f"[-] unsupported output format '{fmt}'")
+        self.stream = stream
+        self.fmt = fmt
+        self.columns = columns
+        # Without columns given, records must fit the first one's keys.
+        self.strict = columns is None
+        self.csv_writer = None
+
+    def write(self, record):
+        record = to_jsonable(record)
+        if self.fmt == 'ndjson':
+            self.stream.write(json.dumps(record, separators=(',', ':')))
+            self.stream.write('\n')
+            return
+        if self.csv_writer is None:
+            if self.columns is None:
+                self.columns = list(record.keys())
+            self.csv_writer = csv.writer(self.stream, lineterminator='\n')
+            self.csv_writer.writerow(self.columns)
+        if self.strict:
+            extra = [key for key in record if key not in self.columns]
+            if extra:
+                raise ValueError('[-] record has fields that are not in '
+                                 f"the CSV header: {', '.join(extra)}")
+        self.csv_writer.writerow([
+            self.csv_value(record.get(column)) for column in self.columns
+        ])
+
+    @staticmethod
+    def csv_value(value):
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, separators=(',', ':'))
+        return '' if value is None else value
+
+
+# vim: set ts=4 sw=4 tw=0 et :
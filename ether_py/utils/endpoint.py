@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""Lazily connected Ethereum endpoints with cached static facts."""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from ether_py import ETHERPY_CACHE_DIR
+from ether_py.utils import (
+    atomic_write_json,
+    endpoint_type,
+    env_number,
+)
+
+
+ENDPOINT_CACHE_TTL = env_number('ETHERPY_ENDPOINT_CACHE_TTL', 3600)
+
+
+logger = logging.getLogger(__name__)
+
+
+class EndpointConnectionError(RuntimeError):
+    """Raised when the initial handshake with an endpoint fails."""
+
+
+class EndpointCache(object):
+    """
+    On-disk cache of static facts about an endpoint.
+
+    Facts that do not change between invocations (``clientVersion``,
+    ``chain_id``, and ``api``) are stored in a JSON file named after a
+    hash of the endpoint URL, so the URL (which can include an Infura
+    project ID) is never written to disk. Entries older than ``ttl``
+    seconds are treated as missing.
+    """
+
+    def __init__(self, url, cache_dir=ETHERPY_CACHE_DIR,
+                 ttl=ENDPOINT_CACHE_TTL):
+        self.ttl = ttl
+        self.cache_dir = os.path.join(cache_dir, 'endpoints')
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(self.cache_dir, f"{digest}.json")
+        self._facts = None
+
+    def load(self):
+        """Return cached facts, or ``None`` if missing or expired."""
+        if self._facts is not None:
+            return self._facts
+        if self.ttl <= 0:
+            return None
+        try:
+            with open(self.path, 'r') as f_in:
+                entry = json.load(f_in)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('timestamp', 0) > self.ttl:
+            return None
+        self._facts = entry.get('facts')
+        return self._facts
+
+    def save(self, facts):
+        """Atomically write facts to the cache file."""
+        self._facts = facts
+        if self.ttl <= 0:
+            return
+        entry = {'timestamp': time.time(), 'facts': facts}
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            atomic_write_json(self.path, entry)
+        except OSError as err:
+            logger.debug(f"[-] could not cache endpoint facts: {err}")
+
+    def clear(self):
+        """Remove the cache file."""
+        self._facts = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Endpoint(object):
+    """
+    Ethereum network endpoint that connects on first use.
+
+    Creating an ``Endpoint`` is cheap: no ``Web3`` object exists and no
+    RPC calls are made until the ``w3`` attribute is first accessed.
+    When fresh cached facts exist the handshake is skipped entirely and
+    any connection problem surfaces on the command's first real RPC.
+    """
+
+    def __init__(self, name, url, cache_dir=ETHERPY_CACHE_DIR,
+                 ttl=ENDPOINT_CACHE_TTL, transport=None, members=None,
+                 routing=None, limits=None, middlewares=None):
+        self.name = name
+        self.url = url
+        self.transport = transport
+        self.limits = limits
+        # (middleware, name) pairs injected closest to the provider.
+        self.middlewares = middlewares or []
+        # (name, URI) pairs for the endpoints of a pool, if more than one.
+        self.members = members if members and len(members) > 1 else None
+        self.routing = routing or {}
+        self.cache = EndpointCache(url, cache_dir=cache_dir, ttl=ttl)
+        self._w3 = None
+        self._lock = threading.Lock()
+
+    @property
+    def type(self):
+        """Return the endpoint type ('http', 'websocket', 'ipc', or 'pool')."""
+        if self.members is not None:
+            return 'pool'
+        return endpoint_type(self.url)
+
+    @property
+    def connected(self):
+        """Return ``True`` if the ``Web3`` object has been created."""
+        return self._w3 is not None
+
+    @property
+    def w3(self):
+        """Return the ``Web3`` object, connecting on first access."""
+        if self._w3 is None:
+            with self._lock:
+                if self._w3 is None:
+                    self._w3 = self.connect()
+        return self._w3
+
+    @property
+    def facts(self):
+        """Return static facts about the endpoint (may trigger RPCs)."""
+        facts = self.cache.load()
+        if facts is None:
+            facts = self.handshake(self.w3)
+        return facts
+
+    def connect(self):
+        """Create the ``Web3`` object and handshake if facts are stale."""
+        from web3 import Web3
+        if self.members is not None:
+            from ether_py.utils.pool import MultiEndpointProvider
+            provider = MultiEndpointProvider(self.members,
+                                             settings=self.transport,
+                                             limits=self.limits,
+                                             **self.routing)
+        else:
+            from ether_py.utils.transport import get_provider
+            provider = get_provider(self.url, settings=self.transport,
+                                    limits=self.limits)
+        w3 = Web3(provider)
+        for middleware, name in self.middlewares:
+            w3.middleware_onion.inject(middleware, name, layer=0)
+        if self.cache.load() is None:
+            self.handshake(w3)
+        return w3
+
+    def handshake(self, w3):
+        """Query the endpoint for static facts and cache them."""
+        try:
+            client_version = w3.clientVersion
+        except Exception as err:  # noqa
+            raise EndpointConnectionError(
+                f'[+] connection to {self.name} '
+                f'endpoint {self.url} failed') from err
+        facts = {
+            'api': w3.api,
+            'chain_id': w3.eth.chain_id,
+            'clientVersion': client_version,
+        }
+        self.cache.save(facts)
+        return facts
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+"""
+Follow the head of the chain as new blocks arrive.
+
+A head source yields the ids (hashes, or ``'latest'`` when it needs to
+catch up) of new chain heads: ``subscribe_heads()`` gets them from a
+``newHeads`` subscription on a WebSocket endpoint, and ``poll_heads()``
+from an ``eth_newBlockFilter`` block filter (or, for endpoints without
+filters, by asking for the latest block). ``HeadTracker`` turns each
+new head into ``apply`` events for the blocks that joined the chain and
+``revert`` events for those a reorg took off it, keeping the hashes of
+only the most recent ``depth`` blocks, so memory use stays flat however
+long it runs.
+"""
+
+import json
+import logging
+import time
+
+from collections import deque
+from ether_py.utils import env_number
+
+
+# Seconds between polls of a block filter (or the latest block).
+POLL_INTERVAL = env_number('ETHERPY_POLL_INTERVAL', 2.0, float)
+# Longest wait (in seconds) before reconnecting a dropped subscription.
+RECONNECT_MAX_DELAY = 30.0
+
+
+logger = logging.getLogger(__name__)
+
+
+def _hex(block_hash):
+    """Return a block hash (``bytes`` or hex string) as a hex string."""
+    if isinstance(block_hash, str):
+        return block_hash
+    return '0x' + bytes(block_hash).hex()
+
+
+class HeadTracker(object):
+    """
+    Track the hashes of the ``depth`` most recent blocks on the chain.
+
+    ``update()`` is given each new head block and yields events for
+    the change it makes to the chain. Blocks that are missing between
+    the previous head and a new one are fetched (by hash, following
+    parent hashes back from the new head) with ``get_block``, so every
+    block that joins the chain is applied in order.
+    """
+
+    def __init__(self, get_block, depth=64):
+        self.get_block = get_block
+        self.depth = max(1, depth)
+        # (number, hash) of recent blocks, in order and without gaps.
+        self.recent = deque(maxlen=self.depth)
+
+    @property
+    def head(self):
+        """Return (number, hash) of the current head, or ``None``."""
+        return self.recent[-1] if self.recent else None
+
+    def hash_at(self, number):
+        """Return the hash of recent block ``number``, or ``None``."""
+        if not self.recent:
+            return None
+        index = number - self.recent[0][0]
+        if 0 <= index < len(self.recent):
+            return self.recent[index][1]
+        return None
+
+    def update(self, block):
+        """
+        Yield ('revert', {'number', 'hash'}) and ('apply', block)
+        events that take the chain from the current head to ``block``.
+        """
+        if self.recent and block['number'] - self.head[0] > self.depth:
+            # Catch up on a long gap (e.g., after being disconnected)
+            # by number, so no more than ``depth`` blocks are ever
+            # fetched back from a new head.
+            for number in range(self.head[0] + 1,
+                                block['number'] - self.depth + 1):
+                yield from self._update(self.get_block(number))
+        yield from self._update(block)
+
+    def _update(self, block):
+        if self.recent:
+            if block['number'] < self.recent[0][0]:
+                logger.debug(f"[-] ignoring block {block['number']} "
+                             'from before the blocks being tracked')
+                return
+            if self.hash_at(block['number']) == _hex(block['hash']):
+                return
+        # Follow parent hashes back from the new head to a block that
+        # is already on the chain.
+        branch = deque([block])
+        while self.recent:
+            parent_number = branch[0]['number'] - 1
+            if parent_number < self.recent[0][0]:
+                logger.warning('[-] chain reorganization deeper than '
+                               f'{self.depth} blocks')
+                break
+            parent_hash = _hex(branch[0]['parentHash'])
+            if self.hash_at(parent_number) == parent_hash:
+                break
+            branch.appendleft(self.get_block(parent_hash))
+        while self.recent and self.head[0] >= branch[0]['number']:
+            number, block_hash = self.recent.pop()
+            yield ('revert', {'number': number, 'hash': block_hash})
+        for new_block in branch:
+            self.recent.append((new_block['number'],
+                                _hex(new_block['hash'])))
+            yield ('apply', new_block)
+
+
+def poll_heads(w3, interval=POLL_INTERVAL):
+    """
+    Yield the ids of new chain heads, polling a block filter.
+
+    ``'latest'`` is yielded first, and again whenever the filter has to
+    be made anew (e.g., the node forgot it), so that blocks added in the
+    meantime are caught up on. Endpoints without block filters are
+    polled for the latest block instead.
+    """
+    block_filter = None
+    use_filter = True
+    while True:
+        if use_filter and block_filter is None:
+            try:
+                block_filter = w3.eth.filter('latest')
+            except ValueError as err:
+                logger.debug(f'[-] cannot make a block filter ({err}): '
+                             'polling the latest block instead')
+                use_filter = False
+            yield 'latest'
+        elif not use_filter:
+            yield 'latest'
+        else:
+            try:
+                yield from map(_hex, block_filter.get_new_entries())
+            except ValueError as err:
+                logger.info(f'[-] lost block filter ({err})')
+                block_filter = None
+                continue
+        time.sleep(interval)
+
+
+def subscribe_heads(url, max_delay=RECONNECT_MAX_DELAY):
+    """
+    Yield the hashes of new chain heads from a ``newHeads`` subscription
+    on the WebSocket endpoint at ``url``.
+
+    ``'latest'`` is yielded first, and again after reconnecting when the
+    connection is lost. Raises ``ValueError`` if the endpoint refuses the
+    subscription, or can't be reached at all before anything has been
+    yielded (so the caller can poll for heads instead).
+    """
+    import asyncio
+    import websockets
+
+    loop = asyncio.new_event_loop()
+    delay = 1.0
+    subscribed = False
+    try:
+        while True:
+            try:
+                websocket = loop.run_until_complete(
+                    _subscribe(websockets, url))
+            except (OSError, websockets.exceptions.WebSocketException,
+                    asyncio.TimeoutError) as err:
+                if not subscribed:
+                    raise ValueError(f'cannot connect ({err})') from err
+                logger.info(f'[-] cannot subscribe to new heads ({err}): '
+                            f'retrying in {delay:.0f}s')
+                time.sleep(delay)
+                delay = min(delay * 2, max_delay)
+                continue
+            delay = 1.0
+            subscribed = True
+            yield 'latest'
+            try:
+                while True:
+                    message = json.loads(
+                        loop.run_until_complete(websocket.recv()))
+                    if message.get('method') == 'eth_subscription':
+                        yield message['params']['result']['hash']
+            except (OSError, websockets.exceptions.WebSocketException,
+                    asyncio.TimeoutError) as err:
+                logger.info(f'[-] lost new heads subscription ({err})')
+            finally:
+                loop.run_until_complete(websocket.close())
+    finally:
+        loop.close()
+
+
+async def _subscribe(websockets, url):
+    websocket = await websockets.connect(url, max_size=None)
+    await websocket.send(json.dumps({
+        'jsonrpc': '2.0',
+        'id': 1,
+        'method': 'eth_subscribe',
+        'params': ['newHeads'],
+    }))
+    response = json.loads(await websocket.recv())
+    if 'error' in response:
+        await websocket.close()
+        raise ValueError(response['error'])
+    return websocket
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per JSON-RPC method call counts, latency, errors, and sizes.
+
+Recording is off until ``start_metrics()`` is called. Calls made through
+``Web3`` are recorded by ``metrics_middleware``; calls sent in batches
+(``RPCBatch``) or concurrently (``AsyncEngine``) bypass ``web3``'s
+middleware and are recorded by those classes with ``observe_calls()``.
+"""
+
+import json
+import random
+import threading
+import time
+
+from ether_py.utils import atomic_write
+
+# Upper bounds (in seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# Latency samples kept per method for percentiles in the summary.
+RESERVOIR_SIZE = 1024
+
+
+_metrics = None
+
+
+def _size(obj):
+    """Return the size in bytes of an object encoded as JSON."""
+    try:
+        return len(json.dumps(obj, separators=(',', ':')))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _escape(value):
+    """Escape a Prometheus label value."""
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+class MethodStats(object):
+    """Statistics for one JSON-RPC method."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.samples = []
+
+    def observe(self, seconds, error=False, sent=0, received=0):
+        self.calls += 1
+        self.errors += 1 if error else 0
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.bytes_sent += sent
+        self.bytes_received += received
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        # Reservoir sampling keeps a uniform sample of all latencies.
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(seconds)
+        else:
+            slot = random.randrange(self.calls)  # nosec
+            if slot < RESERVOIR_SIZE:
+                self.samples[slot] = seconds
+
+    def percentile(self, fraction):
+        """Return the latency below which ``fraction`` of calls fall."""
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class Metrics(object):
+    """Thread safe collection of ``MethodStats`` by method name."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.methods = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method, seconds, error=False, sent=0, received=0):
+        """Record one call."""
+        with self._lock:
+            stats = self.methods.get(method)
+            if stats is None:
+                stats = self.methods[method] = MethodStats()
+            stats.observe(seconds, error=error, sent=sent,
+                          received=received)
+
+    def observe_calls(self, requests, responses, seconds):
+        """
+        Record (method, params) ``requests`` sent together.
+
+        Each call is recorded as taking the ``seconds`` its caller waited.
+        ``responses`` (in the same order) may be ``None`` if the request
+        failed, in which case every call counts as an error.
+        """
+        if responses is None:
+            responses = [None] * len(requests)
+        for (method, params), response in zip(requests, responses):
+            self.observe(
+                method,
+                seconds,
+                error=response is None or 'error' in response,
+                sent=_size({'jsonrpc': '2.0', 'method': method,
+                            'params': params, 'id': 0}),
+                received=0 if response is None else _size(response),
+            )
+
+    def rows(self):
+        """Return summary rows, slowest total time first."""
+        with self._lock:
+            items = sorted(self.methods.items(),
+                           key=lambda item: item[1].seconds,
+                           reverse=True)
+            return [
+                (
+                    method,
+                    stats.calls,
+                    stats.errors,
+                    round(1000 * stats.seconds / stats.calls, 2),
+                    round(1000 * stats.percentile(0.5), 2),
+                    round(1000 * stats.percentile(0.95), 2),
+                    round(1000 * stats.max_seconds, 2),
+                    stats.bytes_sent,
+                    stats.bytes_received,
+                )
+                for method, stats in items
+            ]
+
+    def summary(self):
+        """Return the summary as a text table."""
+        from prettytable import PrettyTable
+        table = PrettyTable()
+        table.field_names = [
+            'method', 'calls', 'errors', 'mean ms', 'p50 ms', 'p95 ms',
+            'max ms', 'bytes sent', 'bytes received',
+        ]
+        table.align = 'r'
+        table.align['method'] = 'l'
+        for row in self.rows():
+            table.add_row(row)
+        return table.get_string()
+
+    def prometheus(self, labels=None):
+        """Return the metrics in Prometheus text exposition format."""
+        base = ''.join(
+            f',{name}="{_escape(value)}"'
+            for name, value in (labels or {}).items()
+        )
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f'# HELP etherpy_{name} {help_text}')
+            lines.append(f'# TYPE etherpy_{name} {kind}')
+
+        with self._lock:
+            methods = sorted(self.methods.items())
+        metric('last_run_timestamp_seconds', 'gauge',
+               'When the last run started.')
+        run_labels = f'{{{base[1:]}}}' if base else ''
+        lines.append(f'etherpy_last_run_timestamp_seconds{run_labels} '
+                     f'{self.started:.3f}')
+        for name, attr, help_text in [
+            ('rpc_calls', 'calls', 'JSON-RPC calls in the last run.'),
+            ('rpc_errors', 'errors',
+             'JSON-RPC calls that failed in the last run.'),
+            ('rpc_sent_bytes', 'bytes_sent',
+             'JSON-RPC request bytes in the last run.'),
+            ('rpc_received_bytes', 'bytes_received',
+             'JSON-RPC response bytes in the last run.'),
+        ]:
+            metric(f'last_run_{name}', 'gauge', help_text)
+            for method, stats in methods:
+                lines.append(
+                    f'etherpy_last_run_{name}{{method="{method}"{base}}} '
+                    f'{getattr(stats, attr)}')
+        metric('last_run_rpc_duration_seconds', 'histogram',
+               'JSON-RPC call latency in the last run.')
+        for method, stats in methods:
+            labels = f'method="{method}"{base}'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(
+                    'etherpy_last_run_rpc_duration_seconds_bucket'
+                    f'{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(
+                'etherpy_last_run_rpc_duration_seconds_bucket'
+                f'{{{labels},le="+Inf"}} {stats.calls}')
+            lines.append(
+                'etherpy_last_run_rpc_duration_seconds_sum'
+                f'{{{labels}}} {stats.seconds:.6f}')
+            lines.append(
+                'etherpy_last_run_rpc_duration_seconds_count'
+                f'{{{labels}}} {stats.calls}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path, labels=None):
+        """
+        Write Prometheus metrics for node_exporter's textfile collector.
+
+        The file is replaced atomically, so the collector never reads a
+        partly written file.
+        """
+        atomic_write(path, self.prometheus(labels=labels), mode=0o644)
+
+
+def start_metrics():
+    """Start recording into a new ``Metrics`` object and return it."""
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+
+def stop_metrics():
+    """Stop recording."""
+    global _metrics
+    _metrics = None
+
+
+def get_metrics():
+    """Return the ``Metrics`` being recorded into, or ``None``."""
+    return _metrics
+
+
+def metrics_middleware(make_request, w3):
+    """
+    ``web3`` middleware that records each request in the active metrics.
+
+    Inject it at layer 0 (closest to the provider), so it sees the raw
+    JSON-RPC responses.
+    """
+    def middleware(method, params):
+        metrics = _metrics
+        if metrics is None:
+            return make_request(method, params)
+        start = time.perf_counter()
+        response = None
+        try:
+            response = make_request(method, params)
+            return response
+        finally:
+            metrics.observe_calls([(method, params)],
+                                  None if response is None else [response],
+                                  time.perf_counter() - start)
+    return middleware
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+"""Route requests across several endpoints with health checks."""
+
+import logging
+import os
+import threading
+import time
+
+from web3.providers import BaseProvider
+
+from ether_py.utils import (
+    env_number,
+    ordered_map,
+    to_int,
+)
+from ether_py.utils.rpcbatch import BatchNotSupported
+
+
+ENDPOINT_COOLDOWN = env_number('ETHERPY_ENDPOINT_COOLDOWN', 30, float)
+ENDPOINT_HEALTH_INTERVAL = env_number(
+    'ETHERPY_ENDPOINT_HEALTH_INTERVAL', 30, float)
+ENDPOINT_MAX_BLOCK_LAG = env_number('ETHERPY_ENDPOINT_MAX_BLOCK_LAG', 3)
+ENDPOINT_ROUTING = os.getenv('ETHERPY_ENDPOINT_ROUTING', 'fastest')
+PRIMARY_ENDPOINT = os.getenv('ETHERPY_PRIMARY_ENDPOINT', None)
+ROUTING_STRATEGIES = ['fastest', 'sticky']
+# Weight given to the newest latency sample in the rolling average.
+LATENCY_ALPHA = 0.3
+# Methods that change state, or that depend on state held by one node
+# (its accounts, filters, and transaction pool), always go to the
+# primary endpoint and are never retried on another one. Nonces come
+# from the primary too, so a transaction is never signed with a nonce
+# from an endpoint that is behind the one it is sent to.
+PRIMARY_METHODS = [
+    'eth_accounts',
+    'eth_coinbase',
+    'eth_getFilterChanges',
+    'eth_getFilterLogs',
+    'eth_getTransactionCount',
+    'eth_newBlockFilter',
+    'eth_newFilter',
+    'eth_newPendingTransactionFilter',
+    'eth_sendRawTransaction',
+    'eth_sendTransaction',
+    'eth_sign',
+    'eth_signTransaction',
+    'eth_signTypedData',
+    'eth_uninstallFilter',
+]
+PRIMARY_METHOD_PREFIXES = ('personal_', 'miner_')
+# Methods whose ``null`` result may only mean that the endpoint has not
+# seen the block or transaction yet, so another endpoint that is further
+# ahead is asked as well.
+NULL_RETRY_METHODS = [
+    'eth_getBlockByHash',
+    'eth_getBlockByNumber',
+    'eth_getTransactionByHash',
+    'eth_getTransactionReceipt',
+]
+# JSON-RPC error codes that mean "try somewhere else" (e.g., Infura's
+# "limit exceeded").
+FAILOVER_ERROR_CODES = [-32005]
+# Settings that can come from CLI options, psec secrets, or defaults.
+# Maps setting name to (option name, secret name, type, default).
+ROUTING_SETTINGS = {
+    'max_block_lag': ('max_block_lag', 'endpoint_max_block_lag', int,
+                      ENDPOINT_MAX_BLOCK_LAG),
+    'primary': ('primary_endpoint', 'ethereum_primary_endpoint', str,
+                PRIMARY_ENDPOINT),
+    'strategy': ('endpoint_routing', 'endpoint_routing', str,
+                 ENDPOINT_ROUTING),
+}
+
+
+logger = logging.getLogger(__name__)
+
+
+class NoHealthyEndpoint(RuntimeError):
+    """Raised when every endpoint in a pool has failed."""
+
+
+def get_routing_settings(options=None, get_secret=None):
+    """
+    Return a dictionary of endpoint pool routing settings.
+
+    Settings come from command line options, psec secrets, or defaults,
+    in that order (see ``get_transport_settings()``).
+    """
+    settings = {}
+    for setting, (option, secret, cast, default) in ROUTING_SETTINGS.items():
+        value = getattr(options, option, None)
+        if value is None and get_secret is not None:
+            value = get_secret(secret)
+        if value is None or value == '':
+            value = default
+        settings[setting] = None if value is None else cast(value)
+    if settings['strategy'] not in ROUTING_STRATEGIES:
+        raise ValueError(
+            f"[-] endpoint routing must be one of {ROUTING_STRATEGIES}")
+    return settings
+
+
+def is_primary_method(method, params):
+    """Return ``True`` if a request must go to the primary endpoint."""
+    return (
+        method in PRIMARY_METHODS
+        or method.startswith(PRIMARY_METHOD_PREFIXES)
+        or 'pending' in (params or [])
+    )
+
+
+class PoolMember(object):
+    """One endpoint in a pool, with its rolling health measurements."""
+
+    def __init__(self, name, uri, settings=None, limits=None):
+        self.name = name
+        self.uri = uri
+        self.settings = settings
+        self.limits = limits
+        self.latency = None
+        self.block_number = None
+        self.down_until = 0.0
+        self.lagging = False
+        self._provider = None
+
+    def __repr__(self):
+        return f'<PoolMember {self.name} {self.uri}>'
+
+    @property
+    def provider(self):
+        if self._provider is None:
+            from ether_py.utils.transport import get_provider
+            self._provider = get_provider(self.uri, settings=self.settings,
+                                          limits=self.limits)
+        return self._provider
+
+    @property
+    def healthy(self):
+        return not self.lagging and time.time() >= self.down_until
+
+    def record_latency(self, seconds):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += LATENCY_ALPHA * (seconds - self.latency)
+
+    def record_failure(self, cooldown=ENDPOINT_COOLDOWN):
+        self.down_until = time.time() + cooldown
+
+
+class MultiEndpointProvider(BaseProvider):
+    """
+    ``web3`` provider that spreads requests across several endpoints.
+
+    Reads go to the healthy endpoint with the lowest rolling average
+    latency (``strategy='fastest'``), or keep going to the same one
+    until it fails (``strategy='sticky'``), so consecutive reads see a
+    consistent view of the chain. A request that fails, or that gets a
+    ``null`` result from an endpoint that is behind another one, is
+    retried on the next endpoint. Endpoints that fail are skipped for
+    ``ENDPOINT_COOLDOWN`` seconds. Endpoints more than ``max_block_lag``
+    blocks behind the highest one are skipped until they catch up.
+
+    Writes, and requests that depend on one node's state (see
+    ``PRIMARY_METHODS``), always go to the ``primary`` endpoint (the
+    first one, by default) and are never retried elsewhere.
+    """
+
+    def __init__(self, members, settings=None, strategy=ENDPOINT_ROUTING,
+                 max_block_lag=ENDPOINT_MAX_BLOCK_LAG, primary=None,
+                 health_interval=ENDPOINT_HEALTH_INTERVAL, limits=None):
+        self.members = [
+            PoolMember(name, uri, settings=settings, limits=limits)
+            for name, uri in members
+        ]
+        self.primary = self.members[0]
+        for member in self.members:
+            if primary in [member.name, member.uri]:
+                self.primary = member
+        self.strategy = strategy
+        self.max_block_lag = max_block_lag
+        self.health_interval = health_interval
+        self.checked = 0.0
+        self.sticky = None
+        self._lock = threading.Lock()
+        super().__init__()
+
+    def __str__(self):
+        return f"pool of {', '.join(m.name for m in self.members)}"
+
+    def isConnected(self):
+        return any(
+            member.provider.isConnected() for member in self.members
+        )
+
+    def check_health(self):
+        """Measure every endpoint's latency and block height."""
+        def probe(member):
+            start = time.perf_counter()
+            try:
+                response = member.provider.make_request('eth_blockNumber', [])
+                block_number = to_int(response['result'])
+            except Exception as err:  # noqa
+                logger.debug(f'[-] {member.name} failed health check: {err}')
+                member.record_failure()
+                return
+            member.record_latency(time.perf_counter() - start)
+            member.block_number = block_number
+
+        for _ in ordered_map(probe, self.members, workers=len(self.members)):
+            pass
+        self.update_lag()
+        self.checked = time.time()
+
+    def update_lag(self):
+        heights = [
+            m.block_number for m in self.members if m.block_number is not None
+        ]
+        if not heights:
+            return
+        highest = max(heights)
+        for member in self.members:
+            member.lagging = (
+                member.block_number is not None
+                and highest - member.block_number > self.max_block_lag
+            )
+            if member.lagging:
+                behind = highest - member.block_number
+                logger.debug(f'[-] {member.name} is {behind} blocks behind')
+
+    def candidates(self):
+        """Return the endpoints to try for a read, best first."""
+        if time.time() - self.checked > self.health_interval:
+            with self._lock:
+                if time.time() - self.checked > self.health_interval:
+                    self.check_health()
+        healthy = [m for m in self.members if m.healthy]
+        others = [m for m in self.members if not m.healthy]
+        healthy.sort(key=lambda m: m.latency or 0.0)
+        if self.strategy == 'sticky':
+            if self.sticky is None or not self.sticky.healthy:
+                self.sticky = healthy[0] if healthy else None
+            if self.sticky is not None:
+                healthy.remove(self.sticky)
+                healthy.insert(0, self.sticky)
+        # Unhealthy endpoints are a last resort rather than never tried.
+        return healthy + others
+
+    def make_request(self, method, params):
+        return self.route(
+            [(method, params)],
+            lambda provider: provider.make_request(method, params))
+
+    def make_batch_request(self, requests):
+        """Send (method, params) pairs as one JSON-RPC batch array."""
+        def send(provider):
+            if not hasattr(provider, 'make_batch_request'):
+                raise BatchNotSupported(f'{provider} can not send batches')
+            return provider.make_batch_request(requests)
+
+        return self.route(requests, send)
+
+    def route(self, requests, send):
+        """
+        Return the response from ``send(provider)`` for the best endpoint.
+
+        ``requests`` are the (method, params) pairs being sent, which
+        decide whether the request must go to the primary endpoint and
+        whether its response warrants asking another endpoint.
+        """
+        if any(is_primary_method(m, p) for m, p in requests):
+            return send(self.primary.provider)
+        errors = []
+        fallback = None
+        members = self.candidates()
+        for member in members:
+            start = time.perf_counter()
+            try:
+                response = send(member.provider)
+            except BatchNotSupported:
+                raise
+            except Exception as err:  # noqa
+                logger.debug(f'[-] {member.name} failed: {err}')
+                member.record_failure()
+                errors.append(f'{member.name}: {err}')
+                continue
+            member.record_latency(time.perf_counter() - start)
+            if self.should_fail_over(member, requests, response, members):
+                fallback = fallback or response
+                continue
+            return response
+        if fallback is not None:
+            return fallback
+        raise NoHealthyEndpoint(
+            f"[-] all endpoints failed: {'; '.join(errors)}")
+
+    def should_fail_over(self, member, requests, response, members):
+        """Return ``True`` if another endpoint should be asked as well."""
+        responses = response if isinstance(response, list) else [response]
+        ahead = any(
+            other.block_number is not None
+            and (member.block_number or 0) < other.block_number
+            for other in members
+            if other is not member and other.healthy
+        )
+        for (method, params), result in zip(requests, responses):
+            error = result.get('error')
+            if (
+                isinstance(error, dict)
+                and error.get('code') in FAILOVER_ERROR_CODES
+            ):
+                member.record_failure()
+                return True
+            if method == 'eth_blockNumber' and 'result' in result:
+                member.block_number = to_int(result['result'])
+                self.update_lag()
+            if (
+                method in NULL_RETRY_METHODS
+                and 'result' in result
+                and result['result'] is None
+                and ahead
+            ):
+                # This endpoint may not have seen the block yet.
+                return True
+        return False
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+CPU profiling of whole commands.
+
+``CommandProfiler`` runs ``cProfile`` (deterministic, for ``pstats``
+tools like ``snakeviz`` or ``python -m pstats``) in the thread running
+the command and, at the same time, a ``StackSampler`` that samples the
+Python stacks of every thread (including worker threads and the
+``asyncio`` event loop) and writes them in the collapsed stack format
+used by flame graph tools (``flamegraph.pl``, ``speedscope``, ...).
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+
+from ether_py.utils import env_number
+
+PROFILE = (
+    os.getenv('ETHERPY_PROFILE', 'false').lower() in ['1', 'true', 'yes', 'on']
+)
+PROFILE_INTERVAL = env_number('ETHERPY_PROFILE_INTERVAL', 0.005, float)
+PROFILE_SAMPLE = env_number('ETHERPY_PROFILE_SAMPLE', 100, float)
+
+
+def _frame_label(frame):
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{frame.f_code.co_name}'.replace(';', ':')
+
+
+class StackSampler(object):
+    """
+    Count the stacks of all other threads every ``interval`` seconds.
+
+    Each stack is keyed by the thread's name followed by one
+    ``module:function`` label per frame, outermost first, joined by
+    semicolons.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name='ether-py-sampler',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)).replace(';', ':'))
+                self.counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path):
+        """Write ``stack count`` lines, most frequent first."""
+        with open(path, 'w') as f_out:
+            for stack, count in self.counts.most_common():
+                f_out.write(f'{stack} {count}\n')
+
+
+class CommandProfiler(object):
+    """
+    Context manager that profiles its body.
+
+    Use ``write()`` afterwards to save the results.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.sampler = StackSampler(interval=interval)
+        self.profile = None
+
+    def __enter__(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.profile.disable()
+        self.sampler.stop()
+
+    def write(self, directory, prefix=None):
+        """
+        Write ``<prefix>.pstats`` and ``<prefix>.collapsed`` files.
+
+        The default prefix is ``ether-py-<timestamp>-<pid>``. Returns
+        the paths of the files written.
+        """
+        if prefix is None:
+            prefix = (
+                f"ether-py-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+            )
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, prefix)
+        self.profile.dump_stats(f'{path}.pstats')
+        self.sampler.write_collapsed(f'{path}.collapsed')
+        return [f'{path}.pstats', f'{path}.collapsed']
+
+
+def should_profile(sample=PROFILE_SAMPLE):
+    """Return ``True`` for ``sample`` percent of calls."""
+    import random
+    return sample >= 100 or random.uniform(0, 100) < sample  # nosec
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+
+"""
+Client side request scheduling for rate limited endpoints.
+
+Hosted endpoints like Infura limit requests per second and per day for
+each project. Each endpoint gets a ``RequestScheduler`` that paces
+requests with a token bucket, adapts how many requests are in flight
+at once to the 429 responses and latency it observes, and counts
+requests per project per (UTC) day in a file that persists between
+invocations.
+"""
+
+import atexit
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from urllib.parse import urlparse
+
+from ether_py import ETHERPY_CACHE_DIR
+from ether_py.utils import (
+    atomic_write_json,
+    env_number,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+ADAPTIVE_CONCURRENCY = (
+    os.getenv('ETHERPY_ADAPTIVE_CONCURRENCY', 'true').lower() == 'true'
+)
+DAILY_LIMIT = env_number('ETHERPY_DAILY_LIMIT', 0)
+DAILY_PACE = os.getenv('ETHERPY_DAILY_PACE', 'false').lower() == 'true'
+MAX_CONCURRENCY = env_number('ETHERPY_CONCURRENCY', 16)
+RATE_BURST = env_number('ETHERPY_RATE_BURST', 0)
+RATE_LIMIT = env_number('ETHERPY_RATE_LIMIT', 0, float)
+# Write the daily request count to disk after this many requests (and
+# on exit).
+DAILY_FLUSH_EVERY = 1000
+# Smoothed latency more than this many times the lowest latency seen
+# counts as congestion, just like a 429 response (only less severely).
+LATENCY_FACTOR = 3.0
+# Minimum seconds between decreases of the concurrency limit.
+DECREASE_INTERVAL = 0.1
+# Settings that can come from CLI options, psec secrets, or defaults.
+# Maps setting name to (option name, secret name, type, default).
+RATE_LIMIT_SETTINGS = {
+    'adaptive': (None, 'adaptive_concurrency', bool, ADAPTIVE_CONCURRENCY),
+    'burst': (None, 'rate_burst', int, RATE_BURST),
+    'concurrency': ('concurrency', None, int, MAX_CONCURRENCY),
+    'daily_limit': ('daily_limit', 'daily_request_limit', int, DAILY_LIMIT),
+    'daily_pace': (None, 'daily_pace', bool, DAILY_PACE),
+    'rate': ('rate_limit', 'rate_limit', float, RATE_LIMIT),
+}
+
+
+logger = logging.getLogger(__name__)
+_registry_lock = threading.Lock()
+_schedulers = {}
+_counters = {}
+
+
+class DailyLimitExceeded(RuntimeError):
+    """Raised when a request would exceed the daily request limit."""
+
+
+def get_rate_limit_settings(options=None, get_secret=None):
+    """
+    Return a dictionary of request scheduling settings.
+
+    Settings come from command line options, psec secrets, or defaults,
+    in that order (see ``get_transport_settings()``).
+    """
+    from ether_py.utils.transport import _to_bool
+    settings = {}
+    for setting, (option, secret, cast, default) in (
+        RATE_LIMIT_SETTINGS.items()
+    ):
+        value = getattr(options, option, None) if option else None
+        if value is None and secret and get_secret is not None:
+            value = get_secret(secret)
+        if value is None or value == '':
+            value = default
+        settings[setting] = _to_bool(value) if cast is bool else cast(value)
+    return settings
+
+
+def project_key(uri):
+    """
+    Return the key that requests to ``uri`` are counted under.
+
+    Infura counts requests per project, whichever network they are for,
+    so its endpoints are keyed by project ID. Other endpoints are keyed
+    by URI.
+    """
+    parsed = urlparse(uri)
+    if (parsed.hostname or '').endswith('infura.io'):
+        project_id = parsed.path.rstrip('/').rsplit('/', 1)[-1]
+        return f'infura:{project_id}'
+    return uri
+
+
+def utc_today():
+    return datetime.datetime.utcnow().date().isoformat()
+
+
+def seconds_until_utc_midnight():
+    now = datetime.datetime.utcnow()
+    midnight = datetime.datetime.combine(
+        now.date() + datetime.timedelta(days=1), datetime.time())
+    return (midnight - now).total_seconds()
+
+
+class TokenBucket(object):
+    """
+    Token bucket allowing ``rate`` requests per second on average.
+
+    Up to ``burst`` tokens accumulate while idle. ``reserve()`` takes
+    tokens even if that leaves the bucket in debt and returns how long
+    the caller must wait, so waiting callers are served in order.
+    """
+
+    def __init__(self, rate, burst=0):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost=1, rate=None):
+        """Take ``cost`` tokens and return the seconds to wait for them."""
+        rate = rate or self.rate
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            self.tokens -= cost
+            return 0.0 if self.tokens >= 0 else -self.tokens / rate
+
+
+class AdaptiveConcurrency(object):
+    """
+    Additive increase, multiplicative decrease (AIMD) concurrency limit.
+
+    Each request that completes without a sign of congestion raises the
+    limit by ``1 / limit`` (i.e., by about one per round of requests).
+    A 429 response halves the limit, and smoothed latency above
+    ``LATENCY_FACTOR`` times the (slowly rising) lowest latency seen
+    reduces it by a quarter, at most once per round trip so that one
+    burst of congestion only counts once.
+    """
+
+    def __init__(self, maximum, minimum=1, latency_factor=LATENCY_FACTOR):
+        self.maximum = max(maximum, minimum)
+        self.minimum = minimum
+        self.latency_factor = latency_factor
+        self.limit = float(self.maximum)
+        self.latency = None
+        self.min_latency = None
+        self.decreased = 0.0
+        self.throttles = 0
+
+    @property
+    def allowed(self):
+        """Return the number of requests allowed in flight."""
+        return max(self.minimum, int(self.limit))
+
+    def record(self, latency=None, throttled=False):
+        """Adjust the limit for one completed (or throttled) request."""
+        now = time.monotonic()
+        congested = False
+        if latency is not None and not throttled:
+            if self.min_latency is None or latency < self.min_latency:
+                self.min_latency = latency
+            else:
+                # Let the floor drift up, so a lasting change in the
+                # endpoint's latency becomes the new normal.
+                self.min_latency += 0.01 * (latency - self.min_latency)
+            self.latency = (
+                latency if self.latency is None
+                else self.latency + 0.2 * (latency - self.latency)
+            )
+            congested = (
+                self.latency > self.latency_factor * self.min_latency
+            )
+        if throttled or congested:
+            if now - self.decreased > max(self.latency or 0.0,
+                                          DECREASE_INTERVAL):
+                self.limit = max(self.minimum,
+                                 self.limit * (0.5 if throttled else 0.75))
+                self.decreased = now
+                logger.debug(f'[-] concurrency limit now {self.allowed}')
+            if throttled:
+                self.throttles += 1
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+
+class DailyCounter(object):
+    """
+    Count requests per key per UTC day in a file under the cache directory.
+
+    The file is named after a hash of the key (so a project ID is never
+    written to disk) and is updated every ``DAILY_FLUSH_EVERY`` requests
+    and on exit, adding this process's count to whatever other processes
+    have recorded in the meantime. With a ``limit``, requests that would
+    exceed it raise ``DailyLimitExceeded``.
+    """
+
+    def __init__(self, key, cache_dir=ETHERPY_CACHE_DIR, limit=0,
+                 flush_every=DAILY_FLUSH_EVERY):
+        self.limit = limit
+        self.flush_every = flush_every
+        self.cache_dir = os.path.join(cache_dir, 'requests')
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(self.cache_dir, f'{digest}.json')
+        self.day = utc_today()
+        self.recorded = self._read(self.day)
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        """Return the number of requests made today."""
+        return self.recorded + self.pending
+
+    @property
+    def remaining(self):
+        """Return the requests left today, or ``None`` with no limit."""
+        if not self.limit:
+            return None
+        return max(0, self.limit - self.count)
+
+    def pace_rate(self):
+        """Return the rate that spreads the remaining requests over today."""
+        return max(self.remaining or 0, 1) / seconds_until_utc_midnight()
+
+    def add(self, cost=1):
+        """Count ``cost`` requests."""
+        with self._lock:
+            if utc_today() != self.day:
+                self._flush()
+                self.day, self.recorded = utc_today(), 0
+            if self.limit and self.count + cost > self.limit:
+                raise DailyLimitExceeded(
+                    f'[-] daily request limit of {self.limit} reached')
+            self.pending += cost
+            if self.pending >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        """Write the count to disk."""
+        with self._lock:
+            self._flush()
+
+    def _read(self, day):
+        try:
+            with open(self.path, 'r') as f_in:
+                entry = json.load(f_in)
+        except (OSError, ValueError):
+            return 0
+        return entry.get('count', 0) if entry.get('day') == day else 0
+
+    def _flush(self):
+        if not self.pending:
+            return
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            with open(f'{self.path}.lock', 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self.recorded = self._read(self.day) + self.pending
+                atomic_write_json(self.path,
+                                  {'day': self.day, 'count': self.recorded})
+        except OSError as err:
+            logger.debug(f'[-] could not save request count: {err}')
+            return
+        self.pending = 0
+
+
+class RequestScheduler(object):
+    """
+    Pace and limit the requests made to one endpoint.
+
+    ``acquire()`` (or ``acquire_async()``) waits for tokens and for a
+    free slot under the adaptive concurrency limit, and ``release()``
+    reports the outcome. A batch of calls costs one token per call, as
+    hosted endpoints count them, but takes a single slot.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST,
+                 concurrency=MAX_CONCURRENCY, adaptive=ADAPTIVE_CONCURRENCY,
+                 daily=None, daily_pace=DAILY_PACE):
+        self.rate = rate
+        self.daily = daily
+        self.daily_pace = bool(daily_pace and daily and daily.limit)
+        self.bucket = (
+            TokenBucket(rate or 1.0, burst)
+            if rate > 0 or self.daily_pace else None
+        )
+        self.aimd = AdaptiveConcurrency(concurrency) if adaptive else None
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def _delay(self, cost):
+        if self.daily is not None:
+            self.daily.add(cost)
+        if self.bucket is None:
+            return 0.0
+        rate = self.rate or None
+        if self.daily_pace:
+            pace = self.daily.pace_rate()
+            rate = pace if rate is None else min(rate, pace)
+        return self.bucket.reserve(cost, rate=rate)
+
+    def _try_take_slot(self):
+        if self.aimd is not None and self.in_flight >= self.aimd.allowed:
+            return False
+        self.in_flight += 1
+        return True
+
+    def acquire(self, cost=1):
+        """Wait until a request may be sent; return its start time."""
+        delay = self._delay(cost)
+        if delay:
+            time.sleep(delay)
+        with self._condition:
+            while not self._try_take_slot():
+                self._condition.wait()
+        return time.monotonic()
+
+    async def acquire_async(self, cost=1):
+        """Like ``acquire()``, without blocking the event loop."""
+        import asyncio
+        delay = self._delay(cost)
+        if delay:
+            await asyncio.sleep(delay)
+        wait = 0.001
+        while True:
+            with self._condition:
+                if self._try_take_slot():
+                    return time.monotonic()
+            await asyncio.sleep(wait)
+            wait = min(wait * 2, 0.05)
+
+    def release(self, started, throttled=False):
+        """Free the request's slot and adapt to how it went."""
+        with self._condition:
+            self.in_flight -= 1
+            if self.aimd is not None:
+                self.aimd.record(None if throttled
+                                 else time.monotonic() - started,
+                                 throttled=throttled)
+            self._condition.notify_all()
+
+    def record_throttle(self):
+        """Adapt to a 429 response that is being retried."""
+        with self._condition:
+            if self.aimd is not None:
+                self.aimd.record(throttled=True)
+
+    def call(self, func, *args, cost=1):
+        """Return ``func(*args)``, sent when the schedule allows."""
+        started = self.acquire(cost)
+        throttled = False
+        try:
+            return func(*args)
+        except Exception as err:  # noqa
+            response = getattr(err, 'response', None)
+            throttled = getattr(response, 'status_code', None) == 429
+            raise
+        finally:
+            self.release(started, throttled=throttled)
+
+
+def get_daily_counter(key, limit=0):
+    """
+    Return the shared ``DailyCounter`` for a key, with the latest
+    ``limit`` asked for.
+    """
+    with _registry_lock:
+        if key not in _counters:
+            _counters[key] = DailyCounter(key, limit=limit)
+            atexit.register(_counters[key].flush)
+        _counters[key].limit = limit
+        return _counters[key]
+
+
+def get_scheduler(uri, settings=None):
+    """
+    Return the shared ``RequestScheduler`` for an endpoint URI and
+    settings.
+
+    Every provider and engine for the same endpoint with the same
+    settings shares one scheduler, so the limits hold however the
+    requests are made. Different settings (e.g., from a later command
+    run by the daemon) get a scheduler of their own.
+    """
+    settings = settings or get_rate_limit_settings()
+    key = (uri, tuple(sorted(settings.items())))
+    daily = get_daily_counter(project_key(uri),
+                              limit=settings['daily_limit'])
+    with _registry_lock:
+        scheduler = _schedulers.get(key)
+    if scheduler is None:
+        scheduler = RequestScheduler(
+            rate=settings['rate'],
+            burst=settings['burst'],
+            concurrency=settings['concurrency'],
+            adaptive=settings['adaptive'],
+            daily=daily,
+            daily_pace=settings['daily_pace'],
+        )
+        with _registry_lock:
+            scheduler = _schedulers.setdefault(key, scheduler)
+    return scheduler
+
+
+# vim: set ts=4 sw=4 tw=0 et :
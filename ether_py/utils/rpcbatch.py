@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""Collect independent JSON-RPC calls and send them as batch arrays."""
+
+import json
+import logging
+import time
+
+from ether_py.utils import (
+    chunked,
+    env_number,
+)
+from ether_py.utils.metrics import get_metrics
+from ether_py.utils.trace import span
+
+RPC_BATCH_SIZE = env_number('ETHERPY_RPC_BATCH_SIZE', 100)
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchNotSupported(ValueError):
+    """Raised when an endpoint does not accept JSON-RPC batch arrays."""
+
+
+def encode_batch(requests, counter):
+    """
+    Return (ids, payload) for a JSON-RPC batch of (method, params) pairs.
+
+    Request ids are taken from ``counter`` (a provider's
+    ``request_counter``) and ``payload`` is the encoded batch array.
+    """
+    ids = [next(counter) for _ in requests]
+    payload = [
+        {'jsonrpc': '2.0', 'method': method, 'params': params, 'id': id_}
+        for id_, (method, params) in zip(ids, requests)
+    ]
+    return (ids, json.dumps(payload).encode('utf-8'))
+
+
+def decode_batch(responses, ids):
+    """Return batch response objects in the order of the request ``ids``."""
+    if not isinstance(responses, list):
+        raise BatchNotSupported('endpoint rejected batch request')
+    by_id = {response.get('id'): response for response in responses}
+    missing = {'error': {'code': -32603, 'message': 'no response'}}
+    return [by_id.get(id_, missing) for id_ in ids]
+
+
+class RPCCall(object):
+    """A JSON-RPC call whose result is available after its batch runs."""
+
+    def __init__(self, method, params=None, formatter=None):
+        self.method = method
+        self.params = list(params or [])
+        self.formatter = formatter
+        self.done = False
+        self._result = None
+        self._error = None
+
+    def set_response(self, response):
+        """Record the JSON-RPC response object for this call."""
+        self.done = True
+        if 'error' in response:
+            self._error = response['error']
+        else:
+            self._result = response.get('result')
+
+    def result(self):
+        """
+        Return the (formatted) result of the call.
+
+        Raises ``ValueError`` with the JSON-RPC error, as ``web3`` does,
+        if the endpoint returned an error for this call.
+        """
+        if not self.done:
+            raise RuntimeError(f'[-] {self.method} has not been executed')
+        if self._error is not None:
+            raise ValueError(self._error)
+        if self.formatter is None or self._result is None:
+            return self._result
+        return self.formatter(self._result)
+
+
+class RPCBatch(object):
+    """
+    Send independent JSON-RPC calls as batches of up to ``batch_size``.
+
+    Calls are queued with ``add()``, which returns an ``RPCCall`` whose
+    ``result()`` can be read once the batch has been executed (which
+    happens automatically when used as a context manager)::
+
+        with RPCBatch(w3) as batch:
+            balances = [
+                batch.add('eth_getBalance', [address, 'latest'], to_int)
+                for address in addresses
+            ]
+        print([balance.result() for balance in balances])
+
+    Responses are matched to calls by their JSON-RPC ``id``, so the order
+    in which the endpoint answers does not matter. Providers that can't
+    send batch arrays, endpoints that reject them, and a ``batch_size``
+    of 1 or less all fall back to making the calls one at a time.
+    """
+
+    def __init__(self, w3, batch_size=RPC_BATCH_SIZE):
+        self.w3 = w3
+        self.batch_size = batch_size
+        self.calls = []
+
+    def __len__(self):
+        return len(self.calls)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+    def add(self, method, params=None, formatter=None):
+        """Queue a call and return its ``RPCCall``."""
+        call = RPCCall(method, params=params, formatter=formatter)
+        self.calls.append(call)
+        return call
+
+    def execute(self):
+        """Send all queued calls."""
+        calls, self.calls = self.calls, []
+        provider = self.w3.provider
+        if (
+            self.batch_size <= 1
+            or not hasattr(provider, 'make_batch_request')
+        ):
+            self.execute_sequentially(calls)
+            return
+        metrics = get_metrics()
+        for start in range(0, len(calls), self.batch_size):
+            chunk = calls[start:start + self.batch_size]
+            requests = [(call.method, call.params) for call in chunk]
+            started = time.perf_counter()
+            try:
+                with span('batch', category='rpc', calls=len(requests)):
+                    responses = provider.make_batch_request(requests)
+            except BatchNotSupported as err:
+                logger.debug(f'[-] {err}: making calls one at a time')
+                self.execute_sequentially(chunk)
+                continue
+            except Exception:  # noqa
+                if metrics is not None:
+                    metrics.observe_calls(requests, None,
+                                          time.perf_counter() - started)
+                raise
+            if metrics is not None:
+                metrics.observe_calls(requests, responses,
+                                      time.perf_counter() - started)
+            for call, response in zip(chunk, responses):
+                call.set_response(response)
+
+    def execute_sequentially(self, calls):
+        """Make calls one at a time through the ``web3`` request manager."""
+        for call in calls:
+            try:
+                result = self.w3.manager.request_blocking(call.method,
+                                                          call.params)
+            except ValueError as err:
+                call.set_response({'error': err.args[0] if err.args else err})
+            else:
+                call.set_response({'result': result})
+
+
+class SerialEngine(object):
+    """
+    Make calls one request at a time through a ``Web3`` provider.
+
+    This has the same ``imap()`` interface as ``AsyncEngine``, for
+    endpoints that it can't reach (i.e., WebSocket and IPC endpoints,
+    which share one persistent connection anyway).
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+
+    def imap(self, requests, formatter=None, batch_size=1, window=None):
+        """
+        Yield an ``RPCCall`` for each (method, params) in ``requests``.
+
+        ``window`` is accepted for compatibility with ``AsyncEngine``;
+        nothing is requested ahead of the caller.
+        """
+        import asyncio
+        from ether_py.utils.endpoint import EndpointConnectionError
+        for chunk in chunked(requests, batch_size):
+            batch = RPCBatch(self.w3, batch_size=batch_size)
+            calls = [
+                batch.add(method, params=params, formatter=formatter)
+                for method, params in chunk
+            ]
+            try:
+                batch.execute()
+            except (OSError, asyncio.TimeoutError) as err:
+                raise EndpointConnectionError(
+                    f'[-] request to {self.w3.provider} failed: {err}'
+                ) from err
+            yield from calls
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cached snapshot of a python-secrets environment.
+
+Loading a ``psec.SecretsEnvironment`` imports ``psec`` (and its
+dependencies), parses every descriptions file and the secrets file, and
+(with ``export_env_vars=True``) exports every variable, on every run.
+``SecretsSnapshot`` instead keeps the names of the secrets that ``psec``
+found in a JSON file in the cache directory, keyed on the environment's
+directory and validated by the modification times and sizes of the
+secrets and descriptions files. The values are never written there:
+they are read from the secrets file itself (which is plain JSON) and
+only kept in memory. Nothing is read until the first ``get_secret()``
+call, and ``psec`` is only imported when the snapshot is missing or
+stale.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+from ether_py import ETHERPY_CACHE_DIR
+from ether_py.utils import atomic_write_json
+from ether_py.utils.trace import span
+
+
+SECRETS_CACHE_DIR = os.path.join(ETHERPY_CACHE_DIR, 'secrets')
+# These match ``psec``'s defaults.
+SECRETS_BASEDIR = os.getenv(
+    'D2_SECRETS_BASEDIR',
+    os.path.join(os.path.expanduser('~'), '.secrets')
+)
+SECRETS_FILE = 'secrets.json'
+SECRETS_DESCRIPTIONS_DIR = 'secrets.d'
+
+
+logger = logging.getLogger(__name__)
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class SecretsSnapshot(object):
+    """
+    Read-only access to the secrets in a python-secrets environment.
+
+    Supports the ``get_secret()`` method of ``psec.SecretsEnvironment``
+    that commands use.
+    """
+
+    def __init__(self,
+                 environment,
+                 secrets_basedir=SECRETS_BASEDIR,
+                 cache_dir=SECRETS_CACHE_DIR):
+        self.environment = environment
+        self.environment_dir = os.path.join(secrets_basedir, environment)
+        key = hashlib.sha256(
+            os.path.abspath(self.environment_dir).encode()).hexdigest()[:16]
+        self.cache_file = os.path.join(cache_dir, f'{key}.json')
+        self.signature = None
+        self._secrets = None
+
+    def get_signature(self):
+        """
+        Return a value that changes whenever the environment's files do.
+
+        Includes the secrets file, the descriptions directory (so added
+        and removed files are noticed), and each descriptions file.
+        """
+        descriptions_dir = os.path.join(self.environment_dir,
+                                        SECRETS_DESCRIPTIONS_DIR)
+        signature = [
+            [SECRETS_FILE,
+             _stat(os.path.join(self.environment_dir, SECRETS_FILE))],
+            [SECRETS_DESCRIPTIONS_DIR, _stat(descriptions_dir)],
+        ]
+        try:
+            names = sorted(
+                name for name in os.listdir(descriptions_dir)
+                if name.endswith('.json')
+            )
+        except OSError:
+            names = []
+        for name in names:
+            signature.append(
+                [name, _stat(os.path.join(descriptions_dir, name))])
+        return signature
+
+    def load(self):
+        """Load the secrets from the snapshot, refreshing it if stale."""
+        with span('load secrets', environment=self.environment):
+            self._load()
+
+    def _load(self):
+        signature = self.get_signature()
+        try:
+            with open(self.cache_file, 'r') as f_in:
+                cache = json.load(f_in)
+            if (
+                cache.get('environment_dir') == self.environment_dir
+                and cache.get('signature') == signature
+            ):
+                keys = cache['keys']
+            else:
+                keys = None
+        except (OSError, ValueError, KeyError):
+            keys = None
+        if keys is None:
+            # The signature was taken before reading the files, so a
+            # change made while they are being read makes the snapshot
+            # stale rather than hiding the change.
+            keys = self._read_keys()
+            self._save({
+                'environment_dir': self.environment_dir,
+                'signature': signature,
+                'keys': keys,
+            })
+        values = self._read_values()
+        self._secrets = {key: values.get(key) for key in keys}
+        self.signature = signature
+
+    def refresh(self):
+        """Forget loaded secrets if the environment's files changed."""
+        if (
+            self._secrets is not None
+            and self.get_signature() != self.signature
+        ):
+            self._secrets = None
+
+    def _read_keys(self):
+        """Return the names of the secrets found by ``psec``."""
+        from psec.secrets_environment import SecretsEnvironment
+        se = SecretsEnvironment(
+            environment=self.environment,
+            secrets_basedir=os.path.dirname(self.environment_dir),
+        )
+        se.read_secrets_and_descriptions()
+        return list(se.keys())
+
+    def _read_values(self):
+        """Return the values in the secrets file, as ``psec`` reads them."""
+        try:
+            with open(os.path.join(self.environment_dir, SECRETS_FILE),
+                      'r') as f_in:
+                return json.load(f_in)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, cache):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            atomic_write_json(self.cache_file, cache)
+        except OSError as err:
+            logger.debug(f'[-] could not cache secret names: {err}')
+
+    def keys(self):
+        """Return the names of the secrets."""
+        if self._secrets is None:
+            self.load()
+        return list(self._secrets.keys())
+
+    def get_secret(self, secret, allow_none=False):
+        """
+        Return the value of ``secret``.
+
+        Raises ``psec``'s ``SecretNotFoundError`` if the value is
+        ``None`` and ``allow_none`` is ``False``.
+        """
+        if self._secrets is None:
+            self.load()
+        value = self._secrets.get(secret)
+        if value is None and not allow_none:
+            from psec.exceptions import SecretNotFoundError
+            raise SecretNotFoundError(secret=secret)
+        return value
+
+
+# vim: set ts=4 sw=4 tw=0 et :
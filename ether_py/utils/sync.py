@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+Incremental, resumable copying of a range of blocks into a block store.
+
+``BlockSync`` fills in the blocks (and, optionally, their receipts)
+that a ``BlockStore`` is missing from a range, in order, in chunks.
+After each chunk a checkpoint (the next block to sync and the hash of
+the last one) is committed together with the chunk's blocks, so an
+interrupted sync picks up where it stopped. Each block's parent hash is
+checked against the block before it (and receipts against their block),
+and when they don't match, stored blocks that are no longer on the
+chain are deleted back to the common ancestor and syncing continues
+from there. The range is pinned, so the store never evicts what was
+synced.
+"""
+
+import logging
+import time
+
+from ether_py.utils import (
+    block_request,
+    chunked,
+)
+from ether_py.utils.transactions import TransactionFetcher
+
+
+# Blocks synced between checkpoints.
+SYNC_CHUNK = 1024
+# Rollbacks in one run before giving up on a chain that keeps changing.
+MAX_ROLLBACKS = 10
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChainReorganized(Exception):
+    """Raised when a synced block is no longer on the chain."""
+
+    def __init__(self, number):
+        super().__init__(f'[-] block {number} is no longer on the chain')
+        self.number = number
+
+
+class BlockSync(object):
+    """
+    Sync blocks ``start`` onward from a ``BlockFetcher`` into its store.
+
+    Blocks are fetched (concurrently, and only those the store doesn't
+    have) by the fetcher, which stores them, so only blocks that are
+    already final can be synced. Receipts are requested by a
+    ``TransactionFetcher`` (one by one if the endpoint lacks
+    ``eth_getBlockReceipts``), and the blocks checked when rolling back
+    through the fetcher's engine.
+    """
+
+    def __init__(self, fetcher, start, receipts=False, window=None,
+                 chunk_size=SYNC_CHUNK):
+        self.fetcher = fetcher
+        self.store = fetcher.store
+        self.engine = fetcher.engine
+        self.start = start
+        self.receipts = receipts
+        self.window = window
+        self.chunk_size = chunk_size
+        self.name = f'block sync {start}'
+        self.tx_fetcher = TransactionFetcher(
+            self.engine, batch_size=fetcher.batch_size)
+        self.synced = 0
+        self.rolled_back = 0
+
+    def todo(self, end):
+        """Return ranges of the blocks still to sync up to ``end``."""
+        return self.store.missing(self.start, end, receipts=self.receipts)
+
+    def run(self, end, progress=None):
+        """
+        Sync through block ``end``. ``progress(synced, total)`` is called
+        after each chunk. Returns the number of blocks synced. The
+        range is pinned in the store, so synced blocks are never evicted.
+        """
+        if end >= self.start:
+            self.store.pin(self.name, self.start, end)
+        checkpoint = self.store.get_checkpoint(self.name)
+        if checkpoint is not None and checkpoint[0] > self.start:
+            # Make sure the chain hasn't changed under the checkpoint.
+            self.rollback(checkpoint[0] - 1)
+        for _ in range(MAX_ROLLBACKS):
+            ranges = self.todo(end)
+            total = self.synced + sum(last - first + 1
+                                      for first, last in ranges)
+            try:
+                self._sync(ranges, progress, total)
+            except ChainReorganized as err:
+                logger.info(str(err))
+                self.rollback(err.number)
+                continue
+            if end >= self.start:
+                self.store.set_checkpoint(self.name, end + 1,
+                                          self.store.hash_at(end))
+            return self.synced
+        raise ValueError(f'[-] the chain changed {MAX_ROLLBACKS} times '
+                         'while syncing: try again later')
+
+    def _sync(self, ranges, progress, total):
+        numbers = (
+            number
+            for first, last in ranges
+            for number in range(first, last + 1)
+        )
+        for chunk in chunked(numbers, self.chunk_size):
+            last_hash = self._sync_chunk(chunk)
+            self.synced += len(chunk)
+            # Blocks are synced in order, so everything through the end
+            # of the chunk is now stored.
+            self.store.set_checkpoint(self.name, chunk[-1] + 1, last_hash)
+            if progress is not None:
+                progress(self.synced, total)
+
+    def _sync_chunk(self, chunk):
+        """Store the blocks (and receipts) in a chunk; return last hash."""
+        hashes = {}
+        previous = None
+        blocks = list(self.fetcher.imap(chunk, window=self.window))
+        for number, block in zip(chunk, blocks):
+            if block is None:
+                raise ValueError(f"[-] block with id '{number}' not found")
+            block_hash = block['hash'].lower()
+            if self.store.hash_at(number) != block_hash:
+                raise ValueError(f'[-] block {number} is less than '
+                                 '--finality-depth blocks old')
+            if previous is None or previous[0] != number - 1:
+                previous = (number - 1, self.store.hash_at(number - 1))
+            if (
+                previous[1] is not None
+                and previous[1] != block['parentHash'].lower()
+            ):
+                raise ChainReorganized(number)
+            previous = (number, block_hash)
+            hashes[number] = block_hash
+        if self.receipts:
+            found = self.tx_fetcher.receipts(blocks, window=self.window)
+            for number, receipts in zip(chunk, found):
+                if any(
+                    receipt is None
+                    or receipt['blockHash'].lower() != hashes[number]
+                    for receipt in receipts
+                ):
+                    raise ChainReorganized(number)
+                self.store.put_receipts(number, receipts)
+        return previous[1]
+
+    def rollback(self, number):
+        """
+        Delete stored blocks from ``number`` back to the last one that
+        is still on the chain, and move the checkpoint back to it.
+        Returns the number of that block (the common ancestor).
+        """
+        top = number
+        while number >= self.start:
+            stored = self.store.hash_at(number)
+            if stored is not None:
+                call = next(self.engine.imap([block_request(str(number))]))
+                block = call.result()
+                if block is not None and block['hash'].lower() == stored:
+                    # The block a mismatch was found at may itself be
+                    # on the chain, with the one before it not.
+                    if number < top:
+                        break
+                else:
+                    self.store.delete([number])
+                    self.rolled_back += 1
+            number -= 1
+        checkpoint = self.store.get_checkpoint(self.name)
+        if checkpoint is not None and checkpoint[0] > number + 1:
+            self.store.set_checkpoint(self.name, max(self.start, number + 1),
+                                      self.store.hash_at(number))
+        if self.rolled_back:
+            logger.info(f'[+] rolled back to block {number}')
+        return number
+
+
+class Throughput(object):
+    """Report progress with the rate since the start, at most so often."""
+
+    def __init__(self, report, every=5.0):
+        self.report = report
+        self.every = every
+        self.started = time.monotonic()
+        self.reported = self.started
+
+    def __call__(self, done, total, final=False):
+        now = time.monotonic()
+        if not final and now - self.reported < self.every:
+            return
+        self.reported = now
+        elapsed = max(now - self.started, 1e-9)
+        self.report(done, total, elapsed, done / elapsed)
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+"""
+Find the block that was the head of the chain at a given time.
+
+A ``TimeIndex`` is a sparse, sorted list of (block number, timestamp)
+samples of one chain. Looking up a time starts from the two samples on
+either side of it and guesses, by interpolating between them, which
+block it falls in. Every block asked for along the way becomes a new
+sample, so the index gets denser where it is used and later lookups
+nearby need fewer (often no) requests. The samples of final blocks are
+saved in the ``blocks`` directory of the data directory.
+"""
+
+import json
+import logging
+import os
+
+from bisect import (
+    bisect_left,
+    bisect_right,
+)
+from ether_py.utils import (
+    atomic_write_json,
+    env_number,
+)
+
+
+# Most samples kept in a saved index.
+TIME_INDEX_SIZE = env_number('ETHERPY_TIME_INDEX_SIZE', 65536)
+
+
+logger = logging.getLogger(__name__)
+
+
+def time_index_path(data_dir, chain_id):
+    """Return the path of the time index for a chain."""
+    return os.path.join(data_dir, 'blocks', f'chain-{chain_id}-times.json')
+
+
+class TimeIndex(object):
+    """
+    Sparse index of block timestamps, loaded from (and saved to)
+    ``path`` if one is given.
+    """
+
+    def __init__(self, path=None, max_size=TIME_INDEX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.numbers = []
+        self.timestamps = []
+        self.loaded = 0
+        if path is not None:
+            for number, timestamp in self._read():
+                self.add(number, timestamp)
+            self.loaded = len(self)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def add(self, number, timestamp):
+        """Add (or replace) the sample for block ``number``."""
+        index = bisect_left(self.numbers, number)
+        if index < len(self.numbers) and self.numbers[index] == number:
+            self.timestamps[index] = timestamp
+        else:
+            self.numbers.insert(index, number)
+            self.timestamps.insert(index, timestamp)
+
+    def has(self, number):
+        """Return ``True`` if there is a sample for block ``number``."""
+        index = bisect_left(self.numbers, number)
+        return index < len(self.numbers) and self.numbers[index] == number
+
+    def bracket(self, timestamp):
+        """
+        Return the samples (number, timestamp) of the last block at or
+        before ``timestamp`` and the first one after it, either of which
+        is ``None`` if there isn't one.
+        """
+        index = bisect_right(self.timestamps, timestamp)
+        before = (
+            (self.numbers[index - 1], self.timestamps[index - 1])
+            if index > 0 else None
+        )
+        after = (
+            (self.numbers[index], self.timestamps[index])
+            if index < len(self.numbers) else None
+        )
+        return (before, after)
+
+    def resolve(self, timestamps, fetch):
+        """
+        Return a dictionary mapping each of ``timestamps`` to the number
+        of the last block at or before it (``None`` for times before the
+        first block sampled).
+
+        The index must already have samples for the first block of the
+        chain and its head; times after the head resolve to the head.
+        ``fetch(numbers)`` returns (number, timestamp) pairs for blocks.
+        The timestamps are swept in sorted order, in rounds: each round
+        asks ``fetch`` for every block guessed for every timestamp still
+        unresolved at once, so the number of rounds (not the number of
+        timestamps) sets how many round trips a lookup takes.
+        """
+        results = {}
+        pending = sorted(set(timestamps))
+        widths = {}
+        while pending:
+            wanted = set()
+            unresolved = []
+            for timestamp in pending:
+                before, after = self.bracket(timestamp)
+                if before is None or after is None:
+                    results[timestamp] = None if before is None else before[0]
+                elif after[0] - before[0] == 1:
+                    results[timestamp] = before[0]
+                else:
+                    width = after[0] - before[0]
+                    wanted.update(self.guesses(
+                        timestamp, before, after,
+                        # Bisect too if the last guess didn't help much.
+                        bisect=width > widths.get(timestamp, 2 * width) / 2))
+                    widths[timestamp] = width
+                    unresolved.append(timestamp)
+            if wanted:
+                for number, block_timestamp in fetch(sorted(wanted)):
+                    self.add(number, block_timestamp)
+            pending = unresolved
+        return results
+
+    def guesses(self, timestamp, before, after, bisect=False):
+        """
+        Return the blocks between samples ``before`` and ``after`` to
+        ask for next when looking for ``timestamp``.
+
+        The block interpolated from the samples is asked for along with
+        the one after it, since (blocks coming at fairly regular
+        intervals) that is usually enough to settle it in one round.
+        """
+        low, low_time = before
+        high, high_time = after
+        guess = low + (timestamp - low_time) * (high - low) // max(
+            high_time - low_time, 1)
+        guess = min(max(guess, low + 1), high - 1)
+        numbers = {guess}
+        if guess + 1 < high:
+            numbers.add(guess + 1)
+        if bisect:
+            numbers.add((low + high) // 2)
+        return [number for number in numbers if not self.has(number)]
+
+    def save(self, final):
+        """
+        Save the samples of blocks up to ``final`` (those no longer
+        expected to change), merged with any saved since this index was
+        loaded, keeping at most ``max_size`` of them.
+        """
+        if self.path is None:
+            return
+        samples = dict(self._read())
+        samples.update(
+            (number, timestamp)
+            for number, timestamp in zip(self.numbers, self.timestamps)
+            if number <= final
+        )
+        samples = sorted(samples.items())
+        if len(samples) > self.max_size:
+            # Thin out evenly, keeping the first and last samples.
+            step = len(samples) / (self.max_size - 1)
+            samples = (
+                [samples[int(i * step)] for i in range(self.max_size - 1)]
+                + [samples[-1]]
+            )
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            atomic_write_json(self.path, {'samples': samples},
+                              separators=(',', ':'))
+        except OSError as err:
+            logger.debug(f'[-] could not save the time index: {err}')
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f_in:
+                return [tuple(sample) for sample in json.load(f_in)['samples']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return []
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""
+Span tracing of command phases and JSON-RPC calls.
+
+Tracing is off until ``start_tracing()`` is given a ``Timer`` to record
+spans into. Code that wants its work to show up in traces wraps it in
+``span()``, which costs almost nothing when tracing is off. Traces are
+written as JSON lines (one span per line) by ``Timer.write_trace()``
+and can be converted with ``to_chrome()`` to the Chrome trace event
+format, for viewing in ``chrome://tracing`` or https://ui.perfetto.dev.
+"""
+
+import json
+import time
+
+
+_tracer = None
+
+
+def start_tracing(timer):
+    """Start recording spans into ``timer``."""
+    global _tracer
+    _tracer = timer
+
+
+def stop_tracing():
+    """Stop recording spans."""
+    global _tracer
+    _tracer = None
+
+
+class _NoSpan(object):
+    """
+    Context manager used in place of a span when tracing is off.
+
+    Like ``contextlib.nullcontext()`` (which needs Python 3.7), it just
+    returns the span's arguments.
+    """
+
+    __slots__ = ('args',)
+
+    def __init__(self, args):
+        self.args = args
+
+    def __enter__(self):
+        return self.args
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def get_tracer():
+    """Return the ``Timer`` spans are being recorded into, or ``None``."""
+    return _tracer
+
+
+def span(name, category='ether-py', **args):
+    """
+    Return a context manager that records a span if tracing is on.
+
+    See ``Timer.span()``.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NoSpan(args)
+    return tracer.span(name, category=category, **args)
+
+
+def traced(name, func, category='ether-py'):
+    """Return ``func`` wrapped to record each call as a span."""
+    def wrapper(*args, **kwargs):
+        with span(name, category=category):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def tracing_middleware(make_request, w3):
+    """``web3`` middleware that records each request as a span."""
+    def middleware(method, params):
+        tracer = _tracer
+        if tracer is None:
+            return make_request(method, params)
+        with tracer.span(method, category='rpc') as args:
+            response = make_request(method, params)
+            if isinstance(response, dict) and 'error' in response:
+                args['error'] = response['error']
+            return response
+    return middleware
+
+
+def record_calls(requests, start, duration, error=None):
+    """
+    Record (method, params) ``requests`` sent together as one span.
+
+    For requests whose time overlaps other requests from the same
+    thread (i.e., requests made concurrently by ``AsyncEngine``).
+    """
+    tracer = _tracer
+    if tracer is None:
+        return
+    methods = sorted({method for method, _ in requests})
+    args = {'calls': len(requests)}
+    if error is not None:
+        args['error'] = error
+    tracer.record(methods[0] if len(methods) == 1 else 'batch',
+                  start, duration, category='rpc', args=args,
+                  concurrent=True)
+
+
+def read_trace(path):
+    """Return the spans in a JSON lines trace file."""
+    with open(path, 'r') as f_in:
+        return [json.loads(line) for line in f_in if line.strip()]
+
+
+def to_chrome(spans):
+    """
+    Return spans as a Chrome trace event format dictionary.
+
+    Spans become complete (``X``) events, which nest by time within
+    each thread. Concurrent spans become pairs of async (``b``/``e``)
+    events, which are drawn on tracks of their own.
+    """
+    origin = min((span['ts'] for span in spans), default=time.time())
+    events = []
+    for span in spans:
+        event = {
+            'name': span['name'],
+            'cat': span.get('cat', 'ether-py'),
+            'ts': round((span['ts'] - origin) * 1e6, 3),
+            'pid': span.get('pid', 0),
+            'tid': span.get('tid', 0),
+            'args': span.get('args', {}),
+        }
+        if span.get('concurrent'):
+            end = dict(event, ph='e', id=span['id'],
+                       ts=round(event['ts'] + span['dur'] * 1e6, 3))
+            events.append(dict(event, ph='b', id=span['id']))
+            events.append(end)
+        else:
+            events.append(dict(event, ph='X',
+                               dur=round(span['dur'] * 1e6, 3)))
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+# vim: set ts=4 sw=4 tw=0 et :
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+"""
+Blocks with their transactions (and receipts) in as few requests as
+the endpoint allows.
+
+Instead of getting a block's transaction hashes and then each
+transaction on its own, ``TransactionFetcher`` asks for blocks with full
+transaction objects and, optionally, for all of a block's receipts at
+once with ``eth_getBlockReceipts``. Endpoints without that method are
+asked for each receipt with ``eth_getTransactionReceipt`` instead, in
+batches, and so are the receipts of blocks fetched some other way
+(``receipts()``). ``denormalize()`` turns a block into one flat record
+per transaction.
+"""
+
+import logging
+
+from ether_py.utils import (
+    block_request,
+    chunked,
+)
+
+
+# Blocks requested together before their receipts are checked.
+TX_FETCH_CHUNK = 64
+# The fields of blocks, transactions and receipts, in the order they
+# are shown. They are the columns of CSV and table output whatever
+# fields each record has (e.g., legacy transactions have no
+# maxFeePerGas, and older blocks no baseFeePerGas).
+BLOCK_COLUMNS = [
+    'number',
+    'hash',
+    'parentHash',
+    'mixHash',
+    'nonce',
+    'sha3Uncles',
+    'logsBloom',
+    'transactionsRoot',
+    'stateRoot',
+    'receiptsRoot',
+    'miner',
+    'difficulty',
+    'totalDifficulty',
+    'extraData',
+    'size',
+    'gasLimit',
+    'gasUsed',
+    'timestamp',
+    'baseFeePerGas',
+    'withdrawalsRoot',
+    'transactions',
+    'uncles',
+    'withdrawals',
+]
+TX_COLUMNS = [
+    'hash',
+    'nonce',
+    'blockHash',
+    'blockNumber',
+    'transactionIndex',
+    'from',
+    'to',
+    'value',
+    'gas',
+    'gasPrice',
+    'maxFeePerGas',
+    'maxPriorityFeePerGas',
+    'input',
+    'type',
+    'chainId',
+    'accessList',
+    'v',
+    'r',
+    's',
+]
+RECEIPT_COLUMNS = [
+    'transactionHash',
+    'transactionIndex',
+    'blockHash',
+    'blockNumber',
+    'from',
+    'to',
+    'cumulativeGasUsed',
+    'gasUsed',
+    'effectiveGasPrice',
+    'contractAddress',
+    'logs',
+    'logsBloom',
+    'status',
+    'type',
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+def _method_missing(err):
+    """Return ``True`` if a JSON-RPC error says the method is missing."""
+    error = err.args[0] if err.args else None
+    if isinstance(error, dict):
+        if error.get('code') == -32601:
+            return True
+        error = error.get('message')
+    return any(words in str(error).lower()
+               for words in ['does not exist', 'method not found',
+                             'not supported'])
+
+
+class TransactionFetcher(object):
+    """
+    Get blocks with full transaction objects (and their receipts)
+    through a JSON-RPC engine.
+
+    Blocks are requested ``chunk_size`` at a time, together with their
+    receipts when the endpoint has ``eth_getBlockReceipts``. The first
+    time it turns out not to, that is remembered and the receipts of
+    each chunk's transactions are requested one by one (in batches of
+    ``batch_size``) instead.
+    """
+
+    def __init__(self, engine, batch_size=1, chunk_size=TX_FETCH_CHUNK):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        # ``None`` until it is known whether eth_getBlockReceipts works.
+        self.block_receipts = None
+
+    def imap(self, block_ids, receipts=False, window=None,
+             full_transactions=True):
+        """
+        Yield (raw block, raw receipts) for each block id, in order.
+
+        The block is ``None`` if it wasn't found, and the receipts (a
+        list in transaction order) are ``None`` unless ``receipts`` is
+        ``True``. Without ``full_transactions``, blocks have just the
+        hashes of their transactions (e.g., when only the receipts are
+        wanted).
+        """
+        for chunk in chunked((str(b) for b in block_ids),
+                             window or self.chunk_size):
+            yield from self._fetch_chunk(chunk, receipts, window,
+                                         full_transactions)
+
+    def _fetch_chunk(self, chunk, receipts, window, full_transactions):
+        with_receipts = receipts and self.block_receipts is not False
+
+        def requests():
+            for block_id in chunk:
+                method, params = block_request(
+                    block_id, full_transactions=full_transactions)
+                yield (method, params)
+                if with_receipts:
+                    yield ('eth_getBlockReceipts', params[:1])
+
+        calls = list(self.engine.imap(requests(),
+                                      batch_size=self.batch_size,
+                                      window=window))
+        step = 2 if with_receipts else 1
+        blocks = [call.result() for call in calls[::step]]
+        if not receipts:
+            return [(block, None) for block in blocks]
+        found = [None] * len(blocks)
+        if with_receipts:
+            for index, call in enumerate(calls[1::2]):
+                found[index] = self._block_receipts(call, blocks[index])
+        self._fill_receipts(blocks, found, window)
+        return list(zip(blocks, found))
+
+    def receipts(self, blocks, window=None):
+        """
+        Return the receipts (a list in transaction order) of each of
+        the raw ``blocks`` already fetched, or ``None`` for a block that
+        is ``None``.
+        """
+        found = [None] * len(blocks)
+        if self.block_receipts is not False:
+            wanted = [index for index, block in enumerate(blocks)
+                      if block is not None]
+            calls = list(self.engine.imap(
+                (('eth_getBlockReceipts', [blocks[index]['number']])
+                 for index in wanted),
+                batch_size=self.batch_size,
+                window=window))
+            for index, call in zip(wanted, calls):
+                found[index] = self._block_receipts(call, blocks[index])
+        self._fill_receipts(blocks, found, window)
+        return found
+
+    def _block_receipts(self, call, block):
+        """Return the receipts from an eth_getBlockReceipts call, if any."""
+        try:
+            block_receipts = call.result()
+        except ValueError as err:
+            if not _method_missing(err):
+                raise
+            if self.block_receipts is None:
+                logger.debug('[-] eth_getBlockReceipts is not available: '
+                             'getting receipts one at a time')
+            self.block_receipts = False
+            return None
+        self.block_receipts = True
+        if (
+            block is None
+            or block_receipts is None
+            or len(block_receipts) != len(block['transactions'])
+            or any(receipt['blockHash'].lower() != block['hash'].lower()
+                   for receipt in block_receipts)
+        ):
+            # E.g., "latest" moved on between the two calls.
+            return None
+        return block_receipts
+
+    def _fill_receipts(self, blocks, found, window):
+        """Request receipts one at a time for blocks that lack them."""
+        wanted = [
+            (index, tx if isinstance(tx, str) else tx['hash'])
+            for index, block in enumerate(blocks)
+            if block is not None and found[index] is None
+            for tx in block['transactions']
+        ]
+        for index, block in enumerate(blocks):
+            if block is not None and found[index] is None:
+                found[index] = []
+        if not wanted:
+            return
+        calls = self.engine.imap(
+            (('eth_getTransactionReceipt', [tx_hash])
+             for _, tx_hash in wanted),
+            batch_size=self.batch_size,
+            window=window)
+        for (index, _), call in zip(wanted, calls):
+            found[index].append(call.result())
+
+
+def record_columns(full_transactions=False, receipts=False):
+    """
+    Return the columns of the records made from blocks: those of a
+    block or, with ``full_transactions``, those ``denormalize()`` gives
+    a transaction (with those of its receipt, if ``receipts``).
+    """
+    if not full_transactions:
+        return list(BLOCK_COLUMNS)
+    columns = list(TX_COLUMNS)
+    if receipts:
+        columns.extend(column for column in RECEIPT_COLUMNS
+                       if column not in columns)
+    columns.extend(
+        name for name in (
+            'block' + column[0].upper() + column[1:]
+            for column in BLOCK_COLUMNS
+            if column != 'transactions'
+        )
+        if name not in columns
+    )
+    return columns
+
+
+def denormalize(eth_block, receipts=None):
+    """
+    Yield one flat record for each transaction in a (formatted) block
+    with full transaction objects.
+
+    Each record has the transaction's fields, then the fields of its
+    receipt (if ``receipts`` is given) that the transaction doesn't
+    have, then the block's fields, named with a ``block`` prefix (e.g.,
+    ``blockTimestamp``; the block's ``number`` and ``hash`` are the
+    transaction's ``blockNumber`` and ``blockHash``).
+    """
+    block_fields = {
+        'block' + k[0].upper() + k[1:]: v
+        for k, v in eth_block.items()
+        if k != 'transactions'
+    }
+    for index, tx in enumerate(eth_block['transactions']):
+        record = dict(tx)
+        if receipts is not None and receipts[index] is not None:
+            for k, v in receipts[index].items():
+                record.setdefault(k, v)
+        for k, v in block_fields.items():
+            record.setdefault(k, v)
+        yield record
+
+
+# vim: set ts=4 sw=4 tw=0 et :
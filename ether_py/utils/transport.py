@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+"""
+Providers for HTTP, WebSocket, and IPC endpoints.
+
+HTTP uses a tuned, pooled ``requests.Session``. WebSocket and IPC
+endpoints keep one persistent connection open, which avoids HTTP framing
+and per-request connection overhead for nodes on the same host.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+
+from web3 import (
+    HTTPProvider,
+    IPCProvider,
+    WebsocketProvider,
+)
+from web3.providers import BaseProvider
+from web3._utils.threads import Timeout
+from web3.providers.ipc import has_valid_json_rpc_ending
+
+from ether_py.utils import (
+    endpoint_type,
+    env_number,
+    ipc_path,
+)
+from ether_py.utils.rpcbatch import (
+    BatchNotSupported,
+    decode_batch,
+    encode_batch,
+)
+
+
+HTTP_BACKOFF = env_number('ETHERPY_HTTP_BACKOFF', 0.5, float)
+HTTP_GZIP = os.getenv('ETHERPY_HTTP_GZIP', 'true').lower() == 'true'
+HTTP_KEEP_ALIVE = (
+    os.getenv('ETHERPY_HTTP_KEEP_ALIVE', 'true').lower() == 'true'
+)
+HTTP_POOL_SIZE = env_number('ETHERPY_HTTP_POOL_SIZE', 10)
+HTTP_RETRIES = env_number('ETHERPY_HTTP_RETRIES', 3)
+HTTP_TIMEOUT = env_number('ETHERPY_HTTP_TIMEOUT', 30, float)
+# HTTP status codes that are retried (with backoff) before giving up.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Settings that can come from CLI options, psec secrets, or defaults.
+# Maps setting name to (secret name, type, default).
+TRANSPORT_SETTINGS = {
+    'backoff': ('http_backoff', float, HTTP_BACKOFF),
+    'gzip': ('http_gzip', bool, HTTP_GZIP),
+    'keep_alive': ('http_keep_alive', bool, HTTP_KEEP_ALIVE),
+    'pool_size': ('http_pool_size', int, HTTP_POOL_SIZE),
+    'retries': ('http_retries', int, HTTP_RETRIES),
+    'timeout': ('http_timeout', float, HTTP_TIMEOUT),
+}
+
+
+logger = logging.getLogger(__name__)
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ['1', 'true', 'yes', 'on']
+
+
+def get_transport_settings(options=None, get_secret=None):
+    """
+    Return a dictionary of transport settings.
+
+    Each setting comes from the first of these that is not ``None``: the
+    attribute ``http_<setting>`` of ``options`` (parsed command line
+    arguments), the psec secret returned by ``get_secret(name)``, or the
+    default (which can itself be set with an ``ETHERPY_HTTP_*``
+    environment variable).
+    """
+    settings = {}
+    for setting, (secret, cast, default) in TRANSPORT_SETTINGS.items():
+        value = getattr(options, f'http_{setting}', None)
+        if value is None and get_secret is not None:
+            value = get_secret(secret)
+        if value is None or value == '':
+            value = default
+        settings[setting] = _to_bool(value) if cast is bool else cast(value)
+    return settings
+
+
+def build_session(pool_size=HTTP_POOL_SIZE,
+                  retries=HTTP_RETRIES,
+                  backoff=HTTP_BACKOFF,
+                  keep_alive=HTTP_KEEP_ALIVE,
+                  gzip=HTTP_GZIP,
+                  on_retry=None,
+                  **kwargs):
+    """
+    Return a ``requests.Session`` with a tuned connection pool.
+
+    Up to ``pool_size`` connections per host are kept open and reused.
+    When all of them are busy, callers wait for one to be released
+    rather than opening (and then discarding) extra connections, which
+    avoids new TLS handshakes and socket exhaustion under concurrent
+    load. Requests that fail to connect or get one of the
+    ``RETRY_STATUSES`` are retried up to ``retries`` times, with
+    exponential ``backoff`` that honors any ``Retry-After`` header.
+    ``on_retry(status)`` is called before each retry, with the HTTP
+    status (or ``None`` if there was no response).
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    class ObservedRetry(Retry):
+        def new(self, **kwargs):
+            retry = super().new(**kwargs)
+            retry.on_retry = self.on_retry
+            return retry
+
+        def increment(self, *args, **kwargs):
+            if self.on_retry is not None:
+                response = kwargs.get('response')
+                self.on_retry(getattr(response, 'status', None))
+            return super().increment(*args, **kwargs)
+
+    retry_kwargs = {
+        'total': retries,
+        'backoff_factor': backoff,
+        'status_forcelist': RETRY_STATUSES,
+        'respect_retry_after_header': True,
+        'raise_on_status': False,
+    }
+    # JSON-RPC always uses POST, which urllib3 does not retry by default.
+    try:
+        retry = ObservedRetry(allowed_methods=frozenset(['POST']),
+                              **retry_kwargs)
+    except TypeError:
+        # urllib3 < 1.26
+        retry = ObservedRetry(method_whitelist=frozenset(['POST']),
+                              **retry_kwargs)
+    retry.on_retry = on_retry
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Accept-Encoding'] = (
+        'gzip, deflate' if gzip else 'identity'
+    )
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """
+    ``HTTPProvider`` that sends every request through one tuned session.
+
+    ``web3`` caches a separate default ``requests.Session`` for each
+    thread, so concurrent callers (e.g., ``ether-py batch``) would each
+    open their own connections without retries. This provider shares
+    a single session built by ``build_session()`` across all threads.
+    """
+
+    def __init__(self, endpoint_uri, settings=None, on_retry=None):
+        settings = settings or get_transport_settings()
+        super().__init__(endpoint_uri,
+                         request_kwargs={'timeout': settings['timeout']})
+        self.settings = settings
+        self.session = build_session(on_retry=on_retry, **settings)
+
+    def make_request(self, method, params):
+        self.logger.debug(f"Making request HTTP. URI: {self.endpoint_uri}, "
+                          f"Method: {method}")
+        request_data = self.encode_rpc_request(method, params)
+        response = self.session.post(self.endpoint_uri,
+                                     data=request_data,
+                                     **self.get_request_kwargs())
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+    def make_batch_request(self, requests):
+        """
+        Send (method, params) pairs as one JSON-RPC batch array.
+
+        Returns the response objects in the same order as ``requests``.
+        """
+        self.logger.debug(f"Making batch request HTTP. "
+                          f"URI: {self.endpoint_uri}, Calls: {len(requests)}")
+        ids, payload = encode_batch(requests, self.request_counter)
+        response = self.session.post(self.endpoint_uri,
+                                     data=payload,
+                                     **self.get_request_kwargs())
+        response.raise_for_status()
+        return decode_batch(self.decode_rpc_response(response.content), ids)
+
+
+class BatchIPCProvider(IPCProvider):
+    """
+    ``IPCProvider`` that can also send JSON-RPC batch arrays.
+
+    Requests are written to one persistent Unix socket connection.
+    """
+
+    def make_request(self, method, params):
+        self.logger.debug(f"Making request IPC. Path: {self.ipc_path}, "
+                          f"Method: {method}")
+        return self.send(self.encode_rpc_request(method, params))
+
+    def make_batch_request(self, requests):
+        """Send (method, params) pairs as one JSON-RPC batch array."""
+        ids, payload = encode_batch(requests, self.request_counter)
+        return decode_batch(self.send(payload), ids)
+
+    def send(self, request):
+        """Send an encoded request and return the decoded response."""
+        with self._lock, self._socket as sock:
+            try:
+                sock.sendall(request)
+            except BrokenPipeError:
+                # One extra attempt, then give up.
+                sock = self._socket.reset()
+                sock.sendall(request)
+            raw_response = b''
+            with Timeout(self.timeout) as timeout:
+                while True:
+                    try:
+                        raw_response += sock.recv(65536)
+                    except socket.timeout:
+                        timeout.sleep(0)
+                        continue
+                    if has_valid_json_rpc_ending(raw_response):
+                        try:
+                            return self.decode_rpc_response(raw_response)
+                        except ValueError:
+                            pass
+                    timeout.sleep(0)
+
+
+class BatchWebsocketProvider(WebsocketProvider):
+    """
+    ``WebsocketProvider`` that can also send JSON-RPC batch arrays.
+
+    ``web3``'s provider shares one persistent connection between all
+    threads without serializing them, so concurrent callers could read
+    each other's responses. This provider sends one request at a time.
+    """
+
+    def __init__(self, endpoint_uri, websocket_timeout=10):
+        super().__init__(endpoint_uri, websocket_timeout=websocket_timeout)
+        self._lock = threading.Lock()
+
+    def make_request(self, method, params):
+        with self._lock:
+            return super().make_request(method, params)
+
+    def make_batch_request(self, requests):
+        """Send (method, params) pairs as one JSON-RPC batch array."""
+        ids, payload = encode_batch(requests, self.request_counter)
+        with self._lock:
+            future = asyncio.run_coroutine_threadsafe(
+                self.coro_make_request(payload), WebsocketProvider._loop)
+            responses = future.result()
+        return decode_batch(responses, ids)
+
+
+class ScheduledProvider(BaseProvider):
+    """
+    Provider that sends requests through a ``RequestScheduler``.
+
+    Requests are passed on to the wrapped ``provider`` when the
+    endpoint's rate limit and adaptive concurrency limit allow.
+    """
+
+    def __init__(self, provider, scheduler):
+        self.provider = provider
+        self.scheduler = scheduler
+        super().__init__()
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def __str__(self):
+        return str(self.provider)
+
+    def isConnected(self):
+        return self.provider.isConnected()
+
+    def make_request(self, method, params):
+        return self.scheduler.call(self.provider.make_request, method, params)
+
+    def make_batch_request(self, requests):
+        """Send (method, params) pairs as one JSON-RPC batch array."""
+        if not hasattr(self.provider, 'make_batch_request'):
+            raise BatchNotSupported(f'{self.provider} can not send batches')
+        return self.scheduler.call(self.provider.make_batch_request,
+                                   requests, cost=len(requests))
+
+
+def get_provider(uri, settings=None, limits=None):
+    """
+    Return the provider for an endpoint URI, chosen by its scheme.
+
+    With ``limits`` (see ``get_rate_limit_settings()``), requests are
+    scheduled by the endpoint's shared ``RequestScheduler``.
+    """
+    settings = settings or get_transport_settings()
+    scheduler = None
+    if limits is not None:
+        from ether_py.utils.ratelimit import get_scheduler
+        scheduler = get_scheduler(uri, limits)
+    kind = endpoint_type(uri)
+    if kind == 'ipc':
+        provider = BatchIPCProvider(ipc_path(uri),
+                                    timeout=settings['timeout'])
+    elif kind == 'websocket':
+        provider = BatchWebsocketProvider(
+            uri, websocket_timeout=settings['timeout'])
+    else:
+        def on_retry(status):
+            if status == 429:
+                scheduler.record_throttle()
+
+        provider = PooledHTTPProvider(
+            uri,
+            settings=settings,
+            on_retry=None if scheduler is None else on_retry)
+    if scheduler is None:
+        return provider
+    return ScheduledProvider(provider, scheduler)
+
+
+# vim: set ts=4 sw=4 tw=0 et :
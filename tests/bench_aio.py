@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+"""
+bench_aio
+---------
+
+Benchmark fetching blocks concurrently with ``AsyncEngine``.
+
+Blocks are fetched from a local stand-in node (see ``standin_node.py``)
+that adds simulated latency to each request, once for each concurrency
+limit, to show throughput scaling with the limit::
+
+    $ python tests/bench_aio.py --blocks 500 --latency 0.02
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TESTS_DIR)
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from ether_py.utils import block_request  # noqa
+from ether_py.utils.aio import AsyncEngine  # noqa
+from standin_node import serve_http  # noqa
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)  # noqa
+    parser.add_argument('--blocks', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Simulated per-request latency (seconds)')
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+    server, url = serve_http(latency=args.latency)
+    requests = [block_request(n) for n in range(args.blocks)]
+    print(f'{"concurrency":>11} {"blocks/s":>10} {"max in flight":>14}')
+    for concurrency in args.concurrency:
+        server.max_in_flight = 0
+        engine = AsyncEngine(url, concurrency=concurrency)
+        start = time.perf_counter()
+        for call in engine.imap(requests):
+            call.result()
+        elapsed = time.perf_counter() - start
+        print(f'{concurrency:>11} {args.blocks / elapsed:>10.1f} '
+              f'{server.max_in_flight:>14}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
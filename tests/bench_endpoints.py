@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+bench_endpoints
+---------------
+
+Compare request latency over HTTP, WebSocket, and IPC endpoints.
+
+The same stand-in node (see ``standin_node.py``) is served over each
+transport and a number of sequential ``eth_blockNumber`` and
+``eth_getBlockByNumber`` calls are timed through the provider that
+``ether-py`` selects for the endpoint URI::
+
+    $ python tests/bench_endpoints.py --requests 2000
+
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TESTS_DIR)
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from ether_py.utils.transport import (  # noqa
+    get_provider,
+    get_transport_settings,
+)
+from standin_node import (  # noqa
+    serve_http,
+    serve_ipc,
+    serve_ws,
+)
+
+
+def run(provider, requests, method, params):
+    """Return per-request latencies in microseconds."""
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        provider.make_request(method, params)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)  # noqa
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args()
+    tmpdir = tempfile.mkdtemp()
+    no_keep_alive = get_transport_settings()
+    no_keep_alive['keep_alive'] = False
+    http_server, http_url = serve_http()
+    ws_server, ws_url = serve_ws()
+    ipc_server, ipc_path = serve_ipc(os.path.join(tmpdir, 'standin.ipc'))
+    transports = [
+        ('http (close)', get_provider(http_url, settings=no_keep_alive)),
+        ('http (pooled)', get_provider(http_url)),
+        ('websocket', get_provider(ws_url)),
+        ('ipc', get_provider(ipc_path)),
+    ]
+    calls = [
+        ('eth_blockNumber', []),
+        ('eth_getBlockByNumber', ['0x10', True]),
+    ]
+    print(f'{"transport":<14} {"method":<21} '
+          f'{"mean us":>9} {"p50 us":>9} {"p99 us":>9}')
+    for label, provider in transports:
+        for method, params in calls:
+            # Warm up connections before timing.
+            run(provider, 10, method, params)
+            latencies = sorted(run(provider, args.requests, method, params))
+            p99 = latencies[int(len(latencies) * 0.99) - 1]
+            print(f'{label:<14} {method:<21} '
+                  f'{statistics.mean(latencies):>9.0f} '
+                  f'{statistics.median(latencies):>9.0f} {p99:>9.0f}')
+    for server in [http_server, ws_server, ipc_server]:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
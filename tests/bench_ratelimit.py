@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""
+bench_ratelimit
+---------------
+
+Benchmark fetching blocks from a rate limited endpoint.
+
+Blocks are fetched concurrently with ``AsyncEngine`` from a local
+stand-in node (see ``standin_node.py``) that answers HTTP 429 to calls
+beyond its per-second limit, once without client side scheduling (so
+throttled requests are retried with backoff) and once with a token
+bucket set to the endpoint's limit plus adaptive concurrency::
+
+    $ python tests/bench_ratelimit.py --blocks 400 --limit 100
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TESTS_DIR)
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from ether_py.utils import block_request  # noqa
+from ether_py.utils.aio import AsyncEngine  # noqa
+from ether_py.utils.ratelimit import get_rate_limit_settings  # noqa
+from ether_py.utils.transport import get_transport_settings  # noqa
+from standin_node import serve_http  # noqa
+
+
+def run(url, server, requests, concurrency, limits):
+    """Return (blocks/sec, 429 responses) for one configuration."""
+    settings = get_transport_settings()
+    settings.update({'retries': 10, 'backoff': 0.05})
+    engine = AsyncEngine(url, concurrency=concurrency, settings=settings,
+                         limits=limits)
+    server.throttled = 0
+    start = time.perf_counter()
+    for call in engine.imap(requests):
+        call.result()
+    elapsed = time.perf_counter() - start
+    return (len(requests) / elapsed, server.throttled)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)  # noqa
+    parser.add_argument('--blocks', type=int, default=400)
+    parser.add_argument('--limit', type=int, default=100,
+                        help="Endpoint's calls per second limit")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='Simulated per-request latency (seconds)')
+    args = parser.parse_args()
+    requests = [block_request(n) for n in range(args.blocks)]
+    print(f'{"scheduling":<12} {"blocks/s":>10} {"429s":>8}')
+    # Scheduling just under the endpoint's limit leaves room for jitter.
+    for label, rate in [('none', None), ('scheduled', 0.9 * args.limit)]:
+        # A fresh endpoint (and scheduler) for each run.
+        server, url = serve_http(latency=args.latency,
+                                 rate_limit=args.limit)
+        limits = None
+        if rate is not None:
+            limits = get_rate_limit_settings()
+            limits.update({'rate': rate, 'burst': rate,
+                           'concurrency': args.concurrency})
+        blocks_per_sec, throttled = run(url, server, requests,
+                                        args.concurrency, limits)
+        print(f'{label:<12} {blocks_per_sec:>10.1f} {throttled:>8}')
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
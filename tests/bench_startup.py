@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+bench_startup
+-------------
+
+Benchmark the cold start time of commands that should not load heavy
+modules.
+
+Each command is run in a fresh interpreter, so this measures cold start
+(interpreter, imports, entry point discovery) rather than warm calls.
+The median of several runs is shown for each command and, with
+``--budget``, the exit status is non-zero if any is over the budget::
+
+    $ python tests/bench_startup.py --runs 5 --budget 1.0
+
+"""
+
+import argparse
+import os
+import statistics
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = [
+    ['about'],
+    ['contract', 'list'],
+]
+
+
+def run_ether_py(argv, env):
+    return subprocess.run(  # nosec
+        [sys.executable, '-m', 'ether_py'] + argv,
+        cwd=TOPDIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+
+def cold_start(argv, env, runs):
+    """Return the median wall time of ``runs`` runs of a command."""
+    # Populate the entry point cache before timing.
+    run_ether_py(argv, env)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = run_ether_py(argv, env)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            sys.exit(f"[-] '{' '.join(argv)}' failed: {result.stderr}")
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)  # noqa
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=None,
+                        help='Most seconds a median cold start may take')
+    args = parser.parse_args()
+    over = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = dict(os.environ, ETHERPY_CACHE_DIR=tmpdir)
+        print(f'{"command":>14} {"cold start (s)":>15}')
+        for argv in COMMANDS:
+            median = cold_start(argv, env, args.runs)
+            print(f'{" ".join(argv):>14} {median:>15.3f}')
+            if args.budget is not None and median > args.budget:
+                over.append(' '.join(argv))
+    if over:
+        sys.exit(f"[-] over the {args.budget}s budget: {', '.join(over)}")
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
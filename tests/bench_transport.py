@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""
+bench_transport
+---------------
+
+Benchmark JSON-RPC requests/sec with and without connection pooling.
+
+Requests are sent to a local stand-in node (see ``standin_node.py``)
+from a number of threads, once through a ``PooledHTTPProvider`` that
+keeps connections alive and once with keep-alive turned off so that
+every request opens a new connection::
+
+    $ python tests/bench_transport.py --requests 2000 --threads 8
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TESTS_DIR)
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+from ether_py.utils import ordered_map  # noqa
+from ether_py.utils.transport import (  # noqa
+    PooledHTTPProvider,
+    get_transport_settings,
+)
+from standin_node import serve_http  # noqa
+
+
+def run(url, server, keep_alive, requests, threads):
+    """Return (requests/sec, connections opened) for one transport."""
+    settings = get_transport_settings()
+    settings.update({'keep_alive': keep_alive, 'pool_size': threads})
+    provider = PooledHTTPProvider(url, settings=settings)
+    server.connections = 0
+    start = time.perf_counter()
+    for _ in ordered_map(
+        lambda i: provider.make_request('eth_blockNumber', []),
+        range(requests),
+        workers=threads,
+    ):
+        pass
+    elapsed = time.perf_counter() - start
+    provider.session.close()
+    return (requests / elapsed, server.connections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)  # noqa
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Simulated per-request latency (seconds)')
+    args = parser.parse_args()
+    server, url = serve_http(latency=args.latency)
+    print(f'{"transport":<12} {"req/s":>10} {"connections":>12}')
+    for label, keep_alive in [('no pooling', False), ('pooled', True)]:
+        rate, connections = run(url, server, keep_alive,
+                                args.requests, args.threads)
+        print(f'{label:<12} {rate:>10.1f} {connections:>12}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,586 @@
+#!/usr/bin/env python
+
+"""
+standin_node
+------------
+
+A local stand-in for an Ethereum JSON-RPC node, for tests and benchmarks.
+
+The node serves a deterministic synthetic chain, so no real node (and
+no network access) is needed. Run it directly to serve the chain on a
+port for manual testing::
+
+    $ python tests/standin_node.py --port 8545 --latency 0.005
+
+The same chain can also be served over a WebSocket (``--ws-port``) and
+an IPC Unix socket (``--ipc-path``).
+
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import socketserver
+import threading
+import time
+
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+CHAIN_ID = 1337
+HEAD = 20000
+GENESIS_TIMESTAMP = 1600000000
+BLOCK_TIME = 12
+ZERO_ADDRESS = '0x' + '00' * 20
+ACCOUNTS = [
+    '0xBe50e2b648e9A0e7E1e2B1b517C53cDAB6424355',
+    '0x7eF9F0e59FC3AdD2f033cbAb86a32fC70816ED2A',
+    '0xC587C57EFEe451e033D853F129f7B5e61a5937C5',
+]
+# The third transaction in a block (if it has one) logs an ERC-20
+# ``Transfer`` from this token contract.
+TOKEN = '0x' + 'a0' * 20
+TRANSFER_TOPIC = (
+    '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+)
+
+
+def _bloom(logs):
+    """Return the ``logsBloom`` of a list of logs."""
+    from eth_utils import keccak
+    bloom = 0
+    for log in logs:
+        for value in [log['address']] + log['topics']:
+            digest = keccak(bytes.fromhex(value[2:]))
+            for i in range(0, 6, 2):
+                bloom |= 1 << (int.from_bytes(digest[i:i + 2], 'big') & 2047)
+    return '0x' + bloom.to_bytes(256, 'big').hex()
+
+
+def _hash(*parts):
+    digest = hashlib.sha256(':'.join(str(p) for p in parts).encode())
+    return '0x' + digest.hexdigest()
+
+
+class StandinChain(object):
+    """
+    Deterministic synthetic chain with ``head + 1`` blocks, served by a
+    node without ``eth_getBlockReceipts`` unless ``block_receipts``.
+    """
+
+    def __init__(self, head=HEAD, block_receipts=True):
+        self.head = head
+        self.block_receipts = block_receipts
+        # Block numbers at which the chain was reorganized.
+        self.forks = []
+        # Hashes of new heads (and of the blocks a reorg put in place),
+        # in the order they joined the chain, for block filters and
+        # ``newHeads`` subscriptions.
+        self.new_heads = []
+        self.filters = {}
+
+    def advance(self, count=1):
+        """Add ``count`` blocks to the chain."""
+        for _ in range(count):
+            self.head += 1
+            self.new_heads.append(self.block_hash(self.head))
+
+    def reorg(self, depth):
+        """Replace the last ``depth`` blocks with different ones."""
+        fork = self.head - depth + 1
+        self.forks.append(fork)
+        self.new_heads.extend(
+            self.block_hash(number) for number in range(fork, self.head + 1))
+
+    # Block and transaction hashes end with the block number (and
+    # transaction index), so they can be looked up again.
+
+    def block_hash(self, number):
+        # Each reorg at or below a block gives it a new hash.
+        fork = sum(1 for at in self.forks if at <= number)
+        parts = ('block', number, fork) if fork else ('block', number)
+        return _hash(*parts)[:-16] + f'{number:016x}'
+
+    def tx_hash(self, number, index):
+        return _hash('tx', number, index)[:-16] + f'{number:012x}{index:04x}'
+
+    def tx_count(self, number):
+        return number % 4
+
+    def logs(self, number, index):
+        if index != 2:
+            return []
+        return [{
+            'address': TOKEN,
+            'blockHash': self.block_hash(number),
+            'blockNumber': hex(number),
+            'data': '0x' + f'{number:064x}',
+            'logIndex': '0x0',
+            'removed': False,
+            'topics': [
+                TRANSFER_TOPIC,
+                '0x' + '00' * 12 + ACCOUNTS[index % len(ACCOUNTS)][2:].lower(),
+                '0x' + '00' * 12
+                + ACCOUNTS[(index + 1) % len(ACCOUNTS)][2:].lower(),
+            ],
+            'transactionHash': self.tx_hash(number, index),
+            'transactionIndex': hex(index),
+        }]
+
+    def block_logs(self, number):
+        return [
+            log
+            for index in range(self.tx_count(number))
+            for log in self.logs(number, index)
+        ]
+
+    def block(self, number, full_transactions=False):
+        if number < 0 or number > self.head:
+            return None
+        transactions = [
+            (
+                self.transaction(number, i) if full_transactions
+                else self.tx_hash(number, i)
+            )
+            for i in range(self.tx_count(number))
+        ]
+        return {
+            'baseFeePerGas': hex(10**9 + number),
+            'difficulty': '0x0',
+            'extraData': '0x',
+            'gasLimit': hex(30000000),
+            'gasUsed': hex(21000 * self.tx_count(number)),
+            'hash': self.block_hash(number),
+            'logsBloom': _bloom(self.block_logs(number)),
+            'miner': ZERO_ADDRESS,
+            'mixHash': '0x' + '00' * 32,
+            'nonce': '0x0000000000000000',
+            'number': hex(number),
+            'parentHash': (
+                self.block_hash(number - 1) if number else '0x' + '00' * 32
+            ),
+            'receiptsRoot': _hash('receipts', number),
+            'sha3Uncles': _hash('uncles'),
+            'size': hex(1000 + 100 * self.tx_count(number)),
+            'stateRoot': _hash('state', number),
+            'timestamp': hex(GENESIS_TIMESTAMP + BLOCK_TIME * number),
+            'totalDifficulty': '0x0',
+            'transactions': transactions,
+            'transactionsRoot': _hash('transactions', number),
+            'uncles': [],
+        }
+
+    def find_tx(self, tx_hash):
+        """Return (block number, index) for a transaction hash, or None."""
+        try:
+            number, index = int(tx_hash[-16:-4], 16), int(tx_hash[-4:], 16)
+        except ValueError:
+            return None
+        if (
+            number > self.head
+            or index >= self.tx_count(number)
+            or self.tx_hash(number, index) != tx_hash
+        ):
+            return None
+        return (number, index)
+
+    def transaction(self, number, index):
+        return {
+            'blockHash': self.block_hash(number),
+            'blockNumber': hex(number),
+            'from': ACCOUNTS[index % len(ACCOUNTS)],
+            'gas': hex(21000),
+            'gasPrice': hex(10**9 + number),
+            'hash': self.tx_hash(number, index),
+            'input': '0x',
+            'nonce': hex(number),
+            'r': _hash('r', number, index),
+            's': _hash('s', number, index),
+            'to': ACCOUNTS[(index + 1) % len(ACCOUNTS)],
+            'transactionIndex': hex(index),
+            'type': '0x0',
+            'v': '0x1b',
+            'value': hex(10**18),
+        }
+
+    def receipt(self, number, index):
+        return {
+            'blockHash': self.block_hash(number),
+            'blockNumber': hex(number),
+            'contractAddress': None,
+            'cumulativeGasUsed': hex(21000 * (index + 1)),
+            'effectiveGasPrice': hex(10**9 + number),
+            'from': ACCOUNTS[index % len(ACCOUNTS)],
+            'gasUsed': hex(21000),
+            'logs': self.logs(number, index),
+            'logsBloom': _bloom(self.logs(number, index)),
+            'status': '0x1',
+            'to': ACCOUNTS[(index + 1) % len(ACCOUNTS)],
+            'transactionHash': self.tx_hash(number, index),
+            'transactionIndex': hex(index),
+            'type': '0x0',
+        }
+
+    def block_number(self, block_id):
+        if block_id in ['latest', 'pending', 'safe', 'finalized']:
+            return self.head
+        if block_id == 'earliest':
+            return 0
+        return int(block_id, 16)
+
+    def dispatch(self, method, params):
+        """Return the result for a JSON-RPC method, or raise KeyError."""
+        if method == 'eth_getBlockByNumber':
+            return self.block(self.block_number(params[0]), params[1])
+        if method == 'eth_getBlockByHash':
+            number = int(params[0][-16:], 16)
+            if number > self.head or self.block_hash(number) != params[0]:
+                return None
+            return self.block(number, params[1])
+        if method == 'eth_getTransactionByHash':
+            found = self.find_tx(params[0])
+            return self.transaction(*found) if found else None
+        if method == 'eth_getTransactionReceipt':
+            found = self.find_tx(params[0])
+            return self.receipt(*found) if found else None
+        if method == 'eth_newBlockFilter':
+            filter_id = hex(len(self.filters) + 1)
+            self.filters[filter_id] = len(self.new_heads)
+            return filter_id
+        if method == 'eth_getFilterChanges':
+            if params[0] not in self.filters:
+                raise ValueError('filter not found')
+            seen, self.filters[params[0]] = (self.filters[params[0]],
+                                             len(self.new_heads))
+            return self.new_heads[seen:]
+        if method == 'eth_getBlockReceipts' and self.block_receipts:
+            number = self.block_number(params[0])
+            return [
+                self.receipt(number, i) for i in range(self.tx_count(number))
+            ]
+        static = {
+            'eth_accounts': ACCOUNTS,
+            'eth_blockNumber': hex(self.head),
+            'eth_chainId': hex(CHAIN_ID),
+            'eth_coinbase': ZERO_ADDRESS,
+            'eth_gasPrice': hex(10**9),
+            'eth_getBalance': hex(10**20),
+            'eth_getTransactionCount': '0x0',
+            'eth_hashrate': '0x0',
+            'eth_mining': False,
+            'eth_protocolVersion': '0x41',
+            'eth_syncing': False,
+            'net_listening': True,
+            'net_peerCount': '0x0',
+            'net_version': str(CHAIN_ID),
+            'web3_clientVersion': 'standin/v1.0.0',
+        }
+        return static[method]
+
+    def handle(self, request):
+        """Return the JSON-RPC response for one request object."""
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        try:
+            response['result'] = self.dispatch(request['method'],
+                                               request.get('params', []))
+        except KeyError:
+            response['error'] = {
+                'code': -32601,
+                'message': f"the method {request.get('method')} "
+                           "does not exist/is not available",
+            }
+        except ValueError as err:
+            response['error'] = {'code': -32000, 'message': str(err)}
+        return response
+
+    def handle_payload(self, payload):
+        """Handle a single request object or a batch array."""
+        if isinstance(payload, list):
+            return [self.handle(request) for request in payload]
+        return self.handle(payload)
+
+
+class StandinCounters(object):
+    """Serve JSON-RPC payloads, counting connections and requests."""
+
+    def init_counters(self, chain, latency):
+        self.chain = chain
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def count_connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def respond(self, payload):
+        """Return the encoded response to a decoded request payload."""
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps(self.chain.handle_payload(payload)).encode()
+        with self.lock:
+            self.in_flight -= 1
+        return body
+
+
+class StandinHTTPServer(StandinCounters, ThreadingHTTPServer):
+    """Threaded HTTP server that counts connections and requests."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, chain, latency=0.0, rate_limit=0):
+        super().__init__(address, StandinHTTPHandler)
+        self.init_counters(chain, latency)
+        # Like a hosted endpoint, answer HTTP 429 to calls beyond
+        # ``rate_limit`` per second (counting each call in a batch),
+        # allowing bursts of up to ``rate_limit`` calls.
+        self.rate_limit = rate_limit
+        self.allowance = float(rate_limit)
+        self.allowance_updated = time.monotonic()
+        self.throttled = 0
+
+    def admit(self, payload):
+        """Return ``False`` if the payload is over the rate limit."""
+        if not self.rate_limit:
+            return True
+        calls = len(payload) if isinstance(payload, list) else 1
+        with self.lock:
+            now = time.monotonic()
+            self.allowance = min(
+                self.rate_limit,
+                self.allowance
+                + (now - self.allowance_updated) * self.rate_limit)
+            self.allowance_updated = now
+            if calls > self.allowance:
+                self.throttled += 1
+                return False
+            self.allowance -= calls
+            return True
+
+    def process_request(self, request, client_address):
+        self.count_connection()
+        super().process_request(request, client_address)
+
+
+class StandinHTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length))
+        if not self.server.admit(payload):
+            self.send_response(429)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = self.server.respond(payload)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandinIPCServer(StandinCounters,
+                       socketserver.ThreadingUnixStreamServer):
+    """Threaded Unix socket server speaking JSON-RPC like geth's IPC."""
+
+    daemon_threads = True
+
+    def __init__(self, path, chain, latency=0.0):
+        super().__init__(path, StandinIPCHandler)
+        self.init_counters(chain, latency)
+
+    def process_request(self, request, client_address):
+        self.count_connection()
+        super().process_request(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.server_address)
+
+
+class StandinIPCHandler(socketserver.BaseRequestHandler):
+    """Answer each JSON value written to the socket, in order."""
+
+    def handle(self):
+        decoder = json.JSONDecoder()
+        buffer = ''
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            buffer += data.decode('utf-8')
+            while buffer.strip():
+                buffer = buffer.lstrip()
+                try:
+                    payload, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    break
+                buffer = buffer[end:]
+                self.request.sendall(self.server.respond(payload))
+
+
+class StandinWSServer(StandinCounters):
+    """WebSocket server, running its own event loop in a thread."""
+
+    def __init__(self, port, chain, latency=0.0):
+        import asyncio
+        self.init_counters(chain, latency)
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(self.start(port))
+        self.server_address = self.server.sockets[0].getsockname()
+
+    async def start(self, port):
+        import websockets
+        return await websockets.serve(self.handle, '127.0.0.1', port)
+
+    async def handle(self, websocket, path):
+        self.count_connection()
+        notifier = None
+        try:
+            async for message in websocket:
+                payload = json.loads(message)
+                if (
+                    isinstance(payload, dict)
+                    and payload.get('method') == 'eth_subscribe'
+                    and payload.get('params') == ['newHeads']
+                    and notifier is None
+                ):
+                    # Heads added once the client has the reply are new.
+                    seen = len(self.chain.new_heads)
+                    await websocket.send(json.dumps({
+                        'jsonrpc': '2.0', 'id': payload.get('id'),
+                        'result': '0x1'}))
+                    notifier = self.loop.create_task(
+                        self.notify_new_heads(websocket, '0x1', seen))
+                    continue
+                body = await self.loop.run_in_executor(
+                    None, self.respond, payload)
+                await websocket.send(body.decode('utf-8'))
+        finally:
+            if notifier is not None:
+                notifier.cancel()
+
+    async def notify_new_heads(self, websocket, subscription, seen):
+        """Send a notification for each new head after the first ``seen``."""
+        import asyncio
+        while True:
+            await asyncio.sleep(0.01)
+            new_heads = self.chain.new_heads[seen:]
+            seen += len(new_heads)
+            for block_hash in new_heads:
+                header = self.chain.block(int(block_hash[-16:], 16))
+                header.pop('transactions')
+                await websocket.send(json.dumps({
+                    'jsonrpc': '2.0',
+                    'method': 'eth_subscription',
+                    'params': {'subscription': subscription,
+                               'result': dict(header, hash=block_hash)},
+                }))
+
+    def serve_forever(self):
+        self.loop.run_forever()
+
+    def shutdown(self):
+        import asyncio
+
+        async def close():
+            self.server.close()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def server_close(self):
+        pass
+
+
+def _serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def serve_http(port=0, latency=0.0, chain=None, rate_limit=0):
+    """Start an HTTP stand-in node in a thread and return (server, url)."""
+    server = _serve(StandinHTTPServer(('127.0.0.1', port),
+                                      chain or StandinChain(),
+                                      latency=latency,
+                                      rate_limit=rate_limit))
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def serve_ipc(path, latency=0.0, chain=None):
+    """Start an IPC stand-in node in a thread and return (server, path)."""
+    server = _serve(StandinIPCServer(path,
+                                     chain or StandinChain(),
+                                     latency=latency))
+    return server, path
+
+
+def serve_ws(port=0, latency=0.0, chain=None):
+    """Start a WebSocket stand-in node in a thread; return (server, url)."""
+    server = _serve(StandinWSServer(port,
+                                    chain or StandinChain(),
+                                    latency=latency))
+    return server, f'ws://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--port', type=int, default=8545,
+                        help='HTTP port (or 0 to not serve HTTP)')
+    parser.add_argument('--ws-port', type=int, default=None,
+                        help='WebSocket port')
+    parser.add_argument('--ipc-path', default=None,
+                        help='IPC socket path')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds of simulated latency per request')
+    parser.add_argument('--head', type=int, default=HEAD,
+                        help='Number of the latest block')
+    parser.add_argument('--rate-limit', type=int, default=0,
+                        help='HTTP calls per second before answering 429')
+    args = parser.parse_args()
+    chain = StandinChain(head=args.head)
+    servers = []
+    if args.port:
+        servers.append(serve_http(port=args.port, latency=args.latency,
+                                  chain=chain, rate_limit=args.rate_limit))
+    if args.ws_port is not None:
+        servers.append(serve_ws(port=args.ws_port, latency=args.latency,
+                                chain=chain))
+    if args.ipc_path is not None:
+        servers.append(serve_ipc(args.ipc_path, latency=args.latency,
+                                 chain=chain))
+    for server, url in servers:
+        print(f'[+] stand-in node serving on {url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server, url in servers:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+test_aio
+--------
+
+Tests for the concurrent JSON-RPC engine.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ether_py.utils import (  # noqa
+    block_request,
+    to_int,
+)
+from ether_py.utils.aio import AsyncEngine  # noqa
+from ether_py.utils.endpoint import EndpointConnectionError  # noqa
+from ether_py.utils.transport import get_transport_settings  # noqa
+from standin_node import serve_http  # noqa
+
+
+class Test_AsyncEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.server, self.url = serve_http(latency=0.01)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_results_in_order_and_bounded(self):
+        engine = AsyncEngine(self.url, concurrency=4)
+        numbers = list(range(50, 0, -1))
+        blocks = [
+            call.result()
+            for call in engine.imap([block_request(n) for n in numbers])
+        ]
+        self.assertEqual([to_int(b['number']) for b in blocks], numbers)
+        self.assertEqual(self.server.max_in_flight, 4)
+
+    def test_batches(self):
+        engine = AsyncEngine(self.url, concurrency=2)
+        requests = [('eth_chainId', [])] * 25
+        results = [
+            call.result()
+            for call in engine.imap(requests, formatter=to_int, batch_size=10)
+        ]
+        self.assertEqual(results, [1337] * 25)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_window_backpressure(self):
+        engine = AsyncEngine(self.url, concurrency=2)
+        requests = (block_request(n) for n in range(10**7))
+        calls = engine.imap(requests, batch_size=2, window=10)
+        for _ in range(5):
+            next(calls)
+        calls.close()
+        # No more than the window is requested ahead of the consumer.
+        self.assertLessEqual(self.server.requests, (5 + 10) // 2 + 1)
+
+    def test_errors_and_missing(self):
+        engine = AsyncEngine(self.url)
+        calls = list(engine.imap([
+            block_request(10**9),
+            ('eth_bogus', []),
+        ]))
+        self.assertIsNone(calls[0].result())
+        with self.assertRaises(ValueError):
+            calls[1].result()
+
+    def test_connection_error(self):
+        settings = get_transport_settings()
+        settings['retries'] = 0
+        self.server.shutdown()
+        self.server.server_close()
+        engine = AsyncEngine(self.url, settings=settings)
+        with self.assertRaises(EndpointConnectionError):
+            list(engine.imap([block_request(1)]))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""
+test_batch
+----------
+
+Tests for running many commands in one process with ``batch``.
+"""
+
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ether_py.__main__ import Ether_pyApp  # noqa
+from ether_py.utils import ordered_map  # noqa
+from standin_node import (  # noqa
+    StandinChain,
+    serve_http,
+)
+
+
+class Test_Batch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        patcher = mock.patch.dict(
+            os.environ, {'ETHERPY_CACHE_DIR': self.tmpdir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.serve()
+
+    def serve(self, latency=0.0):
+        self.server, self.url = serve_http(chain=StandinChain(head=100),
+                                           latency=latency)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def batch(self, lines, *args):
+        path = os.path.join(self.tmpdir.name, 'commands.txt')
+        with open(path, 'w') as f_out:
+            f_out.write('\n'.join(lines) + '\n')
+        stdout = io.StringIO()
+        app = Ether_pyApp(stdout=stdout, stderr=io.StringIO())
+        result = app.run([
+            '-q',
+            '-D', os.path.join(self.tmpdir.name, 'data'),
+            '--endpoint-uri', self.url,
+            'batch', path, '-f', 'csv',
+        ] + list(args))
+        self.assertEqual(result, 0)
+        return list(csv.DictReader(io.StringIO(stdout.getvalue())))
+
+    def test_rows_in_input_order(self):
+        numbers = list(range(20, 60))
+        rows = self.batch(
+            [f'block show {n} -c number -c gasUsed' for n in numbers],
+            '-j', '8')
+        self.assertEqual(
+            [(row['row'], row['field']) for row in rows],
+            [(str(row), field)
+             for row in range(1, len(numbers) + 1)
+             for field in ['number', 'gasUsed']])
+        self.assertEqual([row['value'] for row in rows[0::2]],
+                         [str(n) for n in numbers])
+
+    def test_failing_row(self):
+        rows = self.batch([
+            '# comment',
+            'block show 5 -c number',
+            'block show 5 -c nosuchcolumn',
+            'no such command',
+            '',
+            'block show 6 8 -c number',
+        ])
+        self.assertEqual(rows[0]['value'], '5')
+        self.assertEqual((rows[1]['row'], rows[1]['field']), ('3', 'error'))
+        self.assertIn('No recognized column names', rows[1]['value'])
+        self.assertEqual((rows[2]['row'], rows[2]['field']), ('4', 'error'))
+        # The rows after the failing ones still run, with one item for
+        # each block.
+        self.assertEqual(
+            [(row['row'], row['item'], row['value']) for row in rows[3:]],
+            [('6', '0', '6'), ('6', '1', '8')])
+
+    def test_captured_output(self):
+        rows = self.batch([
+            'block get 20..29 number',
+            'block show 5 -c number',
+            'block get 30..39 number',
+            'block get nope',
+        ], '-j', '4')
+        self.assertEqual(
+            [(row['row'], row['field'], row['value']) for row in rows],
+            [('1', 'output', f'{{"number":{n}}}') for n in range(20, 30)]
+            + [('1', 'result', '0'), ('2', 'number', '5')]
+            + [('3', 'output', f'{{"number":{n}}}') for n in range(30, 40)]
+            + [('3', 'result', '0')]
+            + [('4', 'error', "[-] 'nope' is not a block range "
+                "(e.g., '1000000..1010000' or '1000000..latest')")])
+
+    def test_jobs_run_concurrently(self):
+        self.serve(latency=0.2)
+        lines = [f'block show {n} -c number' for n in range(90, 98)]
+        start = time.perf_counter()
+        self.batch(lines, '-j', '1')
+        serial = time.perf_counter() - start
+        start = time.perf_counter()
+        rows = self.batch(lines, '-j', '8')
+        concurrent = time.perf_counter() - start
+        self.assertEqual([row['value'] for row in rows],
+                         [str(n) for n in range(90, 98)])
+        self.assertLess(concurrent, serial / 2)
+
+
+class Test_OrderedMap(unittest.TestCase):
+
+    def test_order_and_errors(self):
+        def work(n):
+            time.sleep(0.01 * (n % 3))
+            if n == 7:
+                raise ValueError(n)
+            return n * n
+
+        results = ordered_map(work, range(20), workers=4)
+        self.assertEqual([next(results) for _ in range(7)],
+                         [n * n for n in range(7)])
+        with self.assertRaises(ValueError):
+            next(results)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
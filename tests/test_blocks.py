@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+"""
+test_blocks
+-----------
+
+Tests for block range parsing and streamed block output.
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ether_py.__main__ import Ether_pyApp  # noqa
+from ether_py.block.get import BlockGet  # noqa
+from ether_py.block.show import field_columns  # noqa
+from ether_py.utils import parse_block_range  # noqa
+from ether_py.utils.display import RecordWriter  # noqa
+from ether_py.utils.transactions import record_columns  # noqa
+from standin_node import (  # noqa
+    StandinChain,
+    serve_http,
+)
+
+
+class Test_BlockRange(unittest.TestCase):
+
+    def test_parse_block_range(self):
+        self.assertEqual(parse_block_range('1000000..1010000'),
+                         (1000000, 1010000))
+        self.assertEqual(parse_block_range('15'), (15, 15))
+        self.assertEqual(parse_block_range('15..'), (15, 'latest'))
+        self.assertEqual(parse_block_range('15..latest'), (15, 'latest'))
+        for value in ['latest', '..15', '15..13', '0x10..0x20', '1...3']:
+            with self.assertRaises(ValueError):
+                parse_block_range(value)
+
+
+class Test_RecordWriter(unittest.TestCase):
+
+    def test_ndjson(self):
+        stream = io.StringIO()
+        writer = RecordWriter(stream)
+        writer.write({'number': 1, 'hash': b'\x01\x02'})
+        writer.write({'number': 2, 'transactions': [b'\xff']})
+        self.assertEqual(stream.getvalue(),
+                         '{"number":1,"hash":"0x0102"}\n'
+                         '{"number":2,"transactions":["0xff"]}\n')
+
+    def test_csv(self):
+        stream = io.StringIO()
+        writer = RecordWriter(stream, fmt='csv',
+                              columns=['number', 'uncles'])
+        writer.write({'number': 1, 'uncles': []})
+        writer.write({'number': 2, 'uncles': [b'\xff'], 'extra': 1})
+        writer.write({'uncles': None})
+        self.assertEqual(stream.getvalue(),
+                         'number,uncles\n1,[]\n2,"[""0xff""]"\n,\n')
+        with self.assertRaises(ValueError):
+            RecordWriter(stream, fmt='yaml')
+
+    def test_csv_header_from_first_record(self):
+        stream = io.StringIO()
+        writer = RecordWriter(stream, fmt='csv')
+        writer.write({'number': 1, 'uncles': []})
+        writer.write({'uncles': None})
+        self.assertEqual(stream.getvalue(), 'number,uncles\n1,[]\n,\n')
+        with self.assertRaises(ValueError):
+            writer.write({'number': 2, 'maxFeePerGas': 1})
+
+
+class Test_BlockColumns(unittest.TestCase):
+
+    def test_columns(self):
+        columns = record_columns(full_transactions=True, receipts=True)
+        self.assertEqual(columns[:2], ['hash', 'nonce'])
+        for column in ['maxFeePerGas', 'status', 'blockTimestamp',
+                       'blockBaseFeePerGas']:
+            self.assertIn(column, columns)
+        self.assertEqual(len(columns), len(set(columns)))
+        self.assertNotIn('blockTransactions', columns)
+        self.assertEqual(field_columns([], columns), columns)
+        self.assertEqual(
+            field_columns(['GASUSED', 'number', 'bogus', 'gasused'],
+                          record_columns()),
+            ['gasUsed', 'number', 'bogus'])
+        self.assertEqual(
+            BlockGet.select({'gasUsed': 1, 'number': 2}, ['GASUSED']),
+            {'gasUsed': 1})
+
+
+class Test_BlockShow(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        patcher = mock.patch.dict(
+            os.environ, {'ETHERPY_CACHE_DIR': self.tmpdir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.chain = StandinChain(head=100)
+        self.server, self.url = serve_http(chain=self.chain)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def show(self, *args):
+        stdout = io.StringIO()
+        app = Ether_pyApp(stdout=stdout, stderr=io.StringIO())
+        result = app.run([
+            '-q',
+            '-D', os.path.join(self.tmpdir.name, 'data'),
+            '--endpoint-uri', self.url,
+            'block', 'show',
+        ] + list(args))
+        return (result, stdout.getvalue())
+
+    def test_rows(self):
+        result, stdout = self.show('5', '6', 'gasused', 'NUMBER',
+                                   'withdrawals', '-f', 'csv')
+        self.assertEqual(result, 0)
+        self.assertEqual(list(csv.reader(io.StringIO(stdout))), [
+            ['gasUsed', 'number', 'withdrawals'],
+            [str(21000 * self.chain.tx_count(5)), '5', ''],
+            [str(21000 * self.chain.tx_count(6)), '6', ''],
+        ])
+
+    def test_transactions_are_one_document(self):
+        result, stdout = self.show('--full-transactions', '5', '6',
+                                   '-f', 'json')
+        self.assertEqual(result, 0)
+        rows = json.loads(stdout)
+        self.assertEqual(
+            [row['hash'] for row in rows],
+            [self.chain.tx_hash(number, index)
+             for number in [5, 6]
+             for index in range(self.chain.tx_count(number))])
+        self.assertEqual({len(row) for row in rows},
+                         {len(record_columns(full_transactions=True))})
+
+    def test_receipts_are_rows(self):
+        result, stdout = self.show('--receipts', '5', '6', 'hash',
+                                   'status', 'blockTimestamp', '-f', 'csv')
+        self.assertEqual(result, 0)
+        rows = list(csv.DictReader(io.StringIO(stdout)))
+        self.assertEqual(
+            [(row['hash'], row['status']) for row in rows],
+            [(self.chain.tx_hash(number, index), '1')
+             for number in [5, 6]
+             for index in range(self.chain.tx_count(number))])
+        self.assertEqual(len({row['blockTimestamp'] for row in rows}), 2)
+
+    def test_missing_blocks_reported_last(self):
+        stdout = io.StringIO()
+        with self.assertRaises(SystemExit) as exit:
+            Ether_pyApp(stdout=stdout, stderr=io.StringIO()).run([
+                '-q',
+                '-D', os.path.join(self.tmpdir.name, 'data'),
+                '--endpoint-uri', self.url,
+                'block', 'show', '5', '1000', '0xzz', '6', 'number',
+                '-f', 'value',
+            ])
+        # The blocks found are shown before the others are reported.
+        self.assertEqual(stdout.getvalue(), '5\n6\n')
+        self.assertEqual(exit.exception.code.splitlines(), [
+            "[-] not a block number, hash, or tag: '0xzz'",
+            "[-] block with id '1000' not found",
+        ])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+test_blockstats
+---------------
+
+Tests for statistics over columns of block header values.
+"""
+
+import unittest
+
+import numpy as np
+
+from ether_py.utils.blockstats import (
+    derive_metrics,
+    histogram,
+    rolling,
+    select_range,
+    summarize,
+)
+
+
+class Test_BlockStats(unittest.TestCase):
+
+    def setUp(self):
+        count = 10
+        self.arrays = {
+            'number': np.arange(100, 100 + count, dtype=np.uint64),
+            'timestamp': np.arange(count, dtype=np.uint64) * 12 + 1000,
+            'gasUsed': np.arange(count, dtype=np.uint64) * 1000,
+            'gasLimit': np.full(count, 10000, dtype=np.uint64),
+            'size': np.full(count, 500, dtype=np.uint64),
+            # No base fee before the fifth block.
+            'baseFeePerGas': np.array([0] * 5 + [2 * 10**9] * 5,
+                                      dtype=np.uint64),
+            'txCount': np.arange(count, dtype=np.uint32),
+        }
+
+    def test_derive_metrics(self):
+        metrics = derive_metrics(self.arrays)
+        self.assertEqual(len(metrics['block_time']), 9)
+        self.assertTrue((metrics['block_time'] == 12).all())
+        self.assertAlmostEqual(metrics['gas_utilization'][9], 0.9)
+        self.assertEqual(list(metrics['base_fee_gwei']), [2.0] * 5)
+
+    def test_summarize(self):
+        columns, rows = summarize(derive_metrics(self.arrays),
+                                  percentiles=[50])
+        self.assertEqual(columns, ['metric', 'count', 'mean', 'std',
+                                   'min', 'p50', 'max'])
+        row = dict(zip(columns, rows[3]))
+        self.assertEqual(row['metric'], 'tx_count')
+        self.assertEqual(row['count'], 10)
+        self.assertAlmostEqual(row['mean'], 4.5)
+        self.assertEqual((row['min'], row['p50'], row['max']),
+                         (0.0, 4.5, 9.0))
+        empty = {'base_fee_gwei': np.array([])}
+        _, rows = summarize(empty, percentiles=[50])
+        self.assertEqual(rows, [['base_fee_gwei', 0, None, None, None,
+                                 None, None]])
+
+    def test_histogram(self):
+        columns, rows = histogram(self.arrays['txCount'], bins=2)
+        self.assertEqual(columns, ['low', 'high', 'count', 'percent'])
+        self.assertEqual([row[2] for row in rows], [5, 5])
+        self.assertEqual([row[3] for row in rows], [50.0, 50.0])
+
+    def test_rolling(self):
+        columns, rows = rolling(self.arrays, 4, step=3)
+        self.assertEqual(len(rows), 3)
+        first = dict(zip(columns, rows[0]))
+        self.assertEqual((first['first_block'], first['last_block']),
+                         (100, 103))
+        self.assertAlmostEqual(first['gas_utilization'], 0.15)
+        self.assertAlmostEqual(first['block_time'], 12.0)
+        self.assertAlmostEqual(first['tx_count'], 1.5)
+        # No block in the first window has a base fee.
+        self.assertIsNone(first['base_fee_gwei'])
+        self.assertAlmostEqual(dict(zip(columns, rows[2]))['base_fee_gwei'],
+                               2.0)
+        self.assertEqual(rolling(self.arrays, 11), (columns, []))
+
+    def test_select_range(self):
+        arrays = select_range(self.arrays, 102, 104)
+        self.assertEqual(list(arrays['number']), [102, 103, 104])
+        self.assertEqual(list(arrays['txCount']), [2, 3, 4])
+        self.assertIs(select_range(self.arrays), self.arrays)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
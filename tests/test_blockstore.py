@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+"""
+test_blockstore
+---------------
+
+Tests for the local block store.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ether_py.utils import ordered_map  # noqa
+from ether_py.utils.aio import AsyncEngine  # noqa
+from ether_py.utils.blockstore import (  # noqa
+    BlockFetcher,
+    BlockStore,
+    header_hash,
+)
+from standin_node import (  # noqa
+    StandinChain,
+    serve_http,
+)
+
+# Ethereum mainnet's genesis block.
+GENESIS = {
+    'parentHash': '0x' + '00' * 32,
+    'sha3Uncles': (
+        '0x1dcc4de8dec75d7aab85b567b6ccd41ad312451b948a7413f0a142fd40d49347'),
+    'miner': '0x' + '00' * 20,
+    'stateRoot': (
+        '0xd7f8974fb5ac78d9ac099b9ad5018bedc2ce0a72dad1827a1709da30580f0544'),
+    'transactionsRoot': (
+        '0x56e81f171bcc55a6ff8345e692c0f86e5b48e01b996cadc001622fb5e363b421'),
+    'receiptsRoot': (
+        '0x56e81f171bcc55a6ff8345e692c0f86e5b48e01b996cadc001622fb5e363b421'),
+    'logsBloom': '0x' + '00' * 256,
+    'difficulty': '0x400000000',
+    'number': '0x0',
+    'gasLimit': '0x1388',
+    'gasUsed': '0x0',
+    'timestamp': '0x0',
+    'extraData': (
+        '0x11bbe8db4e347b4e8c937c1c8370e4b5ed33adb3db69cbdb7a38e1e50b1b82fa'),
+    'mixHash': '0x' + '00' * 32,
+    'nonce': '0x0000000000000042',
+    'hash': (
+        '0xd4e56740f876aef8c010b86a40d5f56745a118d0906a34e69aec8c0db1cb8fa3'),
+}
+
+
+class Test_BlockStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'blocks', 'chain-1.sqlite3')
+        self.chain = StandinChain(head=100)
+        self.store = BlockStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_put_and_get(self):
+        for number in range(10):
+            self.store.put(self.chain.block(number))
+        block = self.chain.block(5)
+        self.assertEqual(self.store.get(5), block)
+        self.assertEqual(self.store.get(block['hash']), block)
+        self.assertTrue(self.store.contains('5'))
+        self.assertFalse(self.store.contains(10))
+        self.assertIsNone(self.store.get(10))
+        self.assertEqual([n for n, _ in self.store.iter_range(3, 20)],
+                         list(range(3, 10)))
+        # Storing a block again doesn't count it twice.
+        self.store.put(block)
+        stats = self.store.stats()
+        self.assertEqual((stats['blocks'], stats['first_block'],
+                          stats['last_block'], stats['missing_blocks']),
+                         (10, 0, 9, 0))
+        self.assertGreater(stats['compression_ratio'], 1)
+
+    def test_evict_least_recently_used(self):
+        for number in range(50):
+            self.store.put(self.chain.block(number))
+        self.store.db.execute('UPDATE blocks SET accessed = number')
+        self.store.get(0)
+        size = self.store.stats()['stored_bytes']
+        deleted = self.store.evict(max_size=size / 2 / 2**20)
+        self.assertGreater(deleted, 25)
+        self.assertLessEqual(self.store.stats()['stored_bytes'], size / 2)
+        # The block just used and the most recently stored ones are kept.
+        self.assertTrue(self.store.contains(0))
+        self.assertTrue(self.store.contains(49))
+        self.assertFalse(self.store.contains(1))
+        self.assertEqual(self.store.delete_range(0, 100), 50 - deleted)
+        self.assertEqual(self.store.stats()['blocks'], 0)
+
+    def test_verify(self):
+        for number in range(5):
+            self.store.put(self.chain.block(number))
+        self.assertEqual(list(self.store.verify()), [])
+        bad = dict(self.chain.block(3), parentHash='0x' + '11' * 32)
+        self.store.put(bad)
+        self.store.db.execute('UPDATE blocks SET data = ? WHERE number = 1',
+                              (b'garbage',))
+        problems = {number: problem
+                    for number, _, problem in self.store.verify()}
+        self.assertEqual(sorted(problems), [1, 3])
+        self.assertIn('cannot decode', problems[1])
+        self.assertIn('parent hash', problems[3])
+
+    def test_receipts_and_missing(self):
+        for number in [0, 1, 2, 5, 6, 9]:
+            self.store.put(self.chain.block(number))
+        self.assertEqual(self.store.missing(0, 10),
+                         [(3, 4), (7, 8), (10, 10)])
+        receipts = [self.chain.receipt(2, i) for i in range(2)]
+        self.store.put_receipts(2, receipts)
+        self.store.put_receipts(5, [])
+        self.assertEqual(self.store.get_receipts(2), receipts)
+        self.assertEqual(self.store.missing(2, 5, receipts=True), [(3, 4)])
+        self.assertEqual(self.store.stats()['blocks_with_receipts'], 2)
+        # Receipts go away with their block, or when it is replaced.
+        self.store.delete([2])
+        self.assertIsNone(self.store.get_receipts(2))
+        self.store.put(dict(self.chain.block(5), hash='0x' + '55' * 32))
+        self.assertIsNone(self.store.get_receipts(5))
+
+    def test_tx_receipts(self):
+        receipts = [self.chain.receipt(n, 1) for n in [3, 4]]
+        for receipt in receipts:
+            self.store.put_tx_receipt(receipt)
+        self.store.put_tx_receipt(receipts[0])
+        tx_hashes = [r['transactionHash'] for r in receipts]
+        missing = self.chain.tx_hash(5, 0)
+        self.assertEqual(self.store.get_tx_receipts(tx_hashes + [missing]),
+                         dict(zip(tx_hashes, receipts)))
+        self.assertEqual(self.store.stats()['tx_receipts'], 2)
+        # A receipt from a block that was replaced is not used.
+        self.store.put(dict(self.chain.block(4), hash='0x' + '44' * 32))
+        self.assertEqual(list(self.store.get_tx_receipts(tx_hashes)),
+                         tx_hashes[:1])
+        # Receipts are evicted along with blocks, and deleted with the
+        # range of blocks they are in.
+        self.assertEqual(self.store.evict(max_size=0), 3)
+        self.store.put_tx_receipt(receipts[1])
+        self.assertEqual(self.store.delete_range(0, 10), 1)
+        self.assertEqual(self.store.stats()['stored_bytes'], 0)
+
+    def test_threads(self):
+        def use(number):
+            self.store.put(self.chain.block(number))
+            self.store.put_tx_receipt(self.chain.receipt(number, 0))
+            self.assertTrue(self.store.contains(number))
+            self.store.get(max(number - 1, 0))
+            self.store.get_tx_receipts([self.chain.tx_hash(number, 0)])
+            return int(self.store.get(number)['number'], 16)
+
+        numbers = [n for n in range(1, 101) if self.chain.tx_count(n)]
+        self.assertEqual(list(ordered_map(use, numbers, workers=8)),
+                         numbers)
+        self.assertEqual([n for n, _ in self.store.iter_range(0, 1000)],
+                         numbers)
+        stats = self.store.stats()
+        self.assertEqual((stats['blocks'], stats['tx_receipts']),
+                         (len(numbers), len(numbers)))
+        # The store is closed by another thread than the ones that used
+        # it (as ``clean_up()`` does after ``batch``).
+        self.store.close()
+        with BlockStore(self.path) as store:
+            self.assertEqual(store.stats()['blocks'], len(numbers))
+
+    def test_header_hash(self):
+        self.assertEqual(header_hash(GENESIS), GENESIS['hash'])
+        self.store.put(GENESIS)
+        self.assertEqual(list(self.store.verify(check_hashes=True)), [])
+
+
+class Test_BlockFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.server, url = serve_http(chain=StandinChain(head=100))
+        self.engine = AsyncEngine(url, concurrency=4)
+        self.store = BlockStore(os.path.join(self.tmpdir, 'chain.sqlite3'))
+
+    def tearDown(self):
+        self.store.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def fetch(self, block_ids):
+        fetcher = BlockFetcher(self.engine, self.store, finality_depth=10,
+                               batch_size=5)
+        return [
+            None if block is None else int(block['number'], 16)
+            for block in fetcher.imap(block_ids, window=10)
+        ]
+
+    def test_stores_final_blocks(self):
+        numbers = list(range(80, 101))
+        self.assertEqual(self.fetch(numbers), numbers)
+        stats = self.store.stats()
+        self.assertEqual((stats['first_block'], stats['last_block']),
+                         (80, 90))
+        requests = self.server.requests
+        # Stored blocks are read back in order, mixed with fetched ones
+        # (including missing ones), and a hash and a tag.
+        block_ids = (
+            [self.store.get(85)['hash'], 'latest', 200]
+            + list(range(95, 75, -1))
+        )
+        self.assertEqual(self.fetch(block_ids),
+                         [85, 100, None] + list(range(95, 75, -1)))
+        self.assertEqual(self.store.stats()['first_block'], 76)
+        # Only unstored blocks (and the head) were requested.
+        self.server.requests = requests
+        self.assertEqual(self.fetch(range(76, 91)), list(range(76, 91)))
+        self.assertEqual(self.server.requests, requests)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+"""
+test_bloom
+----------
+
+Tests for testing block header blooms for log addresses and topics.
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ether_py.__main__ import Ether_pyApp  # noqa
+from ether_py.utils.bloom import (  # noqa
+    BloomQuery,
+    LogScan,
+)
+from standin_node import (  # noqa
+    TOKEN,
+    TRANSFER_TOPIC,
+    StandinChain,
+    serve_http,
+)
+
+OTHER = '0x' + '11' * 20
+
+
+class LaggingReceiptsChain(StandinChain):
+    """
+    A chain served by a node without ``eth_getBlockReceipts`` that
+    doesn't have a receipt the first ``lag`` times it is asked for it.
+    """
+
+    def __init__(self, lag=1, **kwargs):
+        super().__init__(block_receipts=False, **kwargs)
+        self.lag = lag
+        self.asked = {}
+
+    def dispatch(self, method, params):
+        if method == 'eth_getTransactionReceipt':
+            self.asked[params[0]] = self.asked.get(params[0], 0) + 1
+            if self.asked[params[0]] <= self.lag:
+                return None
+        return super().dispatch(method, params)
+
+
+class Test_Bloom(unittest.TestCase):
+
+    def setUp(self):
+        self.chain = StandinChain(head=100)
+        self.numbers = np.arange(40, dtype=np.uint64)
+        self.blooms = np.array(
+            [
+                bytes.fromhex(self.chain.block(n)['logsBloom'][2:])
+                for n in range(40)
+            ],
+            dtype='S256')
+
+    def test_matches(self):
+        # Only every fourth block has a transfer log.
+        expected = self.numbers % 4 == 3
+        for query in [
+            BloomQuery([TOKEN]),
+            BloomQuery(topics=[TRANSFER_TOPIC]),
+            BloomQuery([OTHER, TOKEN.upper().replace('0X', '0x')],
+                       [TRANSFER_TOPIC]),
+        ]:
+            self.assertEqual(list(query.matches(self.blooms)),
+                             list(expected))
+        self.assertFalse(BloomQuery([OTHER]).matches(self.blooms).any())
+        self.assertFalse(
+            BloomQuery([TOKEN], ['0x' + '22' * 32]).matches(self.blooms).any())
+        # Rows of bytes work as well as fixed size bytes.
+        rows = np.frombuffer(self.blooms.tobytes(), dtype=np.uint8)
+        self.assertEqual(list(BloomQuery([TOKEN]).matches(rows)),
+                         list(expected))
+
+    def test_bad_values(self):
+        with self.assertRaises(ValueError):
+            BloomQuery(['0x1234'])
+        with self.assertRaises(ValueError):
+            BloomQuery(topics=['0x' + 'zz' * 32])
+
+    def test_log_scan(self):
+        scan = LogScan(BloomQuery([TOKEN]))
+        found = scan.select(self.numbers, self.blooms)
+        self.assertEqual(list(found), list(range(3, 40, 4)))
+        for number in found:
+            receipts = [
+                self.chain.receipt(int(number), i)
+                for i in range(self.chain.tx_count(int(number)))
+            ]
+            if number == 7:
+                # A block whose bloom matched but whose logs don't.
+                receipts[2]['logs'][0]['address'] = OTHER
+            scan.logs(receipts)
+        self.assertEqual((scan.scanned, scan.candidates, scan.matched),
+                         (40, 10, 9))
+        self.assertEqual(scan.saved, 30)
+        self.assertEqual(scan.false_positives, 1)
+        self.assertAlmostEqual(scan.false_positive_rate, 0.1)
+        self.assertEqual(scan.unavailable, 0)
+
+    def test_unavailable_receipts(self):
+        scan = LogScan(BloomQuery([TOKEN]))
+        receipts = [
+            self.chain.receipt(3, i) for i in range(self.chain.tx_count(3))
+        ]
+        self.assertEqual(len(scan.logs(receipts + [None])),
+                         len(scan.logs(receipts)))
+        self.assertEqual(scan.logs([None, None]), [])
+        self.assertEqual(scan.unavailable, 3)
+
+
+class Test_LogsScan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        patcher = mock.patch.dict(
+            os.environ, {'ETHERPY_CACHE_DIR': self.tmpdir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scan(self, chain):
+        server, url = serve_http(chain=chain)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        stdout = io.StringIO()
+        app = Ether_pyApp(stdout=stdout, stderr=io.StringIO())
+        result = app.run([
+            '-q',
+            '-D', os.path.join(self.tmpdir.name, 'data'),
+            '--endpoint-uri', url,
+            'logs', 'scan', '--address', TOKEN, '0..39',
+        ])
+        self.assertEqual(result, 0)
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_receipts_asked_for_again(self):
+        logs = self.scan(LaggingReceiptsChain(lag=1, head=100))
+        self.assertEqual(sorted({log['blockNumber'] for log in logs}),
+                         list(range(3, 40, 4)))
+
+    def test_receipts_still_unavailable(self):
+        with self.assertLogs('ether_py.logs.scan', 'WARNING') as logged:
+            logs = self.scan(LaggingReceiptsChain(lag=2, head=100))
+        self.assertEqual(logs, [])
+        self.assertIn('were not available', logged.output[0])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""
+test_columnar
+-------------
+
+Tests for typed columnar export of block headers.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ether_py.utils.columnar import (  # noqa
+    ColumnBuilder,
+    read_columns,
+    write_columns,
+)
+from standin_node import StandinChain  # noqa
+
+try:
+    import pyarrow  # noqa
+except ModuleNotFoundError:
+    pyarrow = None
+
+
+class Test_ColumnBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.chain = StandinChain(head=100)
+        self.builder = ColumnBuilder(
+            ['number', 'txCount', 'baseFeePerGas', 'hash'], length=20)
+        for number in range(10):
+            block = self.chain.block(number)
+            if number < 5:
+                # Before London.
+                del block['baseFeePerGas']
+            self.builder.add(block)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_add(self):
+        arrays = self.builder.arrays()
+        self.assertEqual(list(arrays), ['number', 'txCount',
+                                        'baseFeePerGas', 'hash'])
+        self.assertEqual(arrays['number'].tolist(), list(range(10)))
+        self.assertEqual(str(arrays['txCount'].dtype), 'uint32')
+        self.assertEqual(
+            arrays['txCount'].tolist(),
+            [self.chain.tx_count(number) for number in range(10)])
+        self.assertEqual(arrays['baseFeePerGas'].tolist(),
+                         [0] * 5 + [10**9 + n for n in range(5, 10)])
+        self.assertEqual(arrays['hash'].dtype.itemsize, 32)
+        with self.assertRaises(ValueError):
+            ColumnBuilder(['number', 'nonesuch'])
+
+    def test_overflow(self):
+        block = dict(self.chain.block(10), baseFeePerGas=hex(2**64))
+        with self.assertRaisesRegex(ValueError, 'does not fit'):
+            self.builder.add(block)
+
+    def round_trip(self, fmt, name):
+        path = os.path.join(self.tmpdir, name)
+        arrays = self.builder.arrays()
+        write_columns(arrays, path, fmt=fmt, metadata={'first_block': 0})
+        columns = read_columns(path)
+        self.assertEqual(list(columns), list(arrays))
+        for column, array in arrays.items():
+            self.assertEqual(columns[column].tolist(), array.tolist())
+
+    def test_numpy_formats(self):
+        self.round_trip('npy', 'blocks')
+        self.assertTrue(os.path.exists(
+            os.path.join(self.tmpdir, 'blocks', 'manifest.json')))
+        self.round_trip('npz', 'blocks.npz')
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_arrow_formats(self):
+        self.round_trip('arrow', 'blocks.arrow')
+        self.round_trip('parquet', 'blocks.parquet')
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
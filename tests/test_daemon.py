@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+"""
+test_daemon
+-----------
+
+Tests for the ``ether-py`` daemon Unix socket protocol.
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+from unittest import mock
+
+from ether_py.__main__ import Ether_pyApp
+from ether_py.daemon import (
+    DaemonServer,
+    FrameWriter,
+    control,
+    forward,
+)
+from ether_py.utils.display import discard_output
+
+
+class Test_Daemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, 'daemon.sock')
+        self.server = DaemonServer(socket_path=self.socket_path,
+                                   idle_timeout=0)
+        self.server.timeout = 0.1
+        self.server.handle_timeout = lambda: None
+        self.thread = threading.Thread(target=self.server.serve)
+        self.thread.start()
+
+    def tearDown(self):
+        control('stop', socket_path=self.socket_path)
+        self.thread.join()
+        self.tmpdir.cleanup()
+
+    def test_status(self):
+        reply = control('status', socket_path=self.socket_path)
+        self.assertEqual(reply['status']['pid'], os.getpid())
+        self.assertEqual(reply['status']['requests'], 0)
+
+    def test_forward(self):
+        stdout = io.StringIO()
+        with mock.patch.object(self.server, 'run_command',
+                               return_value=3) as run_command, \
+                contextlib.redirect_stdout(stdout):
+            result = forward(['about'], socket_path=self.socket_path)
+        self.assertEqual(result, 3)
+        run_command.assert_called_once()
+
+    def test_fallback_on_different_cwd(self):
+        with mock.patch('os.getcwd', return_value='/somewhere/else'):
+            result = forward(['about'], socket_path=self.socket_path)
+        self.assertIsNone(result)
+
+    def test_daemon_commands_not_forwarded(self):
+        self.assertIsNone(
+            forward(['daemon', 'status'], socket_path=self.socket_path))
+
+    def test_commands_run_locally(self):
+        parser = Ether_pyApp().parser
+        with mock.patch.object(self.server, 'run_command',
+                               return_value=0) as run_command:
+            for argv in [
+                ['-v', 'batch'],
+                ['--endpoint-uri', 'http://127.0.0.1:8545', 'daemon', 'stop'],
+                ['block', 'follow'],
+                ['-q', 'block', 'sync', '0', '100'],
+                ['tx', 'show', '-', 'blockNumber'],
+                ['tx', 'receipt', '--from-file', '-'],
+                ['block', 'at-time', '-'],
+            ]:
+                self.assertIsNone(forward(argv, socket_path=self.socket_path,
+                                          parser=parser), argv)
+            run_command.assert_not_called()
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(
+                    forward(['-v', 'block', 'show', 'latest'],
+                            socket_path=self.socket_path, parser=parser),
+                    0)
+            run_command.assert_called_once()
+
+    def test_busy_daemon_falls_back(self):
+        with self.server.busy:
+            self.assertIsNone(
+                forward(['about'], socket_path=self.socket_path, timeout=1))
+            reply = control('status', socket_path=self.socket_path)
+            self.assertTrue(reply['status']['busy'])
+
+    def test_help(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            result = forward(['about', '--help'],
+                             socket_path=self.socket_path)
+        self.assertEqual(result, 0)
+        self.assertIn('usage:', stdout.getvalue())
+
+    def test_warm_endpoint_settings(self):
+        warm = {}
+
+        def endpoint(*args):
+            app = Ether_pyApp(warm=warm)
+            app.options, _ = app.parser.parse_known_args(
+                ['--endpoint-uri', 'http://127.0.0.1:8545'] + list(args))
+            app._se = mock.Mock(get_secret=lambda *args, **kwargs: None)
+            app.setup_endpoint()
+            return app.endpoint
+
+        first = endpoint()
+        self.assertIs(endpoint(), first)
+        # A command run with other settings doesn't get the endpoint
+        # made for the first one.
+        limited = endpoint('--rate-limit', '5', '--http-timeout', '3')
+        self.assertIsNot(limited, first)
+        self.assertEqual(limited.limits['rate'], 5.0)
+        self.assertEqual(limited.transport['timeout'], 3.0)
+        self.assertIs(endpoint(), first)
+
+    def test_frame_writer(self):
+        sock_file = io.BytesIO()
+        stdout = FrameWriter(sock_file, 'stdout')
+        print('hello', file=stdout)
+        self.assertEqual(sock_file.getvalue(), b'{"stdout": "hello"}\n'
+                         b'{"stdout": "\\n"}\n')
+        self.assertFalse(stdout.closed)
+        with self.assertRaises(io.UnsupportedOperation):
+            stdout.fileno()
+        discard_output(stdout)
+
+    def test_no_daemon(self):
+        self.assertIsNone(
+            forward(['about'],
+                    socket_path=os.path.join(self.tmpdir.name, 'missing')))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
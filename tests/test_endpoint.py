@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+test_endpoint
+-------------
+
+Tests for the on-disk endpoint fact cache.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from unittest import mock
+
+from ether_py.utils import (
+    atomic_write_json,
+    env_number,
+)
+from ether_py.utils.endpoint import (
+    Endpoint,
+    EndpointCache,
+)
+
+URL = 'https://mainnet.infura.io/v3/0123456789abcdef'
+FACTS = {
+    'api': '5.31.4',
+    'chain_id': 1,
+    'clientVersion': 'Geth/v1.10.2-stable',
+}
+
+
+class Test_EndpointCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        EndpointCache(URL, cache_dir=self.tmpdir.name).save(FACTS)
+        cache = EndpointCache(URL, cache_dir=self.tmpdir.name)
+        self.assertEqual(cache.load(), FACTS)
+
+    def test_url_not_written_to_disk(self):
+        cache = EndpointCache(URL, cache_dir=self.tmpdir.name)
+        cache.save(FACTS)
+        self.assertNotIn('0123456789abcdef', cache.path)
+        with open(cache.path, 'r') as f_in:
+            self.assertNotIn('0123456789abcdef', f_in.read())
+
+    def test_expired(self):
+        cache = EndpointCache(URL, cache_dir=self.tmpdir.name, ttl=10)
+        os.makedirs(cache.cache_dir)
+        with open(cache.path, 'w') as f_out:
+            json.dump({'timestamp': time.time() - 60, 'facts': FACTS}, f_out)
+        self.assertIsNone(cache.load())
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        path = os.path.join(self.tmpdir.name, 'facts.json')
+        atomic_write_json(path, FACTS)
+        with self.assertRaises(TypeError):
+            atomic_write_json(path, {'bad': object()})
+        self.assertEqual(os.listdir(self.tmpdir.name), ['facts.json'])
+        with open(path, 'r') as f_in:
+            self.assertEqual(json.load(f_in), FACTS)
+
+    def test_disabled(self):
+        cache = EndpointCache(URL, cache_dir=self.tmpdir.name, ttl=0)
+        cache.save(FACTS)
+        self.assertFalse(os.path.exists(cache.path))
+
+    def test_endpoint_is_lazy(self):
+        endpoint = Endpoint('mainnet', URL, cache_dir=self.tmpdir.name)
+        self.assertFalse(endpoint.connected)
+
+
+class Test_EnvNumber(unittest.TestCase):
+
+    def test_env_number(self):
+        name = 'ETHERPY_TEST_NUMBER'
+        with mock.patch.dict(os.environ, {name: ' 42 '}):
+            self.assertEqual(env_number(name, 7), 42)
+            self.assertEqual(env_number(name, 7, float), 42.0)
+        with mock.patch.dict(os.environ, {name: ''}):
+            self.assertEqual(env_number(name, 7), 7)
+        with mock.patch.dict(os.environ, {name: 'abc'}):
+            with self.assertLogs('ether_py.utils', 'WARNING') as logged:
+                self.assertEqual(env_number(name, 2.5, float), 2.5)
+            self.assertIn(f"{name}='abc'", logged.output[0])
+
+    def test_bad_value_does_not_stop_commands(self):
+        env = dict(os.environ,
+                   ETHERPY_ENDPOINT_CACHE_TTL='abc',
+                   ETHERPY_HTTP_TIMEOUT='30s',
+                   ETHERPY_NO_DAEMON='1')
+        result = subprocess.run(
+            [sys.executable, '-m', 'ether_py', 'about'],
+            env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('ETHERPY_ENDPOINT_CACHE_TTL', result.stderr)
+        self.assertNotIn('Traceback', result.stderr)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+test_follow
+-----------
+
+Tests for following new chain heads and detecting reorganizations.
+"""
+
+import os
+import socket
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from web3 import Web3  # noqa
+
+from ether_py.utils.follow import (  # noqa
+    HeadTracker,
+    poll_heads,
+    subscribe_heads,
+)
+from standin_node import (  # noqa
+    StandinChain,
+    serve_http,
+    serve_ws,
+)
+
+
+class Test_HeadTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.chain = StandinChain(head=100)
+        self.server, url = serve_http(chain=self.chain)
+        self.w3 = Web3(Web3.HTTPProvider(url))
+        self.tracker = HeadTracker(self.w3.eth.get_block, depth=10)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def update(self):
+        return [
+            (event, block['number'])
+            for event, block in self.tracker.update(
+                self.w3.eth.get_block('latest'))
+        ]
+
+    def test_apply_and_revert(self):
+        self.assertEqual(self.update(), [('apply', 100)])
+        self.assertEqual(self.update(), [])
+        # Blocks skipped between heads are applied too.
+        self.chain.advance(3)
+        self.assertEqual(self.update(),
+                         [('apply', 101), ('apply', 102), ('apply', 103)])
+        reverted = self.tracker.head
+        self.chain.reorg(2)
+        self.chain.advance()
+        self.assertEqual(self.update(),
+                         [('revert', 103), ('revert', 102),
+                          ('apply', 102), ('apply', 103), ('apply', 104)])
+        self.assertNotEqual(self.tracker.hash_at(103), reverted[1])
+        self.assertEqual(self.tracker.hash_at(103),
+                         self.chain.block_hash(103))
+
+    def test_long_gap_and_deep_reorg(self):
+        self.update()
+        self.chain.advance(25)
+        self.assertEqual(self.update(),
+                         [('apply', n) for n in range(101, 126)])
+        # Only the last ``depth`` blocks are remembered.
+        self.assertEqual(len(self.tracker.recent), 10)
+        self.chain.reorg(15)
+        with self.assertLogs('ether_py.utils.follow', level='WARNING'):
+            events = self.update()
+        self.assertEqual(
+            events,
+            [('revert', n) for n in range(125, 115, -1)]
+            + [('apply', n) for n in range(116, 126)])
+
+
+class Test_HeadSources(unittest.TestCase):
+
+    def setUp(self):
+        self.chain = StandinChain(head=100)
+
+    def test_poll_heads(self):
+        server, url = serve_http(chain=self.chain)
+        try:
+            heads = poll_heads(Web3(Web3.HTTPProvider(url)), interval=0)
+            self.assertEqual(next(heads), 'latest')
+            self.chain.advance(2)
+            self.assertEqual([next(heads), next(heads)],
+                             [self.chain.block_hash(101),
+                              self.chain.block_hash(102)])
+            # A forgotten filter is made again, catching up from the
+            # latest block.
+            self.chain.filters.clear()
+            self.assertEqual(next(heads), 'latest')
+            self.chain.advance()
+            self.assertEqual(next(heads), self.chain.block_hash(103))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_subscribe_heads(self):
+        server, url = serve_ws(chain=self.chain)
+        try:
+            heads = subscribe_heads(url)
+            self.assertEqual(next(heads), 'latest')
+            self.chain.advance()
+            self.assertEqual(next(heads), self.chain.block_hash(101))
+            heads.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_subscribe_heads_unreachable(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        # Nothing is listening, so the caller is told at once (and can
+        # poll instead) rather than waiting on reconnects forever.
+        heads = subscribe_heads(f'ws://127.0.0.1:{port}', max_delay=0)
+        with self.assertRaises(ValueError):
+            next(heads)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
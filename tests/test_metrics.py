@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+"""
+test_metrics
+------------
+
+Tests for JSON-RPC metrics.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from web3 import Web3  # noqa
+
+from ether_py.utils.metrics import (  # noqa
+    Metrics,
+    get_metrics,
+    metrics_middleware,
+    start_metrics,
+    stop_metrics,
+)
+from ether_py.utils.rpcbatch import RPCBatch  # noqa
+from ether_py.utils.transport import PooledHTTPProvider  # noqa
+from standin_node import serve_http  # noqa
+
+
+class Test_Metrics(unittest.TestCase):
+
+    def test_observe(self):
+        metrics = Metrics()
+        for seconds in [0.001, 0.002, 0.003, 0.2]:
+            metrics.observe('eth_blockNumber', seconds, sent=10,
+                            received=20)
+        metrics.observe_calls([('eth_chainId', [])],
+                              [{'error': {'code': -32000}}], 0.01)
+        rows = {row[0]: row for row in metrics.rows()}
+        calls, errors, mean, p50, p95, maximum, sent, received = (
+            rows['eth_blockNumber'][1:])
+        self.assertEqual((calls, errors, sent, received), (4, 0, 40, 80))
+        self.assertEqual(maximum, 200.0)
+        self.assertEqual(p50, 3.0)
+        self.assertEqual(rows['eth_chainId'][2], 1)
+        self.assertIn('eth_blockNumber', metrics.summary())
+
+    def test_prometheus(self):
+        metrics = Metrics()
+        metrics.observe('eth_blockNumber', 0.02)
+        metrics.observe('eth_blockNumber', 2.0)
+        text = metrics.prometheus(labels={'command': 'block show'})
+        self.assertIn(
+            'etherpy_last_run_rpc_calls{method="eth_blockNumber",'
+            'command="block show"} 2', text)
+        self.assertIn(
+            'etherpy_last_run_rpc_duration_seconds_bucket{method='
+            '"eth_blockNumber",command="block show",le="0.025"} 1', text)
+        self.assertIn(
+            'etherpy_last_run_rpc_duration_seconds_bucket{method='
+            '"eth_blockNumber",command="block show",le="+Inf"} 2', text)
+        path = os.path.join(tempfile.mkdtemp(), 'etherpy.prom')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        metrics.write_textfile(path)
+        with open(path) as f_in:
+            self.assertEqual(f_in.read(), metrics.prometheus())
+
+
+class Test_MetricsRecording(unittest.TestCase):
+
+    def setUp(self):
+        self.server, url = serve_http()
+        self.w3 = Web3(PooledHTTPProvider(url))
+        self.w3.middleware_onion.inject(metrics_middleware, 'metrics',
+                                        layer=0)
+
+    def tearDown(self):
+        stop_metrics()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_off_by_default(self):
+        self.assertIsNone(get_metrics())
+        self.w3.eth.chain_id
+
+    def test_middleware_and_batches(self):
+        metrics = start_metrics()
+        self.w3.eth.chain_id
+        with RPCBatch(self.w3) as batch:
+            for _ in range(3):
+                batch.add('eth_blockNumber')
+        counts = {row[0]: row[1] for row in metrics.rows()}
+        self.assertEqual(counts, {'eth_chainId': 1, 'eth_blockNumber': 3})
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+"""
+test_pool
+---------
+
+Tests for routing requests across a pool of endpoints.
+"""
+
+import argparse
+import os
+import socket
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ether_py.utils.pool import (  # noqa
+    MultiEndpointProvider,
+    NoHealthyEndpoint,
+    get_routing_settings,
+    is_primary_method,
+)
+from ether_py.utils.transport import get_transport_settings  # noqa
+from standin_node import (  # noqa
+    StandinChain,
+    serve_http,
+)
+
+
+def unused_url():
+    """Return the URL of a port that nothing is listening on."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}'
+
+
+class Test_RoutingSettings(unittest.TestCase):
+
+    def test_precedence(self):
+        options = argparse.Namespace(endpoint_routing='sticky',
+                                     max_block_lag=None,
+                                     primary_endpoint=None)
+        secrets = {'endpoint_routing': 'fastest',
+                   'endpoint_max_block_lag': '10'}
+        settings = get_routing_settings(options=options,
+                                        get_secret=secrets.get)
+        self.assertEqual(settings['strategy'], 'sticky')
+        self.assertEqual(settings['max_block_lag'], 10)
+        self.assertIsNone(settings['primary'])
+
+    def test_bad_strategy(self):
+        with self.assertRaises(ValueError):
+            get_routing_settings(get_secret={'endpoint_routing': 'x'}.get)
+
+    def test_primary_methods(self):
+        self.assertTrue(is_primary_method('eth_sendRawTransaction', ['0x']))
+        self.assertTrue(is_primary_method('personal_listAccounts', []))
+        self.assertTrue(is_primary_method('eth_getBalance',
+                                          ['0x00', 'pending']))
+        self.assertFalse(is_primary_method('eth_getBalance',
+                                           ['0x00', 'latest']))
+
+
+class Test_MultiEndpointProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = get_transport_settings()
+        self.settings['retries'] = 0
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def serve(self, name, latency=0.0, head=None):
+        chain = StandinChain() if head is None else StandinChain(head=head)
+        server, url = serve_http(latency=latency, chain=chain)
+        self.servers.append(server)
+        return server, (name, url)
+
+    def pool(self, members, **kwargs):
+        return MultiEndpointProvider(members, settings=self.settings,
+                                     **kwargs)
+
+    def test_fastest(self):
+        slow, slow_member = self.serve('slow', latency=0.02)
+        fast, fast_member = self.serve('fast')
+        provider = self.pool([slow_member, fast_member])
+        for _ in range(10):
+            provider.make_request('eth_chainId', [])
+        # Each endpoint gets one health check; reads go to the fast one.
+        self.assertEqual(slow.requests, 1)
+        self.assertEqual(fast.requests, 11)
+
+    def test_sticky(self):
+        slow, slow_member = self.serve('slow', latency=0.02)
+        fast, fast_member = self.serve('fast')
+        provider = self.pool([slow_member, fast_member], strategy='sticky')
+        provider.make_request('eth_chainId', [])
+        provider.sticky = provider.members[0]
+        for _ in range(5):
+            provider.make_request('eth_chainId', [])
+        self.assertEqual(slow.requests, 6)
+
+    def test_failover(self):
+        server, member = self.serve('up')
+        provider = self.pool([('down', unused_url()), member])
+        # Make the endpoint that is down look like the fastest one.
+        provider.check_health()
+        provider.members[0].down_until = 0.0
+        provider.members[0].latency = 0.0
+        response = provider.make_request('eth_chainId', [])
+        self.assertEqual(response['result'], '0x539')
+        self.assertFalse(provider.members[0].healthy)
+        with self.assertRaises(NoHealthyEndpoint):
+            self.pool([('down', unused_url())]).make_request(
+                'eth_chainId', [])
+
+    def test_block_lag(self):
+        behind, behind_member = self.serve('behind', head=100)
+        ahead, ahead_member = self.serve('ahead', latency=0.01, head=110)
+        provider = self.pool([behind_member, ahead_member], max_block_lag=3)
+        response = provider.make_request('eth_blockNumber', [])
+        self.assertEqual(int(response['result'], 16), 110)
+        self.assertTrue(provider.members[0].lagging)
+        # Within the allowed lag, a block the faster endpoint has not
+        # seen yet is fetched from the one that has.
+        provider = self.pool([behind_member, ahead_member],
+                             max_block_lag=20)
+        block = provider.make_request('eth_getBlockByNumber',
+                                      [hex(105), False])
+        self.assertEqual(int(block['result']['number'], 16), 105)
+
+    def test_writes_go_to_primary(self):
+        primary, primary_member = self.serve('primary', latency=0.02)
+        other, other_member = self.serve('other')
+        provider = self.pool([other_member, primary_member],
+                             primary=primary_member[1])
+        for method in ['eth_accounts', 'eth_getTransactionCount']:
+            provider.make_request(method, [])
+        self.assertEqual(primary.requests, 2)
+        self.assertEqual(other.requests, 0)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
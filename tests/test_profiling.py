@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+test_profiling
+--------------
+
+Tests for command profiling.
+"""
+
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from ether_py.utils.profiling import (
+    CommandProfiler,
+    should_profile,
+)
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class Test_Profiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_profile(self):
+        profiler = CommandProfiler(interval=0.001)
+        with profiler:
+            worker = threading.Thread(target=spin, args=(0.05,),
+                                      name='worker')
+            worker.start()
+            spin(0.05)
+            worker.join()
+        pstats_path, collapsed_path = profiler.write(self.tmpdir, 'test')
+        stats = pstats.Stats(pstats_path)
+        self.assertTrue(any(func[2] == 'spin' for func in stats.stats))
+        with open(collapsed_path) as f_in:
+            lines = f_in.read().splitlines()
+        stacks = [line.rsplit(' ', 1)[0] for line in lines]
+        # Stacks of all threads are sampled, outermost frame first.
+        self.assertTrue(any(
+            stack.startswith('MainThread;') and stack.endswith(':spin')
+            for stack in stacks))
+        self.assertTrue(any(
+            stack.startswith('worker;threading:') and
+            stack.endswith(':spin')
+            for stack in stacks))
+        self.assertTrue(all(int(line.rsplit(' ', 1)[1]) > 0
+                            for line in lines))
+
+    def test_should_profile(self):
+        self.assertTrue(should_profile(100))
+        self.assertFalse(any(should_profile(0) for _ in range(100)))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
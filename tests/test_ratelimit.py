@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+"""
+test_ratelimit
+--------------
+
+Tests for client side request scheduling.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ether_py.utils import ordered_map  # noqa
+from ether_py.utils.ratelimit import (  # noqa
+    AdaptiveConcurrency,
+    DailyCounter,
+    DailyLimitExceeded,
+    RequestScheduler,
+    TokenBucket,
+    get_rate_limit_settings,
+    get_scheduler,
+    project_key,
+)
+from ether_py.utils.transport import (  # noqa
+    PooledHTTPProvider,
+    ScheduledProvider,
+    get_transport_settings,
+)
+from standin_node import serve_http  # noqa
+
+
+class Test_RateLimitSettings(unittest.TestCase):
+
+    def test_precedence(self):
+        options = argparse.Namespace(rate_limit=5.0, daily_limit=None,
+                                     concurrency=None)
+        secrets = {'rate_limit': '20', 'daily_request_limit': '100000',
+                   'adaptive_concurrency': 'false'}
+        settings = get_rate_limit_settings(options=options,
+                                           get_secret=secrets.get)
+        self.assertEqual(settings['rate'], 5.0)
+        self.assertEqual(settings['daily_limit'], 100000)
+        self.assertIs(settings['adaptive'], False)
+
+    def test_project_key(self):
+        self.assertEqual(
+            project_key('https://mainnet.infura.io/v3/abc123'),
+            project_key('https://goerli.infura.io/v3/abc123'),
+        )
+        self.assertEqual(project_key('http://localhost:8545'),
+                         'http://localhost:8545')
+
+
+class Test_TokenBucket(unittest.TestCase):
+
+    def test_pacing(self):
+        bucket = TokenBucket(rate=100, burst=5)
+        delays = [bucket.reserve() for _ in range(10)]
+        self.assertEqual(delays[:5], [0.0] * 5)
+        # Each request after the burst waits about 10ms longer.
+        self.assertAlmostEqual(delays[9], 0.05, delta=0.005)
+
+
+class Test_AdaptiveConcurrency(unittest.TestCase):
+
+    def test_aimd(self):
+        aimd = AdaptiveConcurrency(16)
+        aimd.record(throttled=True)
+        self.assertEqual(aimd.allowed, 8)
+        # Throttles within the same round trip only count once.
+        aimd.record(throttled=True)
+        self.assertEqual(aimd.allowed, 8)
+        for _ in range(20):
+            aimd.record(latency=0.01)
+        self.assertGreaterEqual(aimd.allowed, 10)
+        self.assertLessEqual(aimd.allowed, 16)
+
+    def test_latency(self):
+        aimd = AdaptiveConcurrency(16)
+        aimd.record(latency=0.01)
+        for _ in range(20):
+            aimd.record(latency=0.1)
+        self.assertLess(aimd.allowed, 16)
+
+
+class Test_DailyCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_persists(self):
+        counter = DailyCounter('key', cache_dir=self.cache_dir,
+                               flush_every=10)
+        for _ in range(25):
+            counter.add()
+        counter.flush()
+        other = DailyCounter('key', cache_dir=self.cache_dir)
+        self.assertEqual(other.count, 25)
+        other.add(5)
+        other.flush()
+        counter.add()
+        counter.flush()
+        self.assertEqual(counter.count, 31)
+        with open(counter.path) as f_in:
+            self.assertNotIn('key', f_in.read())
+
+    def test_limit(self):
+        counter = DailyCounter('key', cache_dir=self.cache_dir, limit=3)
+        counter.add(2)
+        self.assertEqual(counter.remaining, 1)
+        with self.assertRaises(DailyLimitExceeded):
+            counter.add(2)
+
+
+class Test_RequestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.server, self.url = serve_http(latency=0.01)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_concurrency_limit(self):
+        scheduler = RequestScheduler(concurrency=4)
+        provider = ScheduledProvider(PooledHTTPProvider(self.url),
+                                     scheduler)
+        for _ in ordered_map(
+            lambda i: provider.make_request('eth_blockNumber', []),
+            range(40),
+            workers=16,
+        ):
+            pass
+        self.assertEqual(self.server.requests, 40)
+        self.assertLessEqual(self.server.max_in_flight, 4)
+
+    def test_shared_scheduler_settings(self):
+        uri = 'http://scheduler.test:8545'
+        settings = get_rate_limit_settings()
+        scheduler = get_scheduler(uri, settings)
+        self.assertIs(get_scheduler(uri, dict(settings)), scheduler)
+        # Later settings for the same endpoint are not ignored.
+        settings.update({'rate': 5.0, 'daily_limit': 100})
+        limited = get_scheduler(uri, settings)
+        self.assertIsNot(limited, scheduler)
+        self.assertEqual(limited.rate, 5.0)
+        self.assertEqual(limited.daily.limit, 100)
+
+    def test_throttled(self):
+        server, url = serve_http(rate_limit=5)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        settings = get_transport_settings()
+        settings.update({'retries': 5, 'backoff': 0.05})
+        scheduler = RequestScheduler(concurrency=8)
+        provider = PooledHTTPProvider(url, settings=settings,
+                                      on_retry=lambda status: (
+                                          scheduler.record_throttle()))
+        provider = ScheduledProvider(provider, scheduler)
+        start = time.perf_counter()
+        results = list(ordered_map(
+            lambda i: provider.make_request('eth_chainId', []),
+            range(8),
+            workers=8,
+        ))
+        self.assertEqual({r['result'] for r in results}, {'0x539'})
+        self.assertGreater(scheduler.aimd.throttles, 0)
+        self.assertLess(scheduler.aimd.allowed, 8)
+        self.assertGreater(time.perf_counter() - start, 0.1)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
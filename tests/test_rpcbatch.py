@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+"""
+test_rpcbatch
+-------------
+
+Tests for batching JSON-RPC calls.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from web3 import (  # noqa
+    HTTPProvider,
+    Web3,
+)
+
+from ether_py.utils import to_int  # noqa
+from ether_py.utils.rpcbatch import RPCBatch  # noqa
+from ether_py.utils.transport import PooledHTTPProvider  # noqa
+from standin_node import (  # noqa
+    ACCOUNTS,
+    serve_http,
+)
+
+
+class Test_RPCBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.server, self.url = serve_http()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_balances(self, w3, batch_size, count=250):
+        addresses = (ACCOUNTS * count)[:count]
+        with RPCBatch(w3, batch_size=batch_size) as batch:
+            balances = [
+                batch.add('eth_getBalance', [a, 'latest'], to_int)
+                for a in addresses
+            ]
+        return [balance.result() for balance in balances]
+
+    def test_batches(self):
+        w3 = Web3(PooledHTTPProvider(self.url))
+        balances = self.get_balances(w3, batch_size=100)
+        self.assertEqual(balances, [10**20] * 250)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_sequential_fallback(self):
+        w3 = Web3(HTTPProvider(self.url))
+        balances = self.get_balances(w3, batch_size=100, count=5)
+        self.assertEqual(balances, [10**20] * 5)
+        self.assertEqual(self.server.requests, 5)
+
+    def test_errors_dispatched_to_caller(self):
+        for provider in [PooledHTTPProvider, HTTPProvider]:
+            w3 = Web3(provider(self.url))
+            with RPCBatch(w3) as batch:
+                chain_id = batch.add('eth_chainId', formatter=to_int)
+                bogus = batch.add('eth_bogus')
+            self.assertEqual(chain_id.result(), 1337)
+            with self.assertRaises(ValueError):
+                bogus.result()
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
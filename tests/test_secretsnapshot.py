@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+test_secretsnapshot
+-------------------
+
+Tests for the cached snapshot of a python-secrets environment.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from psec.exceptions import SecretNotFoundError
+
+from ether_py.utils.secretsnapshot import SecretsSnapshot
+
+
+DESCRIPTIONS = [
+    {'Variable': 'ethereum_uri', 'Type': 'string', 'Prompt': 'URI',
+     'Export': 'ETHEREUM_URI'},
+    {'Variable': 'ethereum_address', 'Type': 'string', 'Prompt': 'Address'},
+]
+
+
+class Test_SecretsSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.basedir = os.path.join(self.tmpdir, 'secrets')
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        env_dir = os.path.join(self.basedir, 'test')
+        os.makedirs(os.path.join(env_dir, 'secrets.d'))
+        open(os.path.join(self.basedir, '.psec'), 'w').close()
+        self.secrets_file = os.path.join(env_dir, 'secrets.json')
+        with open(os.path.join(env_dir, 'secrets.d', 'ethereum.json'),
+                  'w') as f_out:
+            json.dump(DESCRIPTIONS, f_out)
+        self.write_secrets({'ethereum_uri': 'http://127.0.0.1:8545'})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_secrets(self, secrets):
+        with open(self.secrets_file, 'w') as f_out:
+            json.dump(secrets, f_out)
+        # Make sure the change is visible in the modification time.
+        stamp = time.time_ns() + 1_000_000_000
+        os.utime(self.secrets_file, ns=(stamp, stamp))
+
+    def snapshot(self):
+        return SecretsSnapshot('test', secrets_basedir=self.basedir,
+                               cache_dir=self.cache_dir)
+
+    def test_get_secret(self):
+        se = self.snapshot()
+        self.assertIsNone(se._secrets)
+        self.assertEqual(se.get_secret('ethereum_uri'),
+                         'http://127.0.0.1:8545')
+        self.assertIsNone(se.get_secret('ethereum_address',
+                                        allow_none=True))
+        with self.assertRaises(SecretNotFoundError):
+            se.get_secret('ethereum_address')
+        self.assertEqual(sorted(se.keys()),
+                         ['ethereum_address', 'ethereum_uri'])
+        # Nothing is exported.
+        self.assertNotIn('ETHEREUM_URI', os.environ)
+
+    def test_values_are_not_cached(self):
+        self.snapshot().get_secret('ethereum_uri')
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name)) as f_in:
+                self.assertNotIn('127.0.0.1', f_in.read())
+
+    def test_snapshot_reuse_and_invalidation(self):
+        self.snapshot().get_secret('ethereum_uri')
+        with mock.patch.object(SecretsSnapshot, '_read_keys',
+                               side_effect=AssertionError('reread')):
+            se = self.snapshot()
+            self.assertEqual(se.get_secret('ethereum_uri'),
+                             'http://127.0.0.1:8545')
+        self.write_secrets({'ethereum_uri': 'http://127.0.0.1:8546'})
+        # A loaded snapshot notices the change when refreshed ...
+        se.refresh()
+        self.assertEqual(se.get_secret('ethereum_uri'),
+                         'http://127.0.0.1:8546')
+        # ... and so does a new one.
+        self.assertEqual(self.snapshot().get_secret('ethereum_uri'),
+                         'http://127.0.0.1:8546')
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
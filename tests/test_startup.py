@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""
+test_startup
+------------
+
+Tests that commands which should start quickly don't load heavy modules.
+
+Each command is run in a fresh interpreter, and the heavy modules it
+loaded are checked rather than how long it took, which depends on the
+host. ``bench_startup.py`` measures the cold start times themselves.
+"""
+
+import os
+import subprocess  # nosec
+import sys
+import tempfile
+import unittest
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = [
+    'arrow',
+    'psec',
+    'solcx',
+    'web3',
+]
+LOADED_MODULES = (
+    "import sys\n"
+    "from ether_py.__main__ import main\n"
+    "result = main({argv!r})\n"
+    "print('LOADED:' + ','.join(\n"
+    "    m for m in {heavy!r} if m in sys.modules), file=sys.stderr)\n"
+    "sys.exit(result)\n"
+)
+
+
+def is_installed():
+    try:
+        from importlib.metadata import distribution
+        distribution('ether_py')
+    except Exception:  # noqa
+        return False
+    return True
+
+
+@unittest.skipUnless(is_installed(), 'ether_py entry points not installed')
+class Test_Startup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = dict(os.environ, ETHERPY_CACHE_DIR=self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def loaded_modules(self, argv):
+        result = subprocess.run(  # nosec
+            [
+                sys.executable, '-c',
+                LOADED_MODULES.format(argv=argv, heavy=HEAVY_MODULES)
+            ],
+            cwd=TOPDIR,
+            env=self.env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        line = [
+            line for line in result.stderr.splitlines()
+            if line.startswith('LOADED:')
+        ][0]
+        return [m for m in line[len('LOADED:'):].split(',') if m]
+
+    def test_about_does_not_load_heavy_modules(self):
+        self.assertEqual(self.loaded_modules(['about']), [])
+
+    def test_contract_list_does_not_load_heavy_modules(self):
+        self.assertEqual(self.loaded_modules(['contract', 'list']), [])
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""
+test_sync
+---------
+
+Tests for checkpointed syncing of blocks into the block store.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ether_py.utils.aio import AsyncEngine  # noqa
+from ether_py.utils.blockstore import (  # noqa
+    BlockFetcher,
+    BlockStore,
+)
+from ether_py.utils.sync import BlockSync  # noqa
+from standin_node import (  # noqa
+    StandinChain,
+    serve_http,
+)
+
+
+class Interrupted(Exception):
+    pass
+
+
+class Test_BlockSync(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.serve(StandinChain(head=100))
+        self.store = BlockStore(os.path.join(self.tmpdir, 'chain.sqlite3'))
+
+    def serve(self, chain):
+        self.chain = chain
+        self.server, url = serve_http(chain=self.chain)
+        self.engine = AsyncEngine(url, concurrency=4)
+
+    def tearDown(self):
+        self.store.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def sync(self, start=0, end=60, finality_depth=10, progress=None):
+        fetcher = BlockFetcher(self.engine, self.store,
+                               finality_depth=finality_depth, batch_size=5)
+        sync = BlockSync(fetcher, start, receipts=True, chunk_size=16)
+        sync.run(end, progress=progress)
+        return sync
+
+    def interrupt(self, synced, total):
+        raise Interrupted()
+
+    def assertSynced(self, start, end):
+        self.assertEqual(self.store.missing(start, end, receipts=True), [])
+        for number in range(start, end + 1):
+            self.assertEqual(self.store.hash_at(number),
+                             self.chain.block_hash(number))
+        self.assertEqual(len(self.store.get_receipts(3)),
+                         self.chain.tx_count(3))
+
+    def test_resume(self):
+        with self.assertRaises(Interrupted):
+            self.sync(progress=self.interrupt)
+        self.assertEqual(self.store.get_checkpoint('block sync 0'),
+                         (16, self.chain.block_hash(15)))
+        # Blocks missing from what was synced are filled in as well.
+        self.store.delete([5, 6])
+        requests = self.server.requests
+        sync = self.sync()
+        self.assertEqual(sync.synced, 60 - 16 + 1 + 2)
+        self.assertSynced(0, 60)
+        self.assertEqual(self.store.get_checkpoint('block sync 0'),
+                         (61, self.chain.block_hash(60)))
+        # Nothing is left to do.
+        self.server.requests, requests = requests, self.server.requests
+        self.assertEqual(self.sync().synced, 0)
+        self.assertLess(self.server.requests - requests, 5)
+
+    def test_rollback(self):
+        self.sync(end=100, finality_depth=0)
+        self.chain.reorg(5)
+        with self.assertLogs('ether_py.utils.sync', level='INFO'):
+            sync = self.sync(end=100, finality_depth=0)
+        self.assertEqual((sync.rolled_back, sync.synced), (5, 5))
+        self.assertSynced(0, 100)
+        self.assertEqual(list(self.store.verify()), [])
+
+    def test_reorg_under_stored_blocks(self):
+        # Blocks stored by another sync are replaced by a reorg.
+        self.sync(start=70, end=80, finality_depth=0)
+        self.chain.reorg(40)
+        with self.assertLogs('ether_py.utils.sync', level='INFO'):
+            sync = self.sync(end=100, finality_depth=0)
+        self.assertEqual(sync.rolled_back, 11)
+        self.assertSynced(0, 100)
+
+    def test_receipts_one_at_a_time(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.serve(StandinChain(head=100, block_receipts=False))
+        sync = self.sync()
+        self.assertIs(sync.tx_fetcher.block_receipts, False)
+        self.assertSynced(0, 60)
+        self.assertEqual(
+            [receipt['transactionHash']
+             for receipt in self.store.get_receipts(3)],
+            [self.chain.tx_hash(3, i) for i in range(self.chain.tx_count(3))])
+
+    def test_synced_blocks_are_not_evicted(self):
+        self.sync(end=40)
+        # Blocks stored by other commands are evicted first.
+        fetcher = BlockFetcher(self.engine, self.store, finality_depth=10)
+        self.assertEqual(len(list(fetcher.imap(range(50, 80)))), 30)
+        self.assertEqual(self.store.stats()['synced_blocks'], 41)
+        with self.assertLogs('ether_py.utils.blockstore', level='WARNING'):
+            self.store.evict(max_size=0)
+        self.assertEqual(self.store.missing(50, 79), [(50, 79)])
+        self.assertSynced(0, 40)
+        self.assertEqual(self.sync(end=40).synced, 0)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""
+test_timeindex
+--------------
+
+Tests for the sparse index of block timestamps.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from bisect import bisect_right
+
+from ether_py.utils import parse_timestamp
+from ether_py.utils.timeindex import TimeIndex
+
+
+class Test_TimeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'blocks', 'chain-1-times.json')
+        rng = random.Random(1)
+        # Irregular block times, with a stretch of slow blocks.
+        self.times = [1000]
+        for number in range(1, 50000):
+            gap = rng.randint(20, 40) if 20000 < number < 21000 else 12
+            self.times.append(self.times[-1] + gap + rng.randint(0, 3))
+        self.rounds = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def fetch(self, numbers):
+        self.rounds.append(len(numbers))
+        return [(number, self.times[number]) for number in numbers]
+
+    def make_index(self, path=None):
+        index = TimeIndex(path)
+        head = len(self.times) - 1
+        index.add(0, self.times[0])
+        index.add(head, self.times[head])
+        return index
+
+    def expected(self, timestamp):
+        return bisect_right(self.times, timestamp) - 1
+
+    def test_resolve(self):
+        index = self.make_index()
+        rng = random.Random(2)
+        targets = [rng.randint(self.times[0], self.times[-1])
+                   for _ in range(2000)]
+        results = index.resolve(targets, self.fetch)
+        for target in targets:
+            self.assertEqual(results[target], self.expected(target))
+        # All the targets are resolved together in a few rounds.
+        self.assertLess(len(self.rounds), 12)
+        self.rounds = []
+        results = index.resolve([self.times[20500] + 1], self.fetch)
+        self.assertEqual(results, {self.times[20500] + 1: 20500})
+
+    def test_outside_chain(self):
+        index = self.make_index()
+        results = index.resolve([0, self.times[-1] + 100], self.fetch)
+        self.assertEqual(results, {0: None,
+                                   self.times[-1] + 100: len(self.times) - 1})
+        self.assertEqual(self.rounds, [])
+
+    def test_save(self):
+        index = self.make_index(self.path)
+        target = self.times[30000] + 5
+        index.resolve([target], self.fetch)
+        index.save(final=len(self.times) - 65)
+        # Only samples of final blocks are saved.
+        saved = TimeIndex(self.path)
+        self.assertEqual(saved.loaded, len(index) - 1)
+        self.assertFalse(saved.has(len(self.times) - 1))
+        self.rounds = []
+        saved.add(len(self.times) - 1, self.times[-1])
+        self.assertEqual(saved.resolve([target], self.fetch),
+                         {target: 30000})
+        self.assertEqual(self.rounds, [])
+
+    def test_save_thins(self):
+        index = TimeIndex(self.path, max_size=10)
+        for number in range(0, 1000, 10):
+            index.add(number, self.times[number])
+        index.save(final=1000)
+        saved = TimeIndex(self.path)
+        self.assertEqual(len(saved), 10)
+        self.assertTrue(saved.has(0))
+        self.assertTrue(saved.has(990))
+
+
+class Test_ParseTimestamp(unittest.TestCase):
+
+    def test_formats(self):
+        for value in ['1628121600', '2021-08-05', '2021-08-05T00:00:00Z',
+                      '2021-08-05 00:00', '2021-08-05T02:00:00+02:00',
+                      '2021-08-04T19:00:00.000-0500']:
+            self.assertEqual(parse_timestamp(value), 1628121600, value)
+
+    def test_not_a_time(self):
+        for value in ['yesterday', '2021-13-05', '2021-08-05T00:00+2']:
+            with self.assertRaises(ValueError):
+                parse_timestamp(value)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
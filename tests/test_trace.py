@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+"""
+test_trace
+----------
+
+Tests for ``Timer`` laps and span tracing.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from web3 import Web3  # noqa
+
+from ether_py.utils import Timer  # noqa
+from ether_py.utils.trace import (  # noqa
+    read_trace,
+    span,
+    start_tracing,
+    stop_tracing,
+    to_chrome,
+    tracing_middleware,
+)
+from ether_py.utils.transport import PooledHTTPProvider  # noqa
+from standin_node import serve_http  # noqa
+
+
+class Test_Timer(unittest.TestCase):
+
+    def test_laps(self):
+        timer = Timer()
+        start = timer.start()
+        timer.lap('middle')
+        timer.stop()
+        self.assertEqual(timer.get_lap('__enter__'), start)
+        self.assertGreaterEqual(timer.get_lap('middle'), start)
+        self.assertGreaterEqual(timer.elapsed_raw(), 0.0)
+        self.assertEqual(timer.elapsed()[:6], '00:00:')
+        # Starting again keeps the first start time.
+        timer.start(lap='again')
+        self.assertEqual(timer.get_lap('__enter__'), start)
+
+    def test_nested_spans(self):
+        timer = Timer()
+
+        def work():
+            with timer.span('outer', thread=True):
+                with timer.span('inner') as args:
+                    args['late'] = 1
+
+        with timer.span('root'):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+            with timer.span('child'):
+                pass
+        spans = {s['name']: s for s in timer.spans}
+        self.assertEqual(spans['child']['parent'], spans['root']['id'])
+        # Spans in another thread do not nest under this thread's spans.
+        self.assertIsNone(spans['outer']['parent'])
+        self.assertEqual(spans['inner']['parent'], spans['outer']['id'])
+        self.assertEqual(spans['inner']['args'], {'late': 1})
+        self.assertLessEqual(spans['child']['dur'], spans['root']['dur'])
+
+    def test_error(self):
+        timer = Timer()
+        with self.assertRaises(ValueError):
+            with timer.span('fails'):
+                raise ValueError('bad value')
+        self.assertEqual(timer.spans[0]['args']['error'], 'bad value')
+
+
+class Test_Tracing(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = Timer()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        stop_tracing()
+        shutil.rmtree(self.tmpdir)
+
+    def test_off_by_default(self):
+        with span('ignored', block=1) as args:
+            self.assertEqual(args, {'block': 1})
+        with self.assertRaises(KeyError):
+            with span('ignored'):
+                raise KeyError('not swallowed')
+        self.assertEqual(self.timer.spans, [])
+
+    def test_middleware_and_chrome(self):
+        server, url = serve_http()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        w3 = Web3(PooledHTTPProvider(url))
+        w3.middleware_onion.inject(tracing_middleware, 'tracing', layer=0)
+        start_tracing(self.timer)
+        with span('command'):
+            w3.eth.chain_id
+        self.timer.record('eth_getBlockByNumber', time.time(), 0.01,
+                          category='rpc', concurrent=True)
+        path = os.path.join(self.tmpdir, 'trace.jsonl')
+        self.timer.write_trace(path)
+        spans = read_trace(path)
+        names = [s['name'] for s in spans]
+        self.assertEqual(names[:2], ['command', 'eth_chainId'])
+        self.assertEqual(spans[1]['parent'], spans[0]['id'])
+        events = to_chrome(spans)['traceEvents']
+        self.assertEqual([e['ph'] for e in events], ['X', 'X', 'b', 'e'])
+        self.assertEqual(events[0]['ts'], 0)
+        self.assertGreaterEqual(events[0]['dur'], events[1]['dur'])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+"""
+test_transactions
+-----------------
+
+Tests for getting blocks with their transactions and receipts.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ether_py.tx.receipt import TxReceipt  # noqa
+from ether_py.tx.show import TxShow  # noqa
+from ether_py.utils import (  # noqa
+    is_block_id,
+    is_tx_hash,
+    split_ids_and_fields,
+)
+from ether_py.utils.aio import AsyncEngine  # noqa
+from ether_py.utils.blockstore import BlockStore  # noqa
+from ether_py.utils.transactions import (  # noqa
+    TransactionFetcher,
+    denormalize,
+)
+from standin_node import (  # noqa
+    StandinChain,
+    serve_http,
+)
+
+
+class Test_TransactionFetcher(unittest.TestCase):
+
+    def serve(self, chain):
+        self.server, url = serve_http(chain=chain)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        return TransactionFetcher(AsyncEngine(url, concurrency=4),
+                                  batch_size=5, chunk_size=8)
+
+    def check(self, fetcher, chain):
+        numbers = list(range(10, 30))
+        results = list(fetcher.imap(numbers, receipts=True))
+        self.assertEqual(len(results), len(numbers))
+        for number, (block, receipts) in zip(numbers, results):
+            self.assertEqual(block['hash'], chain.block_hash(number))
+            self.assertEqual(
+                [tx['hash'] for tx in block['transactions']],
+                [chain.tx_hash(number, i)
+                 for i in range(chain.tx_count(number))])
+            self.assertEqual(
+                [receipt['transactionHash'] for receipt in receipts],
+                [tx['hash'] for tx in block['transactions']])
+
+    def test_block_receipts(self):
+        chain = StandinChain(head=100)
+        fetcher = self.serve(chain)
+        self.check(fetcher, chain)
+        self.assertIs(fetcher.block_receipts, True)
+        # A block and its receipts for each of 20 blocks, in batches of
+        # 5 calls, for chunks of 8, 8 and 4 blocks.
+        self.assertEqual(self.server.requests, 4 + 4 + 2)
+
+    def test_receipts_one_at_a_time(self):
+        chain = StandinChain(head=100, block_receipts=False)
+        fetcher = self.serve(chain)
+        self.check(fetcher, chain)
+        self.assertIs(fetcher.block_receipts, False)
+
+    def test_missing_block(self):
+        fetcher = self.serve(StandinChain(head=100))
+        results = list(fetcher.imap([99, 100, 101], receipts=True))
+        self.assertEqual(results[2], (None, None))
+        self.assertEqual(len(results[1][1]), 0)
+
+    def test_denormalize(self):
+        chain = StandinChain(head=100)
+        block = chain.block(15, full_transactions=True)
+        receipts = [chain.receipt(15, i) for i in range(3)]
+        records = list(denormalize(block, receipts))
+        self.assertEqual(len(records), 3)
+        record = records[1]
+        self.assertEqual(record['hash'], chain.tx_hash(15, 1))
+        # Receipt fields, and block fields with a prefix.
+        self.assertEqual(record['status'], '0x1')
+        self.assertEqual(record['gasUsed'], hex(21000))
+        self.assertEqual(record['blockGasUsed'], hex(63000))
+        self.assertEqual(record['blockTimestamp'], block['timestamp'])
+        self.assertEqual(record['blockHash'], block['hash'])
+        self.assertNotIn('blockTransactions', record)
+
+
+class Test_TxShow(unittest.TestCase):
+
+    def setUp(self):
+        self.chain = StandinChain(head=100)
+        self.server, url = serve_http(chain=self.chain)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        app = SimpleNamespace(
+            async_engine=lambda: AsyncEngine(url, concurrency=4),
+            options=SimpleNamespace(rpc_batch_size=10))
+        self.command = TxShow(app, None)
+
+    def test_lookup_in_order(self):
+        txs = [
+            self.chain.tx_hash(number, index)
+            for number in range(1, 60)
+            for index in range(self.chain.tx_count(number))
+        ]
+        missing = self.chain.tx_hash(5, 3)
+        given = ['bogus'] + txs[:40] + [missing] + txs[40:] + ['']
+        results = list(self.command.lookup(iter(given)))
+        self.assertEqual([tx for tx, _ in results], given)
+        self.assertEqual(results[0][1], 'not a transaction hash')
+        self.assertEqual(results[41][1], 'not found')
+        self.assertEqual(results[-1][1], 'not a transaction hash')
+        for tx, eth_tx in results[1:41] + results[42:-1]:
+            self.assertEqual(eth_tx['hash'].hex(), tx)
+
+    def test_rows(self):
+        tx = self.chain.tx_hash(3, 0)
+        columns = self.command.get_columns(['blockNumber', 'hash'])
+        self.assertEqual(columns, ['hash', 'blockNumber', 'error'])
+        self.assertEqual(list(self.command.rows([tx, 'bogus'], columns)), [
+            (tx, '3', ''),
+            ('bogus', '', 'not a transaction hash'),
+        ])
+        # Every row has the default columns, whatever fields each
+        # transaction has.
+        columns = self.command.get_columns([])
+        self.assertEqual(columns[0], 'hash')
+        self.assertIn('maxFeePerGas', columns)
+        rows = list(self.command.rows([tx, 'bogus'], columns))
+        self.assertEqual({len(row) for row in rows}, {len(columns)})
+
+    def test_split_ids_and_fields(self):
+        tx = self.chain.tx_hash(3, 0)
+        self.assertEqual(
+            split_ids_and_fields([tx, '0x1234', '42', 'gas', 'to'],
+                                 is_tx_hash),
+            ([tx, '0x1234', '42'], ['gas', 'to']))
+        self.assertEqual(
+            split_ids_and_fields(['latest', '0XABC', 'number'], is_block_id),
+            (['latest', '0XABC'], ['number']))
+        # A truncated hash gets an error row rather than being taken to
+        # be a field name.
+        txs, fields = split_ids_and_fields([tx, tx[:20], 'blockNumber'],
+                                           is_tx_hash)
+        rows = list(self.command.rows(txs, self.command.get_columns(fields)))
+        self.assertEqual(rows, [
+            (tx, '3', ''),
+            (tx[:20], '', 'not a transaction hash'),
+        ])
+
+
+class Test_TxReceipt(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.chain = StandinChain(head=100)
+        self.server, url = serve_http(chain=self.chain)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.store = BlockStore(os.path.join(self.tmpdir, 'chain.sqlite3'))
+        self.addCleanup(self.store.close)
+        self.app = SimpleNamespace(
+            async_engine=lambda: AsyncEngine(url, concurrency=4),
+            block_store=lambda: self.store,
+            get_block_cache_settings=lambda: {'finality_depth': 10},
+            options=SimpleNamespace(rpc_batch_size=10))
+        self.command = TxReceipt(self.app, None)
+
+    def test_cached_receipts(self):
+        txs = [
+            self.chain.tx_hash(number, index)
+            for number in [5, 50, 95]
+            for index in range(self.chain.tx_count(number))
+        ] + ['bogus']
+        results = list(self.command.lookup(iter(txs)))
+        self.assertEqual([tx for tx, _ in results], txs)
+        for tx, receipt in results[:-1]:
+            self.assertEqual(receipt['transactionHash'], tx)
+        self.assertEqual(results[-1][1], 'not a transaction hash')
+        # Receipts from blocks more than 10 behind the head are stored,
+        # and aren't requested again.
+        stored = self.store.get_tx_receipts(txs[:-1])
+        self.assertEqual(
+            sorted({int(r['blockNumber'], 16) for r in stored.values()}),
+            [5, 50])
+        requests = self.server.requests
+        final = [tx for tx in txs if tx in stored]
+        self.assertEqual(list(self.command.lookup(iter(final))),
+                         [(tx, stored[tx]) for tx in final])
+        self.assertEqual(self.server.requests, requests)
+
+    def test_no_block_store(self):
+        self.app.block_store = lambda: None
+        missing = self.chain.tx_hash(5, 3)
+        tx = self.chain.tx_hash(5, 0)
+        columns = self.command.get_columns(['gasUsed', 'status'])
+        self.assertEqual(list(self.command.rows([tx, missing], columns)), [
+            (tx, '21000', '1', ''),
+            (missing, '', '', 'not found'),
+        ])
+
+    def test_default_columns(self):
+        self.app.block_store = lambda: None
+        txs = [self.chain.tx_hash(5, 0), 'bogus']
+        columns = self.command.get_columns([])
+        self.assertEqual(columns[0], 'transactionHash')
+        self.assertEqual(columns[-1], 'error')
+        rows = [dict(zip(columns, row))
+                for row in self.command.rows(txs, columns)]
+        self.assertEqual(rows[0]['transactionHash'], txs[0])
+        self.assertEqual((rows[0]['gasUsed'], rows[0]['error']),
+                         ('21000', ''))
+        self.assertEqual((rows[1]['transactionHash'], rows[1]['error']),
+                         ('bogus', 'not a transaction hash'))
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+test_transport
+--------------
+
+Tests for the pooled HTTP transport.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from web3 import Web3  # noqa
+
+from ether_py.utils import (  # noqa
+    endpoint_type,
+    ordered_map,
+)
+from ether_py.utils.rpcbatch import RPCBatch  # noqa
+from ether_py.utils.transport import (  # noqa
+    BatchIPCProvider,
+    BatchWebsocketProvider,
+    PooledHTTPProvider,
+    get_provider,
+    get_transport_settings,
+)
+from standin_node import (  # noqa
+    serve_http,
+    serve_ipc,
+    serve_ws,
+)
+
+
+class Test_TransportSettings(unittest.TestCase):
+
+    def test_defaults(self):
+        settings = get_transport_settings()
+        self.assertEqual(
+            sorted(settings),
+            ['backoff', 'gzip', 'keep_alive', 'pool_size', 'retries',
+             'timeout'],
+        )
+
+    def test_precedence(self):
+        options = argparse.Namespace(http_pool_size=3, http_timeout=None)
+        secrets = {'http_pool_size': '7', 'http_timeout': '2.5',
+                   'http_gzip': 'false'}
+        settings = get_transport_settings(options=options,
+                                          get_secret=secrets.get)
+        self.assertEqual(settings['pool_size'], 3)
+        self.assertEqual(settings['timeout'], 2.5)
+        self.assertIs(settings['gzip'], False)
+
+
+class Test_PooledHTTPProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.server, self.url = serve_http()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_reused_across_threads(self):
+        settings = get_transport_settings()
+        settings['pool_size'] = 2
+        provider = PooledHTTPProvider(self.url, settings=settings)
+        results = list(ordered_map(
+            lambda i: provider.make_request('eth_chainId', []),
+            range(20),
+            workers=4,
+        ))
+        self.assertEqual([r['result'] for r in results], ['0x539'] * 20)
+        self.assertEqual(self.server.requests, 20)
+        self.assertLessEqual(self.server.connections, 2)
+
+
+
+class Test_EndpointProviders(unittest.TestCase):
+
+    def test_endpoint_type(self):
+        self.assertEqual(endpoint_type('https://mainnet.infura.io/v3/x'),
+                         'http')
+        self.assertEqual(endpoint_type('wss://node:8546'), 'websocket')
+        self.assertEqual(endpoint_type('/var/run/geth.ipc'), 'ipc')
+        self.assertEqual(endpoint_type('ipc:///var/run/geth.ipc'), 'ipc')
+        with self.assertRaises(ValueError):
+            endpoint_type('ftp://node')
+
+    def check_provider(self, server, uri, provider_class):
+        try:
+            provider = get_provider(uri)
+            self.assertIsInstance(provider, provider_class)
+            self.assertEqual(
+                provider.make_request('eth_chainId', [])['result'], '0x539')
+            with RPCBatch(Web3(provider)) as batch:
+                calls = [batch.add('eth_blockNumber') for _ in range(10)]
+            self.assertEqual({call.result() for call in calls}, {'0x4e20'})
+            self.assertEqual(server.requests, 2)
+            self.assertEqual(server.connections, 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_websocket(self):
+        self.check_provider(*serve_ws(), BatchWebsocketProvider)
+
+    def test_ipc(self):
+        path = os.path.join(tempfile.mkdtemp(), 'standin.ipc')
+        self.check_provider(*serve_ipc(path), BatchIPCProvider)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
+
+# vim: set fileencoding=utf-8 ts=4 sw=4 tw=0 et :